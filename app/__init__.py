@@ -52,6 +52,24 @@ def create_app(config_name='development'):
             'version': '1.0.0'
         }), 200
     
+    @app.route('/api/health/db', methods=['GET'])
+    def health_db():
+        from flask import jsonify
+        from app.utils.conexiones import metricas_pool
+        return jsonify({'status': 'ok', 'pool': metricas_pool()}), 200
+    
+    @app.route('/api/health/cache', methods=['GET'])
+    def health_cache():
+        from flask import jsonify
+        from app.cache import metricas_cache
+        return jsonify({'status': 'ok', 'cache': metricas_cache()}), 200
+    
+    # =====================
+    # POOL DE CONEXIONES (rutas con SQL crudo)
+    # =====================
+    from app.utils.conexiones import iniciar_pool
+    iniciar_pool(app)
+    
     # =====================
     # REGISTRAR BLUEPRINTS
     # =====================
@@ -62,6 +80,37 @@ def create_app(config_name='development'):
     except Exception as e:
         app.logger.warning(f'No se pudo cargar auth blueprint: {e}')
     
+    # =====================
+    # ÍNDICE DE PACIENTES (typeahead)
+    # =====================
+    from app.services.indice_pacientes import indice_pacientes
+    indice_pacientes.iniciar(app)
+
+    # =====================
+    # COMANDOS CLI
+    # =====================
+    from app.services.resumen_diario import resumen_cli
+    app.cli.add_command(resumen_cli)
+    from app.services.cola_ingesta import ingesta_cli
+    app.cli.add_command(ingesta_cli)
+    from app.services.mllp_server import mllp_cli
+    app.cli.add_command(mllp_cli)
+    try:
+        from app.services.file_monitor import monitor_cli
+        app.cli.add_command(monitor_cli)
+    except ImportError as e:
+        app.logger.warning(f'No se pudo cargar el comando monitor: {e}')
+    try:
+        from app.services.indice_dicom import dicom_cli
+        app.cli.add_command(dicom_cli)
+    except ImportError as e:
+        app.logger.warning(f'No se pudo cargar el comando dicom: {e}')
+    try:
+        from app.services.radiografia_service import imagenes_cli
+        app.cli.add_command(imagenes_cli)
+    except ImportError as e:
+        app.logger.warning(f'No se pudo cargar el comando imagenes: {e}')
+    
     # =====================
     # ERROR HANDLERS
     # =====================
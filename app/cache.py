@@ -1,40 +1,474 @@
+"""
+Cache de respuestas HTTP
+
+Dos niveles:
+- local: LRU con TTL y tamaño acotado, por worker
+- compartido (opcional): backend enchufable para que los workers de gunicorn
+  vean lo mismo. CACHE_BACKEND = 'sqlite' (archivo en TEMP_FOLDER, por defecto),
+  'redis' (CACHE_REDIS_URL) o 'ninguno'
+
+Se guarda la respuesta serializada (status, cabeceras, cuerpo), nunca el objeto
+Response. La clave incluye el endpoint, la identidad JWT y el query string.
+
+Invalidación por tags: cada tag tiene una versión en el backend compartido que
+forma parte de la clave; invalidar_tags('facturas') la incrementa y todas las
+entradas anteriores dejan de encontrarse en todos los workers.
+
+    @bp.route('/dashboard')
+    @jwt_required()
+    @cached(timeout=60, tags=('facturas',))
+    def dashboard(): ...
+"""
+from collections import OrderedDict
 from functools import wraps
-from flask import request
+from flask import current_app, request, make_response
 import hashlib
 import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TAG_GLOBAL = '__global__'
+
+
+# ========== NIVEL LOCAL ==========
+
+class CacheLocal:
+    """LRU con TTL, seguro entre hilos"""
+
+    def __init__(self, max_entradas=512):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira < time.time():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, ttl):
+        with self._lock:
+            self._datos[clave] = (valor, time.time() + ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+# ========== BACKENDS COMPARTIDOS ==========
+
+class BackendSQLite:
+    """Archivo SQLite en modo WAL compartido por los workers de la máquina"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._escrituras = 0
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        conn = self._conexion()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (clave TEXT PRIMARY KEY, valor BLOB, expira REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (clave TEXT PRIMARY KEY, valor TEXT)")
+        conn.execute("INSERT OR IGNORE INTO cache_meta (clave, valor) VALUES ('epoca', ?)",
+                     (os.urandom(4).hex(),))
+        self._epoca = conn.execute("SELECT valor FROM cache_meta WHERE clave = 'epoca'").fetchone()[0]
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, clave):
+        fila = self._conexion().execute(
+            "SELECT valor FROM cache WHERE clave = ? AND expira > ?", (clave, time.time())
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def set(self, clave, valor, ttl):
+        conn = self._conexion()
+        conn.execute("INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)",
+                     (clave, valor, time.time() + ttl))
+        self._escrituras += 1
+        if self._escrituras % 500 == 0:
+            conn.execute("DELETE FROM cache WHERE expira <= ?", (time.time(),))
+
+    def versiones(self, tags):
+        marcadores = ','.join('?' * len(tags))
+        filas = self._conexion().execute(
+            f"SELECT tag, version FROM cache_tags WHERE tag IN ({marcadores})", tuple(tags)
+        ).fetchall()
+        versiones = dict(filas)
+        return {tag: versiones.get(tag, 0) for tag in tags}
+
+    def incrementar(self, tag):
+        conn = self._conexion()
+        conn.execute("""
+            INSERT INTO cache_tags (tag, version) VALUES (?, 1)
+            ON CONFLICT(tag) DO UPDATE SET version = version + 1
+        """, (tag,))
+        return conn.execute("SELECT version FROM cache_tags WHERE tag = ?", (tag,)).fetchone()[0]
+
+    def epoca(self):
+        """Identifica este almacén: si se borra el archivo, las versiones no se repiten"""
+        return self._epoca
+
+    def limpiar(self):
+        self._conexion().execute("DELETE FROM cache")
+
+
+class BackendRedis:
+    """Redis (o compatible) para compartir entre máquinas"""
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+
+    def get(self, clave):
+        return self.redis.get(f"cache:{clave}")
+
+    def set(self, clave, valor, ttl):
+        self.redis.set(f"cache:{clave}", valor, ex=max(1, int(ttl)))
+
+    def versiones(self, tags):
+        valores = self.redis.mget([f"cache_tag:{tag}" for tag in tags])
+        return {tag: int(v or 0) for tag, v in zip(tags, valores)}
+
+    def incrementar(self, tag):
+        return self.redis.incr(f"cache_tag:{tag}")
+
+    def epoca(self):
+        self.redis.setnx('cache_epoca', os.urandom(4).hex())
+        return self.redis.get('cache_epoca').decode()
+
+    def limpiar(self):
+        for clave in self.redis.scan_iter('cache:*'):
+            self.redis.delete(clave)
+
+
+class BackendMemoria:
+    """Sin nivel compartido: las versiones de tags solo viven en este worker"""
+
+    def __init__(self):
+        self._versiones = {}
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        return None
+
+    def set(self, clave, valor, ttl):
+        pass
+
+    def versiones(self, tags):
+        return {tag: self._versiones.get(tag, 0) for tag in tags}
+
+    def incrementar(self, tag):
+        with self._lock:
+            self._versiones[tag] = self._versiones.get(tag, 0) + 1
+            return self._versiones[tag]
+
+    def epoca(self):
+        # Cada worker lleva su propio contador: no sirve para ETags por versión
+        return None
+
+    def limpiar(self):
+        pass
+
+
+# ========== ESTADO POR PROCESO ==========
+
+_estado = {'pid': None, 'local': None, 'backend': None}
+_versiones_locales = {}   # tag -> (version, leida_en)
+_metricas = {'hits_local': 0, 'hits_compartido': 0, 'misses': 0, 'guardados': 0,
+             'no_modificados': 0, 'invalidaciones': 0, 'errores_backend': 0}
+_lock = threading.Lock()
+
+
+def _contar(clave):
+    with _lock:
+        _metricas[clave] += 1
+
+
+def _crear_backend(config):
+    tipo = config.get('CACHE_BACKEND', 'sqlite')
+    if tipo == 'redis':
+        return BackendRedis(config['CACHE_REDIS_URL'])
+    if tipo == 'sqlite':
+        return BackendSQLite(config.get('CACHE_SQLITE_PATH') or
+                             os.path.join(config['TEMP_FOLDER'], 'cache.sqlite3'))
+    return BackendMemoria()
 
-# Cache simple en memoria (para producción usar Redis)
-_cache = {}
 
-def cache_key(*args, **kwargs):
-    """Generar clave de cache"""
-    key_data = f"{args}{kwargs}{request.path}"
-    return hashlib.md5(key_data.encode()).hexdigest()
+def _niveles():
+    """(local, backend) de este proceso; se recrean tras un fork"""
+    if _estado['pid'] != os.getpid():
+        with _lock:
+            if _estado['pid'] != os.getpid():
+                config = current_app.config
+                _estado['local'] = CacheLocal(config.get('CACHE_LOCAL_MAX_ENTRADAS', 512))
+                try:
+                    _estado['backend'] = _crear_backend(config)
+                except Exception as e:
+                    logger.warning(f"Cache: backend compartido no disponible ({e}), solo nivel local")
+                    _estado['backend'] = BackendMemoria()
+                _versiones_locales.clear()
+                _estado['pid'] = os.getpid()
+    return _estado['local'], _estado['backend']
 
-def cached(timeout=300):
-    """Decorador para cachear respuestas"""
+
+def _versiones(tags):
+    """Versiones de los tags; se releen del backend cada CACHE_TAGS_TTL segundos"""
+    _, backend = _niveles()
+    ttl = current_app.config.get('CACHE_TAGS_TTL', 1)
+    ahora = time.time()
+    vencidos = [t for t in tags if t not in _versiones_locales or ahora - _versiones_locales[t][1] > ttl]
+    if vencidos:
+        try:
+            for tag, version in backend.versiones(vencidos).items():
+                _versiones_locales[tag] = (version, ahora)
+        except Exception as e:
+            _contar('errores_backend')
+            logger.warning(f"Cache: error leyendo versiones de tags: {e}")
+    return [(t, _versiones_locales.get(t, (0, 0))[0]) for t in tags]
+
+
+def version_tag(tag):
+    """Versión actual de un tag, para cachés propias que dependen de él"""
+    return _versiones([tag])[0][1]
+
+
+def invalidar_tags(*tags):
+    """Invalidar en todos los workers las respuestas marcadas con estos tags"""
+    if not tags:
+        return
+    _, backend = _niveles()
+    for tag in tags:
+        try:
+            version = backend.incrementar(tag)
+        except Exception as e:
+            _contar('errores_backend')
+            logger.warning(f"Cache: error invalidando tag {tag}: {e}")
+            version = _versiones_locales.get(tag, (0, 0))[0] + 1
+        _versiones_locales[tag] = (version, time.time())
+        _contar('invalidaciones')
+
+
+def clear_cache():
+    """Limpiar todo el cache (todos los workers)"""
+    local, backend = _niveles()
+    local.limpiar()
+    invalidar_tags(TAG_GLOBAL)
+    try:
+        backend.limpiar()
+    except Exception as e:
+        logger.warning(f"Cache: error limpiando backend: {e}")
+
+
+def metricas_cache():
+    local, backend = _niveles()
+    with _lock:
+        metricas = dict(_metricas)
+    consultas = metricas['hits_local'] + metricas['hits_compartido'] + metricas['misses']
+    metricas['hit_ratio'] = round((metricas['hits_local'] + metricas['hits_compartido']) / consultas, 3) \
+        if consultas else 0.0
+    metricas['entradas_locales'] = len(local)
+    metricas['backend'] = type(backend).__name__
+    return metricas
+
+
+# ========== CLAVES ==========
+
+def identidad_jwt():
+    """Identidad del token (o 'anonimo'); no falla si la ruta no exige JWT"""
+    try:
+        from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+        verify_jwt_in_request(optional=True)
+        return str(get_jwt_identity() or 'anonimo')
+    except Exception:
+        return 'anonimo'
+
+
+def clave_por_usuario():
+    """endpoint + identidad JWT + query string ordenado"""
+    query = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return f"{request.endpoint}|{identidad_jwt()}|{request.view_args or ''}|{query}"
+
+
+def clave_publica():
+    """Igual que clave_por_usuario pero compartida entre usuarios (catálogos)"""
+    query = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return f"{request.endpoint}|{request.view_args or ''}|{query}"
+
+
+# ========== SERIALIZACIÓN ==========
+
+def _serializar(respuesta):
+    cabecera = json.dumps({
+        'status': respuesta.status_code,
+        'headers': [(k, v) for k, v in respuesta.headers.items()
+                    if k.lower() not in ('content-length', 'set-cookie')]
+    }).encode()
+    return cabecera + b'\n' + respuesta.get_data()
+
+
+def _deserializar(datos):
+    cabecera, cuerpo = datos.split(b'\n', 1)
+    meta = json.loads(cabecera)
+    respuesta = make_response(cuerpo, meta['status'])
+    respuesta.headers.clear()
+    for k, v in meta['headers']:
+        respuesta.headers.add(k, v)
+    return respuesta
+
+
+def _con_etag(respuesta):
+    """Responder 304 si el cliente ya tiene esta versión"""
+    if respuesta.status_code == 200 and not respuesta.is_streamed:
+        if not respuesta.get_etag()[0]:
+            respuesta.set_etag(hashlib.sha1(respuesta.get_data()).hexdigest())
+        respuesta.make_conditional(request)
+        if respuesta.status_code == 304:
+            _contar('no_modificados')
+    return respuesta
+
+
+# ========== DECORADOR ==========
+
+def cached(timeout=300, tags=(), clave=None, compartido=True):
+    """Cachear la respuesta de una vista GET
+
+    timeout: segundos de vida; tags: grupos a invalidar con invalidar_tags();
+    clave: función que identifica la variante (por defecto usuario + query string);
+    compartido: guardar también en el backend compartido.
+    """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            key = f"{f.__name__}:{cache_key(*args, **kwargs)}"
-            
-            # Verificar si está en cache
-            if key in _cache:
-                cached_data, timestamp = _cache[key]
-                from time import time
-                if time() - timestamp < timeout:
-                    return cached_data
-            
-            # Ejecutar función y guardar en cache
-            result = f(*args, **kwargs)
-            from time import time
-            _cache[key] = (result, time())
-            
-            return result
+            if request.method != 'GET' or not current_app.config.get('CACHE_HABILITADO', True):
+                return f(*args, **kwargs)
+
+            local, backend = _niveles()
+            versiones = _versiones((TAG_GLOBAL,) + tuple(tags))
+            base = (clave or clave_por_usuario)()
+            key = hashlib.sha256(f"{base}|{versiones}".encode()).hexdigest()
+
+            datos = local.get(key)
+            if datos is not None:
+                _contar('hits_local')
+                return _con_etag(_deserializar(datos))
+
+            if compartido:
+                try:
+                    datos = backend.get(key)
+                except Exception as e:
+                    _contar('errores_backend')
+                    logger.warning(f"Cache: error leyendo backend: {e}")
+                if datos is not None:
+                    _contar('hits_compartido')
+                    local.set(key, datos, timeout)
+                    return _con_etag(_deserializar(datos))
+
+            _contar('misses')
+            respuesta = make_response(f(*args, **kwargs))
+
+            if respuesta.status_code == 200 and not respuesta.is_streamed:
+                if not respuesta.get_etag()[0]:
+                    respuesta.set_etag(hashlib.sha1(respuesta.get_data()).hexdigest())
+                datos = _serializar(respuesta)
+                if len(datos) <= current_app.config.get('CACHE_MAX_TAMANO', 1024 * 1024):
+                    local.set(key, datos, timeout)
+                    if compartido:
+                        try:
+                            backend.set(key, datos, timeout)
+                        except Exception as e:
+                            _contar('errores_backend')
+                            logger.warning(f"Cache: error escribiendo backend: {e}")
+                    _contar('guardados')
+
+            return _con_etag(respuesta)
         return decorated_function
     return decorator
 
-def clear_cache():
-    """Limpiar todo el cache"""
-    global _cache
-    _cache = {}
+
+# ========== CATÁLOGOS VERSIONADOS ==========
+
+def _epoca(backend):
+    if 'epoca' not in _estado or _estado.get('epoca_pid') != os.getpid():
+        try:
+            _estado['epoca'] = backend.epoca()
+        except Exception as e:
+            _contar('errores_backend')
+            logger.warning(f"Cache: error leyendo época del backend: {e}")
+            return None
+        _estado['epoca_pid'] = os.getpid()
+    return _estado['epoca']
+
+
+def catalogo(tag, max_age=0, publico=False):
+    """Catálogo casi estático con ETag fuerte derivado de la versión del tag
+
+    Las rutas que modifican el catálogo llaman invalidar_tags(tag). Si el ETag
+    del cliente coincide con la versión actual se responde 304 sin ejecutar la
+    vista (ni consultar la base de datos). Sin backend compartido las versiones
+    no son comunes a los workers y se usa el hash del contenido.
+    """
+    control = f"{'public' if publico else 'private'}, " + (
+        f"max-age={max_age}, must-revalidate" if max_age else 'no-cache'
+    )
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            local, backend = _niveles()
+            epoca = _epoca(backend)
+
+            if epoca is None or not current_app.config.get('CACHE_HABILITADO', True):
+                respuesta = _con_etag(make_response(f(*args, **kwargs)))
+                respuesta.headers['Cache-Control'] = control
+                return respuesta
+
+            versiones = _versiones((TAG_GLOBAL, tag))
+            variante = hashlib.sha1(clave_publica().encode()).hexdigest()[:10]
+            etag = f"{tag}-{epoca}-{versiones[0][1]}.{versiones[1][1]}-{variante}"
+
+            if request.if_none_match.contains(etag):
+                _contar('no_modificados')
+                respuesta = make_response('', 304)
+            else:
+                datos = local.get(etag)
+                if datos is not None:
+                    _contar('hits_local')
+                    respuesta = _deserializar(datos)
+                else:
+                    _contar('misses')
+                    respuesta = make_response(f(*args, **kwargs))
+                    if respuesta.status_code != 200:
+                        return respuesta
+                    local.set(etag, _serializar(respuesta), 24 * 3600)
+                    _contar('guardados')
+
+            respuesta.set_etag(etag)
+            respuesta.headers['Cache-Control'] = control
+            return respuesta
+        return decorated_function
+    return decorator
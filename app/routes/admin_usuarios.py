@@ -1,14 +1,10 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import psycopg2
-import os
+from app.utils.conexiones import get_db_connection
 import bcrypt
 
 bp = Blueprint('admin_usuarios', __name__)
 
-def get_db_connection():
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
-
 @bp.route('/usuarios', methods=['GET'])
 @jwt_required()
 def listar_usuarios():
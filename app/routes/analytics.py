@@ -1,16 +1,10 @@
 from flask import Blueprint, jsonify, request
 from functools import wraps
-import psycopg2
-import os
+from app.utils.conexiones import get_db_connection
 from datetime import datetime, timedelta
 
 analytics_bp = Blueprint('analytics', __name__)
 
-def get_db_connection():
-    """Obtener conexión a la base de datos"""
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'))
-    return conn
-
 def require_auth(f):
     """Decorador para requerir autenticación"""
     @wraps(f)
@@ -33,19 +27,19 @@ def dashboard_completo():
                 (SELECT COUNT(*) FROM pacientes) as total_pacientes,
                 (SELECT COUNT(*) FROM ordenes WHERE estado = 'pendiente') as ordenes_pendientes,
                 (SELECT COUNT(*) FROM facturas WHERE estado IN ('pendiente', 'parcial')) as facturas_pendientes,
-                (SELECT COALESCE(SUM(total), 0) FROM facturas WHERE DATE_TRUNC('month', fecha) = DATE_TRUNC('month', CURRENT_DATE) AND estado = 'pagada') as ventas_mes
+                (SELECT COALESCE(SUM(monto_facturas), 0) FROM resumen_diario WHERE fecha >= DATE_TRUNC('month', CURRENT_DATE)::date AND estado = 'pagada') as ventas_mes
         """)
         dashboard = cur.fetchone()
         
-        # Ingresos mensuales (últimos 6 meses)
+        # Ingresos mensuales (últimos 6 meses) desde el rollup diario
         cur.execute("""
             SELECT 
-                TO_CHAR(fecha, 'Mon YYYY') as mes,
-                COALESCE(SUM(total), 0) as ingresos
-            FROM facturas
-            WHERE fecha >= CURRENT_DATE - INTERVAL '6 months'
+                TO_CHAR(DATE_TRUNC('month', fecha), 'Mon YYYY') as mes,
+                COALESCE(SUM(monto_facturas), 0) as ingresos
+            FROM resumen_diario
+            WHERE fecha >= (CURRENT_DATE - INTERVAL '6 months')::date
             AND estado = 'pagada'
-            GROUP BY DATE_TRUNC('month', fecha), TO_CHAR(fecha, 'Mon YYYY')
+            GROUP BY DATE_TRUNC('month', fecha)
             ORDER BY DATE_TRUNC('month', fecha)
         """)
         ingresos_mensuales = [{'mes': row[0], 'ingresos': float(row[1])} for row in cur.fetchall()]
@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app import db
-from app.models import Paciente, Orden, Factura, Estudio
+from app.models import Paciente, Estudio
 from app.utils.validators import sanitize_string
+from app.services.busqueda_service import BusquedaService
+from app.services.indice_pacientes import indice_pacientes
+from app.utils.paginacion import parametros_keyset, paginar_query, total_listado, pagina_solicitada, campos_pagina
 from sqlalchemy import or_, cast, String
 
 bp = Blueprint('busqueda', __name__)
@@ -17,63 +20,7 @@ def busqueda_global():
     if not termino or len(termino) < 2:
         return jsonify({'error': 'Mínimo 2 caracteres para buscar'}), 400
 
-    search = f'%{termino}%'
-    resultados = {}
-
-    # Buscar pacientes
-    pacientes = Paciente.query.filter(
-        or_(
-            Paciente.nombre.ilike(search),
-            Paciente.apellido.ilike(search),
-            Paciente.cedula.ilike(search),
-            Paciente.telefono.ilike(search),
-            Paciente.celular.ilike(search),
-            Paciente.email.ilike(search),
-            Paciente.codigo_paciente.ilike(search)
-        )
-    ).limit(10).all()
-
-    resultados['pacientes'] = [{
-        'id': p.id,
-        'cedula': p.cedula,
-        'nombre': f"{p.nombre} {p.apellido}",
-        'telefono': p.telefono or p.celular,
-        'codigo': p.codigo_paciente,
-        'estado': p.estado
-    } for p in pacientes]
-
-    # Buscar órdenes
-    ordenes = Orden.query.filter(
-        or_(
-            Orden.numero_orden.ilike(search),
-            Orden.medico_referente.ilike(search)
-        )
-    ).order_by(Orden.fecha_orden.desc()).limit(10).all()
-
-    resultados['ordenes'] = [{
-        'id': o.id,
-        'numero_orden': o.numero_orden,
-        'paciente': f"{o.paciente.nombre} {o.paciente.apellido}" if o.paciente else 'N/A',
-        'fecha': o.fecha_orden.isoformat(),
-        'estado': o.estado
-    } for o in ordenes]
-
-    # Buscar facturas
-    facturas = Factura.query.filter(
-        or_(
-            Factura.numero_factura.ilike(search),
-            Factura.ncf.ilike(search)
-        )
-    ).order_by(Factura.fecha_factura.desc()).limit(10).all()
-
-    resultados['facturas'] = [{
-        'id': f.id,
-        'numero_factura': f.numero_factura,
-        'ncf': f.ncf,
-        'paciente': f"{f.paciente.nombre} {f.paciente.apellido}" if f.paciente else 'N/A',
-        'total': float(f.total),
-        'estado': f.estado
-    } for f in facturas]
+    resultados = BusquedaService.buscar_global(termino)
 
     total = len(resultados['pacientes']) + len(resultados['ordenes']) + len(resultados['facturas'])
 
@@ -84,6 +31,39 @@ def busqueda_global():
     })
 
 
+@bp.route('/typeahead', methods=['GET'])
+@jwt_required()
+def typeahead():
+    """Sugerencias por prefijo desde el índice en memoria del worker"""
+    termino = sanitize_string(request.args.get('q', ''), max_length=100)
+    limite = min(20, max(1, request.args.get('limit', 10, type=int)))
+
+    if not termino or len(termino) < 2:
+        return jsonify({'termino': termino, 'pacientes': []})
+
+    indice_pacientes.precargar()
+    if not indice_pacientes.listo:
+        # Mientras el worker construye el índice, responder desde PostgreSQL
+        return jsonify({
+            'termino': termino,
+            'fuente': 'db',
+            'pacientes': BusquedaService.buscar_pacientes(termino, limite)
+        })
+
+    return jsonify({
+        'termino': termino,
+        'fuente': 'memoria',
+        'pacientes': [{
+            'id': p['id'],
+            'cedula': p['cedula'],
+            'nombre': f"{p['nombre']} {p['apellido']}",
+            'telefono': p['telefono'] or p['celular'],
+            'codigo': p['codigo'],
+            'estado': p['estado']
+        } for p in indice_pacientes.buscar(termino, limite)]
+    })
+
+
 @bp.route('/pacientes', methods=['GET'])
 @jwt_required()
 def buscar_pacientes():
@@ -112,16 +92,22 @@ def buscar_pacientes():
     if seguro:
         query = query.filter(Paciente.seguro_medico.ilike(f'%{seguro}%'))
 
-    page = max(1, request.args.get('page', 1, type=int))
-    per_page = min(50, max(1, request.args.get('per_page', 20, type=int)))
+    try:
+        limite, cursor = parametros_keyset(limite_defecto=20, limite_maximo=50)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    result = query.order_by(Paciente.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    pagina = pagina_solicitada()
+    pacientes, siguiente_cursor = paginar_query(
+        query, Paciente.created_at, Paciente.id, limite, cursor, pagina=pagina
     )
+    filtrado = bool((termino and len(termino) >= 2) or estado in ('activo', 'inactivo') or seguro)
+    total, estimado = total_listado('pacientes', query, filtrado=filtrado)
 
     return jsonify({
-        'pacientes': [p.to_dict() for p in result.items],
-        'total': result.total,
-        'pages': result.pages,
-        'current_page': page
+        'pacientes': [p.to_dict() for p in pacientes],
+        'total': total,
+        'total_estimado': estimado,
+        **campos_pagina(total, limite, pagina),
+        'siguiente_cursor': siguiente_cursor
     })
@@ -1,13 +1,9 @@
 from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required
-import psycopg2
-import os
+from app.utils.conexiones import get_db_connection
 
 bp = Blueprint('citas', __name__)
 
-def get_db_connection():
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
-
 @bp.route('/hoy', methods=['GET'])
 @jwt_required()
 def get_citas_hoy():
@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import Configuracion, Usuario
 from app.utils.validators import sanitize_string, sanitize_dict
+from app.cache import catalogo, invalidar_tags
 
 bp = Blueprint('configuracion', __name__)
 
@@ -22,6 +23,7 @@ def require_admin(f):
 
 @bp.route('/', methods=['GET'])
 @jwt_required()
+@catalogo('configuracion')
 def obtener_configuracion():
     """Obtener toda la configuración"""
     configs = Configuracion.query.all()
@@ -55,6 +57,7 @@ def actualizar_configuracion():
             actualizados.append(clave)
 
     db.session.commit()
+    invalidar_tags('configuracion')
 
     return jsonify({
         'success': True,
@@ -64,6 +67,7 @@ def actualizar_configuracion():
 
 
 @bp.route('/empresa', methods=['GET'])
+@catalogo('configuracion', max_age=300, publico=True)
 def info_empresa():
     """Información pública del centro (para recibos, portal)"""
     claves = ['empresa_nombre', 'empresa_rnc', 'empresa_telefono', 'empresa_direccion']
@@ -1,14 +1,10 @@
 from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required
-import psycopg2
-import os
+from app.utils.conexiones import get_db_connection
 from datetime import datetime, timedelta
 
 bp = Blueprint('dashboard', __name__)
 
-def get_db_connection():
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
-
 @bp.route('/stats', methods=['GET'])
 @jwt_required()
 def get_stats():
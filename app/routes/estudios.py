@@ -1,15 +1,13 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-import psycopg2
-import os
+from app.utils.conexiones import get_db_connection
+from app.cache import catalogo, invalidar_tags
 
 bp = Blueprint('estudios', __name__)
 
-def get_db_connection():
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
-
 @bp.route('/', methods=['GET'])
 @jwt_required()
+@catalogo('estudios')
 def listar_estudios():
     """Listar todos los estudios"""
     try:
@@ -86,6 +84,7 @@ def crear_estudio():
         
         estudio_id = cur.fetchone()[0]
         conn.commit()
+        invalidar_tags('estudios')
         cur.close()
         conn.close()
         
@@ -127,6 +126,7 @@ def actualizar_estudio(estudio_id):
         ))
         
         conn.commit()
+        invalidar_tags('estudios')
         cur.close()
         conn.close()
         
@@ -149,6 +149,7 @@ def eliminar_estudio(estudio_id):
         """, (estudio_id,))
         
         conn.commit()
+        invalidar_tags('estudios')
         cur.close()
         conn.close()
         
@@ -158,6 +159,7 @@ def eliminar_estudio(estudio_id):
 
 @bp.route('/categorias', methods=['GET'])
 @jwt_required()
+@catalogo('estudios')
 def listar_categorias():
     """Listar categorías"""
     try:
@@ -183,6 +185,7 @@ def listar_categorias():
 
 @bp.route('/precios', methods=['GET'])
 @jwt_required()
+@catalogo('estudios')
 def listar_precios():
     """Listar precios para facturación"""
     try:
@@ -1,11 +1,12 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import Factura, Pago, Paciente
 from app.services.facturacion import FacturacionService
-from app.services.pdf_service import PDFService
-import os
-import tempfile
+from app.services.documentos_pdf import obtener_documentos
+from app.services.lotes_pdf import obtener_lotes, parsear_filtros
+from app.utils.paginacion import parametros_keyset, paginar_query, total_listado
+from io import BytesIO
 
 bp = Blueprint('facturas', __name__)
 
@@ -13,12 +14,24 @@ bp = Blueprint('facturas', __name__)
 @bp.route('/', methods=['GET'])
 @jwt_required()
 def listar_facturas():
+    try:
+        limite, cursor = parametros_keyset(limite_defecto=100)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     estado = request.args.get('estado')
     query = Factura.query
     if estado:
         query = query.filter(Factura.estado == estado)
-    facturas = query.order_by(Factura.fecha_factura.desc()).limit(100).all()
-    return jsonify({'facturas': [f.to_dict() for f in facturas], 'total': len(facturas)})
+    facturas, siguiente_cursor = paginar_query(
+        query, Factura.fecha_factura, Factura.id, limite, cursor
+    )
+    total, estimado = total_listado('facturas', query, filtrado=bool(estado))
+    return jsonify({
+        'facturas': [f.to_dict() for f in facturas],
+        'total': total,
+        'total_estimado': estimado,
+        'siguiente_cursor': siguiente_cursor
+    })
 
 
 @bp.route('/<int:factura_id>', methods=['GET'])
@@ -101,24 +114,70 @@ def facturas_pendientes():
 @jwt_required()
 def descargar_factura_pdf(factura_id):
     try:
-        factura = Factura.query.get_or_404(factura_id)
-        
-        # Usar directorio temporal del sistema
-        pdf_filename = f'factura_{factura.numero_factura.replace("-", "_")}.pdf'
-        pdf_path = os.path.join(tempfile.gettempdir(), pdf_filename)
-        
-        PDFService.generar_factura_pdf(factura, pdf_path)
-        
+        documento = obtener_documentos(current_app).factura(factura_id)
+        if documento is None:
+            return jsonify({'error': 'Factura no encontrada'}), 404
+        pdf, clave, pdf_filename = documento
+
+        # Desde memoria: sin archivo temporal compartido entre descargas
         return send_file(
-            pdf_path, 
-            as_attachment=True, 
-            download_name=pdf_filename, 
-            mimetype='application/pdf'
+            BytesIO(pdf),
+            as_attachment=True,
+            download_name=pdf_filename,
+            mimetype='application/pdf',
+            conditional=True,
+            etag=clave
         )
     except Exception as e:
         return jsonify({'error': f'Error al generar PDF: {str(e)}'}), 500
 
 
+@bp.route('/lotes', methods=['POST'])
+@jwt_required()
+def crear_lote_pdf():
+    """PDF de muchas facturas en segundo plano: responde 202 con el id del lote"""
+    try:
+        datos = request.get_json() or {}
+        filtros = parsear_filtros(datos)
+        estado = obtener_lotes(current_app).crear(
+            current_app._get_current_object(), filtros, datos.get('formato', 'zip')
+        )
+        estado['estado_url'] = f"/api/facturas/lotes/{estado['lote_id']}"
+        return jsonify(estado), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/lotes/<lote_id>', methods=['GET'])
+@jwt_required()
+def estado_lote_pdf(lote_id):
+    try:
+        estado = obtener_lotes(current_app).estado(lote_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if estado is None:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+    if estado['estado'] == 'listo':
+        estado['descarga_url'] = f'/api/facturas/lotes/{lote_id}/descarga'
+    return jsonify(estado)
+
+
+@bp.route('/lotes/<lote_id>/descarga', methods=['GET'])
+@jwt_required()
+def descargar_lote_pdf(lote_id):
+    try:
+        resultado = obtener_lotes(current_app).resultado(lote_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if resultado is None:
+        return jsonify({'error': 'El lote no existe o aún no está listo'}), 404
+    ruta, mimetype, nombre = resultado
+    return send_file(ruta, mimetype=mimetype, as_attachment=True, download_name=nombre, conditional=True)
+
+
 @bp.route('/crear-directa', methods=['POST'])
 @jwt_required()
 def crear_factura_directa():
@@ -1,15 +1,51 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required
 from app import db
 from app.models import Factura, Orden, Pago, Paciente
 from app.services.impresion_termica import ImpresionTermica
 from app.services.pdf_service import PDFService
+from app.services import escpos, etiquetas, recibos
+from io import BytesIO
 import tempfile
 import os
 
 bp = Blueprint('impresion', __name__)
 
 
+def _es_escpos():
+    return request.args.get('format', 'pdf').lower() == 'escpos'
+
+
+def _responder_escpos(recibo, nombre):
+    """Recibo en ESC/POS: descarga directa o envío a ?impresora=<nombre> por TCP 9100"""
+    datos = recibos.a_escpos(recibo, current_app.config.get('IMPRESORA_TERMICA_COLUMNAS', 48))
+    return _responder_crudo(datos, f'{nombre}.bin')
+
+
+def _responder_crudo(datos, nombre, mimetype='application/octet-stream'):
+    """Bytes para la impresora: descarga o envío a ?impresora=<nombre> por TCP 9100"""
+    impresora = request.args.get('impresora')
+    if not impresora:
+        return send_file(
+            BytesIO(datos),
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=nombre
+        )
+
+    # Solo impresoras configuradas: el host nunca viene del cliente
+    impresoras = escpos.impresoras_configuradas(current_app.config.get('IMPRESORAS_TERMICAS'))
+    if impresora not in impresoras:
+        return jsonify({'error': f'Impresora no configurada: {impresora}'}), 404
+    host, puerto = impresoras[impresora]
+    try:
+        enviados = escpos.enviar_a_impresora(host, puerto, datos,
+                                             timeout=current_app.config.get('IMPRESORA_TERMICA_TIMEOUT', 5))
+    except OSError as e:
+        return jsonify({'error': f'No se pudo imprimir en {impresora}: {e}'}), 502
+    return jsonify({'impresora': impresora, 'bytes': enviados}), 200
+
+
 @bp.route('/recibo-pago/<int:pago_id>', methods=['GET'])
 @jwt_required()
 def imprimir_recibo_pago(pago_id):
@@ -20,6 +56,9 @@ def imprimir_recibo_pago(pago_id):
     if not factura:
         return jsonify({'error': 'Factura no encontrada'}), 404
     
+    if _es_escpos():
+        return _responder_escpos(recibos.recibo_pago(factura, pago), f'recibo_{pago_id}')
+    
     pdf_buffer = ImpresionTermica.generar_recibo_pago(factura, pago)
     
     return send_file(
@@ -36,6 +75,9 @@ def imprimir_ticket_orden(orden_id):
     """Generar ticket de orden para impresora 80mm"""
     orden = Orden.query.get_or_404(orden_id)
     
+    if _es_escpos():
+        return _responder_escpos(recibos.ticket_orden(orden), f'ticket_{orden.numero_orden}')
+    
     pdf_buffer = ImpresionTermica.generar_ticket_orden(orden)
     
     return send_file(
@@ -68,6 +110,31 @@ def imprimir_etiqueta(orden_id, detalle_id):
     )
 
 
+@bp.route('/etiquetas/orden/<int:orden_id>', methods=['GET'])
+@jwt_required()
+def imprimir_etiquetas_orden(orden_id):
+    """Etiquetas de todos los tubos de la orden en un solo documento (pdf, escpos o zpl)"""
+    formato = request.args.get('format', 'pdf').lower()
+    if formato not in etiquetas.FORMATOS:
+        return jsonify({'error': f'Formato inválido: {formato}'}), 400
+    try:
+        lista = etiquetas.etiquetas_orden(orden_id, request.args.get('agrupar'))
+        if lista is None:
+            return jsonify({'error': 'Orden no encontrada'}), 404
+        if not lista:
+            return jsonify({'error': 'La orden no tiene estudios'}), 404
+
+        generar, mimetype, extension = etiquetas.FORMATOS[formato]
+        datos = generar(lista)
+        nombre = f'etiquetas_{lista[0].orden}.{extension}'
+        if formato == 'pdf':
+            return send_file(BytesIO(datos), mimetype=mimetype, as_attachment=True, download_name=nombre)
+        return _responder_crudo(datos, nombre, mimetype)
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @bp.route('/factura/<int:factura_id>', methods=['GET'])
 @jwt_required()
 def imprimir_factura(factura_id):
@@ -94,6 +161,8 @@ def imprimir_factura_termica(factura_id):
     factura = Factura.query.get_or_404(factura_id)
     
     try:
+        if _es_escpos():
+            return _responder_escpos(recibos.factura_80mm(factura), f'factura_{factura.numero_factura}_80mm')
         pdf_buffer = ImpresionService.generar_factura_80mm(factura)
         return send_file(
             pdf_buffer,
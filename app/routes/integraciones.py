@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required
 from app.services.hl7_service import HL7Service
 from app.services.dicom_service import DICOMService
+from app.services.indice_dicom import IndiceDicomService
+from app.services.dicom_render import obtener_cache_render, FORMATOS as FORMATOS_RENDER
+from app.utils.paginacion import parametros_keyset
+from datetime import datetime, timedelta
 import os
 
 bp = Blueprint('integraciones', __name__)
@@ -38,10 +42,86 @@ def parse_dicom():
         return jsonify({'error': 'No file selected'}), 400
     
     try:
-        filepath = f"/tmp/{file.filename}"
-        file.save(filepath)
-        metadata = DICOMService.parse_dicom_file(filepath)
-        os.remove(filepath)
+        # Solo el encabezado, leído directo del upload (sin copia en /tmp)
+        metadata = DICOMService.parse_dicom_file(file.stream)
         return jsonify({'success': True, 'metadata': metadata})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+# ========== ÍNDICE DICOM ==========
+
+@bp.route('/dicom/estudios', methods=['GET'])
+@jwt_required()
+def buscar_estudios_dicom():
+    """Estudios indexados por paciente, fecha (desde/hasta) o modalidad"""
+    try:
+        limite, cursor = parametros_keyset(limite_defecto=50)
+        desde = request.args.get('desde')
+        hasta = request.args.get('hasta')
+        desde = datetime.strptime(desde, '%Y-%m-%d') if desde else None
+        hasta = datetime.strptime(hasta, '%Y-%m-%d') + timedelta(days=1) if hasta else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    estudios, siguiente_cursor = IndiceDicomService.buscar_estudios(
+        paciente_id=request.args.get('paciente_id', type=int),
+        patient_id=request.args.get('patient_id'),
+        orden_id=request.args.get('orden_id', type=int),
+        modalidad=request.args.get('modalidad'),
+        desde=desde,
+        hasta=hasta,
+        limite=limite,
+        cursor=cursor
+    )
+    return jsonify({'estudios': estudios, 'siguiente_cursor': siguiente_cursor})
+
+@bp.route('/dicom/estudios/<study_uid>', methods=['GET'])
+@jwt_required()
+def obtener_estudio_dicom(study_uid):
+    """Estudio con series e instancias desde el índice"""
+    estudio = IndiceDicomService.estudio(study_uid)
+    if not estudio:
+        return jsonify({'error': 'Estudio no encontrado'}), 404
+    return jsonify(estudio)
+
+@bp.route('/dicom/instancias/<sop_uid>/archivo', methods=['GET'])
+@jwt_required()
+def descargar_instancia_dicom(sop_uid):
+    """Archivo DICOM completo (solo aquí se leen los píxeles)"""
+    instancia = IndiceDicomService.instancia(sop_uid)
+    if not instancia or not os.path.exists(instancia['ruta']):
+        return jsonify({'error': 'Instancia no encontrada'}), 404
+    return send_file(instancia['ruta'], mimetype='application/dicom', as_attachment=True,
+                     download_name=f'{sop_uid}.dcm', conditional=True, etag=instancia['sha256'] or True)
+
+@bp.route('/dicom/instancias/<sop_uid>/imagen', methods=['GET'])
+@jwt_required()
+def imagen_instancia_dicom(sop_uid):
+    """
+    Vista renderizada: ?resolucion=miniatura|pantalla|completa, ?cuadro=N,
+    ?centro=&ancho= (ventana; por defecto la del archivo), ?formato=png|jpeg
+    """
+    instancia = IndiceDicomService.instancia(sop_uid)
+    if not instancia or not os.path.exists(instancia['ruta']):
+        return jsonify({'error': 'Instancia no encontrada'}), 404
+
+    formato = request.args.get('formato', 'png')
+    try:
+        ruta = obtener_cache_render(current_app).obtener(
+            sop_uid, instancia['ruta'],
+            indice=request.args.get('cuadro', 0, type=int),
+            centro=request.args.get('centro', type=float),
+            ancho=request.args.get('ancho', type=float),
+            resolucion=request.args.get('resolucion', 'pantalla'),
+            formato=formato
+        )
+    except (ValueError, IndexError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    # La clave de la caché ya identifica instancia + ventana: el contenido no cambia
+    respuesta = send_file(ruta, mimetype=FORMATOS_RENDER[formato][2], conditional=True,
+                          etag=os.path.basename(ruta).split('.')[0], max_age=86400)
+    respuesta.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+    return respuesta
@@ -1,11 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import Paciente, Factura, Orden, OrdenDetalle, Resultado
 from app.services.email_service import EmailService
-from app.services.pdf_service import PDFService
-import tempfile
-import os
+from app.services.documentos_pdf import obtener_documentos
 
 bp = Blueprint('notificaciones', __name__)
 
@@ -39,17 +37,15 @@ def enviar_factura(factura_id):
         return jsonify({'success': False, 'error': 'Paciente no tiene email'}), 400
     
     try:
-        # Generar PDF
-        pdf_path = os.path.join(tempfile.gettempdir(), f'factura_{factura.numero_factura}.pdf')
-        PDFService.generar_factura_pdf(factura, pdf_path)
+        # PDF desde la caché de documentos (se adjunta desde memoria)
+        documento = obtener_documentos(current_app).factura(factura_id)
+        if documento is None:
+            return jsonify({'success': False, 'error': 'Factura no encontrada'}), 404
+        pdf, _, nombre = documento
         
         # Enviar
         email_service = EmailService()
-        resultado = email_service.enviar_factura(paciente, factura, pdf_path)
-        
-        # Limpiar
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
+        resultado = email_service.enviar_factura(paciente, factura, (nombre, pdf))
         
         return jsonify(resultado), 200 if resultado['success'] else 500
         
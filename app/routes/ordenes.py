@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import Orden, OrdenDetalle, Paciente, Estudio
+from app.utils.paginacion import parametros_keyset, paginar_query, total_listado
 from sqlalchemy import text
 
 bp = Blueprint('ordenes', __name__)
@@ -9,12 +10,24 @@ bp = Blueprint('ordenes', __name__)
 @bp.route('/', methods=['GET'])
 @jwt_required()
 def listar_ordenes():
+    try:
+        limite, cursor = parametros_keyset()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     estado = request.args.get('estado')
     query = Orden.query
     if estado:
         query = query.filter(Orden.estado == estado)
-    ordenes = query.order_by(Orden.fecha_orden.desc()).limit(50).all()
-    return jsonify({'ordenes': [o.to_dict() for o in ordenes], 'total': len(ordenes)})
+    ordenes, siguiente_cursor = paginar_query(
+        query, Orden.fecha_orden, Orden.id, limite, cursor
+    )
+    total, estimado = total_listado('ordenes', query, filtrado=bool(estado))
+    return jsonify({
+        'ordenes': [o.to_dict() for o in ordenes],
+        'total': total,
+        'total_estimado': estimado,
+        'siguiente_cursor': siguiente_cursor
+    })
 
 @bp.route('/<int:orden_id>', methods=['GET'])
 @jwt_required()
@@ -2,7 +2,8 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app import db
 from app.models import Paciente
-from app.utils.validators import sanitize_string, sanitize_dict, validate_cedula, validate_email, validate_phone, validate_pagination
+from app.utils.validators import sanitize_string, sanitize_dict, validate_cedula, validate_email, validate_phone
+from app.utils.paginacion import parametros_keyset, paginar_query, total_listado, pagina_solicitada, campos_pagina
 from datetime import datetime
 from sqlalchemy import or_
 import random
@@ -15,7 +16,10 @@ bp = Blueprint('pacientes', __name__)
 @bp.route('/', methods=['GET'])
 @jwt_required()
 def listar_pacientes():
-    page, per_page = validate_pagination()
+    try:
+        limite, cursor = parametros_keyset()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     buscar = sanitize_string(request.args.get('buscar', ''), max_length=100)
 
     query = Paciente.query
@@ -29,13 +33,17 @@ def listar_pacientes():
                 Paciente.cedula.ilike(search_term)
             )
         )
-    query = query.order_by(Paciente.created_at.desc())
-    pacientes = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagina = pagina_solicitada()
+    pacientes, siguiente_cursor = paginar_query(
+        query, Paciente.created_at, Paciente.id, limite, cursor, pagina=pagina
+    )
+    total, estimado = total_listado('pacientes', query, filtrado=bool(buscar))
     return jsonify({
-        'pacientes': [p.to_dict() for p in pacientes.items],
-        'total': pacientes.total,
-        'pages': pacientes.pages,
-        'current_page': page
+        'pacientes': [p.to_dict() for p in pacientes],
+        'total': total,
+        'total_estimado': estimado,
+        **campos_pagina(total, limite, pagina),
+        'siguiente_cursor': siguiente_cursor
     })
 
 
@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required
 from app import db
 from app.models import Paciente, Orden, Resultado, Factura
 from app.utils.validators import sanitize_string
+from app.services.indice_pacientes import indice_pacientes
 from sqlalchemy import or_
 
 bp = Blueprint('portal_medico', __name__)
@@ -66,6 +67,17 @@ def buscar_paciente_medico():
     if not termino or len(termino) < 2:
         return jsonify({'pacientes': []})
 
+    indice_pacientes.precargar()
+    if indice_pacientes.listo:
+        return jsonify({
+            'pacientes': [{
+                'id': p['id'],
+                'nombre': f"{p['nombre']} {p['apellido']}",
+                'cedula': p['cedula'],
+                'telefono': p['telefono']
+            } for p in indice_pacientes.buscar(termino, 10)]
+        })
+
     search_term = f'%{termino}%'
 
     pacientes = Paciente.query.filter(
@@ -1,28 +1,39 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required
-import psycopg2
+from app.utils.paginacion import parametros_keyset, filtro_keyset, orden_keyset, recortar_pagina
+from app.utils.conexiones import get_db_connection
+from app.services.radiografia_service import (obtener_editor, parsear_operaciones, referencia_radiografia,
+                                              migrar_radiografia, ImagenSinMigrar, FORMATOS)
+from app.services.almacen_archivos import ArchivoDemasiadoGrande
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wsgi import get_input_stream
 import os
 
 bp = Blueprint('radiografias', __name__)
 
-def get_db_connection():
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
-
 @bp.route('/', methods=['GET'])
 @jwt_required()
 def listar_radiografias():
+    try:
+        limite, cursor = parametros_keyset(limite_defecto=100)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("""
+        filtro, params = filtro_keyset('r.fecha_toma', 'r.id', cursor, estilo='psycopg2')
+        params['limite'] = limite + 1
+        cur.execute(f"""
             SELECT r.id, r.tipo_estudio, r.region_anatomica, r.informe_medico, 
                    r.estado, r.fecha_toma, p.nombre, p.apellido, p.cedula
             FROM radiografias r
             LEFT JOIN pacientes p ON r.paciente_id = p.id
-            ORDER BY r.fecha_toma DESC LIMIT 100
-        """)
+            WHERE {filtro}
+            ORDER BY {orden_keyset('r.fecha_toma', 'r.id')} LIMIT %(limite)s
+        """, params)
+        filas, siguiente_cursor = recortar_pagina(cur.fetchall(), limite, lambda row: (row[5], row[0]))
         radiografias = []
-        for row in cur.fetchall():
+        for row in filas:
             radiografias.append({
                 'id': row[0], 'tipo_estudio': row[1], 'region_anatomica': row[2],
                 'informe_medico': row[3], 'estado': row[4],
@@ -31,7 +42,11 @@ def listar_radiografias():
             })
         cur.close()
         conn.close()
-        return jsonify(radiografias), 200
+        respuesta = jsonify(radiografias)
+        # La respuesta sigue siendo una lista; la siguiente página va en la cabecera
+        if siguiente_cursor:
+            respuesta.headers['X-Siguiente-Cursor'] = siguiente_cursor
+        return respuesta, 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -41,3 +56,157 @@ def listar_tipos():
     tipos = ['Radiografía de Tórax', 'Radiografía de Columna', 'Radiografía de Extremidades',
              'Radiografía Dental', 'Radiografía Abdominal', 'Mamografía', 'Tomografía', 'Resonancia Magnética']
     return jsonify(tipos), 200
+
+# ========== EDICIÓN DE IMÁGENES ==========
+
+@bp.route('/imagenes', methods=['POST'])
+@jwt_required()
+def subir_imagen():
+    """
+    Subir una radiografía en binario una sola vez; devuelve su id para /render
+    multipart/form-data (campo 'imagen') o cuerpo binario (image/png, image/jpeg...)
+    """
+    editor = obtener_editor(current_app)
+    limite = current_app.config.get('RADIOGRAFIA_MAX_TAMANO')
+    try:
+        if request.mimetype == 'multipart/form-data':
+            if 'imagen' not in request.files:
+                return jsonify({'error': 'No se envió imagen'}), 400
+            info = editor.subir(request.files['imagen'].stream, limite=limite)
+        else:
+            info = editor.subir(get_input_stream(request.environ, max_content_length=limite), limite=limite)
+        info['url'] = f"/api/radiografias/imagenes/{info['id']}/render"
+        return jsonify(info), 201
+    except (RequestEntityTooLarge, ArchivoDemasiadoGrande):
+        return jsonify({'error': f'La imagen supera el máximo de {limite} bytes'}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/imagenes/<imagen_id>/render', methods=['GET'])
+@jwt_required()
+def render_imagen(imagen_id):
+    """
+    Imagen con una cadena de operaciones, en binario:
+    ?ops=contraste:1.5,brillo:1.2,invertir,nitidez,recorte:x:y:ancho:alto,ventana:centro:ancho
+    ?formato=png|webp|jpeg  ?lado=N (lado mayor máximo)
+    """
+    formato = request.args.get('formato', 'png')
+    try:
+        operaciones = parsear_operaciones(request.args.get('ops', ''))
+        lado = request.args.get('lado', type=int)
+        if lado is not None and lado < 1:
+            raise ValueError('lado debe ser positivo')
+        ruta = obtener_editor(current_app).render(imagen_id, operaciones, formato, lado)
+    except FileNotFoundError:
+        return jsonify({'error': 'Imagen no encontrada'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    # El nombre en caché ya es un hash de imagen + cadena: el contenido no cambia
+    respuesta = send_file(ruta, mimetype=FORMATOS[formato][2], conditional=True,
+                          etag=os.path.basename(ruta).split('.')[0], max_age=86400)
+    respuesta.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+    return respuesta
+
+# ========== TESELAS (DEEP ZOOM) ==========
+
+def _descriptor_teselas(editor, imagen_id, base):
+    info = editor.descriptor(imagen_id)
+    info['imagen_id'] = imagen_id
+    info['url'] = base + '/{z}/{x}/{y}'
+    return info
+
+def _enviar_tesela(ruta, imagen_id, z, x, y, inmutable):
+    respuesta = send_file(ruta, mimetype='image/jpeg', conditional=True,
+                          etag=f'{imagen_id[:16]}-{z}-{x}-{y}', max_age=86400 if inmutable else 3600)
+    if inmutable:
+        respuesta.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+    return respuesta
+
+def _sin_migrar(radiografia_id):
+    return jsonify({'error': 'La imagen sigue en la base de datos; migrarla con '
+                             f'POST /api/radiografias/{radiografia_id}/migrar'}), 409
+
+@bp.route('/imagenes/<imagen_id>/tiles', methods=['GET'])
+@jwt_required()
+def descriptor_teselas_imagen(imagen_id):
+    """Tamaño, niveles y plantilla de URL de la pirámide de una imagen del almacén"""
+    try:
+        return jsonify(_descriptor_teselas(obtener_editor(current_app), imagen_id,
+                                           f'/api/radiografias/imagenes/{imagen_id}/tiles')), 200
+    except FileNotFoundError:
+        return jsonify({'error': 'Imagen no encontrada'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/imagenes/<imagen_id>/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@jwt_required()
+def tesela_imagen(imagen_id, z, x, y):
+    """Tesela de una imagen del almacén (sirve también para las de sonografías)"""
+    try:
+        ruta = obtener_editor(current_app).tesela(imagen_id, z, x, y)
+    except FileNotFoundError:
+        return jsonify({'error': 'Tesela no encontrada'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e)}), 500
+    return _enviar_tesela(ruta, imagen_id, z, x, y, inmutable=True)
+
+@bp.route('/<int:radiografia_id>/tiles', methods=['GET'])
+@jwt_required()
+def descriptor_teselas(radiografia_id):
+    """Descriptor Deep Zoom de una radiografía (?variante=procesada|original)"""
+    editor = obtener_editor(current_app)
+    try:
+        imagen_id = referencia_radiografia(radiografia_id, request.args.get('variante', 'procesada'))
+        if not imagen_id:
+            return jsonify({'error': 'Radiografía sin imagen'}), 404
+        return jsonify(_descriptor_teselas(editor, imagen_id, f'/api/radiografias/{radiografia_id}/tiles')), 200
+    except ImagenSinMigrar:
+        return _sin_migrar(radiografia_id)
+    except FileNotFoundError:
+        return jsonify({'error': 'Imagen no encontrada'}), 404
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<int:radiografia_id>/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@jwt_required()
+def tesela(radiografia_id, z, x, y):
+    """Tesela de una radiografía; la pirámide se genera una vez por imagen"""
+    editor = obtener_editor(current_app)
+    try:
+        imagen_id = referencia_radiografia(radiografia_id, request.args.get('variante', 'procesada'))
+        if not imagen_id:
+            return jsonify({'error': 'Radiografía sin imagen'}), 404
+        ruta = editor.tesela(imagen_id, z, x, y)
+    except ImagenSinMigrar:
+        return _sin_migrar(radiografia_id)
+    except FileNotFoundError:
+        return jsonify({'error': 'Tesela no encontrada'}), 404
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e)}), 500
+    # La radiografía puede cambiar de imagen: caché más corta que por id de imagen
+    return _enviar_tesela(ruta, imagen_id, z, x, y, inmutable=False)
+
+@bp.route('/<int:radiografia_id>/migrar', methods=['POST'])
+@jwt_required()
+def migrar_imagenes(radiografia_id):
+    """Pasar al almacén los data URI de una radiografía (lo mismo que `flask imagenes migrar`)"""
+    try:
+        cambios = migrar_radiografia(obtener_editor(current_app), radiografia_id)
+        if cambios is None:
+            return jsonify({'error': 'Radiografía no encontrada'}), 404
+        return jsonify(cambios), 200
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e)}), 500
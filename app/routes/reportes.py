@@ -1,8 +1,13 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app import db
-from app.models import Factura, Orden, Paciente, Estudio, Pago, OrdenDetalle
+from app.models import Factura, Orden, Paciente, Estudio, OrdenDetalle
 from app.utils.validators import sanitize_string
+from app.cache import cached
+from app.services.dashboard_service import DashboardService
+from app.services.resumen_diario import ResumenDiarioService
+from app.utils.paginacion import parametros_keyset, filtro_keyset, orden_keyset, recortar_pagina
+from app.utils.exportar import FORMATOS, consultar_stream, respuesta_exportada
 from sqlalchemy import func, extract, text, and_, or_
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -12,145 +17,10 @@ bp = Blueprint('reportes', __name__)
 
 @bp.route('/dashboard', methods=['GET'])
 @jwt_required()
+@cached(timeout=60, tags=('facturas',))
 def dashboard():
     """Dashboard principal con todas las estadísticas"""
-    hoy = datetime.now().date()
-    inicio_mes = hoy.replace(day=1)
-    inicio_semana = hoy - timedelta(days=hoy.weekday())
-
-    # ========== PACIENTES ==========
-    total_pacientes = Paciente.query.filter_by(estado='activo').count()
-
-    pacientes_hoy = Paciente.query.filter(
-        func.date(Paciente.created_at) == hoy
-    ).count()
-
-    pacientes_mes = Paciente.query.filter(
-        Paciente.created_at >= inicio_mes
-    ).count()
-
-    # ========== ÓRDENES ==========
-    ordenes_pendientes = Orden.query.filter(
-        Orden.estado.in_(['pendiente', 'en_proceso'])
-    ).count()
-
-    ordenes_hoy = Orden.query.filter(
-        func.date(Orden.fecha_orden) == hoy
-    ).count()
-
-    ordenes_mes = Orden.query.filter(
-        Orden.fecha_orden >= inicio_mes
-    ).count()
-
-    # ========== FACTURAS ==========
-    facturas_mes = Factura.query.filter(
-        Factura.fecha_factura >= inicio_mes,
-        Factura.estado != 'anulada'
-    ).all()
-
-    total_facturado_mes = sum(float(f.total) for f in facturas_mes)
-    facturas_pendientes = len([f for f in facturas_mes if f.estado in ('pendiente', 'parcial')])
-    facturas_pagadas = len([f for f in facturas_mes if f.estado == 'pagada'])
-
-    # ========== INGRESOS ==========
-    ingresos_hoy = db.session.query(
-        func.coalesce(func.sum(Pago.monto), 0)
-    ).filter(
-        func.date(Pago.fecha_pago) == hoy
-    ).scalar()
-
-    ingresos_mes = db.session.query(
-        func.coalesce(func.sum(Pago.monto), 0)
-    ).filter(
-        Pago.fecha_pago >= inicio_mes
-    ).scalar()
-
-    ingresos_semana = db.session.query(
-        func.coalesce(func.sum(Pago.monto), 0)
-    ).filter(
-        Pago.fecha_pago >= inicio_semana
-    ).scalar()
-
-    # ========== CUENTAS POR COBRAR ==========
-    facturas_con_saldo = Factura.query.filter(
-        Factura.estado.in_(['pendiente', 'parcial'])
-    ).all()
-
-    cuentas_por_cobrar = 0
-    for f in facturas_con_saldo:
-        pagado = sum(float(p.monto) for p in f.pagos)
-        cuentas_por_cobrar += float(f.total) - pagado
-
-    # ========== ESTUDIOS MÁS SOLICITADOS ==========
-    estudios_populares = db.session.query(
-        Estudio.nombre,
-        func.count(OrdenDetalle.id).label('cantidad')
-    ).join(
-        OrdenDetalle, Estudio.id == OrdenDetalle.estudio_id
-    ).group_by(
-        Estudio.nombre
-    ).order_by(
-        func.count(OrdenDetalle.id).desc()
-    ).limit(5).all()
-
-    # ========== INGRESOS POR DÍA (últimos 7 días) ==========
-    ingresos_diarios = []
-    for i in range(6, -1, -1):
-        dia = hoy - timedelta(days=i)
-        ingreso = db.session.query(
-            func.coalesce(func.sum(Pago.monto), 0)
-        ).filter(
-            func.date(Pago.fecha_pago) == dia
-        ).scalar()
-        ingresos_diarios.append({
-            'fecha': dia.isoformat(),
-            'dia': dia.strftime('%a'),
-            'monto': float(ingreso)
-        })
-
-    # ========== INGRESOS POR MÉTODO DE PAGO ==========
-    pagos_por_metodo = db.session.query(
-        Pago.metodo_pago,
-        func.sum(Pago.monto).label('total'),
-        func.count(Pago.id).label('cantidad')
-    ).filter(
-        Pago.fecha_pago >= inicio_mes
-    ).group_by(Pago.metodo_pago).all()
-
-    return jsonify({
-        'fecha': hoy.isoformat(),
-        'pacientes': {
-            'total': total_pacientes,
-            'hoy': pacientes_hoy,
-            'mes': pacientes_mes
-        },
-        'ordenes': {
-            'pendientes': ordenes_pendientes,
-            'hoy': ordenes_hoy,
-            'mes': ordenes_mes
-        },
-        'facturacion': {
-            'total_mes': total_facturado_mes,
-            'facturas_mes': len(facturas_mes),
-            'pendientes': facturas_pendientes,
-            'pagadas': facturas_pagadas,
-            'cuentas_por_cobrar': cuentas_por_cobrar
-        },
-        'ingresos': {
-            'hoy': float(ingresos_hoy),
-            'semana': float(ingresos_semana),
-            'mes': float(ingresos_mes),
-            'diarios': ingresos_diarios
-        },
-        'estudios_populares': [
-            {'nombre': nombre, 'cantidad': cantidad}
-            for nombre, cantidad in estudios_populares
-        ],
-        'pagos_por_metodo': [
-            {'metodo': metodo, 'total': float(total), 'cantidad': cantidad}
-            for metodo, total, cantidad in pagos_por_metodo
-        ]
-    })
+    return jsonify(DashboardService.resumen())
 
 
 @bp.route('/ventas', methods=['GET'])
@@ -171,23 +41,42 @@ def reporte_ventas():
         except ValueError:
             return jsonify({'error': 'Formato de fecha inválido. Use YYYY-MM-DD'}), 400
 
-    facturas = Factura.query.filter(
-        Factura.fecha_factura >= fecha_inicio_dt,
-        Factura.fecha_factura <= fecha_fin_dt,
-        Factura.estado != 'anulada'
-    ).order_by(Factura.fecha_factura.desc()).all()
-
-    total_ventas = sum(float(f.total) for f in facturas)
-    total_itbis = sum(float(f.itbis) for f in facturas)
-    total_descuentos = sum(float(f.descuento) for f in facturas)
-
-    # Pagos en el período
-    pagos = Pago.query.filter(
-        Pago.fecha_pago >= fecha_inicio_dt,
-        Pago.fecha_pago <= fecha_fin_dt
-    ).all()
-
-    total_cobrado = sum(float(p.monto) for p in pagos)
+    formato = request.args.get('format')
+    if formato and formato not in FORMATOS:
+        return jsonify({'error': f"Formato no soportado. Use: {', '.join(FORMATOS)}"}), 400
+
+    params = {'inicio': fecha_inicio_dt, 'fin': fecha_fin_dt}
+    sql_facturas = """
+        SELECT
+            f.id, f.numero_factura, f.ncf, f.fecha_factura,
+            COALESCE(p.nombre || ' ' || p.apellido, 'N/A') AS paciente,
+            f.subtotal, f.descuento, f.itbis, f.total, f.estado
+        FROM facturas f
+        LEFT JOIN pacientes p ON p.id = f.paciente_id
+        WHERE f.fecha_factura >= :inicio AND f.fecha_factura <= :fin
+          AND f.estado != 'anulada'
+        ORDER BY f.fecha_factura DESC, f.id DESC
+    """
+
+    if formato:
+        return respuesta_exportada(
+            formato,
+            f"ventas_{fecha_inicio_dt:%Y%m%d}_{fecha_fin_dt:%Y%m%d}",
+            ['id', 'numero', 'ncf', 'fecha', 'paciente', 'subtotal', 'descuento', 'itbis', 'total', 'estado'],
+            consultar_stream(sql_facturas, params)
+        )
+
+    resumen = db.session.execute(text("""
+        SELECT
+            COALESCE(SUM(total), 0), COALESCE(SUM(itbis), 0), COALESCE(SUM(descuento), 0), COUNT(*),
+            (SELECT COALESCE(SUM(monto), 0) FROM pagos
+             WHERE fecha_pago >= :inicio AND fecha_pago <= :fin)
+        FROM facturas
+        WHERE fecha_factura >= :inicio AND fecha_factura <= :fin
+          AND estado != 'anulada'
+    """), params).first()
+
+    facturas = db.session.execute(text(sql_facturas), params).fetchall()
 
     return jsonify({
         'periodo': {
@@ -195,66 +84,98 @@ def reporte_ventas():
             'fin': fecha_fin_dt.isoformat()
         },
         'resumen': {
-            'total_ventas': total_ventas,
-            'total_itbis': total_itbis,
-            'total_descuentos': total_descuentos,
-            'total_cobrado': total_cobrado,
-            'cantidad_facturas': len(facturas)
+            'total_ventas': float(resumen[0]),
+            'total_itbis': float(resumen[1]),
+            'total_descuentos': float(resumen[2]),
+            'total_cobrado': float(resumen[4]),
+            'cantidad_facturas': resumen[3]
         },
         'facturas': [{
-            'id': f.id,
-            'numero': f.numero_factura,
-            'ncf': f.ncf,
-            'fecha': f.fecha_factura.isoformat(),
-            'paciente': f"{f.paciente.nombre} {f.paciente.apellido}" if f.paciente else 'N/A',
-            'total': float(f.total),
-            'estado': f.estado
+            'id': f[0],
+            'numero': f[1],
+            'ncf': f[2],
+            'fecha': f[3].isoformat(),
+            'paciente': f[4],
+            'total': float(f[8]),
+            'estado': f[9]
         } for f in facturas]
     })
 
 
 @bp.route('/cuentas-por-cobrar', methods=['GET'])
 @jwt_required()
+@cached(timeout=120, tags=('facturas',))
 def cuentas_por_cobrar():
-    """Reporte de cuentas por cobrar"""
-    facturas = Factura.query.filter(
-        Factura.estado.in_(['pendiente', 'parcial'])
-    ).order_by(Factura.fecha_factura.asc()).all()
-
-    resultado = []
-    total_por_cobrar = 0
-
-    for f in facturas:
-        pagado = sum(float(p.monto) for p in f.pagos)
-        saldo = float(f.total) - pagado
-        dias_vencido = 0
-
-        if f.fecha_vencimiento:
-            dias_vencido = (datetime.now().date() - f.fecha_vencimiento).days
-            if dias_vencido < 0:
-                dias_vencido = 0
-
-        total_por_cobrar += saldo
-
-        resultado.append({
-            'factura_id': f.id,
-            'numero_factura': f.numero_factura,
-            'paciente': f"{f.paciente.nombre} {f.paciente.apellido}" if f.paciente else 'N/A',
-            'paciente_telefono': f.paciente.telefono if f.paciente else None,
-            'fecha_factura': f.fecha_factura.isoformat(),
-            'fecha_vencimiento': f.fecha_vencimiento.isoformat() if f.fecha_vencimiento else None,
-            'total': float(f.total),
-            'pagado': pagado,
-            'saldo': saldo,
-            'dias_vencido': dias_vencido,
-            'estado': 'vencida' if dias_vencido > 0 else f.estado
-        })
-
-    return jsonify({
-        'total_por_cobrar': total_por_cobrar,
-        'cantidad': len(resultado),
-        'cuentas': resultado
-    })
+    """Reporte de cuentas por cobrar (paginado por cursor, más antiguas primero)"""
+    try:
+        limite, cursor = parametros_keyset(limite_defecto=100, limite_maximo=500)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    filtro_cursor, params = filtro_keyset('f.fecha_factura', 'f.id', cursor, descendente=False)
+    params['limite'] = limite + 1
+
+    filas = db.session.execute(text(f"""
+        SELECT
+            f.id, f.numero_factura, p.nombre, p.apellido, p.telefono,
+            f.fecha_factura, f.fecha_vencimiento, f.total, f.total_pagado, f.saldo, f.estado,
+            GREATEST(CURRENT_DATE - f.fecha_vencimiento, 0) AS dias_vencido,
+            CASE
+                WHEN CURRENT_DATE - f.fecha_factura::date <= 30 THEN '0-30'
+                WHEN CURRENT_DATE - f.fecha_factura::date <= 60 THEN '31-60'
+                WHEN CURRENT_DATE - f.fecha_factura::date <= 90 THEN '61-90'
+                ELSE '90+'
+            END AS antiguedad
+        FROM facturas f
+        LEFT JOIN pacientes p ON p.id = f.paciente_id
+        WHERE f.estado IN ('pendiente', 'parcial') AND {filtro_cursor}
+        ORDER BY {orden_keyset('f.fecha_factura', 'f.id', descendente=False)}
+        LIMIT :limite
+    """), params).fetchall()
+
+    filas, siguiente_cursor = recortar_pagina(filas, limite, lambda fila: (fila[5], fila[0]))
+
+    respuesta = {
+        'cuentas': [{
+            'factura_id': fila[0],
+            'numero_factura': fila[1],
+            'paciente': f"{fila[2]} {fila[3]}" if fila[2] else 'N/A',
+            'paciente_telefono': fila[4],
+            'fecha_factura': fila[5].isoformat(),
+            'fecha_vencimiento': fila[6].isoformat() if fila[6] else None,
+            'total': float(fila[7]),
+            'pagado': float(fila[8]),
+            'saldo': float(fila[9]),
+            'dias_vencido': fila[11] or 0,
+            'antiguedad': fila[12],
+            'estado': 'vencida' if fila[11] else fila[10]
+        } for fila in filas],
+        'siguiente_cursor': siguiente_cursor
+    }
+
+    # Resumen y antigüedad de saldos solo en la primera página
+    if not cursor:
+        resumen = db.session.execute(text("""
+            SELECT
+                COUNT(*),
+                COALESCE(SUM(saldo), 0),
+                COALESCE(SUM(saldo) FILTER (WHERE CURRENT_DATE - fecha_factura::date <= 30), 0),
+                COALESCE(SUM(saldo) FILTER (WHERE CURRENT_DATE - fecha_factura::date BETWEEN 31 AND 60), 0),
+                COALESCE(SUM(saldo) FILTER (WHERE CURRENT_DATE - fecha_factura::date BETWEEN 61 AND 90), 0),
+                COALESCE(SUM(saldo) FILTER (WHERE CURRENT_DATE - fecha_factura::date > 90), 0)
+            FROM facturas
+            WHERE estado IN ('pendiente', 'parcial')
+        """)).first()
+        respuesta['cantidad'] = resumen[0]
+        respuesta['total_por_cobrar'] = float(resumen[1])
+        respuesta['antiguedad'] = {
+            '0-30': float(resumen[2]),
+            '31-60': float(resumen[3]),
+            '61-90': float(resumen[4]),
+            '90+': float(resumen[5])
+        }
+
+    return jsonify(respuesta)
 
 
 @bp.route('/estudios-realizados', methods=['GET'])
@@ -342,62 +263,36 @@ def contabilidad():
 
     fecha_fin = hoy
 
-    # Ingresos (pagos recibidos)
-    pagos = Pago.query.filter(
-        func.date(Pago.fecha_pago) >= fecha_inicio,
-        func.date(Pago.fecha_pago) <= fecha_fin
-    ).all()
-
-    total_ingresos = sum(float(p.monto) for p in pagos)
-
-    # Por método de pago
-    pagos_por_metodo = db.session.query(
-        Pago.metodo_pago,
-        func.sum(Pago.monto).label('total'),
-        func.count(Pago.id).label('cantidad')
-    ).filter(
-        func.date(Pago.fecha_pago) >= fecha_inicio,
-        func.date(Pago.fecha_pago) <= fecha_fin
-    ).group_by(Pago.metodo_pago).all()
-
-    # Facturado
-    facturas = Factura.query.filter(
-        func.date(Factura.fecha_factura) >= fecha_inicio,
-        func.date(Factura.fecha_factura) <= fecha_fin,
-        Factura.estado != 'anulada'
-    ).all()
-
-    total_facturado = sum(float(f.total) for f in facturas)
-
-    # Por cobrar
-    facturas_pendientes = Factura.query.filter(
-        Factura.estado.in_(['pendiente', 'parcial'])
-    ).all()
+    # Ingresos y facturado desde el rollup diario
+    totales = ResumenDiarioService.totales(fecha_inicio, fecha_fin)
+    pagos_por_metodo = ResumenDiarioService.pagos_por_metodo(fecha_inicio, fecha_fin)
 
-    por_cobrar = 0
-    for f in facturas_pendientes:
-        pagado = sum(float(p.monto) for p in f.pagos)
-        por_cobrar += float(f.total) - pagado
+    # Por cobrar (saldo mantenido por registrar_pago)
+    por_cobrar, facturas_pendientes = db.session.execute(text("""
+        SELECT COALESCE(SUM(saldo), 0), COUNT(*)
+        FROM facturas
+        WHERE estado IN ('pendiente', 'parcial')
+    """)).first()
 
     # Órdenes
     ordenes = Orden.query.filter(
-        func.date(Orden.fecha_orden) >= fecha_inicio,
-        func.date(Orden.fecha_orden) <= fecha_fin
+        Orden.fecha_orden >= fecha_inicio,
+        Orden.fecha_orden < fecha_fin + timedelta(days=1)
     ).count()
 
     return jsonify({
         'periodo': periodo,
         'fecha_inicio': fecha_inicio.isoformat(),
         'fecha_fin': fecha_fin.isoformat(),
-        'ingresos': total_ingresos,
-        'cantidad_pagos': len(pagos),
-        'facturado': total_facturado,
-        'cantidad_facturas': len(facturas),
-        'por_cobrar': por_cobrar,
-        'facturas_pendientes': len(facturas_pendientes),
+        'ingresos': totales['ingresos'],
+        'cantidad_pagos': totales['cantidad_pagos'],
+        'facturado': totales['facturado'],
+        'cantidad_facturas': totales['cantidad_facturas'],
+        'por_cobrar': float(por_cobrar),
+        'facturas_pendientes': facturas_pendientes,
         'ordenes': ordenes,
         'por_metodo': [
-            {'metodo': m, 'total': float(t), 'cantidad': c}
+            {'metodo': m, 'total': float(t), 'cantidad': int(c)}
             for m, t, c in pagos_por_metodo
         ]
     })
@@ -490,40 +385,46 @@ def reporte_estudios_detallado():
     if not fecha_fin:
         fecha_fin = datetime.now().strftime('%Y-%m-%d')
     
-    query = db.session.query(
-        Estudio.codigo,
-        Estudio.nombre,
-        CategoriaEstudio.nombre.label('categoria'),
-        func.count(OrdenDetalle.id).label('cantidad'),
-        func.sum(OrdenDetalle.precio_final).label('total'),
-        func.avg(OrdenDetalle.precio_final).label('precio_promedio')
-    ).join(
-        OrdenDetalle, Estudio.id == OrdenDetalle.estudio_id
-    ).join(
-        Orden, Orden.id == OrdenDetalle.orden_id
-    ).outerjoin(
-        CategoriaEstudio, CategoriaEstudio.id == Estudio.categoria_id
-    ).filter(
-        Orden.fecha_orden >= fecha_inicio,
-        Orden.fecha_orden <= fecha_fin
-    )
-    
-    if categoria_id:
-        query = query.filter(Estudio.categoria_id == categoria_id)
-    
-    resultado = query.group_by(
-        Estudio.codigo, Estudio.nombre, CategoriaEstudio.nombre
-    ).order_by(func.count(OrdenDetalle.id).desc()).all()
-    
+    formato = request.args.get('format')
+    if formato and formato not in FORMATOS:
+        return jsonify({'error': f"Formato no soportado. Use: {', '.join(FORMATOS)}"}), 400
+
+    params = {'inicio': fecha_inicio, 'fin': fecha_fin, 'categoria_id': categoria_id}
+    filtro_categoria = 'AND e.categoria_id = :categoria_id' if categoria_id else ''
+    sql_estudios = f"""
+        SELECT
+            e.codigo, e.nombre, COALESCE(c.nombre, 'Sin categoría') AS categoria,
+            COUNT(od.id) AS cantidad,
+            COALESCE(SUM(od.precio_final), 0) AS total,
+            COALESCE(AVG(od.precio_final), 0) AS precio_promedio
+        FROM estudios e
+        JOIN orden_detalles od ON od.estudio_id = e.id
+        JOIN ordenes o ON o.id = od.orden_id
+        LEFT JOIN categorias c ON c.id = e.categoria_id
+        WHERE o.fecha_orden >= :inicio AND o.fecha_orden <= :fin {filtro_categoria}
+        GROUP BY e.codigo, e.nombre, c.nombre
+        ORDER BY COUNT(od.id) DESC
+    """
+
+    if formato:
+        return respuesta_exportada(
+            formato,
+            f"estudios_{fecha_inicio.replace('-', '')}_{fecha_fin.replace('-', '')}",
+            ['codigo', 'nombre', 'categoria', 'cantidad', 'total', 'precio_promedio'],
+            consultar_stream(sql_estudios, params)
+        )
+
+    resultado = db.session.execute(text(sql_estudios), params).fetchall()
+
     return jsonify({
         'periodo': {'inicio': fecha_inicio, 'fin': fecha_fin},
         'estudios': [{
             'codigo': codigo,
             'nombre': nombre,
-            'categoria': categoria or 'Sin categoría',
+            'categoria': categoria,
             'cantidad': cantidad,
-            'total': float(total or 0),
-            'precio_promedio': float(precio_promedio or 0)
+            'total': float(total),
+            'precio_promedio': float(precio_promedio)
         } for codigo, nombre, categoria, cantidad, total, precio_promedio in resultado]
     })
 
@@ -535,23 +436,16 @@ def reporte_ingresos_diarios():
     dias = request.args.get('dias', 30, type=int)
     dias = min(dias, 365)  # Máximo un año
     
-    fecha_inicio = datetime.now().date() - timedelta(days=dias)
-    
-    resultado = db.session.query(
-        func.date(Pago.fecha_pago).label('fecha'),
-        func.sum(Pago.monto).label('total'),
-        func.count(Pago.id).label('cantidad')
-    ).filter(
-        func.date(Pago.fecha_pago) >= fecha_inicio
-    ).group_by(
-        func.date(Pago.fecha_pago)
-    ).order_by(func.date(Pago.fecha_pago)).all()
+    hoy = datetime.now().date()
+    fecha_inicio = hoy - timedelta(days=dias)
+
+    resultado = ResumenDiarioService.ingresos_por_dia(fecha_inicio, hoy)
     
     return jsonify({
         'dias': dias,
         'ingresos': [{
             'fecha': fecha.isoformat(),
             'total': float(total or 0),
-            'cantidad': cantidad
+            'cantidad': int(cantidad)
         } for fecha, total, cantidad in resultado]
     })
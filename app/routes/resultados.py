@@ -1,22 +1,25 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-import psycopg2
-import os
+from app.utils.paginacion import parametros_keyset, filtro_keyset, orden_keyset, recortar_pagina
+from app.utils.conexiones import get_db_connection
 import json
 
 bp = Blueprint('resultados', __name__)
 
-def get_db_connection():
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
-
 @bp.route('/', methods=['GET'])
 @jwt_required()
 def listar_resultados():
+    try:
+        limite, cursor = parametros_keyset()
+    except ValueError as e:
+        return jsonify({'error': str(e), 'resultados': []}), 400
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        
-        cur.execute("""
+
+        filtro, params = filtro_keyset('r.fecha_importacion', 'r.id', cursor, estilo='psycopg2')
+        params['limite'] = limite + 1
+        cur.execute(f"""
             SELECT 
                 r.id, 
                 r.tipo_archivo, 
@@ -30,12 +33,14 @@ def listar_resultados():
             LEFT JOIN orden_detalles od ON r.orden_detalle_id = od.id
             LEFT JOIN ordenes o ON od.orden_id = o.id
             LEFT JOIN pacientes p ON o.paciente_id = p.id
-            ORDER BY r.fecha_importacion DESC
-            LIMIT 50
-        """)
-        
+            WHERE {filtro}
+            ORDER BY {orden_keyset('r.fecha_importacion', 'r.id')}
+            LIMIT %(limite)s
+        """, params)
+
+        filas, siguiente_cursor = recortar_pagina(cur.fetchall(), limite, lambda row: (row[3], row[0]))
         resultados = []
-        for row in cur.fetchall():
+        for row in filas:
             resultados.append({
                 'id': row[0],
                 'tipo_archivo': row[1] or 'pdf',
@@ -49,7 +54,7 @@ def listar_resultados():
         
         cur.close()
         conn.close()
-        return jsonify({'resultados': resultados}), 200
+        return jsonify({'resultados': resultados, 'siguiente_cursor': siguiente_cursor}), 200
     except Exception as e:
         return jsonify({'error': str(e), 'resultados': []}), 500
 
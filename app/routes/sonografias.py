@@ -1,35 +1,116 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-import psycopg2
-import os
+from app.utils.paginacion import parametros_keyset, filtro_keyset, orden_keyset, recortar_pagina
+from app.utils.conexiones import get_db_connection
+from app.services.radiografia_service import obtener_editor, imagenes_sonografia, migrar_sonografia
 
 bp = Blueprint('sonografias', __name__)
 
-def get_db_connection():
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
-
 @bp.route('/', methods=['GET'])
 @jwt_required()
 def listar_sonografias():
+    try:
+        limite, cursor = parametros_keyset(limite_defecto=100)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        # Primero verificar qué columnas tiene la tabla
-        cur.execute("SELECT * FROM sonografias LIMIT 0")
-        columnas = [desc[0] for desc in cur.description]
-        
-        # Construir query según columnas disponibles
-        cur.execute("SELECT * FROM sonografias ORDER BY id DESC LIMIT 100")
+        filtro, params = filtro_keyset('s.fecha_estudio', 's.id', cursor, estilo='psycopg2')
+        params['limite'] = limite + 1
+        # Columnas explícitas: imagenes (JSONB) se resume en la cantidad; van en /<id>/imagenes
+        cur.execute(f"""
+            SELECT s.id, s.orden_detalle_id, s.paciente_id, s.tipo_estudio, s.region,
+                   s.informe_medico, s.hallazgos, s.conclusion, s.medico_id, s.estado,
+                   s.fecha_estudio, s.fecha_informe,
+                   CASE WHEN jsonb_typeof(s.imagenes) = 'array' THEN jsonb_array_length(s.imagenes) ELSE 0 END,
+                   s.video_url IS NOT NULL, s.biometria, s.video_url, s.created_at
+            FROM sonografias s
+            WHERE {filtro}
+            ORDER BY {orden_keyset('s.fecha_estudio', 's.id')} LIMIT %(limite)s
+        """, params)
+        filas, siguiente_cursor = recortar_pagina(cur.fetchall(), limite, lambda row: (row[10], row[0]))
         sonografias = []
-        for row in cur.fetchall():
-            sonografias.append({columnas[i]: row[i] for i in range(len(columnas))})
-        
+        for row in filas:
+            sonografias.append({
+                'id': row[0], 'orden_detalle_id': row[1], 'paciente_id': row[2],
+                'tipo_estudio': row[3], 'region': row[4], 'informe_medico': row[5],
+                'hallazgos': row[6], 'conclusion': row[7], 'medico_id': row[8], 'estado': row[9],
+                'fecha_estudio': row[10].isoformat() if row[10] else None,
+                'fecha_informe': row[11].isoformat() if row[11] else None,
+                'cantidad_imagenes': row[12], 'tiene_video': row[13],
+                'biometria': row[14], 'video_url': row[15],
+                'created_at': row[16].isoformat() if row[16] else None
+            })
+        cur.close()
+        conn.close()
+        respuesta = jsonify(sonografias)
+        if siguiente_cursor:
+            respuesta.headers['X-Siguiente-Cursor'] = siguiente_cursor
+        return respuesta, 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<int:sonografia_id>', methods=['GET'])
+@jwt_required()
+def obtener_sonografia(sonografia_id):
+    """Fila completa salvo imagenes (referencias en /<id>/imagenes)"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM sonografias LIMIT 0")
+        columnas = [desc[0] for desc in cur.description if desc[0] != 'imagenes']
+        cur.execute(f"""
+            SELECT {', '.join(columnas)},
+                   CASE WHEN jsonb_typeof(imagenes) = 'array' THEN jsonb_array_length(imagenes) ELSE 0 END
+            FROM sonografias WHERE id = %(id)s
+        """, {'id': sonografia_id})
+        row = cur.fetchone()
         cur.close()
         conn.close()
-        return jsonify(sonografias), 200
+        if row is None:
+            return jsonify({'error': 'Sonografía no encontrada'}), 404
+        sonografia = {c: v.isoformat() if hasattr(v, 'isoformat') else v for c, v in zip(columnas, row)}
+        sonografia['cantidad_imagenes'] = row[-1]
+        sonografia['imagenes_url'] = f"/api/sonografias/{sonografia_id}/imagenes"
+        return jsonify(sonografia), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<int:sonografia_id>/imagenes', methods=['GET'])
+@jwt_required()
+def imagenes_de_sonografia(sonografia_id):
+    """Referencias de las imágenes; cada una se ve por /api/radiografias/imagenes/<id>/render o /tiles"""
+    try:
+        imagenes = imagenes_sonografia(sonografia_id)
+        if imagenes is None:
+            return jsonify({'error': 'Sonografía no encontrada'}), 404
+        return jsonify(_con_urls(imagenes)), 200
     except Exception as e:
+        print(f"Error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/<int:sonografia_id>/imagenes/migrar', methods=['POST'])
+@jwt_required()
+def migrar_imagenes(sonografia_id):
+    """Pasar al almacén los data URI que queden en sonografias.imagenes"""
+    try:
+        imagenes = migrar_sonografia(obtener_editor(current_app), sonografia_id)
+        if imagenes is None:
+            return jsonify({'error': 'Sonografía no encontrada'}), 404
+        return jsonify(_con_urls(imagenes)), 200
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def _con_urls(imagenes):
+    # Las que siguen como data URI (sin migrar) se devuelven tal cual
+    for imagen in imagenes:
+        if isinstance(imagen, dict) and imagen.get('id'):
+            imagen['url'] = f"/api/radiografias/imagenes/{imagen['id']}/render"
+            imagen['tiles'] = f"/api/radiografias/imagenes/{imagen['id']}/tiles"
+    return imagenes
+
 @bp.route('/tipos', methods=['GET'])
 @jwt_required()
 def listar_tipos():
@@ -0,0 +1,150 @@
+"""
+Almacén de archivos direccionado por contenido (estudios DICOM)
+
+Cada archivo se guarda una sola vez bajo su SHA-256:
+
+    DICOM_STORE_PATH/ab/cd/abcd...ef.dcm
+
+La escritura va por bloques a un temporal dentro del mismo almacén mientras
+se calcula el hash; al terminar se hace fsync y os.replace atómico al nombre
+definitivo. Si ya existe un archivo con el mismo hash se descarta el
+temporal (deduplicación). La memoria usada es un bloque, sin importar el
+tamaño del estudio.
+
+    almacen = obtener_almacen(current_app)
+    info = almacen.guardar_stream(request.stream)
+    info['sha256'], info['tamano'], info['ruta']
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+BLOQUE = 1024 * 1024
+
+
+class ArchivoDemasiadoGrande(ValueError):
+    """El stream superó el límite indicado"""
+
+
+class ArchivoHash:
+    """Archivo temporal que calcula SHA-256 y tamaño mientras se escribe
+
+    Sirve como stream_factory de werkzeug: el parser multipart escribe aquí
+    directamente, sin copia intermedia.
+    """
+
+    def __init__(self, directorio, sufijo='.tmp'):
+        fd, self.ruta = tempfile.mkstemp(dir=directorio, suffix=sufijo)
+        self._archivo = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.tamano = 0
+
+    def write(self, datos):
+        self._hash.update(datos)
+        self.tamano += len(datos)
+        return self._archivo.write(datos)
+
+    def seek(self, *args):
+        return self._archivo.seek(*args)
+
+    def tell(self):
+        return self._archivo.tell()
+
+    def read(self, *args):
+        return self._archivo.read(*args)
+
+    def flush(self):
+        return self._archivo.flush()
+
+    def close(self):
+        self._archivo.close()
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def __getattr__(self, nombre):
+        return getattr(self._archivo, nombre)
+
+    def descartar(self):
+        self._archivo.close()
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+
+class AlmacenArchivos:
+
+    def __init__(self, raiz):
+        self.raiz = os.path.abspath(raiz)
+        self.temporales = os.path.join(self.raiz, 'tmp')
+        os.makedirs(self.temporales, exist_ok=True)
+
+    def ruta(self, sha256, extension='.dcm'):
+        """Ruta definitiva de un contenido"""
+        return os.path.join(self.raiz, sha256[:2], sha256[2:4], f'{sha256}{extension}')
+
+    def existe(self, sha256, extension='.dcm'):
+        return os.path.exists(self.ruta(sha256, extension))
+
+    def temporal(self, extension='.dcm'):
+        """ArchivoHash dentro del almacén (mismo sistema de archivos que el destino)"""
+        return ArchivoHash(self.temporales, sufijo=extension + '.tmp')
+
+    def guardar_stream(self, stream, extension='.dcm', limite=None):
+        """Copiar un stream por bloques y confirmarlo en el almacén"""
+        temporal = self.temporal(extension)
+        try:
+            while True:
+                bloque = stream.read(BLOQUE)
+                if not bloque:
+                    break
+                temporal.write(bloque)
+                if limite is not None and temporal.tamano > limite:
+                    raise ArchivoDemasiadoGrande(f'El archivo supera el máximo de {limite} bytes')
+        except BaseException:
+            temporal.descartar()
+            raise
+        return self.confirmar(temporal, extension)
+
+    def confirmar(self, temporal, extension='.dcm'):
+        """fsync + rename atómico del temporal a su ruta por hash; dedup si ya existe"""
+        try:
+            temporal.flush()
+            os.fsync(temporal.fileno())
+            temporal.close()
+
+            if temporal.tamano == 0:
+                raise ValueError('Archivo vacío')
+
+            destino = self.ruta(temporal.sha256, extension)
+            duplicado = os.path.exists(destino)
+            if duplicado:
+                os.remove(temporal.ruta)
+            else:
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                os.replace(temporal.ruta, destino)
+        except BaseException:
+            temporal.descartar()
+            raise
+
+        return {
+            'sha256': temporal.sha256,
+            'tamano': temporal.tamano,
+            'ruta': destino,
+            'relativa': os.path.relpath(destino, self.raiz),
+            'duplicado': duplicado
+        }
+
+
+_almacenes = {}
+_lock = threading.Lock()
+
+
+def obtener_almacen(app, clave='DICOM_STORE_PATH', defecto='dicom'):
+    """Almacén configurado en app.config[clave] (uno por ruta y proceso)"""
+    raiz = app.config.get(clave) or os.path.join(app.config['UPLOAD_FOLDER'], defecto)
+    with _lock:
+        if raiz not in _almacenes:
+            _almacenes[raiz] = AlmacenArchivos(raiz)
+        return _almacenes[raiz]
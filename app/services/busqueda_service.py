@@ -0,0 +1,227 @@
+"""
+Búsqueda global de pacientes, órdenes y facturas
+
+En PostgreSQL usa los índices GIN de pg_trgm (migración d2a8b4c61f03):
+- pacientes.busqueda_texto: todos los campos buscables normalizados con
+  f_unaccent + lower, mantenido por trigger
+- ordenes/facturas: índices de trigramas sobre número, NCF y médico
+
+Los resultados se ordenan por similitud. En SQLite (pruebas) no hay pg_trgm y se
+usa IndiceTrigramas, un índice en memoria con la misma normalización.
+"""
+from collections import defaultdict
+from app import db
+from sqlalchemy import text
+import unicodedata
+
+UMBRAL_SIMILITUD = 0.6  # mismo valor por defecto que pg_trgm.word_similarity_threshold
+
+
+def normalizar(texto):
+    """Minúsculas sin acentos (equivalente a lower(f_unaccent(...)))"""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def _patron_like(termino):
+    escapado = termino.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escapado}%'
+
+
+def trigramas(texto):
+    """Trigramas al estilo pg_trgm: por palabra, con dos espacios delante y uno detrás"""
+    resultado = set()
+    for palabra in ''.join(c if c.isalnum() else ' ' for c in texto).split():
+        relleno = f'  {palabra} '
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+class IndiceTrigramas:
+    """Índice invertido trigrama -> ids, para entornos sin pg_trgm"""
+
+    def __init__(self):
+        self.textos = {}
+        self.indice = defaultdict(set)
+
+    def agregar(self, id_, *campos):
+        texto = normalizar(' '.join(str(c) for c in campos if c))
+        self.textos[id_] = texto
+        for trigrama in trigramas(texto):
+            self.indice[trigrama].add(id_)
+
+    def buscar(self, termino, limite=10):
+        """[(id, score)] con score ~ word_similarity(termino, texto)"""
+        termino = normalizar(termino)
+        consulta = trigramas(termino)
+        if not consulta:
+            return []
+
+        coincidencias = defaultdict(int)
+        for trigrama in consulta:
+            for id_ in self.indice.get(trigrama, ()):
+                coincidencias[id_] += 1
+
+        resultados = []
+        for id_, comunes in coincidencias.items():
+            score = comunes / len(consulta)
+            if termino in self.textos[id_] or score >= UMBRAL_SIMILITUD:
+                resultados.append((id_, score))
+
+        resultados.sort(key=lambda r: (-r[1], -r[0]))
+        return resultados[:limite]
+
+
+class BusquedaService:
+
+    @staticmethod
+    def _usa_trigramas():
+        return db.engine.dialect.name == 'postgresql'
+
+    # ========== PACIENTES ==========
+
+    @staticmethod
+    def buscar_pacientes(termino, limite=10):
+        """Pacientes más parecidos al término (nombre, cédula, teléfonos, email, código)"""
+        if not BusquedaService._usa_trigramas():
+            return BusquedaService._buscar_pacientes_memoria(termino, limite)
+
+        t = normalizar(termino)
+        filas = db.session.execute(text("""
+            SELECT id, cedula, nombre, apellido, telefono, celular, codigo_paciente, estado,
+                   word_similarity(:t, busqueda_texto) AS score
+            FROM pacientes
+            WHERE busqueda_texto LIKE :patron OR :t <% busqueda_texto
+            ORDER BY score DESC, id DESC
+            LIMIT :limite
+        """), {'t': t, 'patron': _patron_like(t), 'limite': limite}).fetchall()
+
+        return [BusquedaService._paciente_dict(f) for f in filas]
+
+    @staticmethod
+    def _buscar_pacientes_memoria(termino, limite):
+        from app.models import Paciente
+
+        pacientes = {p.id: p for p in Paciente.query.all()}
+        indice = IndiceTrigramas()
+        for p in pacientes.values():
+            indice.agregar(p.id, p.nombre, p.apellido, p.cedula, (p.cedula or '').replace('-', ''),
+                           p.telefono, p.celular, p.email, p.codigo_paciente)
+
+        resultados = []
+        for id_, score in indice.buscar(termino, limite):
+            p = pacientes[id_]
+            resultados.append(BusquedaService._paciente_dict((
+                p.id, p.cedula, p.nombre, p.apellido, p.telefono, p.celular,
+                p.codigo_paciente, p.estado, score
+            )))
+        return resultados
+
+    @staticmethod
+    def _paciente_dict(fila):
+        id_, cedula, nombre, apellido, telefono, celular, codigo, estado, score = fila
+        return {
+            'id': id_,
+            'cedula': cedula,
+            'nombre': f"{nombre} {apellido}",
+            'telefono': telefono or celular,
+            'codigo': codigo,
+            'estado': estado,
+            'score': round(float(score), 3)
+        }
+
+    # ========== ÓRDENES Y FACTURAS ==========
+
+    @staticmethod
+    def buscar_ordenes(termino, limite=10):
+        """Órdenes por número o médico referente"""
+        t = normalizar(termino)
+        if BusquedaService._usa_trigramas():
+            filas = db.session.execute(text("""
+                SELECT o.id, o.numero_orden, p.nombre, p.apellido, o.fecha_orden, o.estado,
+                       GREATEST(
+                           word_similarity(:t, lower(o.numero_orden)),
+                           word_similarity(:t, lower(f_unaccent(o.medico_referente)))
+                       ) AS score
+                FROM ordenes o
+                LEFT JOIN pacientes p ON p.id = o.paciente_id
+                WHERE lower(o.numero_orden) LIKE :patron
+                   OR lower(f_unaccent(o.medico_referente)) LIKE :patron
+                ORDER BY score DESC, o.fecha_orden DESC
+                LIMIT :limite
+            """), {'t': t, 'patron': _patron_like(t), 'limite': limite}).fetchall()
+        else:
+            from app.models import Orden
+            ordenes = {o.id: o for o in Orden.query.all()}
+            indice = IndiceTrigramas()
+            for o in ordenes.values():
+                indice.agregar(o.id, o.numero_orden, o.medico_referente)
+            filas = []
+            for id_, score in indice.buscar(t, limite):
+                o = ordenes[id_]
+                filas.append((o.id, o.numero_orden,
+                               o.paciente.nombre if o.paciente else None,
+                               o.paciente.apellido if o.paciente else None,
+                               o.fecha_orden, o.estado, score))
+
+        return [{
+            'id': id_,
+            'numero_orden': numero,
+            'paciente': f"{nombre} {apellido}" if nombre else 'N/A',
+            'fecha': fecha.isoformat(),
+            'estado': estado,
+            'score': round(float(score), 3)
+        } for id_, numero, nombre, apellido, fecha, estado, score in filas]
+
+    @staticmethod
+    def buscar_facturas(termino, limite=10):
+        """Facturas por número o NCF"""
+        t = normalizar(termino)
+        if BusquedaService._usa_trigramas():
+            filas = db.session.execute(text("""
+                SELECT f.id, f.numero_factura, f.ncf, p.nombre, p.apellido, f.total, f.estado,
+                       GREATEST(
+                           word_similarity(:t, lower(f.numero_factura)),
+                           word_similarity(:t, lower(f.ncf))
+                       ) AS score
+                FROM facturas f
+                LEFT JOIN pacientes p ON p.id = f.paciente_id
+                WHERE lower(f.numero_factura) LIKE :patron
+                   OR lower(f.ncf) LIKE :patron
+                ORDER BY score DESC, f.fecha_factura DESC
+                LIMIT :limite
+            """), {'t': t, 'patron': _patron_like(t), 'limite': limite}).fetchall()
+        else:
+            from app.models import Factura
+            facturas = {f.id: f for f in Factura.query.all()}
+            indice = IndiceTrigramas()
+            for f in facturas.values():
+                indice.agregar(f.id, f.numero_factura, f.ncf)
+            filas = []
+            for id_, score in indice.buscar(t, limite):
+                f = facturas[id_]
+                filas.append((f.id, f.numero_factura, f.ncf,
+                               f.paciente.nombre if f.paciente else None,
+                               f.paciente.apellido if f.paciente else None,
+                               f.total, f.estado, score))
+
+        return [{
+            'id': id_,
+            'numero_factura': numero,
+            'ncf': ncf,
+            'paciente': f"{nombre} {apellido}" if nombre else 'N/A',
+            'total': float(total),
+            'estado': estado,
+            'score': round(float(score), 3)
+        } for id_, numero, ncf, nombre, apellido, total, estado, score in filas]
+
+    @staticmethod
+    def buscar_global(termino, limite=10):
+        """Pacientes, órdenes y facturas más parecidos al término"""
+        return {
+            'pacientes': BusquedaService.buscar_pacientes(termino, limite),
+            'ordenes': BusquedaService.buscar_ordenes(termino, limite),
+            'facturas': BusquedaService.buscar_facturas(termino, limite)
+        }
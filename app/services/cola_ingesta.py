@@ -0,0 +1,586 @@
+"""
+Cola de ingesta de resultados de máquinas (HL7, JSON, DICOM)
+
+Los endpoints de /api/maquinas validan el payload, lo guardan en esta cola
+(SQLite en modo WAL, durable ante reinicios) y responden 202 con un recibo.
+Hilos en segundo plano reclaman lotes, insertan en `resultados` y marcan cada
+recibo como completado; los fallos transitorios se reintentan con backoff
+exponencial y los permanentes (o los que agotan intentos) pasan a 'muerto'.
+
+Estados de un recibo: pendiente -> procesando -> completado | muerto
+Un recibo 'procesando' cuyo lease vence (worker caído) vuelve a reclamarse.
+La entrega es al menos una vez; cada resultado se inserta con una
+clave_ingesta única (recibo o MSH-10) para que una repetición no duplique.
+
+    flask ingesta estado         # conteo por estado
+    flask ingesta reintentar     # devolver los muertos a la cola
+"""
+from datetime import datetime
+from app import db
+import click
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TIPOS = ('hl7', 'json', 'dicom')
+
+
+class ErrorPermanente(Exception):
+    """El payload nunca va a poder procesarse (no reintentar)"""
+
+
+class ColaIngesta:
+
+    def __init__(self, ruta, max_intentos=8, lease=120, backoff_base=2, backoff_max=600):
+        self.ruta = ruta
+        self.max_intentos = max_intentos
+        self.lease = lease
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self._conexion().executescript("""
+            CREATE TABLE IF NOT EXISTS recibos (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                estado TEXT NOT NULL DEFAULT 'pendiente',
+                intentos INTEGER NOT NULL DEFAULT 0,
+                proximo_intento REAL NOT NULL,
+                bloqueado_hasta REAL,
+                error TEXT,
+                resultado_id INTEGER,
+                creado REAL NOT NULL,
+                actualizado REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_recibos_estado ON recibos (estado, proximo_intento);
+        """)
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL: el 202 solo se responde con el recibo ya en disco
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # ========== PRODUCTOR ==========
+
+    def encolar(self, tipo, payload):
+        """Guardar el payload y devolver el id del recibo"""
+        recibo_id = uuid.uuid4().hex
+        ahora = time.time()
+        self._conexion().execute("""
+            INSERT INTO recibos (id, tipo, payload, proximo_intento, creado, actualizado)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (recibo_id, tipo, json.dumps(payload), ahora, ahora, ahora))
+        return recibo_id
+
+    def encolar_lote(self, items):
+        """Guardar varios payloads [(tipo, payload)] en una transacción (un solo fsync)"""
+        ahora = time.time()
+        filas = [(uuid.uuid4().hex, tipo, json.dumps(payload), ahora, ahora, ahora) for tipo, payload in items]
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("""
+                INSERT INTO recibos (id, tipo, payload, proximo_intento, creado, actualizado)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, filas)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [fila[0] for fila in filas]
+
+    def estado(self, recibo_id):
+        fila = self._conexion().execute("""
+            SELECT id, tipo, estado, intentos, proximo_intento, error, resultado_id, creado, actualizado
+            FROM recibos WHERE id = ?
+        """, (recibo_id,)).fetchone()
+        if not fila:
+            return None
+        return {
+            'recibo_id': fila[0],
+            'tipo': fila[1],
+            'estado': fila[2],
+            'intentos': fila[3],
+            'proximo_intento': datetime.fromtimestamp(fila[4]).isoformat() if fila[2] == 'pendiente' else None,
+            'error': fila[5],
+            'resultado_id': fila[6],
+            'creado': datetime.fromtimestamp(fila[7]).isoformat(),
+            'actualizado': datetime.fromtimestamp(fila[8]).isoformat()
+        }
+
+    def conteo(self):
+        return dict(self._conexion().execute(
+            "SELECT estado, COUNT(*) FROM recibos GROUP BY estado"
+        ).fetchall())
+
+    # ========== CONSUMIDOR ==========
+
+    def reclamar(self, lote):
+        """Tomar hasta `lote` recibos listos (o con lease vencido) para procesar"""
+        conn = self._conexion()
+        ahora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            filas = conn.execute("""
+                SELECT id, tipo, payload, intentos FROM recibos
+                WHERE (estado = 'pendiente' AND proximo_intento <= ?)
+                   OR (estado = 'procesando' AND bloqueado_hasta < ?)
+                ORDER BY creado
+                LIMIT ?
+            """, (ahora, ahora, lote)).fetchall()
+            if filas:
+                conn.executemany("""
+                    UPDATE recibos SET estado = 'procesando', bloqueado_hasta = ?, actualizado = ?
+                    WHERE id = ?
+                """, [(ahora + self.lease, ahora, f[0]) for f in filas])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [{'id': f[0], 'tipo': f[1], 'payload': json.loads(f[2]), 'intentos': f[3]} for f in filas]
+
+    def completar(self, recibo_id, resultado_id):
+        self._conexion().execute("""
+            UPDATE recibos SET estado = 'completado', resultado_id = ?, error = NULL,
+                               bloqueado_hasta = NULL, actualizado = ?
+            WHERE id = ?
+        """, (resultado_id, time.time(), recibo_id))
+
+    def fallar(self, recibo, error, permanente=False):
+        """Reprogramar con backoff exponencial o mandar a dead-letter"""
+        intentos = recibo['intentos'] + 1
+        ahora = time.time()
+        if permanente or intentos >= self.max_intentos:
+            self._conexion().execute("""
+                UPDATE recibos SET estado = 'muerto', intentos = ?, error = ?,
+                                   bloqueado_hasta = NULL, actualizado = ?
+                WHERE id = ?
+            """, (intentos, str(error)[:1000], ahora, recibo['id']))
+            logger.error(f"Ingesta: recibo {recibo['id']} a dead-letter: {error}")
+            return
+
+        espera = min(self.backoff_max, self.backoff_base ** intentos) * random.uniform(0.8, 1.2)
+        self._conexion().execute("""
+            UPDATE recibos SET estado = 'pendiente', intentos = ?, error = ?, proximo_intento = ?,
+                               bloqueado_hasta = NULL, actualizado = ?
+            WHERE id = ?
+        """, (intentos, str(error)[:1000], ahora + espera, ahora, recibo['id']))
+
+    def reintentar_muertos(self):
+        cur = self._conexion().execute("""
+            UPDATE recibos SET estado = 'pendiente', intentos = 0, proximo_intento = ?, actualizado = ?
+            WHERE estado = 'muerto'
+        """, (time.time(), time.time()))
+        return cur.rowcount
+
+    def purgar(self, dias=7):
+        """Borrar recibos completados antiguos"""
+        self._conexion().execute(
+            "DELETE FROM recibos WHERE estado = 'completado' AND actualizado < ?",
+            (time.time() - dias * 86400,)
+        )
+
+
+# ========== PROCESAMIENTO ==========
+
+COLUMNAS_RESULTADO = (
+    'orden_detalle_id', 'tipo_archivo', 'nombre_archivo', 'datos_hl7', 'datos_dicom',
+    'ruta_archivo', 'tamano_bytes', 'hash_archivo', 'estado_validacion'
+)
+
+
+COLUMNAS_VALOR = (
+    'resultado_id', 'orden_detalle_id', 'secuencia', 'codigo', 'nombre', 'valor', 'valor_numerico',
+    'unidades', 'rango_referencia', 'bandera', 'estado', 'mapeado'
+)
+
+
+def _fila_resultado(tipo, payload, orden_detalle_id, marca, valores=None):
+    """Valores de COLUMNAS_RESULTADO para un recibo"""
+    if tipo == 'hl7':
+        return (orden_detalle_id, 'hl7', f'resultado_hl7_{marca}.hl7', payload['mensaje_hl7'],
+                json.dumps(valores if valores is not None else payload.get('valores', {})),
+                None, None, None, 'pendiente')
+    if tipo == 'dicom':
+        return (orden_detalle_id, 'dicom', payload['filename'], None, None,
+                payload['ruta'], int(payload['tamano']), payload['hash'], 'pendiente')
+    if tipo == 'json':
+        return (orden_detalle_id, 'json', f'resultado_{payload.get("tipo_estudio", "analisis")}_{marca}.json',
+                None, json.dumps(payload.get('valores', {})), None, None, None, 'pendiente')
+    raise ErrorPermanente(f'Tipo de recibo desconocido: {tipo}')
+
+
+def _agrupar_observaciones(mensaje, detalles_orden):
+    """Repartir los OBX entre los orden_detalles de la orden
+
+    Un OBX va al detalle cuyo estudios.codigo coincide con OBX-3 y, si no, con
+    el OBR-4 que lo contiene; los que no coinciden con nada van al detalle más
+    reciente (comportamiento anterior) marcados como no mapeados.
+    Devuelve [(orden_detalle_id, [(observacion, mapeado)])].
+    """
+    por_codigo = {}
+    for detalle_id, codigo in detalles_orden:
+        if codigo:
+            por_codigo.setdefault(codigo, detalle_id)
+    defecto = detalles_orden[0][0]
+
+    grupos = {}
+    for obs in mensaje['observaciones']:
+        detalle_id = por_codigo.get(obs['codigo'].upper()) or por_codigo.get(obs['codigo_obr'].upper())
+        grupos.setdefault(detalle_id or defecto, []).append((obs, detalle_id is not None))
+    return list(grupos.items()) or [(defecto, [])]
+
+
+def _filas_valores(resultado_id, orden_detalle_id, observaciones):
+    filas = []
+    for obs, mapeado in observaciones:
+        secuencia = obs['secuencia']
+        filas.append((
+            resultado_id, orden_detalle_id, int(secuencia) if secuencia.isdigit() else None,
+            obs['codigo'][:50] or None, obs['nombre'][:200] or None, obs['valor'], obs['valor_numerico'],
+            obs['unidades'][:50] or None, obs['rango_referencia'][:100] or None,
+            obs['bandera'][:10] or None, obs['estado'][:5] or None, mapeado
+        ))
+    return filas
+
+
+def _clave_ingesta(tipo, mensaje, clave):
+    """Clave de idempotencia: MSH-3|MSH-4|MSH-10 para HL7, si no el recibo de la cola"""
+    if tipo == 'hl7' and mensaje['control_id']:
+        return f"hl7:{mensaje['aplicacion']}|{mensaje['instalacion']}|{mensaje['control_id']}"[:255]
+    return clave or uuid.uuid4().hex
+
+
+def insertar_lote(cur, items, claves=None):
+    """Insertar muchos resultados con pocas sentencias, dentro de la transacción de `cur`
+
+    items: [(tipo, payload)]. Resuelve todos los orden_id -> orden_detalles en
+    una consulta y hace un único INSERT ... VALUES con execute_values. Los HL7
+    se parsean (hl7_rapido) y generan un resultado por estudio de la orden más
+    sus valores en resultado_valores; si el payload no trae orden_id se toma
+    el número de orden de OBR-2/ORC-2.
+
+    Cada resultado lleva una clave_ingesta (única con orden_detalle_id): el
+    id de control del HL7 (MSH-10, con aplicación e instalación emisoras) o,
+    si no hay, la de `claves` (el recibo de la cola). Un reenvío MLLP o un
+    recibo que se vuelve a reclamar tras un commit sin completar no duplica
+    filas: el INSERT ignora el conflicto y se devuelve el resultado existente.
+
+    Devuelve una lista paralela de (resultado_id, None) o (None, error) para
+    los que no pudieron insertarse.
+    """
+    from psycopg2.extras import execute_values
+    from app.services.hl7_rapido import parsear_oru, numero_orden, ErrorHL7
+
+    estados = [(None, None)] * len(items)
+    mensajes = {}
+    ordenes, numeros = {}, {}
+    for i, (tipo, payload) in enumerate(items):
+        try:
+            if tipo == 'hl7':
+                mensajes[i] = parsear_oru(payload['mensaje_hl7'])
+                if not payload.get('orden_id'):
+                    numero = numero_orden(mensajes[i])
+                    if not numero:
+                        raise ErrorHL7('orden_id no indicado y el mensaje no trae OBR-2/ORC-2')
+                    numeros[i] = numero
+                    continue
+            ordenes[i] = int(payload['orden_id'])
+        except ErrorHL7 as e:
+            estados[i] = (None, f'HL7 inválido: {e}')
+        except (KeyError, TypeError, ValueError):
+            estados[i] = (None, 'orden_id inválido')
+
+    if numeros:
+        cur.execute("SELECT numero_orden, id FROM ordenes WHERE numero_orden = ANY(%s)",
+                    (list(set(numeros.values())),))
+        por_numero = dict(cur.fetchall())
+        for i, numero in numeros.items():
+            if numero in por_numero:
+                ordenes[i] = por_numero[numero]
+            else:
+                estados[i] = (None, f'Orden {numero} no encontrada')
+
+    detalles = {}
+    if ordenes:
+        # Detalles de cada orden, el más reciente primero
+        cur.execute("""
+            SELECT od.orden_id, od.id, UPPER(COALESCE(e.codigo, ''))
+            FROM orden_detalles od
+            LEFT JOIN estudios e ON e.id = od.estudio_id
+            WHERE od.orden_id = ANY(%s)
+            ORDER BY od.orden_id, od.id DESC
+        """, (list(set(ordenes.values())),))
+        for orden_id, detalle_id, codigo in cur.fetchall():
+            detalles.setdefault(orden_id, []).append((detalle_id, codigo))
+
+    marca = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filas, posiciones, observaciones = [], [], []
+    for i, (tipo, payload) in enumerate(items):
+        if estados[i][1]:
+            continue
+        detalles_orden = detalles.get(ordenes[i])
+        if not detalles_orden:
+            estados[i] = (None, 'Orden no encontrada')
+            continue
+        clave = _clave_ingesta(tipo, mensajes.get(i), claves[i] if claves else None)
+        try:
+            if tipo == 'hl7':
+                for orden_detalle_id, grupo in _agrupar_observaciones(mensajes[i], detalles_orden):
+                    valores = {obs['codigo'] or obs['nombre']: obs['valor'] for obs, _ in grupo}
+                    valores.update(payload.get('valores') or {})
+                    filas.append(_fila_resultado(tipo, payload, orden_detalle_id, marca, valores) + (clave,))
+                    posiciones.append(i)
+                    observaciones.append(grupo)
+            else:
+                filas.append(_fila_resultado(tipo, payload, detalles_orden[0][0], marca) + (clave,))
+                posiciones.append(i)
+                observaciones.append([])
+        except ErrorPermanente as e:
+            estados[i] = (None, str(e))
+        except (KeyError, TypeError, ValueError) as e:
+            estados[i] = (None, f'Payload inválido: {e}')
+
+    if filas:
+        insertados = execute_values(cur, f"""
+            INSERT INTO resultados ({', '.join(COLUMNAS_RESULTADO)}, clave_ingesta, fecha_importacion, created_at)
+            VALUES %s
+            ON CONFLICT (clave_ingesta, orden_detalle_id) DO NOTHING
+            RETURNING id, clave_ingesta, orden_detalle_id
+        """, filas, template=f"({', '.join(['%s'] * (len(COLUMNAS_RESULTADO) + 1))}, NOW(), NOW())",
+            page_size=1000, fetch=True)
+        nuevos = {(clave, orden_detalle_id): resultado_id for resultado_id, clave, orden_detalle_id in insertados}
+
+        existentes = {}
+        if len(nuevos) < len(filas):
+            # Ya ingeridos antes (o repetidos dentro del lote): se reporta el resultado que hay
+            cur.execute("""
+                SELECT id, clave_ingesta, orden_detalle_id FROM resultados WHERE clave_ingesta = ANY(%s)
+            """, (list({fila[-1] for fila in filas}),))
+            existentes = {(clave, orden_detalle_id): resultado_id
+                          for resultado_id, clave, orden_detalle_id in cur.fetchall()}
+
+        valores = []
+        for i, fila, grupo in zip(posiciones, filas, observaciones):
+            llave = (fila[-1], fila[0])
+            resultado_id = nuevos.pop(llave, None)
+            if resultado_id is not None:
+                valores.extend(_filas_valores(resultado_id, fila[0], grupo))
+            else:
+                resultado_id = existentes[llave]
+            if estados[i][0] is None:
+                # Un HL7 con varios estudios genera varios resultados: se reporta el primero
+                estados[i] = (resultado_id, None)
+
+        if valores:
+            execute_values(cur, f"""
+                INSERT INTO resultado_valores ({', '.join(COLUMNAS_VALOR)}) VALUES %s
+            """, valores, page_size=1000)
+
+    return estados
+
+
+def insertar_aislando(conn, items, claves=None):
+    """insertar_lote y commit; si la base de datos rechaza el lote, item por item
+
+    Una fila que la base de datos no acepta (desborde numérico, texto largo)
+    no debe arrastrar al resto: se deshace el lote y se inserta cada item
+    bajo su propio savepoint en una sola transacción. Devuelve (estados,
+    fallidos) con fallidos = {posición: excepción} de los items rechazados
+    (su estado queda (None, None)). Los errores de conexión o fuera de la
+    base de datos se propagan como antes.
+    """
+    from psycopg2 import Error as ErrorBD
+
+    cur = conn.cursor()
+    try:
+        estados = insertar_lote(cur, items, claves)
+        conn.commit()
+        cur.close()
+        return estados, {}
+    except ErrorBD as e:
+        conn.rollback()
+        if len(items) == 1:
+            return [(None, None)], {0: e}
+        logger.warning(f"Ingesta: lote de {len(items)} rechazado ({e}); se inserta uno por uno")
+
+    estados, fallidos = [], {}
+    for i, item in enumerate(items):
+        cur.execute("SAVEPOINT item_ingesta")
+        try:
+            estados.extend(insertar_lote(cur, [item], [claves[i]] if claves else None))
+            cur.execute("RELEASE SAVEPOINT item_ingesta")
+        except ErrorBD as e:
+            cur.execute("ROLLBACK TO SAVEPOINT item_ingesta")
+            estados.append((None, None))
+            fallidos[i] = e
+    conn.commit()
+    cur.close()
+    return estados, fallidos
+
+
+def procesar_lote(cola, recibos):
+    """Insertar un lote de recibos en una sola transacción"""
+    from app.utils.conexiones import conexion
+
+    try:
+        with conexion() as conn:
+            estados, fallidos = insertar_aislando(conn, [(r['tipo'], r['payload']) for r in recibos],
+                                                  [r['id'] for r in recibos])
+    except Exception as e:
+        # Error de base de datos/conexión: todo el lote se reintenta
+        logger.warning(f"Ingesta: lote de {len(recibos)} falló, se reintentará: {e}")
+        for recibo in recibos:
+            cola.fallar(recibo, e)
+        return 0
+
+    for i, e in fallidos.items():
+        # Rechazado por la base de datos: se reintenta solo (y acaba en 'muerto' si persiste)
+        cola.fallar(recibos[i], e)
+
+    completados = 0
+    for i, (recibo, (resultado_id, error)) in enumerate(zip(recibos, estados)):
+        if i in fallidos:
+            continue
+        if error:
+            # Orden inexistente o payload inválido: reintentar no lo arregla
+            cola.fallar(recibo, error, permanente=True)
+        else:
+            cola.completar(recibo['id'], resultado_id)
+            completados += 1
+            if recibo['tipo'] == 'dicom':
+                _indexar_dicom(recibo['payload'])
+    return completados
+
+
+def _indexar_dicom(payload):
+    """Registrar el encabezado en el índice DICOM; un fallo no afecta al recibo"""
+    from app.services.indice_dicom import IndiceDicomService
+    try:
+        IndiceDicomService.indexar(payload['ruta'], sha256=payload.get('hash'), tamano=payload.get('tamano'),
+                                   paciente_id=payload.get('paciente_id'), orden_id=payload.get('orden_id'))
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Ingesta: no se pudo indexar {payload.get('ruta')}: {e}")
+
+
+# ========== WORKERS ==========
+
+_estado = {'pid': None, 'cola': None, 'hilos': [], 'despertar': None}
+_lock = threading.Lock()
+
+
+def obtener_cola(app):
+    """Cola de este proceso (se reabre tras un fork)"""
+    if _estado['pid'] != os.getpid():
+        with _lock:
+            if _estado['pid'] != os.getpid():
+                config = app.config
+                _estado['cola'] = ColaIngesta(
+                    config.get('INGESTA_COLA_PATH') or os.path.join(config['UPLOAD_FOLDER'], 'cola_ingesta.sqlite3'),
+                    max_intentos=config.get('INGESTA_MAX_INTENTOS', 8),
+                    lease=config.get('INGESTA_LEASE', 120)
+                )
+                _estado['hilos'] = []
+                _estado['despertar'] = threading.Event()
+                _estado['pid'] = os.getpid()
+    return _estado['cola']
+
+
+def iniciar_workers(app):
+    """Arrancar los hilos que vacían la cola en este proceso (idempotente)"""
+    cola = obtener_cola(app)
+    with _lock:
+        if _estado['hilos'] or not app.config.get('INGESTA_WORKERS', 2):
+            return
+        for i in range(app.config.get('INGESTA_WORKERS', 2)):
+            hilo = threading.Thread(target=_bucle, args=(app, cola), name=f'ingesta-{i}', daemon=True)
+            hilo.start()
+            _estado['hilos'].append(hilo)
+
+
+def encolar(tipo, payload):
+    """Guardar un recibo desde un request y asegurar que haya quien lo procese"""
+    from flask import current_app
+    app = current_app._get_current_object()
+    recibo_id = obtener_cola(app).encolar(tipo, payload)
+    iniciar_workers(app)
+    despertar()
+    return recibo_id
+
+
+def respuesta_recibo(recibo_id):
+    """Cuerpo del 202 Accepted"""
+    return {
+        'success': True,
+        'recibo_id': recibo_id,
+        'estado': 'pendiente',
+        'estado_url': f'/api/maquinas/recibos/{recibo_id}',
+        'message': 'Resultado recibido; se procesará en segundo plano'
+    }
+
+
+def despertar():
+    """Avisar a los hilos locales de que hay trabajo nuevo"""
+    if _estado['despertar'] is not None:
+        _estado['despertar'].set()
+
+
+def _bucle(app, cola):
+    lote = app.config.get('INGESTA_LOTE', 50)
+    despertar_evento = _estado['despertar']
+    ultima_purga = 0
+
+    while True:
+        try:
+            recibos = cola.reclamar(lote)
+            if recibos:
+                with app.app_context():
+                    try:
+                        procesar_lote(cola, recibos)
+                    finally:
+                        db.session.remove()
+                continue
+
+            if time.time() - ultima_purga > 3600:
+                cola.purgar()
+                ultima_purga = time.time()
+        except Exception as e:
+            logger.error(f"Ingesta: error en el worker: {e}")
+
+        despertar_evento.wait(1.0)
+        despertar_evento.clear()
+
+
+@click.group('ingesta')
+def ingesta_cli():
+    """Administración de la cola de ingesta de máquinas"""
+
+
+@ingesta_cli.command('estado')
+def estado_cmd():
+    """Recibos por estado"""
+    from flask import current_app
+    for estado, cantidad in sorted(obtener_cola(current_app).conteo().items()):
+        click.echo(f"{estado:<12} {cantidad}")
+
+
+@ingesta_cli.command('reintentar')
+def reintentar_cmd():
+    """Devolver los recibos en dead-letter a la cola"""
+    from flask import current_app
+    cantidad = obtener_cola(current_app).reintentar_muertos()
+    click.echo(f"{cantidad} recibos devueltos a la cola")
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import Estudio, OrdenDetalle
+from sqlalchemy import func, text
+
+
+class DashboardService:
+    """Agregados del dashboard calculados con un número fijo de consultas"""
+
+    @staticmethod
+    def _rangos(hoy):
+        """Límites usados por los filtros: datetimes [desde, hasta) y fechas del rollup"""
+        inicio_dia = datetime.combine(hoy, datetime.min.time())
+        inicio_semana = hoy - timedelta(days=hoy.weekday())
+        return {
+            'hoy': inicio_dia,
+            'manana': inicio_dia + timedelta(days=1),
+            'inicio_mes': inicio_dia.replace(day=1),
+            'fecha_hoy': hoy,
+            'fecha_inicio_semana': inicio_semana,
+            'fecha_inicio_mes': hoy.replace(day=1),
+            'fecha_inicio_diarios': hoy - timedelta(days=6),
+            'fecha_desde': min(inicio_semana, hoy.replace(day=1)),
+        }
+
+    @staticmethod
+    def conteos(rangos):
+        """Pacientes y órdenes en una sola pasada por tabla"""
+        fila = db.session.execute(text("""
+            WITH pac AS (
+                SELECT
+                    COUNT(*) FILTER (WHERE estado = 'activo') AS total,
+                    COUNT(*) FILTER (WHERE created_at >= :hoy AND created_at < :manana) AS hoy,
+                    COUNT(*) FILTER (WHERE created_at >= :inicio_mes) AS mes
+                FROM pacientes
+            ), ord AS (
+                SELECT
+                    COUNT(*) FILTER (WHERE estado IN ('pendiente', 'en_proceso')) AS pendientes,
+                    COUNT(*) FILTER (WHERE fecha_orden >= :hoy AND fecha_orden < :manana) AS hoy,
+                    COUNT(*) FILTER (WHERE fecha_orden >= :inicio_mes) AS mes
+                FROM ordenes
+            )
+            SELECT pac.total, pac.hoy, pac.mes, ord.pendientes, ord.hoy, ord.mes
+            FROM pac, ord
+        """), rangos).first()
+
+        return {
+            'pacientes': {'total': fila[0], 'hoy': fila[1], 'mes': fila[2]},
+            'ordenes': {'pendientes': fila[3], 'hoy': fila[4], 'mes': fila[5]},
+        }
+
+    @staticmethod
+    def facturacion(rangos):
+        """Facturación del mes (rollup) y cuentas por cobrar"""
+        fila = db.session.execute(text("""
+            WITH mes AS (
+                SELECT
+                    COALESCE(SUM(monto_facturas) FILTER (WHERE estado != 'anulada'), 0) AS total,
+                    COALESCE(SUM(cantidad_facturas) FILTER (WHERE estado != 'anulada'), 0) AS cantidad,
+                    COALESCE(SUM(cantidad_facturas) FILTER (WHERE estado IN ('pendiente', 'parcial')), 0) AS pendientes,
+                    COALESCE(SUM(cantidad_facturas) FILTER (WHERE estado = 'pagada'), 0) AS pagadas
+                FROM resumen_diario
+                WHERE fecha >= :fecha_inicio_mes AND fecha <= :fecha_hoy
+            ), cobrar AS (
+                SELECT COALESCE(SUM(saldo), 0) AS saldo
+                FROM facturas
+                WHERE estado IN ('pendiente', 'parcial')
+            )
+            SELECT mes.total, mes.cantidad, mes.pendientes, mes.pagadas, cobrar.saldo
+            FROM mes, cobrar
+        """), rangos).first()
+
+        return {
+            'total_mes': float(fila[0]),
+            'facturas_mes': int(fila[1]),
+            'pendientes': int(fila[2]),
+            'pagadas': int(fila[3]),
+            'cuentas_por_cobrar': float(fila[4])
+        }
+
+    @staticmethod
+    def ingresos(rangos):
+        """Ingresos hoy/semana/mes y desglose por método, leídos del rollup"""
+        filas = db.session.execute(text("""
+            SELECT
+                metodo_pago,
+                GROUPING(metodo_pago) AS es_total,
+                COALESCE(SUM(monto_pagos) FILTER (WHERE fecha = :fecha_hoy), 0),
+                COALESCE(SUM(monto_pagos) FILTER (WHERE fecha >= :fecha_inicio_semana), 0),
+                COALESCE(SUM(monto_pagos) FILTER (WHERE fecha >= :fecha_inicio_mes), 0),
+                COALESCE(SUM(cantidad_pagos) FILTER (WHERE fecha >= :fecha_inicio_mes), 0)
+            FROM resumen_diario
+            WHERE fecha >= :fecha_desde AND fecha <= :fecha_hoy
+            GROUP BY GROUPING SETS ((metodo_pago), ())
+        """), rangos).fetchall()
+
+        totales = {'hoy': 0.0, 'semana': 0.0, 'mes': 0.0}
+        por_metodo = []
+        for metodo, es_total, hoy, semana, mes, cantidad in filas:
+            if es_total:
+                totales = {'hoy': float(hoy), 'semana': float(semana), 'mes': float(mes)}
+            elif cantidad:
+                por_metodo.append({'metodo': metodo, 'total': float(mes), 'cantidad': int(cantidad)})
+
+        return totales, por_metodo
+
+    @staticmethod
+    def ingresos_diarios(rangos):
+        """Serie de los últimos 7 días, incluyendo días sin pagos"""
+        filas = db.session.execute(text("""
+            SELECT d.dia::date, COALESCE(SUM(r.monto_pagos), 0)
+            FROM generate_series(
+                CAST(:fecha_inicio_diarios AS date), CAST(:fecha_hoy AS date), INTERVAL '1 day'
+            ) AS d(dia)
+            LEFT JOIN resumen_diario r ON r.fecha = d.dia::date
+            GROUP BY d.dia
+            ORDER BY d.dia
+        """), rangos).fetchall()
+
+        return [{
+            'fecha': dia.isoformat(),
+            'dia': dia.strftime('%a'),
+            'monto': float(monto)
+        } for dia, monto in filas]
+
+    @staticmethod
+    def estudios_populares(limite=5):
+        """Estudios más solicitados"""
+        return db.session.query(
+            Estudio.nombre,
+            func.count(OrdenDetalle.id).label('cantidad')
+        ).join(
+            OrdenDetalle, Estudio.id == OrdenDetalle.estudio_id
+        ).group_by(
+            Estudio.nombre
+        ).order_by(
+            func.count(OrdenDetalle.id).desc()
+        ).limit(limite).all()
+
+    @staticmethod
+    def resumen(hoy=None):
+        """Todos los bloques del dashboard (5 consultas en total)"""
+        hoy = hoy or datetime.now().date()
+        rangos = DashboardService._rangos(hoy)
+
+        conteos = DashboardService.conteos(rangos)
+        ingresos, pagos_por_metodo = DashboardService.ingresos(rangos)
+        ingresos['diarios'] = DashboardService.ingresos_diarios(rangos)
+
+        return {
+            'fecha': hoy.isoformat(),
+            'pacientes': conteos['pacientes'],
+            'ordenes': conteos['ordenes'],
+            'facturacion': DashboardService.facturacion(rangos),
+            'ingresos': ingresos,
+            'estudios_populares': [
+                {'nombre': nombre, 'cantidad': cantidad}
+                for nombre, cantidad in DashboardService.estudios_populares()
+            ],
+            'pagos_por_metodo': pagos_por_metodo
+        }
@@ -0,0 +1,260 @@
+"""
+Render de DICOM a imagen (PNG/JPEG) con ventana y caché de vistas previas
+
+Pipeline por cuadro, sobre un solo buffer float32 (operaciones in-place de
+NumPy, sin float64 ni copias intermedias):
+1. LUT de modalidad: valor * RescaleSlope + RescaleIntercept
+2. Ventana VOI lineal (WindowCenter/WindowWidth, fórmula de PS3.3 C.11.2.1.2);
+   sin ventana en el archivo se usa mínimo/máximo del cuadro. Una imagen
+   constante da gris medio en vez de dividir por cero
+3. MONOCHROME1 se invierte; RGB pasa sin ventana
+4. uint8 -> Pillow, reducido a cada resolución
+
+Las vistas (miniatura, pantalla, completa) se guardan en disco con clave
+SOPInstanceUID + cuadro + ventana; en un fallo de caché se decodifica solo ese
+cuadro (no el volumen multi-frame) y se generan sus tres resoluciones.
+
+    cache = obtener_cache_render(current_app)
+    ruta = cache.obtener(sop_uid, ruta_dicom, resolucion='pantalla')
+"""
+from io import BytesIO
+from PIL import Image
+import hashlib
+import numpy as np
+import os
+import tempfile
+import threading
+
+RESOLUCIONES = {'miniatura': 256, 'pantalla': 1024, 'completa': None}
+FORMATOS = {'png': ('PNG', '.png', 'image/png'), 'jpeg': ('JPEG', '.jpg', 'image/jpeg')}
+
+
+def _primero(valor):
+    """Primer valor de un atributo multivalor (WindowCenter suele traer varios)"""
+    if valor is None or valor == '':
+        return None
+    try:
+        return float(valor[0] if hasattr(valor, '__len__') and not isinstance(valor, str) else valor)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def parametros_imagen(ds):
+    """LUT de modalidad, ventana por defecto y fotometría de un dataset"""
+    fotometria = str(ds.get('PhotometricInterpretation', 'MONOCHROME2'))
+    return {
+        'pendiente': _primero(ds.get('RescaleSlope')) or 1.0,
+        'intercepto': _primero(ds.get('RescaleIntercept')) or 0.0,
+        'centro': _primero(ds.get('WindowCenter')),
+        'ancho': _primero(ds.get('WindowWidth')),
+        'monochrome1': fotometria == 'MONOCHROME1',
+        'color': int(ds.get('SamplesPerPixel', 1) or 1) > 1,
+        'cuadros': int(ds.get('NumberOfFrames', 1) or 1)
+    }
+
+
+def cuadro(pixeles, indice, cuadros):
+    """Vista (sin copia) del cuadro `indice` de pixel_array"""
+    if cuadros > 1:
+        if not 0 <= indice < cuadros:
+            raise IndexError(f'Cuadro {indice} fuera de rango (0-{cuadros - 1})')
+        return pixeles[indice]
+    if indice != 0:
+        raise IndexError('La imagen tiene un solo cuadro')
+    return pixeles
+
+
+def ventana(pixeles, pendiente=1.0, intercepto=0.0, centro=None, ancho=None, monochrome1=False):
+    """Cuadro monocromo -> uint8 con LUT de modalidad y ventana VOI"""
+    buffer = pixeles.astype(np.float32, copy=True)
+    if pendiente != 1.0:
+        buffer *= np.float32(pendiente)
+    if intercepto != 0.0:
+        buffer += np.float32(intercepto)
+
+    if centro is None or ancho is None or ancho < 1:
+        minimo, maximo = float(buffer.min()), float(buffer.max())
+        centro = (minimo + maximo) / 2 + 0.5
+        ancho = maximo - minimo + 1
+
+    if ancho <= 1:
+        # Imagen constante (o ventana degenerada): gris medio
+        buffer.fill(127.5)
+    else:
+        # y = ((x - (c - 0.5)) / (w - 1) + 0.5) * 255, recortado a [0, 255]
+        escala = np.float32(255.0 / (ancho - 1))
+        buffer -= np.float32(centro - 0.5)
+        buffer *= escala
+        buffer += np.float32(127.5)
+        np.clip(buffer, 0, 255, out=buffer)
+
+    if monochrome1:
+        np.subtract(np.float32(255), buffer, out=buffer)
+    buffer += np.float32(0.5)
+    return buffer.astype(np.uint8)
+
+
+def color_a_uint8(pixeles):
+    """RGB de 8 bits pasa igual; de más bits se escala al rango"""
+    if pixeles.dtype == np.uint8:
+        return pixeles
+    buffer = pixeles.astype(np.float32)
+    maximo = float(buffer.max()) or 1.0
+    buffer *= np.float32(255.0 / maximo)
+    return buffer.astype(np.uint8)
+
+
+def leer_cuadro(ruta_dicom, indice=0):
+    """(parametros_imagen, píxeles de un solo cuadro) sin decodificar el volumen
+
+    Con pydicom >= 3 se decodifica solo el cuadro pedido (pydicom.pixels con
+    index); con versiones anteriores se cae a ds.pixel_array completo. Los
+    parámetros devueltos ya son los de una imagen de un cuadro.
+    """
+    import pydicom
+
+    ds = pydicom.dcmread(ruta_dicom, stop_before_pixels=True)
+    params = parametros_imagen(ds)
+    cuadros = params['cuadros']
+    if not 0 <= indice < cuadros:
+        raise IndexError(f'Cuadro {indice} fuera de rango (0-{cuadros - 1})' if cuadros > 1
+                         else 'La imagen tiene un solo cuadro')
+    try:
+        from pydicom.pixels import pixel_array
+    except ImportError:
+        pixeles = cuadro(pydicom.dcmread(ruta_dicom).pixel_array, indice, cuadros)
+    else:
+        pixeles = pixel_array(ruta_dicom, index=indice if cuadros > 1 else None)
+    return dict(params, cuadros=1), pixeles
+
+
+def renderizar(pixeles, params, indice=0, centro=None, ancho=None):
+    """pixel_array + parametros_imagen -> imagen Pillow a resolución completa"""
+    datos = cuadro(pixeles, indice, params['cuadros'])
+    if params['color']:
+        return Image.fromarray(color_a_uint8(datos), 'RGB')
+    return Image.fromarray(ventana(
+        datos, params['pendiente'], params['intercepto'],
+        centro if centro is not None else params['centro'],
+        ancho if ancho is not None else params['ancho'],
+        params['monochrome1']
+    ), 'L')
+
+
+def reducir(imagen, lado_maximo):
+    """Copia reducida para que el lado mayor no supere lado_maximo"""
+    if lado_maximo is None or max(imagen.size) <= lado_maximo:
+        return imagen
+    factor = max(imagen.size) / lado_maximo
+    tamano = (max(1, round(imagen.width / factor)), max(1, round(imagen.height / factor)))
+    # reduce() entero primero (barato) y LANCZOS solo para el resto
+    entero = int(factor)
+    if entero >= 2:
+        imagen = imagen.reduce(entero)
+    return imagen.resize(tamano, Image.LANCZOS)
+
+
+def codificar(imagen, formato='png'):
+    nombre, _, _ = FORMATOS[formato]
+    salida = BytesIO()
+    if nombre == 'JPEG':
+        imagen.save(salida, nombre, quality=90)
+    else:
+        imagen.save(salida, nombre, compress_level=3)
+    return salida.getvalue()
+
+
+class CacheRender:
+    """Vistas renderizadas en disco, por SOPInstanceUID + cuadro + ventana"""
+
+    def __init__(self, raiz):
+        self.raiz = os.path.abspath(raiz)
+        os.makedirs(self.raiz, exist_ok=True)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def ruta(self, sop_uid, indice=0, centro=None, ancho=None, resolucion='pantalla', formato='png'):
+        clave = f'{sop_uid}|{indice}|{centro}|{ancho}|{resolucion}'
+        digest = hashlib.sha1(clave.encode()).hexdigest()
+        return os.path.join(self.raiz, digest[:2], f'{digest}{FORMATOS[formato][1]}')
+
+    def _lock_clave(self, clave):
+        with self._lock:
+            return self._locks.setdefault(clave, threading.Lock())
+
+    def obtener(self, sop_uid, ruta_dicom, indice=0, centro=None, ancho=None, resolucion='pantalla', formato='png'):
+        """Ruta de la vista pedida; la genera (con las demás resoluciones) si falta"""
+        if resolucion not in RESOLUCIONES:
+            raise ValueError(f'Resolución inválida: {resolucion}')
+        if formato not in FORMATOS:
+            raise ValueError(f'Formato inválido: {formato}')
+
+        destino = self.ruta(sop_uid, indice, centro, ancho, resolucion, formato)
+        if os.path.exists(destino):
+            return destino
+
+        # Un solo hilo renderiza cada instancia/ventana; los demás esperan el archivo
+        lock = self._lock_clave((sop_uid, indice, centro, ancho, formato))
+        with lock:
+            if not os.path.exists(destino):
+                self.generar(sop_uid, ruta_dicom, indice, centro, ancho, formato)
+        with self._lock:
+            self._locks.pop((sop_uid, indice, centro, ancho, formato), None)
+        return destino
+
+    def generar(self, sop_uid, ruta_dicom, indice=0, centro=None, ancho=None, formato='png'):
+        """Decodificar solo el cuadro pedido y escribir las tres resoluciones"""
+        params, pixeles = leer_cuadro(ruta_dicom, indice)
+        completa = renderizar(pixeles, params, 0, centro, ancho)
+
+        imagen = completa
+        # De mayor a menor: cada reducción parte de la anterior
+        for resolucion, lado in sorted(RESOLUCIONES.items(), key=lambda r: -(r[1] or 10 ** 9)):
+            imagen = reducir(imagen, lado)
+            self._escribir(self.ruta(sop_uid, indice, centro, ancho, resolucion, formato), codificar(imagen, formato))
+
+    def _escribir(self, destino, datos):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, destino)
+
+    def purgar(self, max_bytes):
+        """Borrar las vistas usadas hace más tiempo hasta quedar bajo max_bytes"""
+        archivos = []
+        total = 0
+        for raiz, _, nombres in os.walk(self.raiz):
+            for nombre in nombres:
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    st = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                archivos.append((st.st_atime, st.st_size, ruta))
+                total += st.st_size
+
+        borrados = 0
+        for _, tamano, ruta in sorted(archivos):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(ruta)
+                total -= tamano
+                borrados += 1
+            except FileNotFoundError:
+                pass
+        return borrados
+
+
+_caches = {}
+_lock_caches = threading.Lock()
+
+
+def obtener_cache_render(app):
+    """CacheRender en DICOM_RENDER_CACHE (por defecto UPLOAD_FOLDER/dicom_render)"""
+    raiz = app.config.get('DICOM_RENDER_CACHE') or os.path.join(app.config['UPLOAD_FOLDER'], 'dicom_render')
+    with _lock_caches:
+        if raiz not in _caches:
+            _caches[raiz] = CacheRender(raiz)
+        return _caches[raiz]
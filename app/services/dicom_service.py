@@ -4,49 +4,79 @@ import os
 
 class DICOMService:
     
+    # Tags que se leen del encabezado (el resto del archivo, incluidos los
+    # píxeles, no se toca)
+    TAGS_ENCABEZADO = [
+        'PatientID', 'PatientName', 'PatientBirthDate', 'PatientSex',
+        'StudyInstanceUID', 'SeriesInstanceUID', 'SOPInstanceUID', 'SOPClassUID',
+        'StudyDate', 'StudyTime', 'StudyDescription', 'AccessionNumber',
+        'Modality', 'InstitutionName', 'SeriesDescription', 'SeriesNumber',
+        'InstanceNumber', 'BodyPartExamined', 'ImageType', 'Rows', 'Columns',
+        'NumberOfFrames', 'BitsAllocated', 'PhotometricInterpretation',
+        'WindowCenter', 'WindowWidth', 'RescaleSlope', 'RescaleIntercept'
+    ]
+
+    @staticmethod
+    def leer_encabezado(filepath):
+        """Dataset solo con TAGS_ENCABEZADO (sin píxeles)"""
+        return pydicom.dcmread(filepath, stop_before_pixels=True,
+                               specific_tags=DICOMService.TAGS_ENCABEZADO)
+
     @staticmethod
     def parse_dicom_file(filepath):
-        """Leer archivo DICOM y extraer metadatos"""
+        """Leer el encabezado DICOM y extraer metadatos"""
         try:
-            ds = pydicom.dcmread(filepath)
-            
+            ds = DICOMService.leer_encabezado(filepath)
+
+            def texto(nombre):
+                valor = ds.get(nombre)
+                return str(valor) if valor is not None and str(valor) != '' else None
+
+            def entero(nombre):
+                valor = ds.get(nombre)
+                try:
+                    return int(valor) if valor not in (None, '') else None
+                except (TypeError, ValueError):
+                    return None
+
+            meta = getattr(ds, 'file_meta', None)
             metadata = {
-                'patient_id': str(ds.PatientID) if hasattr(ds, 'PatientID') else None,
-                'patient_name': str(ds.PatientName) if hasattr(ds, 'PatientName') else None,
-                'patient_dob': str(ds.PatientBirthDate) if hasattr(ds, 'PatientBirthDate') else None,
-                'patient_sex': str(ds.PatientSex) if hasattr(ds, 'PatientSex') else None,
-                'study_date': str(ds.StudyDate) if hasattr(ds, 'StudyDate') else None,
-                'study_time': str(ds.StudyTime) if hasattr(ds, 'StudyTime') else None,
-                'study_description': str(ds.StudyDescription) if hasattr(ds, 'StudyDescription') else None,
-                'modality': str(ds.Modality) if hasattr(ds, 'Modality') else None,
-                'institution_name': str(ds.InstitutionName) if hasattr(ds, 'InstitutionName') else None,
-                'series_description': str(ds.SeriesDescription) if hasattr(ds, 'SeriesDescription') else None,
-                'image_type': str(ds.ImageType) if hasattr(ds, 'ImageType') else None,
-                'rows': int(ds.Rows) if hasattr(ds, 'Rows') else None,
-                'columns': int(ds.Columns) if hasattr(ds, 'Columns') else None
+                'patient_id': texto('PatientID'),
+                'patient_name': texto('PatientName'),
+                'patient_dob': texto('PatientBirthDate'),
+                'patient_sex': texto('PatientSex'),
+                'study_instance_uid': texto('StudyInstanceUID'),
+                'series_instance_uid': texto('SeriesInstanceUID'),
+                'sop_instance_uid': texto('SOPInstanceUID'),
+                'sop_class_uid': texto('SOPClassUID'),
+                'accession_number': texto('AccessionNumber'),
+                'study_date': texto('StudyDate'),
+                'study_time': texto('StudyTime'),
+                'study_description': texto('StudyDescription'),
+                'modality': texto('Modality'),
+                'institution_name': texto('InstitutionName'),
+                'series_description': texto('SeriesDescription'),
+                'series_number': entero('SeriesNumber'),
+                'instance_number': entero('InstanceNumber'),
+                'body_part': texto('BodyPartExamined'),
+                'image_type': texto('ImageType'),
+                'rows': entero('Rows'),
+                'columns': entero('Columns'),
+                'number_of_frames': entero('NumberOfFrames') or 1,
+                'transfer_syntax': str(meta.TransferSyntaxUID) if meta is not None and 'TransferSyntaxUID' in meta else None
             }
-            
+
             return metadata
         except Exception as e:
             raise Exception(f"Error parsing DICOM: {str(e)}")
-    
+
     @staticmethod
-    def convert_dicom_to_png(dicom_path, output_path):
-        """Convertir DICOM a PNG para visualización"""
+    def convert_dicom_to_png(dicom_path, output_path, cuadro=0):
+        """Convertir DICOM a PNG para visualización (ventana del archivo o mínimo/máximo)"""
+        from app.services.dicom_render import leer_cuadro, renderizar
         try:
-            ds = pydicom.dcmread(dicom_path)
-            pixel_array = ds.pixel_array
-            
-            from PIL import Image
-            import numpy as np
-            
-            # Normalizar y convertir a imagen
-            pixel_array = pixel_array - np.min(pixel_array)
-            pixel_array = pixel_array / np.max(pixel_array)
-            pixel_array = (pixel_array * 255).astype(np.uint8)
-            
-            image = Image.fromarray(pixel_array)
-            image.save(output_path)
+            params, pixeles = leer_cuadro(dicom_path, cuadro)
+            renderizar(pixeles, params).save(output_path)
             return output_path
         except Exception as e:
             raise Exception(f"Error converting DICOM: {str(e)}")
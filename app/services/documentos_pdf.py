@@ -0,0 +1,236 @@
+"""
+Render de PDF fuera del worker de gunicorn, con caché por contenido
+
+Los PDF se generan en un pool de procesos (PDF_PROCESOS por worker, creado al
+primer uso, después del fork) que ya tiene los estilos de reportlab armados.
+El worker solo arma el dict de datos (pdf_service.datos_factura) y espera
+los bytes.
+
+Cada PDF se guarda en PDF_CACHE_PATH con clave SHA-256 de
+(tipo, id, versión, PLANTILLA). La versión de una factura es
+facturas.version (sube con cada pago y anulación) más pacientes.updated_at
+(nombre y cédula salen en el PDF), así que una versión vieja simplemente
+deja de pedirse. Se
+escribe a un temporal único y os.replace; dos descargas simultáneas nunca
+comparten archivo, y la respuesta sale de memoria.
+
+    pdf, clave, nombre = obtener_documentos(current_app).factura(factura_id)
+"""
+from app import db
+from app.services.pdf_service import datos_factura, renderizar_factura, estilos
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sqlalchemy import text
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Subir al cambiar el diseño: invalida todos los PDF cacheados
+PLANTILLA = 1
+
+
+def _iniciar_proceso():
+    """Inicializador del pool: estilos y fuentes cargados antes del primer PDF"""
+    estilos()
+
+
+class DocumentosPDF:
+
+    def __init__(self, cache_dir, procesos=2, timeout=60):
+        self.cache_dir = os.path.abspath(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.procesos = procesos
+        self.timeout = timeout
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    # ========== POOL ==========
+
+    def pool(self):
+        """Pool propio de este proceso (uno nuevo si se heredó por fork)"""
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # spawn: el worker puede tener hilos (cola de ingesta), fork no es seguro
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_iniciar_proceso
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def renderizar(self, funcion, datos):
+        """Ejecutar funcion(datos) -> bytes en el pool (o aquí con PDF_PROCESOS = 0)"""
+        if not self.procesos:
+            return funcion(datos)
+        return self.pool().submit(funcion, datos).result(timeout=self.timeout)
+
+    def calentar(self):
+        """Levantar los procesos del pool sin esperar (post_fork)"""
+        if self.procesos:
+            pool = self.pool()
+            for _ in range(self.procesos):
+                pool.submit(_iniciar_proceso)
+
+    def cerrar(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # ========== CACHÉ ==========
+
+    def clave(self, tipo, id_, version):
+        return hashlib.sha256(f'{tipo}|{id_}|{version}|{PLANTILLA}'.encode()).hexdigest()
+
+    def ruta(self, clave):
+        return os.path.join(self.cache_dir, clave[:2], f'{clave}.pdf')
+
+    def obtener(self, clave, generar):
+        """Bytes del PDF en caché; si falta, generar() -> bytes (o None) y se guarda"""
+        ruta = self.ruta(clave)
+        try:
+            with open(ruta, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+
+        # Un solo render por clave en este proceso; entre procesos el rename es atómico
+        with self._lock:
+            lock = self._locks.setdefault(clave, threading.Lock())
+        try:
+            with lock:
+                if os.path.exists(ruta):
+                    with open(ruta, 'rb') as f:
+                        return f.read()
+                pdf = generar()
+                if pdf is not None:
+                    self._escribir(ruta, pdf)
+                return pdf
+        finally:
+            with self._lock:
+                self._locks.pop(clave, None)
+
+    def _escribir(self, destino, datos):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(datos)
+            os.replace(temporal, destino)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    # ========== DOCUMENTOS ==========
+
+    def factura(self, factura_id):
+        """(bytes, clave, nombre de archivo) del PDF de una factura; None si no existe"""
+        fila = db.session.execute(text("""
+            SELECT f.numero_factura, f.version, p.updated_at
+            FROM facturas f
+            LEFT JOIN pacientes p ON p.id = f.paciente_id
+            WHERE f.id = :id
+        """), {'id': factura_id}).first()
+        if fila is None:
+            return None
+        numero_factura, version, paciente_actualizado = fila
+        clave = self.clave('factura', factura_id, version_pdf(version, paciente_actualizado))
+
+        def generar():
+            from app.models import Factura
+            factura = Factura.query.get(factura_id)
+            # Borrada entre la consulta y el render
+            return self.renderizar(renderizar_factura, datos_factura(factura)) if factura else None
+
+        pdf = self.obtener(clave, generar)
+        if pdf is None:
+            return None
+        return pdf, clave, nombre_factura(numero_factura)
+
+    def facturas(self, items, al_avanzar=None):
+        """PDF de varias facturas [(factura_id, version, datos)] en paralelo
+
+        Las que ya están en caché no se renderizan; el resto se reparte en el
+        pool. Devuelve los bytes en el mismo orden; al_avanzar(hechas) se
+        llama a medida que terminan.
+        """
+        resultado = [None] * len(items)
+        pendientes = {}
+        hechas = 0
+        for i, (factura_id, version, datos) in enumerate(items):
+            ruta = self.ruta(self.clave('factura', factura_id, version))
+            try:
+                with open(ruta, 'rb') as f:
+                    resultado[i] = f.read()
+                hechas += 1
+            except FileNotFoundError:
+                pendientes[i] = (ruta, datos)
+        if al_avanzar is not None:
+            al_avanzar(hechas)
+
+        if not self.procesos:
+            tareas = ((i, ruta, renderizar_factura(datos)) for i, (ruta, datos) in pendientes.items())
+        else:
+            pool = self.pool()
+            futuros = {pool.submit(renderizar_factura, datos): (i, ruta) for i, (ruta, datos) in pendientes.items()}
+            tareas = ((*futuros[f], f.result()) for f in as_completed(futuros))
+
+        for i, ruta, pdf in tareas:
+            self._escribir(ruta, pdf)
+            resultado[i] = pdf
+            hechas += 1
+            if al_avanzar is not None:
+                al_avanzar(hechas)
+        return resultado
+
+
+def version_pdf(version, paciente_actualizado):
+    """Versión de la factura para la clave de caché"""
+    return f"{version}|{paciente_actualizado.isoformat() if paciente_actualizado else ''}"
+
+
+def versiones_facturas(ids):
+    """{factura_id: version_pdf} de varias facturas en una consulta"""
+    filas = db.session.execute(text("""
+        SELECT f.id, f.version, p.updated_at
+        FROM facturas f
+        LEFT JOIN pacientes p ON p.id = f.paciente_id
+        WHERE f.id = ANY(:ids)
+    """), {'ids': list(ids)}).fetchall()
+    return {factura_id: version_pdf(version, actualizado) for factura_id, version, actualizado in filas}
+
+
+def nombre_factura(numero_factura):
+    return f'factura_{numero_factura.replace("-", "_")}.pdf'
+
+
+_documentos = {}
+_lock_documentos = threading.Lock()
+
+
+def obtener_documentos(app):
+    """DocumentosPDF de este proceso (PDF_CACHE_PATH, por defecto UPLOAD_FOLDER/pdf_cache)"""
+    cache_dir = app.config.get('PDF_CACHE_PATH') or os.path.join(app.config['UPLOAD_FOLDER'], 'pdf_cache')
+    with _lock_documentos:
+        if cache_dir not in _documentos:
+            _documentos[cache_dir] = DocumentosPDF(
+                cache_dir,
+                procesos=app.config.get('PDF_PROCESOS', 2),
+                timeout=app.config.get('PDF_TIMEOUT', 60)
+            )
+        return _documentos[cache_dir]
+
+
+def cerrar_pools():
+    """Cerrar los pools de este proceso (worker_exit de gunicorn)"""
+    with _lock_documentos:
+        for documentos in _documentos.values():
+            documentos.cerrar()
@@ -30,17 +30,22 @@ class EmailService:
             html_part = MIMEText(body_html, 'html', 'utf-8')
             msg.attach(html_part)
             
-            # Adjuntos
+            # Adjuntos: ruta de archivo o (nombre, bytes) ya en memoria
             if attachments:
-                for filepath in attachments:
-                    if os.path.exists(filepath):
-                        with open(filepath, 'rb') as f:
-                            part = MIMEBase('application', 'octet-stream')
-                            part.set_payload(f.read())
-                            encoders.encode_base64(part)
-                            filename = os.path.basename(filepath)
-                            part.add_header('Content-Disposition', f'attachment; filename="{filename}"')
-                            msg.attach(part)
+                for adjunto in attachments:
+                    if isinstance(adjunto, tuple):
+                        filename, contenido = adjunto
+                    elif os.path.exists(adjunto):
+                        with open(adjunto, 'rb') as f:
+                            contenido = f.read()
+                        filename = os.path.basename(adjunto)
+                    else:
+                        continue
+                    part = MIMEBase('application', 'octet-stream')
+                    part.set_payload(contenido)
+                    encoders.encode_base64(part)
+                    part.add_header('Content-Disposition', f'attachment; filename="{filename}"')
+                    msg.attach(part)
             
             # Enviar
             with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
@@ -101,7 +106,7 @@ class EmailService:
         return self.enviar(paciente.email, f'Resultados Listos - {estudio_nombre}', html, attachments)
     
     def enviar_factura(self, paciente, factura, pdf_path):
-        """Enviar factura por email"""
+        """Enviar factura por email (pdf_path: ruta o (nombre, bytes))"""
         if not paciente.email:
             return {'success': False, 'error': 'Paciente sin email'}
         
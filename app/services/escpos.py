@@ -0,0 +1,146 @@
+"""
+Tickets en ESC/POS para impresoras térmicas de 80 mm
+
+En lugar de un PDF que el navegador tiene que rasterizar, se arma el flujo
+de bytes que la impresora entiende directamente: texto en su code page
+(PC850, con tildes y ñ), negrita/doble tamaño, Code128 y QR nativos y corte.
+Un ticket son unos cientos de bytes y se genera en microsegundos.
+
+    ticket = TicketESCPOS(columnas=48)
+    ticket.titulo('CENTRO DIAGNÓSTICO').columnas('TOTAL:', 'RD$ 1,500.00').cortar()
+    datos = ticket.bytes()
+
+Los recibos (pago, orden, factura) se maquetan en recibos.py, que usa
+este constructor como backend. Se descargan con ?format=escpos o se envían
+a la impresora por TCP (puerto 9100, "raw"/JetDirect) con
+?impresora=<nombre> de IMPRESORAS_TERMICAS.
+"""
+import socket
+
+ESC = b'\x1b'
+GS = b'\x1d'
+
+INICIALIZAR = ESC + b'@'
+CODEPAGE_PC850 = ESC + b't\x02'
+ALINEACION = {'izquierda': 0, 'centro': 1, 'derecha': 2}
+
+
+class TicketESCPOS:
+    """Constructor de un ticket ESC/POS (métodos encadenables)"""
+
+    def __init__(self, columnas=48, codificacion='cp850', inicializar=True):
+        self.ancho = columnas
+        self.codificacion = codificacion
+        self._partes = [INICIALIZAR, CODEPAGE_PC850] if inicializar else []
+        # Sin inicializar (fragmento que se inserta en otro ticket) no se sabe la alineación
+        self._alineacion = 0 if inicializar else None
+
+    # ========== TEXTO ==========
+
+    def _alinear(self, alineacion):
+        valor = ALINEACION[alineacion]
+        if valor != self._alineacion:
+            self._partes.append(ESC + b'a' + bytes((valor,)))
+            self._alineacion = valor
+
+    def texto(self, linea, alineacion='izquierda', negrita=False, doble=False):
+        """Una línea; doble = doble alto y ancho (la mitad de columnas)"""
+        self._alinear(alineacion)
+        if negrita:
+            self._partes.append(ESC + b'E\x01')
+        if doble:
+            self._partes.append(GS + b'!\x11')
+        limite = self.ancho // 2 if doble else self.ancho
+        self._partes.append(linea[:limite].encode(self.codificacion, errors='replace') + b'\n')
+        if doble:
+            self._partes.append(GS + b'!\x00')
+        if negrita:
+            self._partes.append(ESC + b'E\x00')
+        return self
+
+    def titulo(self, linea, doble=True):
+        return self.texto(linea, 'centro', negrita=True, doble=doble)
+
+    def centrado(self, linea, negrita=False):
+        return self.texto(linea, 'centro', negrita=negrita)
+
+    def columnas(self, izquierda, derecha, negrita=False, doble=False):
+        """Texto a la izquierda y a la derecha en la misma línea"""
+        ancho = self.ancho // 2 if doble else self.ancho
+        derecha = derecha[:ancho]
+        izquierda = izquierda[:max(0, ancho - len(derecha) - 1)]
+        return self.texto(izquierda + ' ' * (ancho - len(izquierda) - len(derecha)) + derecha,
+                          negrita=negrita, doble=doble)
+
+    def separador(self, caracter='-'):
+        return self.texto(caracter * self.ancho)
+
+    def avanzar(self, lineas=1):
+        self._partes.append(ESC + b'd' + bytes((min(lineas, 255),)))
+        return self
+
+    # ========== CÓDIGOS ==========
+
+    def code128(self, datos, alto=80, ancho_modulo=2):
+        """Code128 nativo (juego B) con el texto debajo"""
+        contenido = b'{B' + datos.encode('ascii', errors='replace')
+        self._alinear('centro')
+        self._partes.append(GS + b'h' + bytes((alto,)) + GS + b'w' + bytes((ancho_modulo,)) + GS + b'H\x02')
+        self._partes.append(GS + b'k\x49' + bytes((len(contenido),)) + contenido + b'\n')
+        return self
+
+    def qr(self, datos, tamano=5):
+        """QR nativo (modelo 2, corrección M)"""
+        contenido = datos.encode('utf-8')
+        largo = len(contenido) + 3
+        self._alinear('centro')
+        self._partes.extend((
+            GS + b'(k\x04\x00\x31\x41\x32\x00',                  # modelo 2
+            GS + b'(k\x03\x00\x31\x43' + bytes((tamano,)),       # tamaño de módulo
+            GS + b'(k\x03\x00\x31\x45\x31',                      # corrección M
+            GS + b'(k' + bytes((largo % 256, largo // 256)) + b'\x31\x50\x30' + contenido,
+            GS + b'(k\x03\x00\x31\x51\x30',                      # imprimir
+            b'\n'
+        ))
+        return self
+
+    def crudo(self, datos):
+        """Insertar un fragmento ya emitido (p. ej. un encabezado compilado)"""
+        self._partes.append(datos)
+        self._alineacion = None
+        return self
+
+    # ========== FIN ==========
+
+    def cortar(self, avance=3):
+        """Avanzar papel y corte parcial"""
+        self._partes.append(GS + b'V\x42' + bytes((avance,)))
+        return self
+
+    def siguiente_etiqueta(self):
+        """Avanzar hasta el inicio de la siguiente etiqueta (papel con marca/gap)"""
+        self._partes.append(GS + b'\x0c')
+        return self
+
+    def bytes(self):
+        return b''.join(self._partes)
+
+
+def enviar_a_impresora(host, puerto, datos, timeout=5):
+    """Mandar el flujo a una impresora de red en modo raw (TCP 9100)"""
+    with socket.create_connection((host, puerto), timeout=timeout) as conexion:
+        conexion.sendall(datos)
+        conexion.shutdown(socket.SHUT_WR)
+    return len(datos)
+
+
+def impresoras_configuradas(texto):
+    """'caja1=192.168.1.50:9100,lab=192.168.1.51' -> {'caja1': ('192.168.1.50', 9100), ...}"""
+    impresoras = {}
+    for entrada in (texto or '').split(','):
+        if '=' not in entrada:
+            continue
+        nombre, direccion = entrada.split('=', 1)
+        host, _, puerto = direccion.strip().partition(':')
+        impresoras[nombre.strip()] = (host, int(puerto or 9100))
+    return impresoras
@@ -0,0 +1,180 @@
+"""
+Etiquetas de muestra (50x25 mm) por lote: todos los tubos de una orden
+
+    GET /api/impresion/etiquetas/orden/<orden_id>?format=pdf|escpos|zpl
+        &agrupar=categoria        una etiqueta por categoría de estudio
+        &impresora=<nombre>       enviar por TCP 9100 (escpos/zpl)
+
+Una sola consulta trae orden, paciente y detalles. Los formatos:
+- pdf: un documento con una página por etiqueta. El Code128 se construye
+  una vez por código (LRU por proceso) y se dibuja una vez por documento
+  como XObject; cada página solo lo referencia.
+- escpos: un flujo con GS FF entre etiquetas (impresora en modo etiqueta).
+- zpl: un ^XA...^XZ por etiqueta para impresoras Zebra.
+
+Sin columna de tipo de contenedor en el esquema, agrupar=categoria junta
+los estudios de la misma categoría en una etiqueta (un tubo por área).
+"""
+from app.services.escpos import TicketESCPOS
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from io import BytesIO
+import threading
+
+MM = 72 / 25.4
+ANCHO = 50 * MM
+ALTO = 25 * MM
+
+Etiqueta = namedtuple('Etiqueta', 'codigo paciente orden estudio fecha')
+
+
+def codigo_paciente(paciente_id, codigo):
+    return codigo or f"P{paciente_id:06d}"
+
+
+def etiqueta(paciente, orden, estudio_nombre):
+    """Etiqueta de un tubo a partir de los modelos"""
+    return Etiqueta(codigo_paciente(paciente.id, paciente.codigo_paciente),
+                    f"{paciente.nombre} {paciente.apellido}", orden.numero_orden,
+                    estudio_nombre, datetime.now().strftime('%d/%m/%y'))
+
+
+def etiquetas_orden(orden_id, agrupar=None):
+    """Etiquetas de todos los detalles de una orden; None si la orden no existe"""
+    from app import db
+    from sqlalchemy import text
+
+    filas = db.session.execute(text("""
+        SELECT o.numero_orden, p.id, p.nombre, p.apellido, p.codigo_paciente,
+               od.id, e.nombre, COALESCE(c.nombre, 'General')
+        FROM ordenes o
+        JOIN pacientes p ON p.id = o.paciente_id
+        LEFT JOIN orden_detalles od ON od.orden_id = o.id
+        LEFT JOIN estudios e ON e.id = od.estudio_id
+        LEFT JOIN categorias c ON c.id = e.categoria_id
+        WHERE o.id = :id
+        ORDER BY od.id
+    """), {'id': orden_id}).fetchall()
+    if not filas:
+        return None
+
+    numero_orden, paciente_id, nombre, apellido, codigo = filas[0][:5]
+    base = Etiqueta(codigo_paciente(paciente_id, codigo), f"{nombre} {apellido}", numero_orden,
+                    None, datetime.now().strftime('%d/%m/%y'))
+    detalles = [(estudio or 'Estudio', categoria) for _, _, _, _, _, detalle_id, estudio, categoria in filas
+                if detalle_id is not None]
+    if agrupar != 'categoria':
+        return [base._replace(estudio=estudio) for estudio, _ in detalles]
+
+    grupos = OrderedDict()
+    for estudio, categoria in detalles:
+        grupos.setdefault(categoria, []).append(estudio)
+    return [base._replace(estudio=f"{categoria}: {', '.join(estudios)}") for categoria, estudios in grupos.items()]
+
+
+# ========== PDF ==========
+
+MAX_BARCODES = 512
+
+_barcodes = OrderedDict()   # codigo -> Code128 ya calculado
+_lock_barcodes = threading.Lock()
+
+
+def barcode(codigo):
+    """Code128 de la etiqueta (LRU por proceso); dibujarlo con _lock_barcodes tomado"""
+    with _lock_barcodes:
+        objeto = _barcodes.get(codigo)
+        if objeto is not None:
+            _barcodes.move_to_end(codigo)
+            return objeto
+
+    from reportlab.graphics.barcode import code128
+    objeto = code128.Code128(codigo, barHeight=7*MM, barWidth=0.25*MM)
+    with _lock_barcodes:
+        _barcodes[codigo] = objeto
+        if len(_barcodes) > MAX_BARCODES:
+            _barcodes.popitem(last=False)
+    return objeto
+
+
+def etiquetas_pdf(etiquetas):
+    """Un PDF de 50x25 mm con una página por etiqueta"""
+    from reportlab.pdfgen import canvas
+
+    salida = BytesIO()
+    c = canvas.Canvas(salida, pagesize=(ANCHO, ALTO))
+    formas = {}
+    for e in etiquetas:
+        forma = formas.get(e.codigo)
+        if forma is None:
+            forma = formas[e.codigo] = f'bc{len(formas)}'
+            c.beginForm(forma)
+            objeto = barcode(e.codigo)
+            with _lock_barcodes:
+                objeto.drawOn(c, 0, 0)
+            c.endForm()
+
+        c.saveState()
+        c.translate(2*MM, ALTO - 10*MM)
+        c.doForm(forma)
+        c.restoreState()
+
+        c.setFont("Helvetica-Bold", 7)
+        c.drawString(2*MM, ALTO - 13*MM, e.paciente[:25])
+        c.setFont("Helvetica", 6)
+        c.drawString(2*MM, ALTO - 16*MM, f"Cod: {e.codigo}")
+        c.drawString(2*MM, ALTO - 19*MM, f"Ord: {e.orden}")
+        c.drawString(2*MM, ALTO - 22*MM, e.estudio[:25])
+        c.drawRightString(ANCHO - 2*MM, ALTO - 22*MM, e.fecha)
+        c.showPage()
+    c.save()
+    return salida.getvalue()
+
+
+# ========== ESC/POS ==========
+
+def etiquetas_escpos(etiquetas, columnas=32):
+    """Flujo ESC/POS para impresora en modo etiqueta (50 mm ~ 32 columnas)"""
+    t = TicketESCPOS(columnas)
+    for e in etiquetas:
+        t.code128(e.codigo, alto=56, ancho_modulo=2)
+        t.texto(e.paciente, negrita=True)
+        t.texto(f"Cod: {e.codigo}  Ord: {e.orden}")
+        t.columnas(e.estudio, e.fecha)
+        t.siguiente_etiqueta()
+    return t.bytes()
+
+
+# ========== ZPL ==========
+
+PLANTILLA_ZPL = (
+    "^XA^CI28^PW400^LL200"
+    "^FO16,12^BY2^BCN,56,N,N,N^FD{codigo}^FS"
+    "^FO16,76^A0N,24,24^FD{paciente}^FS"
+    "^FO16,104^A0N,20,20^FDCod: {codigo}^FS"
+    "^FO16,128^A0N,20,20^FDOrd: {orden}^FS"
+    "^FO16,152^A0N,20,20^FD{estudio}^FS"
+    "^FO300,152^A0N,20,20^FD{fecha}^FS"
+    "^XZ\n"
+)
+
+
+def _zpl(texto):
+    # ^ y ~ son prefijos de comando en ZPL
+    return texto.replace('^', ' ').replace('~', ' ')
+
+
+def etiquetas_zpl(etiquetas):
+    """Flujo ZPL (Zebra, 203 dpi: 50x25 mm = 400x200 puntos)"""
+    return ''.join(PLANTILLA_ZPL.format(
+        codigo=_zpl(e.codigo), paciente=_zpl(e.paciente[:25]), orden=_zpl(e.orden),
+        estudio=_zpl(e.estudio[:22]), fecha=e.fecha
+    ) for e in etiquetas).encode('utf-8')
+
+
+# formato -> (generar, mimetype, extensión)
+FORMATOS = {
+    'pdf': (etiquetas_pdf, 'application/pdf', 'pdf'),
+    'escpos': (etiquetas_escpos, 'application/octet-stream', 'bin'),
+    'zpl': (etiquetas_zpl, 'application/octet-stream', 'zpl')
+}
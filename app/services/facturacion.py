@@ -2,7 +2,9 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 from app import db
 from app.models import Factura, FacturaDetalle, Pago, Orden, OrdenDetalle, NCFSecuencia
-from sqlalchemy import func
+from app.services.resumen_diario import ResumenDiarioService
+from app.cache import invalidar_tags
+from sqlalchemy import func, text
 
 class FacturacionService:
     
@@ -76,7 +78,8 @@ class FacturacionService:
         factura.usuario_emision_id = datos_factura.get('usuario_id')
         
         db.session.add(factura)
-        db.session.flush()
+        db.session.flush()  # saldo = total lo pone trg_facturas_saldo al insertar
+        ResumenDiarioService.registrar_factura(factura)
         
         for detalle_orden in detalles_orden:
             detalle_factura = FacturaDetalle()
@@ -92,18 +95,22 @@ class FacturacionService:
         
         orden.estado = 'facturada'
         db.session.commit()
+        invalidar_tags('facturas')
         return factura
     
     @staticmethod
     def registrar_pago(factura_id, datos_pago):
-        factura = Factura.query.get(factura_id)
+        # Bloquear la factura: dos cajas no pueden cobrar el mismo saldo
+        factura = Factura.query.filter(Factura.id == factura_id).with_for_update().first()
         if not factura:
             raise ValueError('Factura no encontrada')
         if factura.estado == 'anulada':
             raise ValueError('No se puede pagar factura anulada')
         
-        pagos_previos = db.session.query(func.sum(Pago.monto)).filter(Pago.factura_id == factura_id).scalar() or Decimal('0')
-        saldo = Decimal(str(factura.total)) - Decimal(str(pagos_previos))
+        saldo = db.session.execute(text(
+            "SELECT saldo FROM facturas WHERE id = :id"
+        ), {'id': factura_id}).scalar()
+        saldo = Decimal(str(saldo or 0))
         monto = Decimal(str(datos_pago['monto']))
         
         if monto > saldo:
@@ -117,8 +124,47 @@ class FacturacionService:
         pago.banco = datos_pago.get('banco', '')
         pago.usuario_recibe_id = datos_pago.get('usuario_id')
         db.session.add(pago)
+        db.session.flush()
+        db.session.execute(text("""
+            UPDATE facturas
+            SET total_pagado = total_pagado + :monto, saldo = saldo - :monto,
+                version = version + 1
+            WHERE id = :id
+        """), {'monto': monto, 'id': factura_id})
+        ResumenDiarioService.registrar_pago(pago)
         
         nuevo_saldo = saldo - monto
+        estado_anterior = factura.estado
         factura.estado = 'pagada' if nuevo_saldo == 0 else 'parcial'
+        ResumenDiarioService.cambiar_estado_factura(factura, estado_anterior)
         db.session.commit()
+        invalidar_tags('facturas')
         return pago
+
+    @staticmethod
+    def anular_factura(factura_id):
+        """Marcar la factura como anulada y subir su versión (invalida el PDF en caché)
+
+        Sin ruta todavía: la orden queda 'facturada' y no registra quién anuló.
+        """
+        factura = Factura.query.filter(Factura.id == factura_id).with_for_update().first()
+        if not factura:
+            raise ValueError('Factura no encontrada')
+        if factura.estado == 'anulada':
+            raise ValueError('La factura ya está anulada')
+
+        pagado = db.session.execute(text(
+            "SELECT total_pagado FROM facturas WHERE id = :id"
+        ), {'id': factura_id}).scalar()
+        if pagado:
+            raise ValueError('La factura tiene pagos registrados')
+
+        estado_anterior = factura.estado
+        factura.estado = 'anulada'
+        db.session.execute(text("""
+            UPDATE facturas SET saldo = 0, version = version + 1 WHERE id = :id
+        """), {'id': factura_id})
+        ResumenDiarioService.cambiar_estado_factura(factura, estado_anterior)
+        db.session.commit()
+        invalidar_tags('facturas')
+        return factura
@@ -1,72 +1,395 @@
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+"""
+Monitor de la carpeta de exportación de los equipos (HL7 y DICOM)
+
+Pipeline:
+- los eventos de watchdog solo anotan la ruta (nada de sleep en el hilo del
+  observer); varios eventos del mismo archivo se fusionan
+- un hilo revisa las rutas anotadas y cuando el tamaño y la fecha de
+  modificación dejan de cambiar durante MONITOR_ESTABILIDAD segundos el
+  archivo pasa a un pool acotado de MONITOR_WORKERS hilos
+- cada archivo procesado queda en un libro de control SQLite
+  (ruta + mtime + tamaño + sha256): al reiniciar no se reprocesa lo ya hecho
+  y el escaneo inicial (y uno periódico) encuentra lo que llegó con el
+  servicio caído o lo que falló
+
+HL7: cada mensaje del archivo va a la cola de ingesta (cola_ingesta.py); la
+orden se toma de OBR-2/ORC-2. DICOM: se envía a Orthanc en streaming, sin
+leer el archivo completo en memoria.
+
+    flask monitor servir                # vigilar EQUIPOS_EXPORT_PATH
+    flask monitor estado                # archivos por estado en el libro
+"""
 from app.services.hl7_service import HL7Service
 from app.services.dicom_service import DICOMService
-from app import db
-from app.models import Resultado, OrdenDetalle
+from concurrent.futures import ThreadPoolExecutor
+import click
+import hashlib
+import logging
 import os
-import time
+import sqlite3
 import threading
+import time
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    # Sin watchdog el monitor funciona solo con el escaneo periódico
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES = {'.hl7': 'hl7', '.dcm': 'dicom'}
+BLOQUE = 1024 * 1024
+
+
+def tipo_archivo(ruta):
+    return EXTENSIONES.get(os.path.splitext(ruta)[1].lower())
+
+
+def sha256_archivo(ruta):
+    """Hash leyendo por bloques"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(BLOQUE), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class LibroControl:
+    """Registro persistente de archivos procesados (checkpoint del monitor)"""
+
+    def __init__(self, ruta, max_intentos=5):
+        self.ruta = ruta
+        self.max_intentos = max_intentos
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self._conexion().executescript("""
+            CREATE TABLE IF NOT EXISTS archivos (
+                ruta TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                tamano INTEGER NOT NULL,
+                sha256 TEXT,
+                estado TEXT NOT NULL,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                actualizado REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_archivos_sha256 ON archivos (sha256);
+        """)
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def pendiente(self, ruta, mtime, tamano):
+        """¿Hay que procesar esta versión del archivo?"""
+        fila = self._conexion().execute(
+            "SELECT mtime, tamano, estado, intentos FROM archivos WHERE ruta = ?", (ruta,)
+        ).fetchone()
+        if fila is None or fila[0] != mtime or fila[1] != tamano:
+            return True
+        return fila[2] == 'error' and fila[3] < self.max_intentos
+
+    def duplicado(self, ruta, sha256):
+        """Mismo contenido ya procesado bajo otro nombre (copias del equipo)"""
+        return self._conexion().execute(
+            "SELECT 1 FROM archivos WHERE sha256 = ? AND ruta <> ? AND estado = 'procesado' LIMIT 1",
+            (sha256, ruta)
+        ).fetchone() is not None
+
+    def registrar(self, ruta, mtime, tamano, sha256, estado, error=None):
+        self._conexion().execute("""
+            INSERT INTO archivos (ruta, mtime, tamano, sha256, estado, intentos, error, actualizado)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (ruta) DO UPDATE SET
+                intentos = CASE WHEN archivos.mtime = excluded.mtime AND archivos.tamano = excluded.tamano
+                                THEN archivos.intentos + excluded.intentos ELSE excluded.intentos END,
+                mtime = excluded.mtime, tamano = excluded.tamano, sha256 = excluded.sha256,
+                estado = excluded.estado, error = excluded.error, actualizado = excluded.actualizado
+        """, (ruta, mtime, tamano, sha256, estado, 1 if estado == 'error' else 0, error, time.time()))
+
+    def conteo(self):
+        return dict(self._conexion().execute(
+            "SELECT estado, COUNT(*) FROM archivos GROUP BY estado"
+        ).fetchall())
+
 
 class FileMonitor(FileSystemEventHandler):
-    
-    def __init__(self, watch_path='/home/equipos/export'):
+
+    def __init__(self, watch_path='/home/equipos/export', app=None, ledger_path=None, workers=4,
+                 estabilidad=1.0, reescaneo=300):
         self.watch_path = watch_path
+        self.app = app
+        self.estabilidad = estabilidad
+        self.reescaneo = reescaneo
         os.makedirs(watch_path, exist_ok=True)
-    
+
+        config = app.config if app is not None else {}
+        self.orthanc_url = config.get('ORTHANC_URL', 'http://127.0.0.1:8042')
+        self.orthanc_auth = (config.get('ORTHANC_USUARIO', 'orthanc'), config.get('ORTHANC_CLAVE', 'orthanc'))
+        self.libro = LibroControl(ledger_path or os.path.join(watch_path, '.monitor_archivos.sqlite3'))
+
+        # ruta -> (tamaño, mtime, instante del último cambio visto)
+        self._vigilados = {}
+        self._en_proceso = set()
+        self._lock = threading.Lock()
+        self._ejecutor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='monitor')
+        # Cola acotada: el hilo de estabilidad espera si el pool está lleno
+        self._cupos = threading.BoundedSemaphore(workers * 4)
+        self._local = threading.local()
+        self._detener = threading.Event()
+
+    # ========== EVENTOS ==========
+
     def on_created(self, event):
-        if event.is_directory:
+        if not event.is_directory:
+            self.anotar(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.anotar(event.src_path)
+
+    def on_moved(self, event):
+        # Los equipos suelen escribir un .tmp y renombrarlo al final
+        if not event.is_directory:
+            self.anotar(event.dest_path)
+
+    def anotar(self, ruta):
+        """Registrar la ruta para procesarla cuando deje de cambiar"""
+        if tipo_archivo(ruta) is None:
             return
-        
-        filepath = event.src_path
-        filename = os.path.basename(filepath)
-        
-        # Esperar a que el archivo termine de escribirse
-        time.sleep(2)
-        
+        with self._lock:
+            if ruta not in self._vigilados:
+                self._vigilados[ruta] = (None, None, time.monotonic())
+
+    # ========== ESTABILIDAD ==========
+
+    def _hilo_estabilidad(self):
+        ultimo_escaneo = time.monotonic()
+        while not self._detener.wait(0.5):
+            self._revisar()
+            if self.reescaneo and time.monotonic() - ultimo_escaneo > self.reescaneo:
+                self.escanear()
+                ultimo_escaneo = time.monotonic()
+
+    def _revisar(self):
+        ahora = time.monotonic()
+        with self._lock:
+            rutas = list(self._vigilados.items())
+
+        for ruta, (tamano, mtime, desde) in rutas:
+            try:
+                st = os.stat(ruta)
+            except FileNotFoundError:
+                with self._lock:
+                    self._vigilados.pop(ruta, None)
+                continue
+
+            if (st.st_size, st.st_mtime) != (tamano, mtime):
+                # Sigue creciendo (o es la primera lectura): reiniciar el plazo
+                with self._lock:
+                    self._vigilados[ruta] = (st.st_size, st.st_mtime, ahora)
+                continue
+            if ahora - desde < self.estabilidad or st.st_size == 0:
+                continue
+
+            with self._lock:
+                if ruta in self._en_proceso:
+                    # Cambió mientras se procesaba: se revisa cuando termine
+                    continue
+                self._vigilados.pop(ruta, None)
+                self._en_proceso.add(ruta)
+            self._cupos.acquire()
+            self._ejecutor.submit(self._procesar, ruta, st.st_mtime, st.st_size)
+
+    def escanear(self):
+        """Anotar los archivos de la carpeta que el libro no tiene como procesados"""
+        encontrados = 0
+        for raiz, _, archivos in os.walk(self.watch_path):
+            for nombre in archivos:
+                ruta = os.path.join(raiz, nombre)
+                if tipo_archivo(ruta) is None:
+                    continue
+                try:
+                    st = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                if self.libro.pendiente(ruta, st.st_mtime, st.st_size):
+                    self.anotar(ruta)
+                    encontrados += 1
+        if encontrados:
+            logger.info(f"Monitor: {encontrados} archivos pendientes en {self.watch_path}")
+        return encontrados
+
+    # ========== PROCESAMIENTO ==========
+
+    def _procesar(self, ruta, mtime, tamano):
+        sha256 = None
         try:
-            if filename.endswith('.hl7'):
-                self.process_hl7(filepath)
-            elif filename.endswith('.dcm'):
-                self.process_dicom(filepath)
+            if not self.libro.pendiente(ruta, mtime, tamano):
+                return
+            sha256 = sha256_archivo(ruta)
+            if self.libro.duplicado(ruta, sha256):
+                self.libro.registrar(ruta, mtime, tamano, sha256, 'duplicado')
+                return
+
+            if tipo_archivo(ruta) == 'hl7':
+                self.process_hl7(ruta)
+            else:
+                self.process_dicom(ruta)
+            self.libro.registrar(ruta, mtime, tamano, sha256, 'procesado')
         except Exception as e:
-            print(f"Error processing {filepath}: {str(e)}")
-    
+            logger.error(f"Monitor: error procesando {ruta}: {e}")
+            self.libro.registrar(ruta, mtime, tamano, sha256, 'error', str(e)[:500])
+        finally:
+            with self._lock:
+                self._en_proceso.discard(ruta)
+            self._cupos.release()
+
     def process_hl7(self, filepath):
-        """Procesar archivo HL7"""
-        data = HL7Service.parse_hl7_file(filepath)
-        print(f"HL7 procesado: {data['patient']['name']}")
-        # Aquí guardarías el resultado en la BD
-    
+        """Encolar cada mensaje del archivo para la ingesta"""
+        from app.services.cola_ingesta import obtener_cola, despertar
+        from app.services.hl7_rapido import dividir_mensajes
+
+        with open(filepath, 'rb') as f:
+            contenido = f.read()
+        try:
+            texto = contenido.decode('utf-8')
+        except UnicodeDecodeError:
+            texto = contenido.decode('latin-1')
+
+        items = []
+        for mensaje in dividir_mensajes(texto):
+            data = HL7Service.parse_hl7_rapido(mensaje)
+            if not data['order_number']:
+                raise ValueError(f"Mensaje {data['message_control_id']} sin número de orden (OBR-2/ORC-2)")
+            items.append(('hl7', {
+                'paciente_id': None,
+                'orden_id': None,
+                'mensaje_hl7': mensaje,
+                'valores': {},
+                'origen': f'archivo:{os.path.basename(filepath)}'
+            }))
+        if not items:
+            raise ValueError('Archivo HL7 sin mensajes')
+
+        obtener_cola(self.app).encolar_lote(items)
+        despertar()
+        logger.info(f"HL7 encolado: {os.path.basename(filepath)} ({len(items)} mensajes)")
+
     def process_dicom(self, filepath):
-    """Procesar archivo DICOM y enviar a Orthanc"""
-    import requests
-    
-    metadata = DICOMService.parse_dicom_file(filepath)
-    print(f"DICOM procesado: {metadata['patient_name']}")
-    
-    # Enviar a Orthanc
-    try:
+        """Enviar el archivo DICOM a Orthanc en streaming"""
+        import requests
+
+        metadata = DICOMService.parse_dicom_file(filepath)
+
+        sesion = getattr(self._local, 'sesion', None)
+        if sesion is None:
+            # Una sesión por hilo: reutiliza la conexión HTTP con Orthanc
+            sesion = self._local.sesion = requests.Session()
+            sesion.auth = self.orthanc_auth
+
         with open(filepath, 'rb') as f:
-            response = requests.post(
-                'http://127.0.0.1:8042/instances',
-                data=f.read(),
-                auth=('orthanc', 'orthanc'),
-                headers={'Content-Type': 'application/dicom'}
+            response = sesion.post(
+                f'{self.orthanc_url}/instances',
+                data=f,
+                headers={'Content-Type': 'application/dicom',
+                         'Content-Length': str(os.path.getsize(filepath))},
+                timeout=(5, 300)
             )
-        if response.status_code == 200:
-            print(f"? DICOM enviado a Orthanc: {metadata['patient_name']}")
-        else:
-            print(f"? Error Orthanc: {response.status_code}")
-    except Exception as e:
-        print(f"? Error enviando a Orthanc: {str(e)}")
-    
-    @staticmethod
-    def start_monitoring(watch_path='/home/equipos/export'):
-        """Iniciar monitor en segundo plano"""
-        event_handler = FileMonitor(watch_path)
+        if response.status_code != 200:
+            raise Exception(f"Orthanc respondió {response.status_code}")
+        logger.info(f"DICOM enviado a Orthanc: {metadata['patient_name']}")
+
+        if self.app is not None:
+            from app import db
+            from app.services.indice_dicom import IndiceDicomService
+            with self.app.app_context():
+                try:
+                    IndiceDicomService.indexar(filepath)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning(f"Monitor: no se pudo indexar {filepath}: {e}")
+                finally:
+                    db.session.remove()
+
+    # ========== CICLO DE VIDA ==========
+
+    def iniciar(self):
+        """Escaneo inicial, hilo de estabilidad y observer (si hay watchdog)"""
+        self.escanear()
+        threading.Thread(target=self._hilo_estabilidad, name='monitor-estabilidad', daemon=True).start()
+        if Observer is None:
+            logger.warning("watchdog no está instalado: el monitor solo usa el escaneo periódico")
+            return None
         observer = Observer()
-        observer.schedule(event_handler, watch_path, recursive=True)
+        observer.schedule(self, self.watch_path, recursive=True)
         observer.start()
-        print(f"Monitoring {watch_path} for new files...")
         return observer
+
+    def detener(self, observer=None):
+        self._detener.set()
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        self._ejecutor.shutdown(wait=True)
+
+    @staticmethod
+    def start_monitoring(watch_path='/home/equipos/export', app=None):
+        """Iniciar monitor en segundo plano"""
+        config = app.config if app is not None else {}
+        event_handler = FileMonitor(
+            watch_path,
+            app=app,
+            ledger_path=config.get('MONITOR_LEDGER_PATH'),
+            workers=config.get('MONITOR_WORKERS', 4),
+            estabilidad=config.get('MONITOR_ESTABILIDAD', 1.0),
+            reescaneo=config.get('MONITOR_REESCANEO', 300)
+        )
+        observer = event_handler.iniciar()
+        logger.info(f"Monitor: vigilando {watch_path}")
+        return event_handler, observer
+
+
+# ========== CLI ==========
+
+@click.group('monitor')
+def monitor_cli():
+    """Monitor de la carpeta de exportación de los equipos"""
+
+
+@monitor_cli.command('servir')
+@click.option('--ruta', default=None, help='Carpeta a vigilar (por defecto EQUIPOS_EXPORT_PATH)')
+def servir_cmd(ruta):
+    """Vigilar la carpeta hasta Ctrl+C"""
+    from flask import current_app
+    from app.services.cola_ingesta import iniciar_workers
+
+    app = current_app._get_current_object()
+    logging.basicConfig(level=logging.INFO)
+    iniciar_workers(app)
+    monitor, observer = FileMonitor.start_monitoring(ruta or app.config['EQUIPOS_EXPORT_PATH'], app)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        monitor.detener(observer)
+        click.echo(f"Monitor detenido: {monitor.libro.conteo()}")
+
+
+@monitor_cli.command('estado')
+@click.option('--ruta', default=None, help='Carpeta vigilada (por defecto EQUIPOS_EXPORT_PATH)')
+def estado_cmd(ruta):
+    """Archivos por estado en el libro de control"""
+    from flask import current_app
+    ruta = ruta or current_app.config['EQUIPOS_EXPORT_PATH']
+    libro = LibroControl(current_app.config.get('MONITOR_LEDGER_PATH')
+                         or os.path.join(ruta, '.monitor_archivos.sqlite3'))
+    for estado, cantidad in sorted(libro.conteo().items()):
+        click.echo(f"{estado:<12} {cantidad}")
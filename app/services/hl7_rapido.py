@@ -0,0 +1,224 @@
+"""
+Parser HL7 v2 rápido para resultados (ORU^R01) de los analizadores
+
+Divide segmentos, campos y componentes con los delimitadores del MSH, sin
+construir el árbol de objetos de hl7apy: para la ingesta solo hacen falta
+MSH, PID, ORC, OBR y OBX. Acepta CR, LF o CRLF como fin de segmento y
+mensajes con varios OBR (cada OBX queda bajo el OBR que lo precede).
+
+    mensaje = parsear_oru(texto)
+    mensaje['paciente']['nombre']
+    for obs in mensaje['observaciones']:
+        obs['codigo'], obs['valor'], obs['codigo_obr']
+"""
+import math
+
+
+class ErrorHL7(ValueError):
+    """Mensaje HL7 mal formado"""
+
+
+_ESCAPES = {'F': 'field', 'S': 'comp', 'T': 'sub', 'R': 'rep', 'E': 'esc'}
+
+
+def segmentos(texto):
+    """Segmentos no vacíos del mensaje, con cualquier fin de línea"""
+    if isinstance(texto, bytes):
+        texto = texto.decode('utf-8', errors='replace')
+    return [s for s in texto.replace('\r\n', '\r').replace('\n', '\r').split('\r') if s.strip()]
+
+
+def dividir_mensajes(texto):
+    """Separar un archivo/lote con varios mensajes (uno por cada MSH)"""
+    mensajes, actual = [], []
+    for segmento in segmentos(texto):
+        if segmento.startswith('MSH') and actual:
+            mensajes.append('\r'.join(actual))
+            actual = []
+        if segmento[:3] in ('FHS', 'BHS', 'BTS', 'FTS'):
+            continue
+        actual.append(segmento)
+    if actual:
+        mensajes.append('\r'.join(actual))
+    return mensajes
+
+
+class Delimitadores:
+
+    __slots__ = ('campo', 'componente', 'repeticion', 'escape', 'subcomponente')
+
+    def __init__(self, msh):
+        if not msh.startswith('MSH') or len(msh) < 8:
+            raise ErrorHL7('El mensaje no empieza con un segmento MSH')
+        self.campo = msh[3]
+        codificacion = msh[4:msh.index(self.campo, 4)] if self.campo in msh[4:] else msh[4:]
+        codificacion = (codificacion + '^~\\&')[:4]
+        self.componente, self.repeticion, self.escape, self.subcomponente = codificacion
+
+    def desescapar(self, valor):
+        """Reemplazar \\F\\, \\S\\, \\T\\, \\R\\ y \\E\\; otras secuencias se quitan"""
+        esc = self.escape
+        if esc not in valor:
+            return valor
+        partes = valor.split(esc)
+        salida = [partes[0]]
+        # Las secuencias quedan en las posiciones impares: texto \X\ texto
+        for i in range(1, len(partes), 2):
+            secuencia = partes[i]
+            if secuencia in _ESCAPES:
+                salida.append({
+                    'field': self.campo, 'comp': self.componente, 'sub': self.subcomponente,
+                    'rep': self.repeticion, 'esc': self.escape
+                }[_ESCAPES[secuencia]])
+            elif secuencia in ('.br', 'X0A', 'X0D'):
+                salida.append('\n')
+            if i + 1 < len(partes):
+                salida.append(partes[i + 1])
+        return ''.join(salida)
+
+
+def _campos(segmento, d):
+    campos = segmento.split(d.campo)
+    if campos[0] == 'MSH':
+        # En el MSH el propio separador es MSH-1: desplazar para que MSH-n == campos[n]
+        campos.insert(1, d.campo)
+    return campos
+
+
+def _campo(campos, n):
+    return campos[n] if n < len(campos) else ''
+
+
+def _componente(valor, d, n=1):
+    """Componente n (1-based) de la primera repetición, sin escapes"""
+    if not valor:
+        return ''
+    if d.repeticion in valor:
+        valor = valor.split(d.repeticion, 1)[0]
+    if d.componente in valor:
+        partes = valor.split(d.componente)
+        valor = partes[n - 1] if n <= len(partes) else ''
+    elif n != 1:
+        return ''
+    if d.subcomponente in valor:
+        valor = valor.split(d.subcomponente, 1)[0]
+    return d.desescapar(valor).strip()
+
+
+# resultado_valores.valor_numerico es NUMERIC(14,4): |x| < 1e10
+MAXIMO_NUMERICO = 1e10
+
+
+def _numero(valor):
+    """Valor numérico de OBX-5; None si no cabe en valor_numerico (el texto queda en valor)"""
+    try:
+        numero = float(valor.replace(',', '.')) if valor else None
+    except ValueError:
+        return None
+    # Con el redondeo a 4 decimales de la columna: 9999999999.99999 ya no cabe
+    if numero is None or not math.isfinite(numero) or abs(round(numero, 4)) >= MAXIMO_NUMERICO:
+        return None
+    return numero
+
+
+def parsear_oru(texto):
+    """Extraer MSH/PID/OBR/OBX de un mensaje de resultados"""
+    lista = segmentos(texto)
+    if not lista:
+        raise ErrorHL7('Mensaje HL7 vacío')
+    d = Delimitadores(lista[0])
+
+    mensaje = {
+        'tipo': '',
+        'control_id': '',
+        'version': '',
+        'fecha': '',
+        'aplicacion': '',
+        'instalacion': '',
+        'paciente': {},
+        'ordenes': [],
+        'observaciones': []
+    }
+    obr = None
+    orc_placer = ''
+
+    for segmento in lista:
+        nombre = segmento[:3]
+        if nombre not in ('MSH', 'PID', 'ORC', 'OBR', 'OBX'):
+            continue
+        campos = _campos(segmento, d)
+
+        if nombre == 'MSH':
+            tipo = _campo(campos, 9)
+            mensaje['tipo'] = '^'.join(p for p in (_componente(tipo, d, 1), _componente(tipo, d, 2)) if p)
+            mensaje['aplicacion'] = _componente(_campo(campos, 3), d)
+            mensaje['instalacion'] = _componente(_campo(campos, 4), d)
+            mensaje['fecha'] = _componente(_campo(campos, 7), d)
+            mensaje['control_id'] = _componente(_campo(campos, 10), d)
+            mensaje['version'] = _componente(_campo(campos, 12), d)
+
+        elif nombre == 'PID':
+            mensaje['paciente'] = {
+                'id': _componente(_campo(campos, 3), d),
+                'apellido': _componente(_campo(campos, 5), d, 1),
+                'nombre': _componente(_campo(campos, 5), d, 2),
+                'fecha_nacimiento': _componente(_campo(campos, 7), d),
+                'sexo': _componente(_campo(campos, 8), d)
+            }
+
+        elif nombre == 'ORC':
+            orc_placer = _componente(_campo(campos, 2), d)
+
+        elif nombre == 'OBR':
+            obr = {
+                'placer': _componente(_campo(campos, 2), d) or orc_placer,
+                'filler': _componente(_campo(campos, 3), d),
+                'codigo': _componente(_campo(campos, 4), d, 1),
+                'nombre': _componente(_campo(campos, 4), d, 2),
+                'fecha': _componente(_campo(campos, 7), d)
+            }
+            mensaje['ordenes'].append(obr)
+
+        else:
+            valor = _campo(campos, 5)
+            tipo_valor = _componente(_campo(campos, 2), d)
+            # Valores codificados (CE/CWE) muestran el texto; el resto va completo
+            numerico = None
+            if tipo_valor in ('CE', 'CWE'):
+                texto = _componente(valor, d, 2) or _componente(valor, d)
+            elif tipo_valor == 'SN':
+                # Numérico estructurado: comparador^número (">^10" -> ">10")
+                texto = ''.join(_componente(valor, d, n) for n in (1, 2, 3, 4))
+                numerico = _numero(_componente(valor, d, 2))
+            else:
+                texto = d.desescapar(valor.split(d.repeticion, 1)[0]).strip()
+            mensaje['observaciones'].append({
+                'secuencia': _componente(_campo(campos, 1), d),
+                'tipo_valor': tipo_valor,
+                'codigo': _componente(_campo(campos, 3), d, 1),
+                'nombre': _componente(_campo(campos, 3), d, 2),
+                'valor': texto,
+                'valor_numerico': numerico if tipo_valor == 'SN' else _numero(texto) if tipo_valor in ('NM', '') else None,
+                'unidades': _componente(_campo(campos, 6), d),
+                'rango_referencia': _componente(_campo(campos, 7), d),
+                'bandera': _componente(_campo(campos, 8), d),
+                'estado': _componente(_campo(campos, 11), d),
+                'fecha': _componente(_campo(campos, 14), d),
+                'codigo_obr': obr['codigo'] if obr else '',
+                'placer': obr['placer'] if obr else orc_placer
+            })
+
+    if not mensaje['tipo']:
+        raise ErrorHL7('MSH-9 (tipo de mensaje) vacío')
+    return mensaje
+
+
+def numero_orden(mensaje):
+    """Número de orden del centro (OBR-2 / ORC-2) si el analizador lo envía"""
+    for orden in mensaje['ordenes']:
+        if orden['placer']:
+            return orden['placer']
+    for obs in mensaje['observaciones']:
+        if obs['placer']:
+            return obs['placer']
+    return None
@@ -1,5 +1,4 @@
-from hl7apy.parser import parse_message
-from hl7apy.core import Message
+from app.services.hl7_rapido import parsear_oru, numero_orden, ErrorHL7
 from datetime import datetime
 import os
 
@@ -8,6 +7,7 @@ class HL7Service:
     @staticmethod
     def parse_hl7_file(filepath):
         """Parsear archivo HL7 y extraer datos del paciente y resultados"""
+        from hl7apy.parser import parse_message
         try:
             with open(filepath, 'r') as f:
                 hl7_content = f.read()
@@ -44,9 +44,43 @@ class HL7Service:
         except Exception as e:
             raise Exception(f"Error parsing HL7: {str(e)}")
     
+    @staticmethod
+    def parse_hl7_rapido(contenido):
+        """Igual que parse_hl7_file pero con el parser rápido (sin árbol de hl7apy)"""
+        try:
+            mensaje = parsear_oru(contenido)
+        except ErrorHL7 as e:
+            raise Exception(f"Error parsing HL7: {str(e)}")
+
+        pid = mensaje['paciente']
+        return {
+            'patient': {
+                'patient_id': pid.get('id') or None,
+                'name': ' '.join(p for p in (pid.get('nombre'), pid.get('apellido')) if p) or None,
+                'dob': pid.get('fecha_nacimiento') or None,
+                'sex': pid.get('sexo') or None
+            },
+            'results': [{
+                'test_id': obs['codigo'] or None,
+                'test_name': obs['nombre'] or None,
+                'value': obs['valor'] or None,
+                'units': obs['unidades'] or None,
+                'reference_range': obs['rango_referencia'] or None,
+                'status': obs['estado'] or None
+            } for obs in mensaje['observaciones']],
+            'order_number': numero_orden(mensaje),
+            'message_type': mensaje['tipo'] or None,
+            'message_control_id': mensaje['control_id'] or None,
+            'sending_application': mensaje['aplicacion'] or None,
+            'sending_facility': mensaje['instalacion'] or None,
+            'version': mensaje['version'] or None,
+            'timestamp': datetime.now().isoformat()
+        }
+
     @staticmethod
     def create_hl7_message(patient_data, order_data):
         """Crear mensaje HL7 para enviar a equipos"""
+        from hl7apy.core import Message
         msg = Message("ORM_O01")
         msg.msh.msh_3 = "CENTRO_DIAGNOSTICO"
         msg.msh.msh_4 = "LAB"
@@ -63,3 +97,20 @@ class HL7Service:
         msg.pid.pid_8 = patient_data.get('sex', '')
         
         return msg.to_er7()
+
+    @staticmethod
+    def create_ack(control_id, codigo='AA', error=None, destino=None, version='2.5', disparador='R01'):
+        """ACK (AA) o NAK (AE/AR) en ER7 para el mensaje con MSH-10 = control_id"""
+        def limpiar(valor):
+            return ''.join(' ' if c in '|^\r\n' else c for c in (valor or ''))
+
+        aplicacion, instalacion = destino or ('', '')
+        ahora = datetime.now().strftime("%Y%m%d%H%M%S")
+        segmentos = [
+            f"MSH|^~\\&|CENTRO_DIAGNOSTICO|LAB|{limpiar(aplicacion)}|{limpiar(instalacion)}|{ahora}||"
+            f"ACK^{disparador}^ACK|ACK{ahora}{limpiar(control_id)[:8]}|P|{version or '2.5'}",
+            f"MSA|{codigo}|{limpiar(control_id)}" + (f"|{limpiar(error)[:80]}" if error else '')
+        ]
+        if error:
+            segmentos.append(f"ERR|||{'207' if codigo == 'AE' else '100'}^{limpiar(error)[:80]}|E")
+        return '\r'.join(segmentos) + '\r'
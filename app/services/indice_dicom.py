@@ -0,0 +1,320 @@
+"""
+Índice de metadatos DICOM (migración f6c2a9d84e17)
+
+Al recibir un archivo se lee solo el encabezado (DICOMService.leer_encabezado:
+stop_before_pixels + specific_tags) y se guardan estudio / serie / instancia
+con sus UIDs en dicom_estudios, dicom_series y dicom_instancias. Las
+consultas por paciente, fecha o modalidad se resuelven con esas tablas, sin
+abrir archivos; los píxeles se leen solo cuando se pide la imagen.
+
+La orden se toma del payload o del AccessionNumber (= ordenes.numero_orden) y
+el paciente de la orden.
+
+    flask dicom indexar                 # indexar DICOM_STORE_PATH completo
+    flask dicom purgar-render           # recortar la caché de vistas (dicom_render.py)
+"""
+from app import db
+from app.services.dicom_service import DICOMService
+from sqlalchemy import text
+from datetime import datetime
+import click
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def _fecha_estudio(fecha, hora):
+    """StudyDate + StudyTime (DA/TM) a datetime; None si no hay fecha válida"""
+    if not fecha:
+        return None
+    try:
+        dia = datetime.strptime(fecha.strip()[:8], '%Y%m%d')
+    except ValueError:
+        return None
+    digitos = ''.join(c for c in (hora or '').split('.')[0] if c.isdigit())[:6].ljust(6, '0')
+    try:
+        return dia.replace(hour=int(digitos[:2]), minute=int(digitos[2:4]), second=int(digitos[4:6]))
+    except ValueError:
+        return dia
+
+
+class IndiceDicomService:
+
+    # ========== INDEXACIÓN ==========
+
+    @staticmethod
+    def indexar(ruta, sha256=None, tamano=None, paciente_id=None, orden_id=None, commit=True):
+        """Leer el encabezado de un archivo y registrar estudio/serie/instancia"""
+        meta = DICOMService.parse_dicom_file(ruta)
+        if not (meta['study_instance_uid'] and meta['series_instance_uid'] and meta['sop_instance_uid']):
+            raise ValueError('DICOM sin Study/Series/SOP Instance UID')
+
+        estudio_id = db.session.execute(text("""
+            WITH orden AS (
+                SELECT id, paciente_id FROM ordenes
+                WHERE id = CAST(:orden_id AS INTEGER)
+                   OR (CAST(:orden_id AS INTEGER) IS NULL AND numero_orden = :accession)
+                LIMIT 1
+            )
+            INSERT INTO dicom_estudios (
+                study_uid, paciente_id, orden_id, patient_id, patient_name, patient_birth_date,
+                patient_sex, accession_number, fecha_estudio, descripcion, institucion, modalidades
+            )
+            SELECT :study_uid,
+                   COALESCE(CAST(:paciente_id AS INTEGER), (SELECT paciente_id FROM orden)),
+                   (SELECT id FROM orden),
+                   :patient_id, :patient_name, :patient_birth_date, :patient_sex, :accession,
+                   :fecha_estudio, :descripcion, :institucion, COALESCE(:modalidad, '')
+            ON CONFLICT (study_uid) DO UPDATE SET
+                paciente_id = COALESCE(dicom_estudios.paciente_id, EXCLUDED.paciente_id),
+                orden_id = COALESCE(dicom_estudios.orden_id, EXCLUDED.orden_id),
+                modalidades = CASE
+                    WHEN EXCLUDED.modalidades = ''
+                      OR EXCLUDED.modalidades = ANY(string_to_array(dicom_estudios.modalidades, '\\'))
+                        THEN dicom_estudios.modalidades
+                    WHEN dicom_estudios.modalidades = '' THEN EXCLUDED.modalidades
+                    ELSE dicom_estudios.modalidades || '\\' || EXCLUDED.modalidades
+                END,
+                updated_at = NOW()
+            RETURNING id
+        """), {
+            'study_uid': meta['study_instance_uid'],
+            'paciente_id': paciente_id,
+            'orden_id': orden_id,
+            'patient_id': meta['patient_id'],
+            'patient_name': (meta['patient_name'] or '')[:200] or None,
+            'patient_birth_date': (meta['patient_dob'] or '')[:8] or None,
+            'patient_sex': meta['patient_sex'],
+            'accession': meta['accession_number'],
+            'fecha_estudio': _fecha_estudio(meta['study_date'], meta['study_time']) or datetime.now(),
+            'descripcion': (meta['study_description'] or '')[:200] or None,
+            'institucion': (meta['institution_name'] or '')[:200] or None,
+            'modalidad': meta['modality']
+        }).scalar()
+
+        serie_id = db.session.execute(text("""
+            INSERT INTO dicom_series (series_uid, estudio_id, modalidad, numero, descripcion, parte_cuerpo)
+            VALUES (:series_uid, :estudio_id, :modalidad, :numero, :descripcion, :parte_cuerpo)
+            ON CONFLICT (series_uid) DO UPDATE SET
+                modalidad = COALESCE(dicom_series.modalidad, EXCLUDED.modalidad)
+            RETURNING id
+        """), {
+            'series_uid': meta['series_instance_uid'],
+            'estudio_id': estudio_id,
+            'modalidad': meta['modality'],
+            'numero': meta['series_number'],
+            'descripcion': (meta['series_description'] or '')[:200] or None,
+            'parte_cuerpo': meta['body_part']
+        }).scalar()
+
+        instancia_id = db.session.execute(text("""
+            INSERT INTO dicom_instancias (
+                sop_uid, serie_id, sop_class_uid, numero, filas, columnas, cuadros,
+                transfer_syntax, ruta, sha256, tamano_bytes
+            )
+            VALUES (:sop_uid, :serie_id, :sop_class_uid, :numero, :filas, :columnas, :cuadros,
+                    :transfer_syntax, :ruta, :sha256, :tamano)
+            ON CONFLICT (sop_uid) DO UPDATE SET
+                ruta = EXCLUDED.ruta,
+                sha256 = COALESCE(EXCLUDED.sha256, dicom_instancias.sha256),
+                tamano_bytes = COALESCE(EXCLUDED.tamano_bytes, dicom_instancias.tamano_bytes)
+            RETURNING id
+        """), {
+            'sop_uid': meta['sop_instance_uid'],
+            'serie_id': serie_id,
+            'sop_class_uid': meta['sop_class_uid'],
+            'numero': meta['instance_number'],
+            'filas': meta['rows'],
+            'columnas': meta['columns'],
+            'cuadros': meta['number_of_frames'],
+            'transfer_syntax': meta['transfer_syntax'],
+            'ruta': os.path.abspath(ruta),
+            'sha256': sha256,
+            'tamano': tamano if tamano is not None else os.path.getsize(ruta)
+        }).scalar()
+
+        if commit:
+            db.session.commit()
+        return {
+            'estudio_id': estudio_id,
+            'serie_id': serie_id,
+            'instancia_id': instancia_id,
+            'study_uid': meta['study_instance_uid'],
+            'sop_uid': meta['sop_instance_uid']
+        }
+
+    @staticmethod
+    def indexar_carpeta(carpeta, lote=200):
+        """Indexar todos los .dcm de una carpeta (archivos ya indexados se actualizan)"""
+        indexados, errores = 0, 0
+        for raiz, directorios, archivos in os.walk(carpeta):
+            directorios[:] = [d for d in directorios if d != 'tmp']
+            for nombre in archivos:
+                if not nombre.lower().endswith('.dcm'):
+                    continue
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    with db.session.begin_nested():
+                        IndiceDicomService.indexar(ruta, commit=False)
+                    indexados += 1
+                except Exception as e:
+                    logger.warning(f"DICOM no indexado {ruta}: {e}")
+                    errores += 1
+                if indexados and indexados % lote == 0:
+                    db.session.commit()
+        db.session.commit()
+        return indexados, errores
+
+    # ========== CONSULTAS ==========
+
+    @staticmethod
+    def buscar_estudios(paciente_id=None, patient_id=None, orden_id=None, modalidad=None,
+                        desde=None, hasta=None, limite=50, cursor=None):
+        """Estudios por paciente / fecha / modalidad, del más reciente al más antiguo"""
+        from app.utils.paginacion import filtro_keyset, orden_keyset, recortar_pagina
+
+        condiciones, params = [], {'limite': limite + 1}
+        if paciente_id:
+            condiciones.append('e.paciente_id = :paciente_id')
+            params['paciente_id'] = paciente_id
+        if patient_id:
+            condiciones.append('e.patient_id = :patient_id')
+            params['patient_id'] = patient_id
+        if orden_id:
+            condiciones.append('e.orden_id = :orden_id')
+            params['orden_id'] = orden_id
+        if desde:
+            condiciones.append('e.fecha_estudio >= :desde')
+            params['desde'] = desde
+        if hasta:
+            condiciones.append('e.fecha_estudio < :hasta')
+            params['hasta'] = hasta
+        if modalidad:
+            condiciones.append('EXISTS (SELECT 1 FROM dicom_series s WHERE s.estudio_id = e.id AND s.modalidad = :modalidad)')
+            params['modalidad'] = modalidad.upper()
+
+        filtro, params_cursor = filtro_keyset('e.fecha_estudio', 'e.id', cursor)
+        condiciones.append(filtro)
+        params.update(params_cursor)
+
+        filas = db.session.execute(text(f"""
+            SELECT e.id, e.study_uid, e.paciente_id, e.orden_id, e.patient_id, e.patient_name,
+                   e.accession_number, e.fecha_estudio, e.descripcion, e.modalidades,
+                   (SELECT COUNT(*) FROM dicom_series s WHERE s.estudio_id = e.id) AS series,
+                   (SELECT COUNT(*) FROM dicom_instancias i
+                    JOIN dicom_series s ON s.id = i.serie_id WHERE s.estudio_id = e.id) AS instancias
+            FROM dicom_estudios e
+            WHERE {' AND '.join(condiciones)}
+            ORDER BY {orden_keyset('e.fecha_estudio', 'e.id')}
+            LIMIT :limite
+        """), params).fetchall()
+
+        filas, siguiente = recortar_pagina(filas, limite, lambda f: (f.fecha_estudio, f.id))
+        return [{
+            'id': f.id,
+            'study_uid': f.study_uid,
+            'paciente_id': f.paciente_id,
+            'orden_id': f.orden_id,
+            'patient_id': f.patient_id,
+            'patient_name': f.patient_name,
+            'accession_number': f.accession_number,
+            'fecha_estudio': f.fecha_estudio.isoformat() if f.fecha_estudio else None,
+            'descripcion': f.descripcion,
+            'modalidades': [m for m in (f.modalidades or '').split('\\') if m],
+            'series': f.series,
+            'instancias': f.instancias
+        } for f in filas], siguiente
+
+    @staticmethod
+    def estudio(study_uid):
+        """Estudio con sus series e instancias (sin abrir archivos)"""
+        estudio = db.session.execute(text("""
+            SELECT id, study_uid, paciente_id, orden_id, patient_id, patient_name, patient_birth_date,
+                   patient_sex, accession_number, fecha_estudio, descripcion, institucion, modalidades
+            FROM dicom_estudios WHERE study_uid = :study_uid
+        """), {'study_uid': study_uid}).mappings().first()
+        if not estudio:
+            return None
+
+        filas = db.session.execute(text("""
+            SELECT s.id AS serie_id, s.series_uid, s.modalidad, s.numero AS serie_numero,
+                   s.descripcion, s.parte_cuerpo,
+                   i.sop_uid, i.numero, i.filas, i.columnas, i.cuadros
+            FROM dicom_series s
+            LEFT JOIN dicom_instancias i ON i.serie_id = s.id
+            WHERE s.estudio_id = :estudio_id
+            ORDER BY s.numero NULLS LAST, s.id, i.numero NULLS LAST, i.id
+        """), {'estudio_id': estudio['id']}).mappings().all()
+
+        series = {}
+        for fila in filas:
+            serie = series.get(fila['serie_id'])
+            if serie is None:
+                serie = series[fila['serie_id']] = {
+                    'series_uid': fila['series_uid'],
+                    'modalidad': fila['modalidad'],
+                    'numero': fila['serie_numero'],
+                    'descripcion': fila['descripcion'],
+                    'parte_cuerpo': fila['parte_cuerpo'],
+                    'instancias': []
+                }
+            if fila['sop_uid']:
+                serie['instancias'].append({
+                    'sop_uid': fila['sop_uid'],
+                    'numero': fila['numero'],
+                    'filas': fila['filas'],
+                    'columnas': fila['columnas'],
+                    'cuadros': fila['cuadros']
+                })
+
+        resultado = dict(estudio)
+        resultado['fecha_estudio'] = estudio['fecha_estudio'].isoformat() if estudio['fecha_estudio'] else None
+        resultado['modalidades'] = [m for m in (estudio['modalidades'] or '').split('\\') if m]
+        resultado['series'] = list(series.values())
+        return resultado
+
+    @staticmethod
+    def instancia(sop_uid):
+        """Datos de una instancia, incluida la ruta del archivo"""
+        fila = db.session.execute(text("""
+            SELECT i.id, i.sop_uid, i.sop_class_uid, i.numero, i.filas, i.columnas, i.cuadros,
+                   i.transfer_syntax, i.ruta, i.sha256, i.tamano_bytes,
+                   s.series_uid, s.modalidad, e.study_uid, e.paciente_id
+            FROM dicom_instancias i
+            JOIN dicom_series s ON s.id = i.serie_id
+            JOIN dicom_estudios e ON e.id = s.estudio_id
+            WHERE i.sop_uid = :sop_uid
+        """), {'sop_uid': sop_uid}).mappings().first()
+        return dict(fila) if fila else None
+
+
+# ========== CLI ==========
+
+@click.group('dicom')
+def dicom_cli():
+    """Índice de metadatos DICOM"""
+
+
+@dicom_cli.command('indexar')
+@click.argument('carpeta', required=False)
+def indexar_cmd(carpeta):
+    """Indexar los .dcm de una carpeta (por defecto el almacén DICOM)"""
+    from flask import current_app
+    from app.services.almacen_archivos import obtener_almacen
+
+    carpeta = carpeta or obtener_almacen(current_app).raiz
+    indexados, errores = IndiceDicomService.indexar_carpeta(carpeta)
+    click.echo(f"{indexados} archivos indexados, {errores} con error")
+
+
+@dicom_cli.command('purgar-render')
+@click.option('--max-mb', type=int, default=None, help='Tamaño máximo de la caché (por defecto DICOM_RENDER_CACHE_MAX)')
+def purgar_render_cmd(max_mb):
+    """Borrar las vistas renderizadas menos usadas"""
+    from flask import current_app
+    from app.services.dicom_render import obtener_cache_render
+
+    max_bytes = max_mb * 1024 * 1024 if max_mb is not None else current_app.config.get('DICOM_RENDER_CACHE_MAX', 5 * 1024 ** 3)
+    borrados = obtener_cache_render(current_app).purgar(max_bytes)
+    click.echo(f"{borrados} vistas borradas")
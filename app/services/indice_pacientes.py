@@ -0,0 +1,331 @@
+"""
+Índice de pacientes en memoria para el typeahead de recepción
+
+Cada worker mantiene arreglos ordenados de (clave, id) con las palabras
+normalizadas de nombre y apellido, los dígitos de cédula/teléfonos y el código
+del paciente. Una búsqueda por prefijo es un bisect sobre esos arreglos, sin
+tocar PostgreSQL.
+
+Frescura:
+- los commits de este worker que tocan Paciente se aplican al instante
+  (eventos after_flush / after_commit de la sesión)
+- un hilo refresca cada INDICE_PACIENTES_REFRESCO segundos las filas con
+  id o updated_at nuevos (cambios de otros workers o SQL crudo; ambas
+  columnas indexadas y un trigger mantiene updated_at en cada UPDATE),
+  releyendo una ventana de solape para no perder commits tardíos
+- cada INDICE_PACIENTES_PURGA segundos se comparan los ids (solo el índice
+  de la clave primaria) para quitar los pacientes borrados fuera del worker
+
+Las búsquedas leen con el mismo lock con que se escribe.
+
+Con preload_app=True el índice no se construye en el master: gunicorn llama a
+precargar() en post_fork y, si no, se construye al primer uso.
+"""
+from bisect import bisect_left, insort
+from app import db
+from app.services.busqueda_service import normalizar
+from sqlalchemy import event, text
+from datetime import datetime, timedelta
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDIENTES = 2000
+# updated_at se fija al inicio de la transacción y los ids no se confirman en
+# orden: cada refresco vuelve a leer esta ventana (reaplicar una fila no cambia nada)
+SOLAPE_TIEMPO = timedelta(minutes=5)
+SOLAPE_IDS = 1000
+COLUMNAS = 'id, nombre, apellido, cedula, telefono, celular, codigo_paciente, estado, updated_at'
+
+
+def _digitos(texto):
+    return ''.join(c for c in (texto or '') if c.isdigit())
+
+
+def claves_paciente(datos):
+    """Claves por las que se encuentra un paciente"""
+    claves = set(normalizar(f"{datos['nombre'] or ''} {datos['apellido'] or ''}").split())
+    for campo in ('cedula', 'telefono', 'celular'):
+        digitos = _digitos(datos[campo])
+        if digitos:
+            claves.add(digitos)
+    if datos['codigo']:
+        claves.add(normalizar(datos['codigo']))
+    return frozenset(claves)
+
+
+def tokens_consulta(termino):
+    """Tokens de búsqueda; cédulas y teléfonos con guiones cuentan como uno solo"""
+    termino = normalizar(termino).strip()
+    if termino and all(c.isdigit() or c in '-() ' for c in termino):
+        digitos = _digitos(termino)
+        return [digitos] if digitos else []
+    return [t for t in termino.replace(',', ' ').split() if t]
+
+
+class IndicePacientes:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reiniciar()
+        self.app = None
+
+    def _reiniciar(self):
+        self._pid = os.getpid()
+        self._claves = []        # [(clave, id)] ordenado, reconstruido al compactar
+        self._pendientes = []    # inserciones desde la última compactación
+        self._por_id = {}        # id -> (datos, claves vigentes)
+        self._obsoletas = 0
+        self._max_id = 0
+        self._ultima_modificacion = None
+        self.listo = False
+        self._cargando = False
+
+    # ========== CICLO DE VIDA ==========
+
+    def iniciar(self, app):
+        """Registrar la app y los eventos de sesión (una vez, en create_app)"""
+        self.app = app
+        self.intervalo = app.config.get('INDICE_PACIENTES_REFRESCO', 30)
+        self.intervalo_purga = app.config.get('INDICE_PACIENTES_PURGA', 300)
+        if not getattr(self, '_eventos', False):
+            event.listen(db.session, 'after_flush', _despues_flush)
+            event.listen(db.session, 'after_commit', _despues_commit)
+            event.listen(db.session, 'after_rollback', _despues_rollback)
+            self._eventos = True
+
+    def precargar(self, app=None):
+        """Construir el índice en segundo plano y arrancar el refresco periódico"""
+        if app is not None:
+            self.app = app
+        if os.getpid() != self._pid:
+            # Proceso hijo tras el fork: el estado heredado del master no sirve
+            self._lock = threading.Lock()
+            self._reiniciar()
+        with self._lock:
+            if self.listo or self._cargando or self.app is None:
+                return
+            self._cargando = True
+        threading.Thread(target=self._hilo, name='indice-pacientes', daemon=True).start()
+
+    def _hilo(self):
+        with self.app.app_context():
+            try:
+                self.cargar()
+            except Exception as e:
+                logger.error(f"Índice de pacientes: error en la carga inicial: {e}")
+                self._cargando = False
+                return
+            finally:
+                db.session.remove()
+
+        ultima_purga = time.monotonic()
+        while True:
+            time.sleep(self.intervalo)
+            with self.app.app_context():
+                try:
+                    self.refrescar()
+                    if time.monotonic() - ultima_purga >= self.intervalo_purga:
+                        self.purgar()
+                        ultima_purga = time.monotonic()
+                except Exception as e:
+                    logger.warning(f"Índice de pacientes: error al refrescar: {e}")
+                finally:
+                    db.session.remove()
+
+    # ========== CARGA ==========
+
+    def cargar(self):
+        """Leer todos los pacientes (cursor del servidor) y construir los arreglos"""
+        inicio = time.perf_counter()
+        por_id = {}
+        max_id, ultima = 0, None
+
+        with db.engine.connect() as conn:
+            filas = conn.execution_options(yield_per=5000).execute(text(f"SELECT {COLUMNAS} FROM pacientes"))
+            for fila in filas:
+                datos = self._datos(fila)
+                por_id[fila[0]] = (datos, claves_paciente(datos))
+                max_id = max(max_id, fila[0])
+                if fila[8] and (ultima is None or fila[8] > ultima):
+                    ultima = fila[8]
+
+        claves = sorted((clave, id_) for id_, (_, cs) in por_id.items() for clave in cs)
+        with self._lock:
+            self._por_id = por_id
+            self._claves = claves
+            self._pendientes = []
+            self._obsoletas = 0
+            self._max_id = max_id
+            self._ultima_modificacion = ultima
+            self.listo = True
+            self._cargando = False
+
+        logger.info(f"Índice de pacientes: {len(por_id)} pacientes, {len(claves)} claves "
+                    f"en {time.perf_counter() - inicio:.1f}s")
+
+    def refrescar(self):
+        """Aplicar pacientes nuevos o modificados desde la última lectura"""
+        if not self.listo:
+            return 0
+        filas = db.session.execute(text(f"""
+            SELECT {COLUMNAS} FROM pacientes
+            WHERE id > :max_id OR updated_at >= :desde
+        """), {
+            'max_id': self._max_id - SOLAPE_IDS,
+            'desde': self._ultima_modificacion - SOLAPE_TIEMPO if self._ultima_modificacion else datetime.min
+        }).fetchall()
+
+        aplicadas = 0
+        for fila in filas:
+            datos = self._datos(fila)
+            actual = self._por_id.get(fila[0])
+            if actual is None or actual[0] != datos:
+                self.aplicar(fila[0], datos)
+                aplicadas += 1
+            if fila[8] and (self._ultima_modificacion is None or fila[8] > self._ultima_modificacion):
+                self._ultima_modificacion = fila[8]
+        return aplicadas
+
+    def purgar(self):
+        """Quitar los pacientes que ya no existen (borrados por SQL u otro worker)"""
+        if not self.listo:
+            return 0
+        # Solo los ids conocidos antes de la consulta: un alta posterior no está en su resultado
+        with self._lock:
+            conocidos = set(self._por_id)
+        existentes = set(db.session.execute(text("SELECT id FROM pacientes")).scalars())
+        borrados = conocidos - existentes
+        for id_ in borrados:
+            self.aplicar(id_, None)
+        if borrados:
+            logger.info(f"Índice de pacientes: {len(borrados)} pacientes borrados quitados")
+        return len(borrados)
+
+    @staticmethod
+    def _datos(fila):
+        return {
+            'id': fila[0],
+            'nombre': fila[1],
+            'apellido': fila[2],
+            'cedula': fila[3],
+            'telefono': fila[4],
+            'celular': fila[5],
+            'codigo': fila[6],
+            'estado': fila[7]
+        }
+
+    # ========== ACTUALIZACIÓN ==========
+
+    def aplicar(self, id_, datos):
+        """Insertar/actualizar un paciente; datos=None lo elimina"""
+        with self._lock:
+            anterior = self._por_id.get(id_)
+            claves_anteriores = anterior[1] if anterior else frozenset()
+
+            if datos is None:
+                self._por_id.pop(id_, None)
+                self._obsoletas += len(claves_anteriores)
+            else:
+                claves = claves_paciente(datos)
+                self._por_id[id_] = (datos, claves)
+                # Las entradas de claves que ya no aplican se filtran al leer
+                self._obsoletas += len(claves_anteriores - claves)
+                for clave in claves - claves_anteriores:
+                    insort(self._pendientes, (clave, id_))
+                self._max_id = max(self._max_id, id_)
+
+            if len(self._pendientes) > MAX_PENDIENTES or self._obsoletas > len(self._claves) // 10 + MAX_PENDIENTES:
+                self._compactar()
+
+    def _compactar(self):
+        self._claves = sorted((clave, id_) for id_, (_, cs) in self._por_id.items() for clave in cs)
+        self._pendientes = []
+        self._obsoletas = 0
+
+    # ========== BÚSQUEDA ==========
+
+    def buscar(self, termino, limite=10):
+        """Pacientes cuyas claves empiezan por cada token del término"""
+        tokens = tokens_consulta(termino)
+        if not tokens:
+            return []
+        with self._lock:
+            return self._buscar(tokens, limite)
+
+    def _buscar(self, tokens, limite):
+        # Recorrer el rango del token más selectivo (dos bisect por token)
+        principal = min(tokens, key=lambda t: (
+            bisect_left(self._claves, (t + '\uffff',)) - bisect_left(self._claves, (t,))
+        ))
+        maximo_candidatos = limite * 3
+
+        candidatos = {}
+        for arreglo in (self._claves, self._pendientes):
+            i = bisect_left(arreglo, (principal,))
+            while i < len(arreglo) and len(candidatos) < maximo_candidatos:
+                clave, id_ = arreglo[i]
+                i += 1
+                if not clave.startswith(principal):
+                    break
+                registro = self._por_id.get(id_)
+                if registro is None or clave not in registro[1] or id_ in candidatos:
+                    continue
+                if all(any(c.startswith(t) for c in registro[1]) for t in tokens):
+                    # Coincidencia exacta de la clave principal primero
+                    candidatos[id_] = (clave != principal, registro[0]['nombre'] or '', id_)
+
+        orden = sorted(candidatos.values())[:limite]
+        return [self._por_id[id_][0] for _, _, id_ in orden]
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'listo': self.listo,
+                'pacientes': len(self._por_id),
+                'claves': len(self._claves) + len(self._pendientes),
+                'pendientes': len(self._pendientes),
+                'obsoletas': self._obsoletas
+            }
+
+
+indice_pacientes = IndicePacientes()
+
+
+# ========== EVENTOS DE SESIÓN ==========
+
+def _despues_flush(session, flush_context):
+    """Anotar los pacientes tocados; se aplican solo si la transacción confirma"""
+    from app.models import Paciente
+
+    cambios = session.info.setdefault('indice_pacientes', {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Paciente) and obj.id is not None:
+            cambios[obj.id] = {
+                'id': obj.id,
+                'nombre': obj.nombre,
+                'apellido': obj.apellido,
+                'cedula': obj.cedula,
+                'telefono': obj.telefono,
+                'celular': obj.celular,
+                'codigo': obj.codigo_paciente,
+                'estado': obj.estado
+            }
+    for obj in session.deleted:
+        if isinstance(obj, Paciente):
+            cambios[obj.id] = None
+
+
+def _despues_commit(session):
+    cambios = session.info.pop('indice_pacientes', None)
+    if not cambios or not indice_pacientes.listo or os.getpid() != indice_pacientes._pid:
+        return
+    for id_, datos in cambios.items():
+        indice_pacientes.aplicar(id_, datos)
+
+
+def _despues_rollback(session):
+    session.info.pop('indice_pacientes', None)
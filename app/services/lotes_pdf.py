@@ -0,0 +1,249 @@
+"""
+Lotes de facturas en PDF (cierre del día, envíos a ARS)
+
+    POST /api/facturas/lotes {"desde": "2026-10-01", "hasta": "2026-10-31",
+                              "seguro": "SENASA", "estado": "pendiente,parcial",
+                              "formato": "zip" | "pdf"}
+        -> 202 {"lote_id": ..., "estado_url": ...}
+    GET  /api/facturas/lotes/<lote_id>            -> progreso
+    GET  /api/facturas/lotes/<lote_id>/descarga   -> ZIP o PDF combinado
+
+El lote corre en un hilo del worker que lo recibió: carga todas las facturas
+de una vez (detalles con selectinload, paciente en el mismo JOIN del filtro),
+reparte el render en el pool de DocumentosPDF (las ya cacheadas no se
+vuelven a generar) y escribe el resultado en PDF_LOTES_PATH/<lote_id>/. El
+estado se guarda en estado.json junto al resultado, así que cualquier worker
+puede responder el progreso y servir la descarga.
+
+El PDF combinado une los PDF individuales con pypdf si está instalado; sin
+pypdf se genera un único documento con todas las facturas en un proceso del
+pool.
+"""
+from app import db
+from app.services.documentos_pdf import nombre_factura, versiones_facturas
+from app.services.pdf_service import datos_factura, renderizar_facturas
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload, contains_eager
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = {
+    'zip': ('resultado.zip', 'application/zip'),
+    'pdf': ('resultado.pdf', 'application/pdf')
+}
+
+_ID_VALIDO = re.compile(r'^[0-9a-f]{32}$')
+
+
+def consulta_facturas(filtros, cargar=True):
+    """Facturas del filtro; con cargar, detalles y paciente ya cargados"""
+    from app.models import Factura, Paciente
+
+    query = Factura.query.outerjoin(Paciente, Factura.paciente_id == Paciente.id)
+    if cargar:
+        query = query.options(contains_eager(Factura.paciente), selectinload(Factura.detalles))
+    if filtros.get('desde'):
+        query = query.filter(Factura.fecha_factura >= filtros['desde'])
+    if filtros.get('hasta'):
+        query = query.filter(Factura.fecha_factura < filtros['hasta'] + timedelta(days=1))
+    if filtros.get('estados'):
+        query = query.filter(Factura.estado.in_(filtros['estados']))
+    if filtros.get('seguro'):
+        query = query.filter(func.lower(Paciente.seguro_medico) == filtros['seguro'].lower())
+    return query.order_by(Factura.fecha_factura, Factura.id)
+
+
+def parsear_filtros(datos):
+    """Filtros del cuerpo JSON -> dict validado (ValueError si algo no sirve)"""
+    filtros = {}
+    for campo in ('desde', 'hasta'):
+        if datos.get(campo):
+            try:
+                filtros[campo] = datetime.strptime(datos[campo], '%Y-%m-%d')
+            except (TypeError, ValueError):
+                raise ValueError(f'{campo} debe tener formato YYYY-MM-DD')
+    estados = datos.get('estado')
+    if estados:
+        filtros['estados'] = [e.strip() for e in (estados.split(',') if isinstance(estados, str) else estados) if e.strip()]
+    if datos.get('seguro'):
+        filtros['seguro'] = str(datos['seguro']).strip()
+    if not filtros.get('desde') and not filtros.get('hasta'):
+        raise ValueError('Indique al menos desde o hasta')
+    return filtros
+
+
+class LotesPDF:
+
+    def __init__(self, documentos, raiz, max_facturas=2000, hilos=1, expira_horas=24):
+        self.documentos = documentos
+        self.raiz = os.path.abspath(raiz)
+        os.makedirs(self.raiz, exist_ok=True)
+        self.max_facturas = max_facturas
+        self.expira_horas = expira_horas
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='lotes-pdf')
+
+    # ========== ESTADO ==========
+
+    def carpeta(self, lote_id):
+        if not _ID_VALIDO.match(lote_id or ''):
+            raise ValueError('Id de lote inválido')
+        return os.path.join(self.raiz, lote_id)
+
+    def _guardar_estado(self, lote_id, **cambios):
+        ruta = os.path.join(self.carpeta(lote_id), 'estado.json')
+        try:
+            with open(ruta) as f:
+                estado = json.load(f)
+        except FileNotFoundError:
+            estado = {'lote_id': lote_id}
+        estado.update(cambios, actualizado=time.time())
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(estado, f)
+        os.replace(temporal, ruta)
+        return estado
+
+    def estado(self, lote_id):
+        """Progreso del lote; None si no existe"""
+        try:
+            with open(os.path.join(self.carpeta(lote_id), 'estado.json')) as f:
+                estado = json.load(f)
+        except FileNotFoundError:
+            return None
+        # El worker que lo corría se reinició: el hilo ya no existe
+        if estado['estado'] in ('pendiente', 'procesando') and time.time() - estado['actualizado'] > 600:
+            estado.update(estado='error', error='El lote se interrumpió; vuelva a solicitarlo')
+        return estado
+
+    def resultado(self, lote_id):
+        """(ruta, mimetype, nombre de descarga) de un lote listo"""
+        estado = self.estado(lote_id)
+        if not estado or estado['estado'] != 'listo':
+            return None
+        archivo, mimetype = FORMATOS[estado['formato']]
+        extension = archivo.rsplit('.', 1)[1]
+        return os.path.join(self.carpeta(lote_id), archivo), mimetype, f'facturas_{lote_id[:8]}.{extension}'
+
+    # ========== EJECUCIÓN ==========
+
+    def crear(self, app, filtros, formato='zip'):
+        """Validar, registrar el lote y lanzarlo en segundo plano; devuelve el estado inicial"""
+        if formato not in FORMATOS:
+            raise ValueError(f'Formato inválido: {formato}')
+        total = consulta_facturas(filtros, cargar=False).order_by(None).count()
+        if not total:
+            raise ValueError('Ninguna factura coincide con el filtro')
+        if total > self.max_facturas:
+            raise ValueError(f'El filtro incluye {total} facturas; máximo {self.max_facturas} por lote')
+
+        self.purgar()
+        lote_id = uuid.uuid4().hex
+        os.makedirs(self.carpeta(lote_id))
+        estado = self._guardar_estado(lote_id, estado='pendiente', formato=formato, total=total, hechas=0,
+                                      creado=datetime.now().isoformat())
+        self._ejecutor.submit(self._ejecutar, app, lote_id, filtros, formato)
+        return estado
+
+    def _ejecutar(self, app, lote_id, filtros, formato):
+        with app.app_context():
+            try:
+                self._guardar_estado(lote_id, estado='procesando')
+                facturas = consulta_facturas(filtros).limit(self.max_facturas).all()
+                versiones = versiones_facturas(f.id for f in facturas)
+                items = [(f.id, versiones.get(f.id, 1), datos_factura(f)) for f in facturas]
+                nombres = [nombre_factura(f.numero_factura) for f in facturas]
+                db.session.remove()
+
+                ultimo = [0.0]
+
+                def al_avanzar(hechas):
+                    # Como mucho dos escrituras por segundo
+                    if time.time() - ultimo[0] >= 0.5 or hechas == len(items):
+                        ultimo[0] = time.time()
+                        self._guardar_estado(lote_id, hechas=hechas, total=len(items))
+
+                archivo, _ = FORMATOS[formato]
+                destino = os.path.join(self.carpeta(lote_id), archivo)
+                if formato == 'zip':
+                    pdfs = self.documentos.facturas(items, al_avanzar)
+                    self._escribir_zip(destino, nombres, pdfs)
+                else:
+                    self._escribir_combinado(destino, items, al_avanzar)
+
+                self._guardar_estado(lote_id, estado='listo', hechas=len(items), total=len(items),
+                                     tamano=os.path.getsize(destino),
+                                     terminado=datetime.now().isoformat())
+            except Exception as e:
+                logger.error(f"Lote PDF {lote_id}: {e}")
+                self._guardar_estado(lote_id, estado='error', error=str(e))
+
+    def _escribir_zip(self, destino, nombres, pdfs):
+        temporal = destino + '.tmp'
+        # Los PDF ya vienen comprimidos: ZIP_STORED no gasta CPU en nada
+        with zipfile.ZipFile(temporal, 'w', zipfile.ZIP_STORED) as zip_:
+            for nombre, pdf in zip(nombres, pdfs):
+                zip_.writestr(nombre, pdf)
+        os.replace(temporal, destino)
+
+    def _escribir_combinado(self, destino, items, al_avanzar):
+        try:
+            from pypdf import PdfWriter
+        except ImportError:
+            PdfWriter = None
+
+        temporal = destino + '.tmp'
+        if PdfWriter is None:
+            pdf = self.documentos.renderizar(renderizar_facturas, [datos for _, _, datos in items])
+            al_avanzar(len(items))
+            with open(temporal, 'wb') as f:
+                f.write(pdf)
+        else:
+            from io import BytesIO
+            escritor = PdfWriter()
+            for pdf in self.documentos.facturas(items, al_avanzar):
+                escritor.append(BytesIO(pdf))
+            with open(temporal, 'wb') as f:
+                escritor.write(f)
+        os.replace(temporal, destino)
+
+    def purgar(self):
+        """Borrar lotes más viejos que expira_horas"""
+        limite = time.time() - self.expira_horas * 3600
+        for nombre in os.listdir(self.raiz):
+            carpeta = os.path.join(self.raiz, nombre)
+            try:
+                if os.path.getmtime(carpeta) < limite:
+                    shutil.rmtree(carpeta, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+
+_lotes = {}
+_lock_lotes = threading.Lock()
+
+
+def obtener_lotes(app):
+    """LotesPDF de este proceso (PDF_LOTES_PATH, por defecto UPLOAD_FOLDER/pdf_lotes)"""
+    from app.services.documentos_pdf import obtener_documentos
+
+    raiz = app.config.get('PDF_LOTES_PATH') or os.path.join(app.config['UPLOAD_FOLDER'], 'pdf_lotes')
+    with _lock_lotes:
+        if raiz not in _lotes:
+            _lotes[raiz] = LotesPDF(
+                obtener_documentos(app), raiz,
+                max_facturas=app.config.get('PDF_LOTE_MAXIMO', 2000),
+                hilos=app.config.get('PDF_LOTES_HILOS', 1)
+            )
+        return _lotes[raiz]
@@ -2,96 +2,56 @@
 Servicio de integración con máquinas de laboratorio
 Recibe resultados vía HL7, DICOM o API REST desde las máquinas
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-import psycopg2
-import os
+from app.services.cola_ingesta import encolar, respuesta_recibo, obtener_cola, insertar_aislando
+from app.services.hl7_rapido import parsear_oru, numero_orden, ErrorHL7
+from app.services.almacen_archivos import obtener_almacen, ArchivoDemasiadoGrande
+from app.utils.conexiones import conexion
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+from werkzeug.wsgi import get_input_stream
 import json
 from datetime import datetime
-import hashlib
 
 maquinas_bp = Blueprint('maquinas', __name__)
 
-def get_db_connection():
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
-
 @maquinas_bp.route('/recibir-hl7', methods=['POST'])
 def recibir_resultado_hl7():
     """
     Endpoint para que las máquinas de laboratorio envíen resultados en formato HL7
     La máquina hace POST a: http://192.9.135.84:5000/api/maquinas/recibir-hl7
+
+    Responde 202 con un recibo; el resultado se inserta en segundo plano
+    (ver app/services/cola_ingesta.py y GET /api/maquinas/recibos/<id>)
     """
     try:
-        data = request.json
+        data = request.get_json(silent=True) or {}
         
         # Validar datos requeridos
         if not data.get('mensaje_hl7'):
             return jsonify({'error': 'mensaje_hl7 es requerido'}), 400
         
-        # Parsear mensaje HL7
-        mensaje_hl7 = data['mensaje_hl7']
-        
-        # Extraer información del mensaje HL7
-        # Formato típico: MSH|^~\&|LAB|HOSPITAL|...
-        lineas = mensaje_hl7.split('\n')
-        
+        # Validar la sintaxis aquí: un mensaje mal formado nunca va a procesarse
+        try:
+            mensaje = parsear_oru(data['mensaje_hl7'])
+        except ErrorHL7 as e:
+            return jsonify({'error': f'HL7 inválido: {e}'}), 400
+
         paciente_id = data.get('paciente_id')
         orden_id = data.get('orden_id')
-        
-        if not paciente_id or not orden_id:
-            return jsonify({'error': 'paciente_id y orden_id son requeridos'}), 400
-        
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Buscar orden_detalle_id
-        cur.execute("""
-            SELECT id FROM orden_detalles 
-            WHERE orden_id = %s 
-            ORDER BY id DESC LIMIT 1
-        """, (orden_id,))
-        
-        row = cur.fetchone()
-        if not row:
-            return jsonify({'error': 'Orden no encontrada'}), 404
-        
-        orden_detalle_id = row[0]
-        
-        # Crear resultado
-        valores_json = data.get('valores', {})
-        
-        cur.execute("""
-            INSERT INTO resultados (
-                orden_detalle_id,
-                tipo_archivo,
-                nombre_archivo,
-                datos_hl7,
-                datos_dicom,
-                estado_validacion,
-                fecha_importacion,
-                created_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
-            RETURNING id
-        """, (
-            orden_detalle_id,
-            'hl7',
-            f'resultado_hl7_{datetime.now().strftime("%Y%m%d_%H%M%S")}.hl7',
-            mensaje_hl7,
-            json.dumps(valores_json),
-            'pendiente'
-        ))
-        
-        resultado_id = cur.fetchone()[0]
-        conn.commit()
-        
-        cur.close()
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'resultado_id': resultado_id,
-            'message': 'Resultado recibido y almacenado correctamente'
-        }), 201
+
+        # Sin orden_id la orden se busca por el número de OBR-2/ORC-2
+        if not orden_id and not numero_orden(mensaje):
+            return jsonify({'error': 'orden_id es requerido si el mensaje no trae OBR-2/ORC-2'}), 400
+
+        recibo_id = encolar('hl7', {
+            'paciente_id': paciente_id,
+            'orden_id': orden_id,
+            'mensaje_hl7': data['mensaje_hl7'],
+            'valores': data.get('valores', {})
+        })
+        return jsonify(respuesta_recibo(recibo_id)), 202
         
     except Exception as e:
         print(f"Error: {e}")
@@ -102,86 +62,74 @@ def recibir_resultado_dicom():
     """
     Endpoint para recibir imágenes DICOM de equipos de radiología/imagenología
     La máquina hace POST a: http://192.9.135.84:5000/api/maquinas/recibir-dicom
+
+    Dos formas de envío:
+    - multipart/form-data con el campo 'archivo' y paciente_id/orden_id
+    - cuerpo binario (Content-Type: application/dicom) con ?paciente_id=&orden_id=
+
+    El cuerpo se escribe por bloques en el almacén por contenido
+    (almacen_archivos.py) mientras se calcula el SHA-256, sin cargarlo en
+    memoria; el registro en resultados se encola y responde 202 con un recibo
     """
+    almacen = obtener_almacen(current_app)
+    limite = current_app.config.get('DICOM_MAX_TAMANO')
+    temporales = []
+
     try:
-        # Archivo DICOM en formato multipart/form-data
-        if 'archivo' not in request.files:
-            return jsonify({'error': 'No se envió archivo'}), 400
-        
-        archivo = request.files['archivo']
-        paciente_id = request.form.get('paciente_id')
-        orden_id = request.form.get('orden_id')
-        
-        if not paciente_id or not orden_id:
-            return jsonify({'error': 'paciente_id y orden_id son requeridos'}), 400
-        
-        # Guardar archivo
-        upload_dir = '/home/opc/centro-diagnostico/uploads/dicom'
-        os.makedirs(upload_dir, exist_ok=True)
-        
+        if request.mimetype == 'multipart/form-data':
+            def fabrica(total_content_length, content_type, filename, content_length=None):
+                # El parser multipart escribe cada archivo directo al almacén
+                temporal = almacen.temporal()
+                temporales.append(temporal)
+                return temporal
+
+            _, form, files = parse_form_data(request.environ, stream_factory=fabrica,
+                                             max_content_length=limite)
+            paciente_id = form.get('paciente_id') or request.args.get('paciente_id')
+            orden_id = form.get('orden_id') or request.args.get('orden_id')
+
+            if 'archivo' not in files:
+                return jsonify({'error': 'No se envió archivo'}), 400
+            if not paciente_id or not orden_id:
+                return jsonify({'error': 'paciente_id y orden_id son requeridos'}), 400
+
+            archivo = files['archivo'].stream
+            temporales.remove(archivo)
+            info = almacen.confirmar(archivo)
+        else:
+            paciente_id = request.args.get('paciente_id')
+            orden_id = request.args.get('orden_id')
+            if not paciente_id or not orden_id:
+                return jsonify({'error': 'paciente_id y orden_id son requeridos'}), 400
+
+            info = almacen.guardar_stream(
+                get_input_stream(request.environ, max_content_length=limite), limite=limite
+            )
+
         filename = f'dicom_{orden_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.dcm'
-        filepath = os.path.join(upload_dir, filename)
-        archivo.save(filepath)
-        
-        # Calcular hash
-        with open(filepath, 'rb') as f:
-            file_hash = hashlib.md5(f.read()).hexdigest()
-        
-        # Guardar en BD
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT id FROM orden_detalles 
-            WHERE orden_id = %s 
-            ORDER BY id DESC LIMIT 1
-        """, (orden_id,))
-        
-        row = cur.fetchone()
-        if not row:
-            return jsonify({'error': 'Orden no encontrada'}), 404
-        
-        orden_detalle_id = row[0]
-        
-        cur.execute("""
-            INSERT INTO resultados (
-                orden_detalle_id,
-                tipo_archivo,
-                nombre_archivo,
-                ruta_archivo,
-                tamano_bytes,
-                hash_archivo,
-                estado_validacion,
-                fecha_importacion,
-                created_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
-            RETURNING id
-        """, (
-            orden_detalle_id,
-            'dicom',
-            filename,
-            filepath,
-            os.path.getsize(filepath),
-            file_hash,
-            'pendiente'
-        ))
-        
-        resultado_id = cur.fetchone()[0]
-        conn.commit()
-        
-        cur.close()
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'resultado_id': resultado_id,
+        recibo_id = encolar('dicom', {
+            'paciente_id': paciente_id,
+            'orden_id': orden_id,
             'filename': filename,
-            'message': 'Imagen DICOM recibida correctamente'
-        }), 201
-        
+            'ruta': info['ruta'],
+            'tamano': info['tamano'],
+            'hash': info['sha256']
+        })
+        respuesta = respuesta_recibo(recibo_id)
+        respuesta.update(filename=filename, sha256=info['sha256'], tamano=info['tamano'],
+                         duplicado=info['duplicado'])
+        return jsonify(respuesta), 202
+
+    except (RequestEntityTooLarge, ArchivoDemasiadoGrande):
+        return jsonify({'error': f'El archivo supera el máximo de {limite} bytes'}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        for temporal in temporales:
+            temporal.descartar()
 
 @maquinas_bp.route('/recibir-json', methods=['POST'])
 def recibir_resultado_json():
@@ -199,9 +147,11 @@ def recibir_resultado_json():
             "leucocitos": {"valor": 7500, "unidad": "cel/µL", "referencia": "4000-11000"}
         }
     }
+
+    Responde 202 con un recibo; el resultado se inserta en segundo plano
     """
     try:
-        data = request.json
+        data = request.get_json(silent=True) or {}
         
         paciente_id = data.get('paciente_id')
         orden_id = data.get('orden_id')
@@ -209,59 +159,109 @@ def recibir_resultado_json():
         
         if not paciente_id or not orden_id:
             return jsonify({'error': 'paciente_id y orden_id son requeridos'}), 400
+        if not isinstance(valores, dict):
+            return jsonify({'error': 'valores debe ser un objeto'}), 400
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Buscar orden_detalle
-        cur.execute("""
-            SELECT id FROM orden_detalles 
-            WHERE orden_id = %s 
-            ORDER BY id DESC LIMIT 1
-        """, (orden_id,))
-        
-        row = cur.fetchone()
-        if not row:
-            return jsonify({'error': 'Orden no encontrada'}), 404
-        
-        orden_detalle_id = row[0]
-        
-        # Insertar resultado
-        cur.execute("""
-            INSERT INTO resultados (
-                orden_detalle_id,
-                tipo_archivo,
-                nombre_archivo,
-                datos_dicom,
-                estado_validacion,
-                fecha_importacion,
-                created_at
-            ) VALUES (%s, %s, %s, %s, %s, NOW(), NOW())
-            RETURNING id
-        """, (
-            orden_detalle_id,
-            'json',
-            f'resultado_{data.get("tipo_estudio", "analisis")}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json',
-            json.dumps(valores),
-            'pendiente'
-        ))
-        
-        resultado_id = cur.fetchone()[0]
-        conn.commit()
-        
-        cur.close()
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'resultado_id': resultado_id,
-            'message': 'Resultado recibido correctamente'
-        }), 201
+        recibo_id = encolar('json', {
+            'paciente_id': paciente_id,
+            'orden_id': orden_id,
+            'tipo_estudio': data.get('tipo_estudio', 'analisis'),
+            'valores': valores
+        })
+        return jsonify(respuesta_recibo(recibo_id)), 202
         
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _leer_lote():
+    """Items del request: arreglo JSON, {"resultados": [...]} o NDJSON (una línea por item)"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = []
+        for numero, linea in enumerate(request.stream, 1):
+            linea = linea.strip()
+            if linea:
+                try:
+                    items.append(json.loads(linea))
+                except ValueError:
+                    raise ValueError(f'Línea {numero}: JSON inválido')
+        return items
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('resultados')
+    if not isinstance(data, list):
+        raise ValueError('Se espera un arreglo de resultados o NDJSON')
+    return data
+
+
+@maquinas_bp.route('/recibir-lote', methods=['POST'])
+def recibir_lote():
+    """
+    Lote de resultados de muchas órdenes en un solo POST (analizadores que
+    descargan el turno completo). Cada item tiene el formato de recibir-json;
+    si trae mensaje_hl7 se parsea y guarda como HL7.
+
+    Todos los items válidos se insertan en una transacción (si la base de
+    datos rechaza alguno, solo ese queda con error); la respuesta trae el
+    estado de cada uno en el mismo orden del envío.
+    """
+    try:
+        items = _leer_lote()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    maximo = current_app.config.get('INGESTA_LOTE_MAXIMO', 10000)
+    if len(items) > maximo:
+        return jsonify({'error': f'Máximo {maximo} resultados por lote'}), 413
+
+    resultados = [None] * len(items)
+    validos, posiciones = [], []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            resultados[i] = {'indice': i, 'estado': 'error', 'error': 'Item inválido'}
+            continue
+        tipo = 'hl7' if item.get('mensaje_hl7') else 'json'
+        # Los HL7 pueden omitir orden_id (se toma de OBR-2/ORC-2 al insertar)
+        if tipo == 'json' and (not item.get('paciente_id') or not item.get('orden_id')):
+            resultados[i] = {'indice': i, 'estado': 'error', 'error': 'paciente_id y orden_id son requeridos'}
+            continue
+        validos.append((tipo, item))
+        posiciones.append(i)
+
+    try:
+        with conexion() as conn:
+            # Los items que la base de datos rechaza se reportan uno por uno
+            estados, fallidos = insertar_aislando(conn, validos)
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    for j, (i, (resultado_id, error)) in enumerate(zip(posiciones, estados)):
+        if j in fallidos:
+            error = f'Rechazado por la base de datos: {fallidos[j]}'
+        if error:
+            resultados[i] = {'indice': i, 'estado': 'error', 'error': error}
+        else:
+            resultados[i] = {'indice': i, 'estado': 'creado', 'resultado_id': resultado_id}
+
+    creados = sum(1 for r in resultados if r['estado'] == 'creado')
+    return jsonify({
+        'success': creados > 0 or not items,
+        'total': len(items),
+        'creados': creados,
+        'errores': len(items) - creados,
+        'resultados': resultados
+    }), 200
+
+@maquinas_bp.route('/recibos/<recibo_id>', methods=['GET'])
+def estado_recibo(recibo_id):
+    """Estado de un recibo de ingesta (pendiente, procesando, completado, muerto)"""
+    estado = obtener_cola(current_app).estado(recibo_id)
+    if not estado:
+        return jsonify({'error': 'Recibo no encontrado'}), 404
+    return jsonify(estado), 200
+
 @maquinas_bp.route('/estado', methods=['GET'])
 def estado_servicio():
     """Verificar que el servicio de integración está activo"""
@@ -271,7 +271,10 @@ def estado_servicio():
         'endpoints': {
             'hl7': '/api/maquinas/recibir-hl7',
             'dicom': '/api/maquinas/recibir-dicom',
-            'json': '/api/maquinas/recibir-json'
+            'json': '/api/maquinas/recibir-json',
+            'lote': '/api/maquinas/recibir-lote',
+            'recibo': '/api/maquinas/recibos/<recibo_id>'
         },
+        'cola': obtener_cola(current_app).conteo(),
         'timestamp': datetime.now().isoformat()
     }), 200
@@ -0,0 +1,284 @@
+"""
+Listener MLLP (HL7 sobre TCP) para conectar los analizadores directamente
+
+La mayoría de los equipos solo hablan MLLP: cada mensaje llega enmarcado como
+<VT> mensaje <FS><CR> y el equipo espera un ACK enmarcado antes de mandar el
+siguiente. El servidor es asyncio en un solo hilo, así que cientos de
+conexiones abiertas no cuestan un hilo cada una.
+
+Por cada mensaje:
+- se parsea con HL7Service (parser rápido); si no se puede -> NAK (AR)
+- ORU sin número de orden en OBR-2/ORC-2 -> NAK (AE)
+- se guarda en la cola de ingesta y se responde ACK (AA) con el recibo ya en
+  disco; los mensajes de todas las conexiones se escriben en lotes (un fsync
+  por lote) desde un único hilo
+
+La inserción en resultados la hacen los workers de la cola (cola_ingesta.py).
+Corre como proceso aparte junto a gunicorn:
+
+    flask mllp servir --puerto 2575
+"""
+from app.services.hl7_service import HL7Service
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import click
+import logging
+
+logger = logging.getLogger(__name__)
+
+INICIO = b'\x0b'
+FIN = b'\x1c\x0d'
+
+
+def enmarcar(texto):
+    """Trama MLLP de un mensaje"""
+    return INICIO + texto.encode('utf-8') + FIN
+
+
+def _control_id_crudo(texto):
+    """MSH-10 de un mensaje que no se pudo parsear (para el NAK)"""
+    primera = texto.lstrip().split('\r', 1)[0].split('\n', 1)[0]
+    if primera.startswith('MSH') and len(primera) > 3:
+        campos = primera.split(primera[3])
+        return campos[9] if len(campos) > 9 else ''
+    return ''
+
+
+class ServidorMLLP:
+
+    def __init__(self, cola, host='0.0.0.0', puerto=2575, max_conexiones=500,
+                 max_mensaje=1024 * 1024, timeout_inactivo=600, lote_escritura=200, al_encolar=None):
+        self.cola = cola
+        self.host = host
+        self.puerto = puerto
+        self.max_conexiones = max_conexiones
+        self.max_mensaje = max_mensaje
+        self.timeout_inactivo = timeout_inactivo
+        self.lote_escritura = lote_escritura
+        self.al_encolar = al_encolar
+        self.metricas = {
+            'conexiones': 0, 'conexiones_activas': 0, 'rechazadas': 0,
+            'mensajes': 0, 'ack': 0, 'nak': 0, 'errores_trama': 0, 'lotes_escritos': 0
+        }
+        self._servidor = None
+        self._pendientes = None
+        self._escritor = None
+        self._clientes = set()
+        # SQLite: un solo hilo escribe, las conexiones esperan su futuro
+        self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mllp-cola')
+
+    # ========== CICLO DE VIDA ==========
+
+    async def iniciar(self):
+        self._pendientes = asyncio.Queue()
+        self._escritor = asyncio.create_task(self._escribir())
+        self._servidor = await asyncio.start_server(
+            self._atender, self.host, self.puerto,
+            limit=self.max_mensaje + len(FIN), backlog=self.max_conexiones
+        )
+        direcciones = ', '.join(str(s.getsockname()) for s in self._servidor.sockets)
+        logger.info(f"MLLP escuchando en {direcciones}")
+        return self._servidor
+
+    async def detener(self):
+        """Dejar de aceptar, cerrar las conexiones abiertas y luego el escritor"""
+        if self._servidor is not None:
+            self._servidor.close()
+        # Antes de wait_closed (que desde 3.12 espera a los clientes) y del
+        # escritor (un cliente cancelado ya no espera su recibo)
+        clientes = list(self._clientes)
+        for tarea in clientes:
+            tarea.cancel()
+        await asyncio.gather(*clientes, return_exceptions=True)
+        if self._servidor is not None:
+            await self._servidor.wait_closed()
+        if self._escritor is not None:
+            self._escritor.cancel()
+            try:
+                await self._escritor
+            except asyncio.CancelledError:
+                pass
+        self._ejecutor.shutdown(wait=True)
+
+    async def servir_siempre(self):
+        await self.iniciar()
+        try:
+            async with self._servidor:
+                await self._servidor.serve_forever()
+        finally:
+            await self.detener()
+
+    @property
+    def puerto_real(self):
+        """Puerto asignado (útil con puerto=0 en pruebas)"""
+        return self._servidor.sockets[0].getsockname()[1]
+
+    # ========== CONEXIONES ==========
+
+    async def _atender(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        remitente = peer[0] if peer else 'desconocido'
+        if self.metricas['conexiones_activas'] >= self.max_conexiones:
+            self.metricas['rechazadas'] += 1
+            await self._cerrar(writer)
+            return
+
+        tarea = asyncio.current_task()
+        self._clientes.add(tarea)
+        self.metricas['conexiones'] += 1
+        self.metricas['conexiones_activas'] += 1
+        try:
+            while True:
+                try:
+                    trama = await asyncio.wait_for(reader.readuntil(FIN), self.timeout_inactivo)
+                except asyncio.IncompleteReadError:
+                    break  # el equipo cerró la conexión
+                except asyncio.TimeoutError:
+                    logger.info(f"MLLP {remitente}: conexión inactiva cerrada")
+                    break
+                except asyncio.LimitOverrunError:
+                    # No se puede resincronizar el flujo: NAK y cerrar
+                    self.metricas['errores_trama'] += 1
+                    await self._responder(writer, HL7Service.create_ack(
+                        '', 'AR', f'Mensaje mayor a {self.max_mensaje} bytes'))
+                    break
+
+                inicio = trama.rfind(INICIO)
+                if inicio < 0:
+                    # Bytes sueltos sin <VT>: se descartan
+                    self.metricas['errores_trama'] += 1
+                    continue
+
+                respuesta = await self._procesar(trama[inicio + 1:-len(FIN)], remitente)
+                if respuesta is not None:
+                    await self._responder(writer, respuesta)
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # el equipo se desconectó o el servidor se está deteniendo
+        except Exception as e:
+            logger.error(f"MLLP {remitente}: {e}")
+        finally:
+            self.metricas['conexiones_activas'] -= 1
+            self._clientes.discard(tarea)
+            await self._cerrar(writer)
+
+    @staticmethod
+    async def _cerrar(writer):
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    async def _responder(self, writer, ack):
+        if '\rMSA|AA|' in ack:
+            self.metricas['ack'] += 1
+        else:
+            self.metricas['nak'] += 1
+        writer.write(enmarcar(ack))
+        await writer.drain()
+
+    async def _procesar(self, datos, remitente):
+        """ACK/NAK para un mensaje (None si no requiere respuesta)"""
+        self.metricas['mensajes'] += 1
+        try:
+            texto = datos.decode('utf-8')
+        except UnicodeDecodeError:
+            # Equipos viejos mandan ISO-8859-1 sin declararlo en MSH-18
+            texto = datos.decode('latin-1')
+
+        try:
+            info = HL7Service.parse_hl7_rapido(texto)
+        except Exception as e:
+            return HL7Service.create_ack(_control_id_crudo(texto), 'AR', str(e))
+
+        control_id = info['message_control_id'] or ''
+        tipo = info['message_type'] or ''
+        partes = tipo.split('^')
+        ack = dict(destino=(info['sending_application'], info['sending_facility']),
+                   version=info['version'], disparador=partes[1] if len(partes) > 1 else '')
+
+        if partes[0] == 'ACK':
+            return None
+        if partes[0] != 'ORU':
+            return HL7Service.create_ack(control_id, 'AR', f'Tipo de mensaje no soportado: {tipo}', **ack)
+        if not info['order_number']:
+            return HL7Service.create_ack(control_id, 'AE', 'El mensaje no trae número de orden (OBR-2/ORC-2)', **ack)
+
+        futuro = asyncio.get_running_loop().create_future()
+        await self._pendientes.put(({
+            'paciente_id': None,
+            'orden_id': None,
+            'mensaje_hl7': texto,
+            'valores': {},
+            'origen': f'mllp:{remitente}'
+        }, futuro))
+        try:
+            await futuro
+        except Exception as e:
+            # AE: el equipo reintenta el mismo mensaje
+            logger.error(f"MLLP {remitente}: no se pudo encolar {control_id}: {e}")
+            return HL7Service.create_ack(control_id, 'AE', 'Error interno al guardar el mensaje', **ack)
+        return HL7Service.create_ack(control_id, 'AA', **ack)
+
+    # ========== ESCRITURA EN LA COLA ==========
+
+    async def _escribir(self):
+        """Vaciar los mensajes pendientes en lotes: un fsync para todas las conexiones"""
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self._pendientes.get()]
+            while len(lote) < self.lote_escritura and not self._pendientes.empty():
+                lote.append(self._pendientes.get_nowait())
+
+            try:
+                recibos = await loop.run_in_executor(
+                    self._ejecutor, self.cola.encolar_lote, [('hl7', payload) for payload, _ in lote]
+                )
+            except Exception as e:
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+
+            self.metricas['lotes_escritos'] += 1
+            for (_, futuro), recibo_id in zip(lote, recibos):
+                if not futuro.done():
+                    futuro.set_result(recibo_id)
+            if self.al_encolar is not None:
+                self.al_encolar()
+
+
+# ========== CLI ==========
+
+@click.group('mllp')
+def mllp_cli():
+    """Listener MLLP para analizadores de laboratorio"""
+
+
+@mllp_cli.command('servir')
+@click.option('--host', default=None, help='Interfaz (por defecto MLLP_HOST)')
+@click.option('--puerto', type=int, default=None, help='Puerto TCP (por defecto MLLP_PUERTO)')
+def servir_cmd(host, puerto):
+    """Escuchar conexiones MLLP hasta Ctrl+C"""
+    from flask import current_app
+    from app.services.cola_ingesta import obtener_cola, iniciar_workers, despertar
+
+    app = current_app._get_current_object()
+    config = app.config
+    logging.basicConfig(level=logging.INFO)
+
+    # Los workers de este proceso insertan apenas llega un lote (además de los de gunicorn)
+    iniciar_workers(app)
+    servidor = ServidorMLLP(
+        obtener_cola(app),
+        host=host or config.get('MLLP_HOST', '0.0.0.0'),
+        puerto=puerto or config.get('MLLP_PUERTO', 2575),
+        max_conexiones=config.get('MLLP_MAX_CONEXIONES', 500),
+        max_mensaje=config.get('MLLP_MAX_MENSAJE', 1024 * 1024),
+        timeout_inactivo=config.get('MLLP_TIMEOUT_INACTIVO', 600),
+        al_encolar=despertar
+    )
+    try:
+        asyncio.run(servidor.servir_siempre())
+    except KeyboardInterrupt:
+        click.echo(f"MLLP detenido: {servidor.metricas}")
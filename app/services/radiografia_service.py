@@ -1,80 +1,671 @@
-from PIL import Image, ImageEnhance, ImageFilter
-import base64
+"""
+Edición de radiografías en el servidor, sin ida y vuelta en base64
+
+La imagen se sube una vez en binario al almacén por contenido (su SHA-256 es
+el id). Las operaciones se piden como cadena en la URL y se aplican juntas al
+renderizar:
+
+    POST /api/radiografias/imagenes                     -> {"id": "ab12..."}
+    GET  /api/radiografias/imagenes/ab12.../render?ops=contraste:1.5,brillo:1.2,nitidez&formato=webp
+
+Operaciones: contraste:f, brillo:f, invertir, nitidez, recorte:x:y:ancho:alto,
+ventana:centro:ancho.
+
+Las operaciones puntuales (contraste, brillo, invertir, ventana) se componen
+en una sola tabla de 256 valores y se aplican con Image.point en una pasada;
+solo la nitidez (convolución) obliga a aplicar la tabla antes. Cada paso
+trunca y recorta como ImageEnhance (Image.blend), así que la tabla compuesta
+da los mismos niveles que aplicar cada paso por separado. Las imágenes de 16
+bits pasan a 8 con la primera ventana (o mínimo/máximo) sobre los valores
+originales.
+
+El original decodificado queda en memoria (pocas imágenes por proceso) y cada
+resultado en disco, así que repetir una cadena no vuelve a procesar nada. Los
+parámetros se redondean a DECIMALES y `flask imagenes purgar-render` recorta
+la caché a RADIOGRAFIA_CACHE_MAX.
+
+Para visores con zoom se sirve una pirámide Deep Zoom (teselas de 256 px,
+nivel 0 = 1x1 px); se genera completa la primera vez y luego son archivos:
+
+    GET /api/radiografias/<id>/tiles                    -> descriptor
+    GET /api/radiografias/<id>/tiles/<z>/<x>/<y>        -> tesela JPEG
+
+En la base de datos solo quedan referencias (radiografias.imagen_*_id,
+sonografias.imagenes = [{"id": ...}]); los data URI anteriores se pasan al
+almacén con `flask imagenes migrar` o, uno por uno, con
+POST /api/radiografias/<id>/migrar y POST /api/sonografias/<id>/imagenes/migrar.
+Las lecturas (GET) no escriben: una radiografía sin migrar responde 409.
+"""
+from app import db
+from app.services.almacen_archivos import obtener_almacen
+from app.services.dicom_render import ventana, reducir
+from collections import OrderedDict
+from PIL import Image, ImageFilter
 from io import BytesIO
+from sqlalchemy import text
+import numpy as np
+import base64
+import click
+import hashlib
+import json
+import logging
+import math
 import os
+import re
+import shutil
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# nombre -> cantidad de parámetros
+OPERACIONES = {
+    'contraste': 1,
+    'brillo': 1,
+    'invertir': 0,
+    'nitidez': 0,
+    'recorte': 4,
+    'ventana': 2
+}
+PUNTUALES = {'contraste', 'brillo', 'invertir', 'ventana'}
+MAX_OPERACIONES = 32
+# Los parámetros se redondean antes de la clave de caché: 1.5 y 1.50001 son el mismo archivo
+DECIMALES = 2
+
+FORMATOS = {
+    'png': ('PNG', '.png', 'image/png'),
+    'webp': ('WEBP', '.webp', 'image/webp'),
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg')
+}
+
+_ID_VALIDO = re.compile(r'^[0-9a-f]{64}$')
+
+TESELA = 256
+
+
+# ========== OPERACIONES ==========
+
+def parsear_operaciones(texto):
+    """'contraste:1.5,invertir' -> [('contraste', 1.5), ('invertir',)]"""
+    operaciones = []
+    for parte in (texto or '').split(','):
+        parte = parte.strip()
+        if not parte:
+            continue
+        nombre, *valores = parte.split(':')
+        nombre = nombre.strip().lower()
+        if nombre not in OPERACIONES:
+            raise ValueError(f'Operación desconocida: {nombre}')
+        if len(valores) != OPERACIONES[nombre]:
+            raise ValueError(f'{nombre} espera {OPERACIONES[nombre]} parámetros')
+        try:
+            numeros = [float(v) for v in valores]
+        except ValueError:
+            raise ValueError(f'Parámetro inválido en {parte}')
+        if any(not np.isfinite(n) for n in numeros):
+            raise ValueError(f'Parámetro inválido en {parte}')
+        if nombre in ('contraste', 'brillo') and numeros[0] < 0:
+            raise ValueError(f'{nombre} no admite factores negativos')
+        if nombre == 'ventana' and numeros[1] < 1:
+            raise ValueError('El ancho de ventana debe ser >= 1')
+        if nombre == 'recorte':
+            numeros = [int(n) for n in numeros]
+        else:
+            numeros = [round(n, DECIMALES) for n in numeros]
+        operaciones.append((nombre, *numeros))
+
+    if len(operaciones) > MAX_OPERACIONES:
+        raise ValueError(f'Máximo {MAX_OPERACIONES} operaciones')
+    return operaciones
+
+
+def canonica(operaciones):
+    """Texto estable de una cadena (clave de caché)"""
+    return ','.join(':'.join([op[0]] + [f'{v:g}' for v in op[1:]]) for op in operaciones)
+
+
+def _media(imagen, lut):
+    """Media de la imagen tras la tabla pendiente (desde el histograma, sin tocar píxeles)"""
+    if imagen.mode != 'L':
+        # Como ImageEnhance.Contrast: la media de la luminancia
+        imagen = imagen.convert('L')
+    histograma = np.asarray(imagen.histogram()[:256], dtype=np.float64)
+    total = histograma.sum()
+    if not total:
+        return 0
+    return int((histograma * lut).sum() / total + 0.5)
+
+
+def _a_8_bits(imagen, operaciones, conservar_modo=False):
+    """Imagen en 'L'; si es de 16 bits se usa la primera ventana de la cadena
+
+    Con conservar_modo las imágenes a color de 8 bits quedan en RGB/RGBA/LA
+    (la tabla se aplica a cada banda y el alfa no se toca).
+    """
+    if imagen.mode == 'L':
+        return imagen, operaciones
+    if imagen.mode in ('I;16', 'I;16B', 'I;16L', 'I', 'F'):
+        centro = ancho = None
+        if operaciones and operaciones[0][0] == 'ventana':
+            _, centro, ancho = operaciones[0]
+            operaciones = operaciones[1:]
+        pixeles = np.asarray(imagen)
+        return Image.fromarray(ventana(pixeles, centro=centro, ancho=ancho), 'L'), operaciones
+    if conservar_modo:
+        if imagen.mode in ('RGB', 'RGBA', 'LA'):
+            return imagen, operaciones
+        return imagen.convert('RGBA' if 'A' in imagen.getbands() else 'RGB'), operaciones
+    return imagen.convert('L'), operaciones
+
+
+def _aplicar_lut(imagen, lut):
+    tabla = lut.tolist()
+    bandas = imagen.getbands()
+    if len(bandas) > 1:
+        tabla = [v for banda in bandas for v in (range(256) if banda == 'A' else tabla)]
+    return imagen.point(tabla)
+
+
+def aplicar_operaciones(imagen, operaciones, conservar_modo=False):
+    """Aplicar la cadena en orden; devuelve una imagen nueva en modo 'L' (o el de entrada)"""
+    imagen, operaciones = _a_8_bits(imagen, list(operaciones), conservar_modo)
+    identidad = np.arange(256, dtype=np.int32)
+    lut = identidad
+
+    for nombre, *args in operaciones:
+        if nombre in PUNTUALES:
+            if nombre == 'contraste' and imagen.mode != 'L' and lut is not identidad:
+                # La luminancia tras una tabla por banda no sale del histograma de 'L'
+                imagen, lut = _aplicar_lut(imagen, lut), identidad
+            x = lut.astype(np.float32)
+            if nombre == 'contraste':
+                media = _media(imagen, lut)
+                x = media + args[0] * (x - media)
+            elif nombre == 'brillo':
+                x = x * args[0]
+            elif nombre == 'invertir':
+                x = 255 - x
+            else:
+                centro, ancho = args
+                x = ((x - (centro - 0.5)) / max(ancho - 1, 1) + 0.5) * 255
+            # ImageEnhance (Image.blend) trunca; la ventana redondea como dicom_render
+            x = np.floor(x) if nombre in ('contraste', 'brillo') else np.rint(x)
+            lut = np.clip(x, 0, 255).astype(np.int32)
+
+        elif nombre == 'recorte':
+            # Puntual y recorte conmutan: la tabla sigue pendiente
+            x0, y0, ancho, alto = args
+            x0, y0 = max(0, x0), max(0, y0)
+            x1, y1 = min(imagen.width, x0 + ancho), min(imagen.height, y0 + alto)
+            if x1 <= x0 or y1 <= y0:
+                raise ValueError('El recorte queda fuera de la imagen')
+            imagen = imagen.crop((x0, y0, x1, y1))
+
+        elif nombre == 'nitidez':
+            if lut is not identidad:
+                imagen = _aplicar_lut(imagen, lut)
+                lut = identidad
+            imagen = imagen.filter(ImageFilter.SHARPEN)
+
+    if lut is not identidad:
+        imagen = _aplicar_lut(imagen, lut)
+    return imagen
+
+
+def codificar(imagen, formato='png'):
+    nombre, _, _ = FORMATOS[formato]
+    salida = BytesIO()
+    if nombre == 'PNG':
+        imagen.save(salida, nombre, compress_level=3)
+    else:
+        imagen.save(salida, nombre, quality=90)
+    return salida.getvalue()
+
+
+# ========== IMÁGENES SUBIDAS ==========
+
+class EditorRadiografias:
+    """Originales en el almacén por contenido y resultados en caché de disco"""
+
+    def __init__(self, almacen, cache_dir, max_decodificadas=8):
+        self.almacen = almacen
+        self.cache_dir = os.path.abspath(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_decodificadas = max_decodificadas
+        self._decodificadas = OrderedDict()
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def ruta_original(self, imagen_id):
+        if not _ID_VALIDO.match(imagen_id or ''):
+            raise ValueError('Id de imagen inválido')
+        return self.almacen.ruta(imagen_id, '.img')
+
+    def subir(self, stream, limite=None):
+        """Guardar el binario y comprobar que es una imagen"""
+        info = self.almacen.guardar_stream(stream, '.img', limite=limite)
+        try:
+            with Image.open(info['ruta']) as imagen:
+                ancho, alto, modo = imagen.width, imagen.height, imagen.mode
+                imagen.verify()
+        except Exception:
+            if not info['duplicado']:
+                os.remove(info['ruta'])
+            raise ValueError('El archivo no es una imagen válida')
+        return {
+            'id': info['sha256'],
+            'ancho': ancho,
+            'alto': alto,
+            'modo': modo,
+            'tamano': info['tamano'],
+            'duplicado': info['duplicado']
+        }
+
+    def original(self, imagen_id):
+        """Original decodificado (LRU en memoria); no se modifica nunca"""
+        with self._lock:
+            if imagen_id in self._decodificadas:
+                self._decodificadas.move_to_end(imagen_id)
+                return self._decodificadas[imagen_id]
+
+        ruta = self.ruta_original(imagen_id)
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(imagen_id)
+        imagen = Image.open(ruta)
+        imagen.load()
+
+        with self._lock:
+            self._decodificadas[imagen_id] = imagen
+            while len(self._decodificadas) > self.max_decodificadas:
+                self._decodificadas.popitem(last=False)
+        return imagen
+
+    def ruta_render(self, imagen_id, operaciones, formato='png', lado=None):
+        clave = f'{imagen_id}|{canonica(operaciones)}|{lado}'
+        digest = hashlib.sha1(clave.encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}{FORMATOS[formato][1]}')
+
+    def render(self, imagen_id, operaciones, formato='png', lado=None):
+        """Ruta del resultado de la cadena; se procesa solo si no está en caché"""
+        if formato not in FORMATOS:
+            raise ValueError(f'Formato inválido: {formato}')
+        self.ruta_original(imagen_id)
+        destino = self.ruta_render(imagen_id, operaciones, formato, lado)
+        if os.path.exists(destino):
+            return destino
+
+        with self._lock:
+            lock = self._locks.setdefault(destino, threading.Lock())
+        try:
+            with lock:
+                if not os.path.exists(destino):
+                    imagen = aplicar_operaciones(self.original(imagen_id), operaciones)
+                    self._escribir(destino, codificar(reducir(imagen, lado), formato))
+        finally:
+            with self._lock:
+                self._locks.pop(destino, None)
+        return destino
+
+    # ---------- pirámide Deep Zoom ----------
+
+    def descriptor(self, imagen_id):
+        """Tamaño y niveles de la pirámide (solo lee el encabezado del original)"""
+        ruta = self.ruta_original(imagen_id)
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(imagen_id)
+        with Image.open(ruta) as imagen:
+            ancho, alto = imagen.size
+        return {
+            'ancho': ancho,
+            'alto': alto,
+            'tesela': TESELA,
+            'solapamiento': 0,
+            'formato': 'jpeg',
+            'nivel_maximo': math.ceil(math.log2(max(ancho, alto, 1)))
+        }
+
+    def tesela(self, imagen_id, z, x, y):
+        """Ruta de una tesela; la primera petición genera la pirámide completa"""
+        carpeta = os.path.join(self.cache_dir, 'teselas', imagen_id)
+        if not os.path.exists(os.path.join(carpeta, 'piramide.json')):
+            with self._lock:
+                lock = self._locks.setdefault(carpeta, threading.Lock())
+            try:
+                with lock:
+                    if not os.path.exists(os.path.join(carpeta, 'piramide.json')):
+                        self.generar_piramide(imagen_id, carpeta)
+            finally:
+                with self._lock:
+                    self._locks.pop(carpeta, None)
+        ruta = os.path.join(carpeta, str(z), f'{x}_{y}.jpg')
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(f'{z}/{x}/{y}')
+        return ruta
+
+    def generar_piramide(self, imagen_id, carpeta):
+        """Todas las teselas, del nivel completo hacia abajo reduciendo a la mitad"""
+        info = self.descriptor(imagen_id)
+        # En el modo del original (las sonografías a color siguen a color); JPEG no lleva alfa
+        nivel = aplicar_operaciones(self.original(imagen_id), [], conservar_modo=True)
+        if nivel.mode != 'L':
+            nivel = nivel.convert('RGB')
+        for z in range(info['nivel_maximo'], -1, -1):
+            for x in range(math.ceil(nivel.width / TESELA)):
+                for y in range(math.ceil(nivel.height / TESELA)):
+                    recorte = nivel.crop((x * TESELA, y * TESELA,
+                                          min(nivel.width, (x + 1) * TESELA),
+                                          min(nivel.height, (y + 1) * TESELA)))
+                    self._escribir(os.path.join(carpeta, str(z), f'{x}_{y}.jpg'), codificar(recorte, 'jpeg'))
+            if z:
+                # reduce() redondea hacia arriba: coincide con ceil(ancho / 2^n) de Deep Zoom
+                nivel = nivel.reduce(2)
+        # El descriptor se escribe al final: su presencia marca la pirámide completa
+        self._escribir(os.path.join(carpeta, 'piramide.json'), json.dumps(info).encode())
+
+    def _escribir(self, destino, datos):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, destino)
+
+    # ---------- purga ----------
+
+    def purgar(self, max_bytes):
+        """Borrar los resultados usados hace más tiempo hasta quedar bajo max_bytes
+
+        Cada pirámide cuenta como una unidad (se borra entera: piramide.json
+        marca que está completa); las que aún no tienen piramide.json se están
+        generando y no se tocan.
+        """
+        unidades = []
+        total = 0
+        carpeta_teselas = os.path.join(self.cache_dir, 'teselas')
+        for raiz, carpetas, nombres in os.walk(self.cache_dir):
+            if raiz == self.cache_dir and 'teselas' in carpetas:
+                carpetas.remove('teselas')
+            for nombre in nombres:
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    st = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                unidades.append((st.st_atime, st.st_size, ruta))
+                total += st.st_size
+
+        if os.path.isdir(carpeta_teselas):
+            for imagen_id in os.listdir(carpeta_teselas):
+                carpeta = os.path.join(carpeta_teselas, imagen_id)
+                if not os.path.exists(os.path.join(carpeta, 'piramide.json')):
+                    continue
+                acceso, tamano = 0, 0
+                for raiz, _, nombres in os.walk(carpeta):
+                    for nombre in nombres:
+                        try:
+                            st = os.stat(os.path.join(raiz, nombre))
+                        except FileNotFoundError:
+                            continue
+                        acceso = max(acceso, st.st_atime)
+                        tamano += st.st_size
+                unidades.append((acceso, tamano, carpeta))
+                total += tamano
+
+        borrados = 0
+        for _, tamano, ruta in sorted(unidades):
+            if total <= max_bytes:
+                break
+            try:
+                if ruta.startswith(carpeta_teselas + os.sep):
+                    # Sin descriptor primero: una petición concurrente regenera en vez de leer a medias
+                    os.remove(os.path.join(ruta, 'piramide.json'))
+                    shutil.rmtree(ruta, ignore_errors=True)
+                else:
+                    os.remove(ruta)
+                total -= tamano
+                borrados += 1
+            except FileNotFoundError:
+                pass
+        return borrados
+
+
+_editores = {}
+_lock_editores = threading.Lock()
+
+
+def obtener_editor(app):
+    """EditorRadiografias con RADIOGRAFIA_STORE_PATH y RADIOGRAFIA_CACHE"""
+    cache_dir = app.config.get('RADIOGRAFIA_CACHE') or os.path.join(app.config['UPLOAD_FOLDER'], 'radiografias_render')
+    with _lock_editores:
+        if cache_dir not in _editores:
+            _editores[cache_dir] = EditorRadiografias(
+                obtener_almacen(app, 'RADIOGRAFIA_STORE_PATH', 'radiografias'),
+                cache_dir,
+                app.config.get('RADIOGRAFIA_DECODIFICADAS', 8)
+            )
+        return _editores[cache_dir]
+
+
+# ========== REFERENCIAS EN BASE DE DATOS ==========
+
+def es_data_uri(valor):
+    return isinstance(valor, str) and valor.startswith('data:')
+
+
+def _decodificar_data_uri(texto):
+    return base64.b64decode(texto.split(',', 1)[1] if ',' in texto else texto)
+
+
+def guardar_data_uri(editor, texto):
+    """Pasar un data URI al almacén; devuelve la info de EditorRadiografias.subir"""
+    return editor.subir(BytesIO(_decodificar_data_uri(texto)))
+
+
+def _imagen_en_almacen(editor, item):
+    """Un elemento de sonografias.imagenes con el data URI cambiado por {'id': ...}"""
+    if es_data_uri(item):
+        info = guardar_data_uri(editor, item)
+        return {'id': info['id'], 'ancho': info['ancho'], 'alto': info['alto']}
+    if isinstance(item, dict):
+        for clave in ('imagen', 'url', 'data', 'src'):
+            if es_data_uri(item.get(clave)):
+                info = guardar_data_uri(editor, item[clave])
+                nuevo = {k: v for k, v in item.items() if k != clave}
+                nuevo.update(id=info['id'], ancho=info['ancho'], alto=info['alto'])
+                return nuevo
+    return item
+
+
+class ImagenSinMigrar(Exception):
+    """La imagen sigue como data URI en la base de datos"""
+
+
+def referencia_radiografia(radiografia_id, variante='procesada'):
+    """Id en el almacén de la imagen de una radiografía (solo lectura)
+
+    Si la imagen todavía es un data URI lanza ImagenSinMigrar: se pasa al
+    almacén con migrar_radiografia (POST) o `flask imagenes migrar`.
+    """
+    columna = 'imagen_procesada' if variante == 'procesada' else 'imagen_original'
+    fila = db.session.execute(text(f"""
+        SELECT {columna}_id, imagen_original_id,
+               {columna}_id IS NULL AND {columna} LIKE 'data:%'
+        FROM radiografias WHERE id = :id
+    """), {'id': radiografia_id}).first()
+    if fila is None:
+        return None
+    imagen_id, original_id, sin_migrar = fila
+    if imagen_id:
+        return imagen_id
+    if sin_migrar:
+        raise ImagenSinMigrar(radiografia_id)
+    # Sin procesada se muestra la original
+    if variante == 'procesada':
+        return original_id or referencia_radiografia(radiografia_id, 'original')
+    return None
+
+
+def _migrar_fila_radiografia(editor, radiografia_id, original, procesada):
+    """UPDATE (sin commit) de los data URI de una fila; devuelve {columna_id: imagen_id}"""
+    cambios = {}
+    for columna, valor in (('imagen_original', original), ('imagen_procesada', procesada)):
+        if es_data_uri(valor):
+            cambios[columna] = guardar_data_uri(editor, valor)['id']
+    if cambios:
+        asignaciones = ', '.join(f'{c}_id = :{c}, {c} = NULL' for c in cambios)
+        db.session.execute(text(f"UPDATE radiografias SET {asignaciones} WHERE id = :id"),
+                           dict(cambios, id=radiografia_id))
+    return {f'{c}_id': imagen_id for c, imagen_id in cambios.items()}
+
+
+def migrar_radiografia(editor, radiografia_id):
+    """Pasar al almacén los data URI de una radiografía; None si no existe"""
+    fila = db.session.execute(text("""
+        SELECT imagen_original, imagen_procesada FROM radiografias WHERE id = :id
+    """), {'id': radiografia_id}).first()
+    if fila is None:
+        return None
+    cambios = _migrar_fila_radiografia(editor, radiografia_id, *fila)
+    db.session.commit()
+    return cambios
+
+
+def imagenes_sonografia(sonografia_id):
+    """sonografias.imagenes tal como están (solo lectura); None si no existe"""
+    fila = db.session.execute(text("SELECT imagenes FROM sonografias WHERE id = :id"),
+                              {'id': sonografia_id}).first()
+    if fila is None:
+        return None
+    return fila[0] if isinstance(fila[0], list) else []
+
+
+def migrar_sonografia(editor, sonografia_id):
+    """sonografias.imagenes con los data URI pasados al almacén; None si no existe"""
+    imagenes = imagenes_sonografia(sonografia_id)
+    if imagenes is None:
+        return None
+    if any(es_data_uri(i) or (isinstance(i, dict) and any(es_data_uri(v) for v in i.values())) for i in imagenes):
+        imagenes = [_imagen_en_almacen(editor, i) for i in imagenes]
+        db.session.execute(text("UPDATE sonografias SET imagenes = CAST(:imagenes AS JSONB) WHERE id = :id"),
+                           {'imagenes': json.dumps(imagenes), 'id': sonografia_id})
+        db.session.commit()
+    return imagenes
+
+
+def migrar_radiografias(editor, lote=50):
+    """Pasar al almacén todos los data URI de radiografias; devuelve (migradas, errores)"""
+    migradas, errores, ultimo = 0, 0, 0
+    while True:
+        filas = db.session.execute(text("""
+            SELECT id, imagen_original, imagen_procesada FROM radiografias
+            WHERE id > :ultimo AND (imagen_original LIKE 'data:%' OR imagen_procesada LIKE 'data:%')
+            ORDER BY id LIMIT :lote
+        """), {'ultimo': ultimo, 'lote': lote}).fetchall()
+        if not filas:
+            return migradas, errores
+        for radiografia_id, original, procesada in filas:
+            ultimo = radiografia_id
+            try:
+                _migrar_fila_radiografia(editor, radiografia_id, original, procesada)
+                migradas += 1
+            except Exception as e:
+                logger.warning(f"Radiografía {radiografia_id} no migrada: {e}")
+                errores += 1
+        # Un commit por lote; los data URI del lote ya se soltaron
+        db.session.commit()
+
+
+def migrar_sonografias(editor, lote=50):
+    """Pasar al almacén los data URI de sonografias.imagenes; devuelve (migradas, errores)"""
+    migradas, errores, ultimo = 0, 0, 0
+    while True:
+        ids = db.session.execute(text("""
+            SELECT id FROM sonografias
+            WHERE id > :ultimo AND CAST(imagenes AS TEXT) LIKE '%"data:%'
+            ORDER BY id LIMIT :lote
+        """), {'ultimo': ultimo, 'lote': lote}).scalars().all()
+        if not ids:
+            return migradas, errores
+        for sonografia_id in ids:
+            ultimo = sonografia_id
+            try:
+                migrar_sonografia(editor, sonografia_id)
+                migradas += 1
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Sonografía {sonografia_id} no migrada: {e}")
+                errores += 1
+
+
+# ========== CLI ==========
+
+@click.group('imagenes')
+def imagenes_cli():
+    """Imágenes de radiografías y sonografías en el almacén"""
+
+
+@imagenes_cli.command('migrar')
+@click.option('--lote', type=int, default=50, help='Filas por commit')
+def migrar_cmd(lote):
+    """Pasar los data URI guardados en la base de datos al almacén por contenido"""
+    from flask import current_app
+
+    editor = obtener_editor(current_app)
+    migradas, errores = migrar_radiografias(editor, lote)
+    click.echo(f"radiografias: {migradas} migradas, {errores} con error")
+    migradas, errores = migrar_sonografias(editor, lote)
+    click.echo(f"sonografias: {migradas} migradas, {errores} con error")
+
+
+@imagenes_cli.command('purgar-render')
+@click.option('--max-mb', type=int, default=None, help='Tamaño máximo de la caché (por defecto RADIOGRAFIA_CACHE_MAX)')
+def purgar_render_cmd(max_mb):
+    """Borrar los resultados y pirámides menos usados"""
+    from flask import current_app
+
+    max_bytes = max_mb * 1024 * 1024 if max_mb is not None else current_app.config.get('RADIOGRAFIA_CACHE_MAX', 2 * 1024 ** 3)
+    borrados = obtener_editor(current_app).purgar(max_bytes)
+    click.echo(f"{borrados} resultados borrados")
+
+
+# ========== API BASE64 (compatibilidad) ==========
+
+def _desde_base64(imagen_base64):
+    return Image.open(BytesIO(_decodificar_data_uri(imagen_base64)))
+
+
+def _a_base64(img):
+    return f"data:image/png;base64,{base64.b64encode(codificar(img)).decode()}"
+
 
 class RadiologiaService:
-    
+
     @staticmethod
     def procesar_imagen(imagen_base64):
         """Procesar imagen radiográfica"""
-        # Decodificar base64
-        img_data = base64.b64decode(imagen_base64.split(',')[1] if ',' in imagen_base64 else imagen_base64)
-        img = Image.open(BytesIO(img_data))
-        
-        # Convertir a escala de grises si no lo está
-        if img.mode != 'L':
-            img = img.convert('L')
-        
-        # Mejoras automáticas
-        # 1. Ajustar contraste
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.5)
-        
-        # 2. Ajustar brillo
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(1.2)
-        
-        # 3. Nitidez
-        img = img.filter(ImageFilter.SHARPEN)
-        
-        # Convertir de vuelta a base64
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode()
-        
+        # Escala de grises + contraste, brillo y nitidez en una sola pasada
+        img = aplicar_operaciones(_desde_base64(imagen_base64),
+                                  [('contraste', 1.5), ('brillo', 1.2), ('nitidez',)])
         return {
-            'imagen_procesada': f"data:image/png;base64,{img_base64}",
+            'imagen_procesada': _a_base64(img),
             'ancho': img.width,
             'alto': img.height,
             'formato': 'PNG'
         }
-    
+
     @staticmethod
     def ajustar_contraste(imagen_base64, factor):
         """Ajustar contraste de imagen"""
-        img_data = base64.b64decode(imagen_base64.split(',')[1])
-        img = Image.open(BytesIO(img_data))
-        
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(factor)
-        
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        return f"data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode()}"
-    
+        return _a_base64(aplicar_operaciones(_desde_base64(imagen_base64), [('contraste', factor)],
+                                             conservar_modo=True))
+
     @staticmethod
     def ajustar_brillo(imagen_base64, factor):
         """Ajustar brillo de imagen"""
-        img_data = base64.b64decode(imagen_base64.split(',')[1])
-        img = Image.open(BytesIO(img_data))
-        
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(factor)
-        
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        return f"data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode()}"
-    
+        return _a_base64(aplicar_operaciones(_desde_base64(imagen_base64), [('brillo', factor)],
+                                             conservar_modo=True))
+
     @staticmethod
     def invertir_colores(imagen_base64):
         """Invertir colores de radiografía"""
-        img_data = base64.b64decode(imagen_base64.split(',')[1])
-        img = Image.open(BytesIO(img_data))
-        
-        from PIL import ImageOps
-        img = ImageOps.invert(img.convert('RGB'))
-        
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        return f"data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode()}"
+        return _a_base64(aplicar_operaciones(_desde_base64(imagen_base64), [('invertir',)],
+                                             conservar_modo=True))
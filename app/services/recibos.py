@@ -0,0 +1,542 @@
+"""
+Maquetación de recibos térmicos de 80 mm (PDF y ESC/POS)
+
+Un recibo se describe con bloques (texto, columnas, separadores, espacios,
+QR, Code128) sin posiciones. Cada backend hace una sola pasada de medición
+(maquetar: parte las líneas largas y calcula el alto real) y después emite
+los bytes:
+
+    recibo = recibo_pago(factura, pago)
+    pdf = a_pdf(recibo)          # página del alto exacto del contenido
+    datos = a_escpos(recibo)     # TicketESCPOS
+
+BackendPDF mide con las métricas de reportlab (anchos por carácter
+cacheados por fuente); BackendESCPOS mide en columnas.
+
+Los bloques fijos (el encabezado con nombre/RNC/teléfono de
+configuracion.info_empresa) se declaran con Recibo.fijo(clave, construir):
+cada backend los maqueta una vez por clave y reutiliza el resultado. La
+clave lleva la versión del tag 'configuracion' de app.cache, así que editar
+los datos del centro invalida el encabezado en todos los workers.
+"""
+from app.services.escpos import TicketESCPOS
+from collections import namedtuple
+from datetime import datetime
+from io import BytesIO
+import threading
+
+MM = 72 / 25.4
+
+# interlineado en mm; negrita/doble solo para ESC/POS
+Estilo = namedtuple('Estilo', 'fuente puntos interlineado negrita doble')
+
+ESTILOS = {
+    'titulo': Estilo('Helvetica-Bold', 12, 4.5, True, True),
+    'subtitulo': Estilo('Helvetica-Bold', 10, 5.0, True, False),
+    'encabezado': Estilo('Helvetica', 7, 3.0, False, False),
+    'normal': Estilo('Helvetica', 8, 3.5, False, False),
+    'negrita': Estilo('Helvetica-Bold', 8, 3.5, True, False),
+    'detalle': Estilo('Helvetica', 7, 3.5, False, False),
+    'total': Estilo('Helvetica-Bold', 11, 5.0, True, True),
+    'pie': Estilo('Helvetica', 6, 3.0, False, False),
+}
+
+Maqueta = namedtuple('Maqueta', 'operaciones alto')
+
+MAX_FIJOS = 32
+
+
+class Recibo:
+    """Descripción declarativa de un recibo (métodos encadenables)"""
+
+    def __init__(self):
+        self.elementos = []
+
+    def texto(self, texto, estilo='normal', alineacion='izquierda'):
+        self.elementos.append(('texto', texto, ESTILOS[estilo], alineacion))
+        return self
+
+    def centrado(self, texto, estilo='normal'):
+        return self.texto(texto, estilo, 'centro')
+
+    def columnas(self, izquierda, derecha, estilo='normal'):
+        """Izquierda (se parte si no cabe) y derecha en el mismo renglón"""
+        self.elementos.append(('columnas', izquierda, derecha, ESTILOS[estilo]))
+        return self
+
+    def separador(self, tipo='linea'):
+        """linea, doble o punteada"""
+        self.elementos.append(('separador', tipo))
+        return self
+
+    def espacio(self, mm):
+        self.elementos.append(('espacio', mm))
+        return self
+
+    def qr(self, datos, lado=18):
+        self.elementos.append(('qr', datos, lado))
+        return self
+
+    def code128(self, datos, alto=8):
+        self.elementos.append(('code128', datos, alto))
+        return self
+
+    def fijo(self, clave, construir):
+        """Bloque que no cambia entre recibos: construir() -> Recibo, maquetado una vez por clave"""
+        self.elementos.append(('fijo', clave, construir))
+        return self
+
+
+def partir(texto, ancho_maximo, medir):
+    """Partir texto en renglones que quepan en ancho_maximo (por palabras)"""
+    if medir(texto) <= ancho_maximo:
+        return [texto]
+    renglones, actual = [], ''
+    for palabra in texto.split(' '):
+        candidato = f'{actual} {palabra}' if actual else palabra
+        if medir(candidato) <= ancho_maximo:
+            actual = candidato
+            continue
+        if actual:
+            renglones.append(actual)
+        # Palabra más ancha que el renglón: cortarla por caracteres
+        while medir(palabra) > ancho_maximo and len(palabra) > 1:
+            corte = len(palabra) - 1
+            while corte > 1 and medir(palabra[:corte]) > ancho_maximo:
+                corte -= 1
+            renglones.append(palabra[:corte])
+            palabra = palabra[corte:]
+        actual = palabra
+    if actual:
+        renglones.append(actual)
+    return renglones
+
+
+class Maquetador:
+    """Pasada de medición común; los backends definen anchos y altos
+
+    Operaciones de la maqueta (y = distancia desde el tope a la base):
+        ('renglon', y, estilo, izquierda, centro, derecha)
+        ('linea', y, tipo) / ('espacio', y, mm)
+        ('qr', y, datos, lado) / ('code128', y, datos, alto)
+    """
+
+    ancho_util = 0
+    separacion = 0
+
+    def __init__(self):
+        self._fijos = {}
+        self._lock = threading.Lock()
+
+    def ancho(self, texto, estilo):
+        raise NotImplementedError
+
+    def alto(self, elemento, estilo=None):
+        raise NotImplementedError
+
+    def compilar(self, maqueta):
+        """Forma guardada de un bloque fijo (por defecto la misma maqueta)"""
+        return maqueta
+
+    def _fijo(self, clave, construir):
+        with self._lock:
+            compilado = self._fijos.get(clave)
+        if compilado is None:
+            compilado = self.compilar(self.maquetar(construir()))
+            with self._lock:
+                if len(self._fijos) >= MAX_FIJOS:
+                    self._fijos.clear()
+                self._fijos[clave] = compilado
+        return compilado
+
+    def maquetar(self, recibo):
+        operaciones = []
+        y = 0
+        for elemento in recibo.elementos:
+            tipo = elemento[0]
+            if tipo == 'texto':
+                _, texto, estilo, alineacion = elemento
+                alto = self.alto('renglon', estilo)
+                for renglon in partir(texto, self.ancho_util, lambda t: self.ancho(t, estilo)):
+                    y += alto
+                    partes = {'izquierda': (renglon, None, None), 'centro': (None, renglon, None),
+                              'derecha': (None, None, renglon)}[alineacion]
+                    operaciones.append(('renglon', y, estilo) + partes)
+            elif tipo == 'columnas':
+                _, izquierda, derecha, estilo = elemento
+                alto = self.alto('renglon', estilo)
+                disponible = self.ancho_util - self.ancho(derecha, estilo) - self.separacion
+                for i, renglon in enumerate(partir(izquierda, disponible, lambda t: self.ancho(t, estilo))):
+                    y += alto
+                    operaciones.append(('renglon', y, estilo, renglon, None, None if i else derecha))
+            elif tipo == 'separador':
+                mitad = self.alto('separador') / 2
+                operaciones.append(('linea', y + mitad, elemento[1]))
+                y += 2 * mitad
+            elif tipo == 'espacio':
+                y += self.alto('espacio', elemento[1])
+                operaciones.append(('espacio', y, elemento[1]))
+            elif tipo in ('qr', 'code128'):
+                y += self.alto(tipo, elemento[2])
+                operaciones.append((tipo, y) + elemento[1:])
+            elif tipo == 'fijo':
+                compilado = self._fijo(elemento[1], elemento[2])
+                operaciones.extend((op[0], op[1] + y) + op[2:] for op in compilado.operaciones)
+                y += compilado.alto
+        return Maqueta(operaciones, y)
+
+
+# ========== PDF ==========
+
+_anchos = {}  # fuente -> {caracter: ancho a 1 pt}
+
+
+def ancho_texto(texto, fuente, puntos):
+    """stringWidth de reportlab con el ancho de cada carácter cacheado"""
+    tabla = _anchos.setdefault(fuente, {})
+    total = 0.0
+    for caracter in texto:
+        ancho = tabla.get(caracter)
+        if ancho is None:
+            from reportlab.pdfbase.pdfmetrics import stringWidth
+            ancho = tabla[caracter] = stringWidth(caracter, fuente, 1)
+        total += ancho
+    return total * puntos
+
+
+class BackendPDF(Maquetador):
+
+    def __init__(self, ancho_mm=80, margen_mm=4, margen_vertical_mm=5):
+        super().__init__()
+        self.ancho_pagina = ancho_mm * MM
+        self.margen = margen_mm * MM
+        self.margen_vertical = margen_vertical_mm * MM
+        self.ancho_util = self.ancho_pagina - 2 * self.margen
+        self.separacion = 3 * MM
+
+    def ancho(self, texto, estilo):
+        return ancho_texto(texto, estilo.fuente, estilo.puntos)
+
+    def alto(self, elemento, valor=None):
+        if elemento == 'renglon':
+            return valor.interlineado * MM
+        if elemento == 'separador':
+            return 5 * MM
+        if elemento == 'qr':
+            return (valor + 2) * MM
+        if elemento == 'code128':
+            return (valor + 5) * MM
+        return valor * MM
+
+    def emitir(self, maqueta):
+        """Maqueta -> bytes del PDF (alto de página = alto del contenido)"""
+        from reportlab.pdfgen import canvas
+
+        salida = BytesIO()
+        alto = maqueta.alto + 2 * self.margen_vertical
+        c = canvas.Canvas(salida, pagesize=(self.ancho_pagina, alto))
+        tope = alto - self.margen_vertical
+        izquierda, centro, derecha = self.margen, self.ancho_pagina / 2, self.ancho_pagina - self.margen
+        fuente = None
+        for op in maqueta.operaciones:
+            tipo, y = op[0], tope - op[1]
+            if tipo == 'renglon':
+                _, _, estilo, texto_izq, texto_centro, texto_der = op
+                if fuente != estilo[:2]:
+                    fuente = estilo[:2]
+                    c.setFont(estilo.fuente, estilo.puntos)
+                if texto_izq:
+                    c.drawString(izquierda, y, texto_izq)
+                if texto_centro:
+                    c.drawCentredString(centro, y, texto_centro)
+                if texto_der:
+                    c.drawRightString(derecha, y, texto_der)
+            elif tipo == 'linea':
+                self._linea(c, op[2], y, izquierda, derecha)
+            elif tipo == 'qr':
+                self._qr(c, op[2], op[3] * MM, centro, y + 1 * MM)
+            elif tipo == 'code128':
+                self._code128(c, op[2], op[3] * MM, centro, y + 4 * MM)
+        c.save()
+        return salida.getvalue()
+
+    def _linea(self, c, tipo, y, izquierda, derecha):
+        if tipo == 'doble':
+            c.setLineWidth(0.8)
+            c.line(izquierda, y + 0.5 * MM, derecha, y + 0.5 * MM)
+            c.line(izquierda, y - 0.5 * MM, derecha, y - 0.5 * MM)
+        elif tipo == 'punteada':
+            c.setLineWidth(0.3)
+            c.setDash(2, 2)
+            c.line(izquierda, y, derecha, y)
+            c.setDash()
+        else:
+            c.setLineWidth(0.5)
+            c.line(izquierda, y, derecha, y)
+
+    def _qr(self, c, datos, lado, centro, base):
+        from reportlab.graphics import renderPDF
+        from reportlab.graphics.barcode.qr import QrCodeWidget
+        from reportlab.graphics.shapes import Drawing
+
+        widget = QrCodeWidget(datos)
+        x1, y1, x2, y2 = widget.getBounds()
+        dibujo = Drawing(lado, lado, transform=[lado / (x2 - x1), 0, 0, lado / (y2 - y1), 0, 0])
+        dibujo.add(widget)
+        renderPDF.draw(dibujo, c, centro - lado / 2, base)
+
+    def _code128(self, c, datos, alto, centro, base):
+        from reportlab.graphics.barcode import code128
+
+        barcode = code128.Code128(datos, barHeight=alto, barWidth=0.25 * MM, humanReadable=True)
+        barcode.drawOn(c, centro - barcode.width / 2, base)
+
+
+# ========== ESC/POS ==========
+
+class BackendESCPOS(Maquetador):
+
+    def __init__(self, columnas=48):
+        super().__init__()
+        self.ancho_util = columnas
+        self.separacion = 1
+
+    def ancho(self, texto, estilo):
+        return len(texto) * (2 if estilo.doble else 1)
+
+    def alto(self, elemento, valor=None):
+        if elemento == 'renglon':
+            return 2 if valor.doble else 1
+        if elemento == 'espacio':
+            return max(1, round(valor / 3.5))
+        return 1
+
+    def _ticket(self, maqueta, completo):
+        t = TicketESCPOS(self.ancho_util, inicializar=completo)
+        for op in maqueta.operaciones:
+            tipo = op[0]
+            if tipo == 'renglon':
+                _, _, estilo, izquierda, centro, derecha = op
+                if centro:
+                    t.texto(centro, 'centro', estilo.negrita, estilo.doble)
+                elif not derecha:
+                    t.texto(izquierda, 'izquierda', estilo.negrita, estilo.doble)
+                elif not izquierda:
+                    t.texto(derecha, 'derecha', estilo.negrita, estilo.doble)
+                else:
+                    t.columnas(izquierda, derecha, estilo.negrita, estilo.doble)
+            elif tipo == 'linea':
+                t.separador({'doble': '=', 'punteada': '- '}.get(op[2], '-'))
+            elif tipo == 'espacio':
+                t.avanzar(self.alto('espacio', op[2]))
+            elif tipo == 'qr':
+                t.qr(op[2])
+            elif tipo == 'code128':
+                t.code128(op[2])
+            elif tipo == 'crudo':
+                t.crudo(op[2])
+        if completo:
+            t.cortar()
+        return t.bytes()
+
+    def compilar(self, maqueta):
+        """Un bloque fijo queda como los bytes ya emitidos"""
+        return Maqueta([('crudo', 0, self._ticket(maqueta, completo=False))], maqueta.alto)
+
+    def emitir(self, maqueta):
+        return self._ticket(maqueta, completo=True)
+
+
+_backends = {}
+_lock_backends = threading.Lock()
+
+
+def _backend(clave, crear):
+    with _lock_backends:
+        if clave not in _backends:
+            _backends[clave] = crear()
+        return _backends[clave]
+
+
+def a_pdf(recibo, ancho_mm=80):
+    """Recibo -> bytes del PDF"""
+    backend = _backend(('pdf', ancho_mm), lambda: BackendPDF(ancho_mm))
+    return backend.emitir(backend.maquetar(recibo))
+
+
+def a_escpos(recibo, columnas=48):
+    """Recibo -> bytes ESC/POS (con corte)"""
+    backend = _backend(('escpos', columnas), lambda: BackendESCPOS(columnas))
+    return backend.emitir(backend.maquetar(recibo))
+
+
+# ========== DATOS DEL CENTRO ==========
+
+CLAVES_EMPRESA = ['empresa_nombre', 'empresa_rnc', 'empresa_telefono', 'empresa_direccion']
+
+EMPRESA_POR_DEFECTO = {
+    'nombre': 'MI ESPERANZA CENTRO DIAGNÓSTICO',
+    'rnc': '000-00000-0',
+    'telefono': '809-000-0000',
+    'direccion': None
+}
+
+_empresa = {'version': None, 'datos': None}
+_lock_empresa = threading.Lock()
+
+
+def info_empresa():
+    """Datos del centro para el encabezado; se releen solo si cambió la configuración"""
+    from app.cache import version_tag
+    from app.models import Configuracion
+
+    version = version_tag('configuracion')
+    with _lock_empresa:
+        if _empresa['version'] == version:
+            return _empresa['datos']
+    configs = Configuracion.query.filter(Configuracion.clave.in_(CLAVES_EMPRESA)).all()
+    datos = dict(EMPRESA_POR_DEFECTO, version=version)
+    datos.update({c.clave.replace('empresa_', ''): c.valor for c in configs if c.valor})
+    with _lock_empresa:
+        _empresa.update(version=version, datos=datos)
+    return datos
+
+
+def _encabezado(empresa):
+    def construir():
+        r = Recibo()
+        r.centrado(empresa['nombre'], 'titulo')
+        r.centrado(f"RNC: {empresa['rnc']}", 'encabezado')
+        r.centrado(f"Tel: {empresa['telefono']}", 'encabezado')
+        if empresa.get('direccion'):
+            r.centrado(empresa['direccion'], 'encabezado')
+        r.separador('doble')
+        return r
+    return ('encabezado', empresa['version'], empresa['nombre']), construir
+
+
+def _dinero(valor):
+    return f"RD$ {float(valor):,.2f}"
+
+
+# ========== DOCUMENTOS ==========
+
+def recibo_pago(factura, pago, empresa=None):
+    """Recibo de un pago de la factura"""
+    r = Recibo().fijo(*_encabezado(empresa or info_empresa()))
+    r.centrado('RECIBO DE PAGO', 'subtitulo')
+    r.texto(f"Factura: {factura.numero_factura}")
+    r.texto(f"NCF: {factura.ncf or 'N/A'}")
+    r.texto(f"Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+    r.espacio(1.5)
+
+    paciente = factura.paciente
+    r.texto('PACIENTE:', 'negrita')
+    r.texto(f"{paciente.nombre} {paciente.apellido}")
+    r.texto(f"Cédula: {paciente.cedula or 'N/A'}")
+    r.separador()
+
+    r.texto('PAGO RECIBIDO:', 'negrita')
+    r.columnas('Monto:', _dinero(pago.monto))
+    r.columnas('Método:', pago.metodo_pago.upper())
+    if pago.referencia:
+        r.columnas('Ref:', pago.referencia)
+    r.separador()
+
+    total_pagado = sum(float(p.monto) for p in factura.pagos)
+    saldo = float(factura.total) - total_pagado
+    r.columnas('Total Factura:', _dinero(factura.total))
+    r.columnas('Total Pagado:', _dinero(total_pagado))
+    if saldo > 0:
+        r.columnas('SALDO:', _dinero(saldo), 'negrita')
+    else:
+        r.centrado('** PAGADO **', 'negrita')
+    r.espacio(2)
+
+    r.centrado('¡Gracias por su preferencia!', 'pie')
+    r.centrado('Conserve este recibo', 'pie')
+    return r
+
+
+def ticket_orden(orden, empresa=None):
+    """Ticket de la orden para el paciente, con QR de seguimiento"""
+    r = Recibo().fijo(*_encabezado(empresa or info_empresa()))
+    r.centrado(f"ORDEN: {orden.numero_orden}", 'subtitulo')
+
+    paciente = orden.paciente
+    r.texto(f"Paciente: {paciente.nombre} {paciente.apellido}")
+    r.texto(f"Cédula: {paciente.cedula or 'N/A'}")
+    r.texto(f"Fecha: {orden.fecha_orden.strftime('%d/%m/%Y %H:%M')}")
+    if orden.medico_referente:
+        r.texto(f"Dr(a): {orden.medico_referente}")
+    r.separador()
+
+    r.texto('ESTUDIOS:', 'negrita')
+    total = 0
+    for detalle in orden.detalles:
+        precio = float(detalle.precio_final)
+        total += precio
+        r.columnas(detalle.estudio.nombre if detalle.estudio else 'Estudio', _dinero(precio), 'detalle')
+    r.separador()
+    r.columnas('TOTAL:', _dinero(total), 'subtitulo')
+    r.espacio(2)
+
+    r.qr(f"ORD:{orden.numero_orden}")
+    r.centrado('Escanee para seguimiento', 'pie')
+    r.centrado('¡Gracias por su visita!', 'pie')
+    return r
+
+
+def factura_80mm(factura, empresa=None):
+    """Factura completa en rollo de 80 mm"""
+    r = Recibo().fijo(*_encabezado(empresa or info_empresa()))
+    r.centrado('FACTURA', 'subtitulo')
+    r.texto(f"No: {factura.numero_factura}", 'negrita')
+    r.texto(f"NCF: {factura.ncf or 'N/A'}", 'detalle')
+    r.texto(f"Fecha: {factura.fecha_factura.strftime('%d/%m/%Y %H:%M')}", 'detalle')
+    if factura.forma_pago:
+        r.texto(f"Forma Pago: {factura.forma_pago}", 'detalle')
+
+    paciente = factura.paciente
+    r.separador('punteada')
+    r.texto('PACIENTE:', 'negrita')
+    if paciente:
+        r.texto(f"{paciente.nombre} {paciente.apellido}", 'detalle')
+        r.texto(f"Cédula: {paciente.cedula or 'N/A'}", 'detalle')
+        if paciente.telefono:
+            r.texto(f"Tel: {paciente.telefono}", 'detalle')
+        if paciente.seguro_medico:
+            r.texto(f"Seguro: {paciente.seguro_medico}", 'detalle')
+
+    r.separador('punteada')
+    r.columnas('DESCRIPCION', 'TOTAL', 'negrita')
+    r.separador()
+    for detalle in factura.detalles:
+        r.columnas(detalle.descripcion, f"{float(detalle.total):,.2f}", 'detalle')
+    r.separador('punteada')
+
+    r.columnas('Subtotal:', _dinero(factura.subtotal), 'detalle')
+    if float(factura.descuento) > 0:
+        r.columnas('Descuento:', '-' + _dinero(factura.descuento), 'detalle')
+    r.columnas('ITBIS (18%):', _dinero(factura.itbis), 'detalle')
+    r.separador()
+    r.columnas('TOTAL:', _dinero(factura.total), 'total')
+
+    pagos = list(factura.pagos)
+    if pagos:
+        r.separador('punteada')
+        r.texto('PAGOS REGISTRADOS:', 'negrita')
+        total_pagado = 0
+        for pago in pagos:
+            monto = float(pago.monto)
+            total_pagado += monto
+            r.columnas(f"  {pago.metodo_pago} - {pago.fecha_pago.strftime('%d/%m/%Y')}", _dinero(monto), 'detalle')
+        saldo = float(factura.total) - total_pagado
+        if saldo > 0.01:
+            r.columnas('SALDO PENDIENTE:', _dinero(saldo), 'negrita')
+
+    r.separador('punteada')
+    r.centrado('Gracias por su preferencia', 'negrita')
+    r.centrado(f"Impreso: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", 'pie')
+    r.centrado('Conserve este documento', 'pie')
+    return r
@@ -0,0 +1,173 @@
+"""
+Rollup diario de pagos y facturas (tabla resumen_diario)
+
+Cada fila está identificada por (fecha, metodo_pago, estado):
+- los pagos acumulan en (día de fecha_pago, metodo_pago, '')
+- las facturas acumulan en (día de fecha_factura, '', estado de la factura)
+
+FacturacionService lo mantiene al día de forma incremental y el comando
+`flask resumen-diario reconciliar` (cron nocturno) lo recalcula desde
+pagos/facturas para corregir cualquier desviación.
+"""
+from datetime import datetime, timedelta
+from app import db
+from sqlalchemy import text
+import click
+
+
+class ResumenDiarioService:
+
+    @staticmethod
+    def _acumular(fecha, metodo_pago='', estado='', cantidad_pagos=0, monto_pagos=0,
+                  cantidad_facturas=0, monto_facturas=0):
+        """Suma (o resta) en la fila del día dentro de la transacción actual"""
+        db.session.execute(text("""
+            INSERT INTO resumen_diario (
+                fecha, metodo_pago, estado, cantidad_pagos, monto_pagos,
+                cantidad_facturas, monto_facturas, actualizado_en
+            ) VALUES (:fecha, :metodo_pago, :estado, :cantidad_pagos, :monto_pagos,
+                      :cantidad_facturas, :monto_facturas, NOW())
+            ON CONFLICT (fecha, metodo_pago, estado) DO UPDATE
+            SET cantidad_pagos = resumen_diario.cantidad_pagos + EXCLUDED.cantidad_pagos,
+                monto_pagos = resumen_diario.monto_pagos + EXCLUDED.monto_pagos,
+                cantidad_facturas = resumen_diario.cantidad_facturas + EXCLUDED.cantidad_facturas,
+                monto_facturas = resumen_diario.monto_facturas + EXCLUDED.monto_facturas,
+                actualizado_en = NOW()
+        """), {
+            'fecha': fecha,
+            'metodo_pago': metodo_pago or '',
+            'estado': estado or '',
+            'cantidad_pagos': cantidad_pagos,
+            'monto_pagos': monto_pagos,
+            'cantidad_facturas': cantidad_facturas,
+            'monto_facturas': monto_facturas
+        })
+
+    @staticmethod
+    def registrar_pago(pago):
+        """Acumular un pago recién insertado (requiere flush previo)"""
+        ResumenDiarioService._acumular(
+            (pago.fecha_pago or datetime.now()).date(),
+            metodo_pago=pago.metodo_pago,
+            cantidad_pagos=1,
+            monto_pagos=pago.monto
+        )
+
+    @staticmethod
+    def registrar_factura(factura):
+        """Acumular una factura nueva en el bucket de su estado"""
+        ResumenDiarioService._acumular(
+            factura.fecha_factura.date(),
+            estado=factura.estado,
+            cantidad_facturas=1,
+            monto_facturas=factura.total
+        )
+
+    @staticmethod
+    def cambiar_estado_factura(factura, estado_anterior):
+        """Mover la factura de bucket cuando cambia su estado"""
+        if estado_anterior == factura.estado:
+            return
+        fecha = factura.fecha_factura.date()
+        ResumenDiarioService._acumular(fecha, estado=estado_anterior,
+                                       cantidad_facturas=-1, monto_facturas=-factura.total)
+        ResumenDiarioService._acumular(fecha, estado=factura.estado,
+                                       cantidad_facturas=1, monto_facturas=factura.total)
+
+    @staticmethod
+    def reconciliar(desde, hasta):
+        """Recalcular los días [desde, hasta] desde las tablas origen"""
+        params = {
+            'desde': desde,
+            'hasta': hasta,
+            'inicio': datetime.combine(desde, datetime.min.time()),
+            'fin': datetime.combine(hasta + timedelta(days=1), datetime.min.time())
+        }
+
+        db.session.execute(text("""
+            DELETE FROM resumen_diario WHERE fecha >= :desde AND fecha <= :hasta
+        """), params)
+        db.session.execute(text("""
+            INSERT INTO resumen_diario (fecha, metodo_pago, estado, cantidad_pagos, monto_pagos)
+            SELECT fecha_pago::date, COALESCE(metodo_pago, ''), '', COUNT(*), COALESCE(SUM(monto), 0)
+            FROM pagos
+            WHERE fecha_pago >= :inicio AND fecha_pago < :fin
+            GROUP BY 1, 2
+        """), params)
+        db.session.execute(text("""
+            INSERT INTO resumen_diario (fecha, metodo_pago, estado, cantidad_facturas, monto_facturas)
+            SELECT fecha_factura::date, '', COALESCE(estado, ''), COUNT(*), COALESCE(SUM(total), 0)
+            FROM facturas
+            WHERE fecha_factura >= :inicio AND fecha_factura < :fin
+            GROUP BY 1, 3
+            ON CONFLICT (fecha, metodo_pago, estado) DO UPDATE
+            SET cantidad_facturas = EXCLUDED.cantidad_facturas,
+                monto_facturas = EXCLUDED.monto_facturas
+        """), params)
+        db.session.commit()
+
+    # ========== LECTURA ==========
+
+    @staticmethod
+    def ingresos_por_dia(desde, hasta):
+        """[(fecha, total, cantidad)] de pagos, solo días con movimiento"""
+        return db.session.execute(text("""
+            SELECT fecha, SUM(monto_pagos), SUM(cantidad_pagos)
+            FROM resumen_diario
+            WHERE fecha >= :desde AND fecha <= :hasta
+            GROUP BY fecha
+            HAVING SUM(cantidad_pagos) > 0
+            ORDER BY fecha
+        """), {'desde': desde, 'hasta': hasta}).fetchall()
+
+    @staticmethod
+    def pagos_por_metodo(desde, hasta):
+        """[(metodo, total, cantidad)] de pagos en el período"""
+        return db.session.execute(text("""
+            SELECT metodo_pago, SUM(monto_pagos), SUM(cantidad_pagos)
+            FROM resumen_diario
+            WHERE fecha >= :desde AND fecha <= :hasta
+            GROUP BY metodo_pago
+            HAVING SUM(cantidad_pagos) > 0
+        """), {'desde': desde, 'hasta': hasta}).fetchall()
+
+    @staticmethod
+    def totales(desde, hasta):
+        """Ingresos y facturación del período en una sola lectura"""
+        fila = db.session.execute(text("""
+            SELECT
+                COALESCE(SUM(monto_pagos), 0),
+                COALESCE(SUM(cantidad_pagos), 0),
+                COALESCE(SUM(monto_facturas) FILTER (WHERE estado != 'anulada'), 0),
+                COALESCE(SUM(cantidad_facturas) FILTER (WHERE estado != 'anulada'), 0),
+                COALESCE(SUM(cantidad_facturas) FILTER (WHERE estado IN ('pendiente', 'parcial')), 0),
+                COALESCE(SUM(cantidad_facturas) FILTER (WHERE estado = 'pagada'), 0)
+            FROM resumen_diario
+            WHERE fecha >= :desde AND fecha <= :hasta
+        """), {'desde': desde, 'hasta': hasta}).first()
+
+        return {
+            'ingresos': float(fila[0]),
+            'cantidad_pagos': int(fila[1]),
+            'facturado': float(fila[2]),
+            'cantidad_facturas': int(fila[3]),
+            'facturas_pendientes': int(fila[4]),
+            'facturas_pagadas': int(fila[5])
+        }
+
+
+@click.group('resumen-diario')
+def resumen_cli():
+    """Mantenimiento de la tabla resumen_diario"""
+
+
+@resumen_cli.command('reconciliar')
+@click.option('--dias', default=3, help='Días hacia atrás a recalcular (incluye hoy)')
+@click.option('--desde', default=None, help='Fecha inicial YYYY-MM-DD (ignora --dias)')
+@click.option('--hasta', default=None, help='Fecha final YYYY-MM-DD')
+def reconciliar_cmd(dias, desde, hasta):
+    """Recalcular el rollup; pensado para ejecutarse cada noche por cron"""
+    hasta_dt = datetime.fromisoformat(hasta).date() if hasta else datetime.now().date()
+    desde_dt = datetime.fromisoformat(desde).date() if desde else hasta_dt - timedelta(days=dias - 1)
+    ResumenDiarioService.reconciliar(desde_dt, hasta_dt)
+    click.echo(f"resumen_diario reconciliado: {desde_dt.isoformat()} a {hasta_dt.isoformat()}")
@@ -0,0 +1,96 @@
+"""
+Conexiones psycopg2 para las rutas con SQL crudo, tomadas del pool del engine
+de SQLAlchemy (SQLALCHEMY_ENGINE_OPTIONS) en lugar de abrir una conexión
+TCP + autenticación por request.
+
+    with conexion() as conn:
+        cur = conn.cursor()
+        ...
+
+get_db_connection() se mantiene para el código existente: close() devuelve la
+conexión al pool y, si una ruta sale antes de cerrarla (return temprano o
+excepción), el teardown del app context la devuelve igual.
+"""
+from contextlib import contextmanager
+from flask import g, has_app_context
+from app import db
+from sqlalchemy import event
+import threading
+import time
+
+_metricas = {'conexiones_nuevas': 0, 'checkouts': 0, 'devueltas_en_teardown': 0, 'espera_ms_total': 0.0}
+_lock = threading.Lock()
+
+
+def _sumar(clave, valor=1):
+    with _lock:
+        _metricas[clave] += valor
+
+
+@contextmanager
+def conexion():
+    """Conexión del pool; se devuelve (con rollback de lo no confirmado) al salir"""
+    conn = _checkout()
+    try:
+        yield conn
+    finally:
+        if conn.dbapi_connection is not None:
+            conn.close()
+
+
+def get_db_connection():
+    """Conexión del pool para rutas con SQL crudo; close() la devuelve al pool"""
+    conn = _checkout()
+    if has_app_context():
+        g.setdefault('_conexiones_pool', []).append(conn)
+    return conn
+
+
+def _checkout():
+    inicio = time.perf_counter()
+    conn = db.engine.raw_connection()
+    _sumar('espera_ms_total', (time.perf_counter() - inicio) * 1000)
+    return conn
+
+
+def devolver_conexiones(exc=None):
+    """Teardown: devolver al pool las conexiones que la ruta no cerró"""
+    for conn in g.pop('_conexiones_pool', []):
+        if conn.dbapi_connection is not None:
+            conn.close()
+            _sumar('devueltas_en_teardown')
+
+
+def metricas_pool():
+    """Estado del pool de este worker"""
+    pool = db.engine.pool
+    with _lock:
+        metricas = dict(_metricas)
+    metricas['espera_ms_promedio'] = round(
+        metricas.pop('espera_ms_total') / metricas['checkouts'], 3
+    ) if metricas['checkouts'] else 0.0
+
+    for nombre in ('size', 'checkedin', 'checkedout', 'overflow'):
+        medida = getattr(pool, nombre, None)
+        metricas[nombre] = medida() if callable(medida) else None
+    metricas['estado'] = pool.status()
+    return metricas
+
+
+def iniciar_pool(app):
+    """Registrar el teardown y los contadores del pool (en create_app)"""
+    app.teardown_appcontext(devolver_conexiones)
+
+    with app.app_context():
+        engine = db.engine
+        if not event.contains(engine, 'connect', _al_conectar):
+            event.listen(engine, 'connect', _al_conectar)
+            event.listen(engine, 'checkout', _al_checkout)
+
+
+def _al_conectar(dbapi_connection, connection_record):
+    _sumar('conexiones_nuevas')
+
+
+def _al_checkout(dbapi_connection, connection_record, connection_proxy):
+    _sumar('checkouts')
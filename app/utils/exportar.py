@@ -0,0 +1,208 @@
+"""
+Exportación de reportes en streaming (csv, xlsx, ndjson)
+
+Las filas se leen con un cursor del servidor (yield_per) y se escriben al
+cliente por lotes, así la memoria del worker no depende del tamaño del reporte.
+"""
+from flask import Response, stream_with_context
+from app import db
+from sqlalchemy import text
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+import csv
+import io
+import json
+import re
+import zipfile
+
+FORMATOS = ('csv', 'xlsx', 'ndjson')
+LOTE = 2000
+
+TIPOS_MIME = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'ndjson': 'application/x-ndjson'
+}
+
+# Caracteres de control que XML 1.0 no admite
+_XML_INVALIDO = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def consultar_stream(sql, params=None, lote=LOTE):
+    """Iterar las filas de una consulta con cursor del servidor"""
+    conn = db.engine.connect()
+    try:
+        resultado = conn.execution_options(yield_per=lote).execute(text(sql), params or {})
+        for fila in resultado:
+            yield tuple(fila)
+    finally:
+        conn.close()
+
+
+def _valor_texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _valor_json(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def _generar_csv(columnas, filas):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel respete los acentos
+    buffer.write('﻿')
+    writer.writerow(columnas)
+
+    for i, fila in enumerate(filas, 1):
+        writer.writerow([_valor_texto(v) for v in fila])
+        if i % LOTE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def _generar_ndjson(columnas, filas):
+    lineas = []
+    for fila in filas:
+        lineas.append(json.dumps(
+            {c: _valor_json(v) for c, v in zip(columnas, fila)}, ensure_ascii=False
+        ))
+        if len(lineas) == LOTE:
+            yield '\n'.join(lineas) + '\n'
+            lineas = []
+    if lineas:
+        yield '\n'.join(lineas) + '\n'
+
+
+# ========== XLSX ==========
+
+class _Salida:
+    """Destino del zip sin seek(): zipfile usa data descriptors y podemos vaciarlo por partes"""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _celda(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_XML_INVALIDO.sub('', _valor_texto(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(valores):
+    return '<row>' + ''.join(_celda(v) for v in valores) + '</row>'
+
+
+def _generar_xlsx(columnas, filas, hoja='Reporte'):
+    salida = _Salida()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _RELS)
+        zf.writestr('xl/workbook.xml', _WORKBOOK.format(hoja=escape(hoja[:31])))
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja_xml:
+            hoja_xml.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _fila_xml(columnas)
+            ).encode('utf-8'))
+
+            lineas = []
+            for fila in filas:
+                lineas.append(_fila_xml(fila))
+                if len(lineas) == LOTE:
+                    hoja_xml.write(''.join(lineas).encode('utf-8'))
+                    lineas = []
+                    yield salida.vaciar()
+
+            hoja_xml.write((''.join(lineas) + '</sheetData></worksheet>').encode('utf-8'))
+
+    yield salida.vaciar()
+
+
+def respuesta_exportada(formato, nombre, columnas, filas):
+    """Response en streaming para `formato`; `filas` es un iterable de tuplas"""
+    if formato == 'csv':
+        cuerpo = _generar_csv(columnas, filas)
+    elif formato == 'xlsx':
+        cuerpo = _generar_xlsx(columnas, filas)
+    else:
+        cuerpo = _generar_ndjson(columnas, filas)
+
+    return Response(
+        stream_with_context(cuerpo),
+        mimetype=TIPOS_MIME[formato],
+        headers={
+            'Content-Disposition': f'attachment; filename={nombre}.{formato}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
@@ -0,0 +1,163 @@
+"""
+Paginación por cursor (keyset) para los listados
+
+El cursor es opaco para el cliente: codifica la clave de orden (fecha, id) de la
+última fila devuelta, así cualquier página cuesta lo mismo que la primera
+(sin OFFSET). El total es opcional: por defecto se estima con pg_class.reltuples
+y con ?total=exacto se ejecuta el COUNT(*).
+
+La fecha puede ser NULL. Se respeta el orden natural de PostgreSQL (y de los
+índices): NULL va primero en DESC y último en ASC, así que el filtro del
+cursor tiene una rama explícita para las filas sin fecha; una comparación
+de tuplas con NULL no devuelve nada y cortaba el listado.
+
+Los clientes anteriores que mandan ?page (sin ?cursor) siguen recibiendo esa
+página (con OFFSET) y los campos pages/current_page.
+"""
+from flask import request
+from app import db
+from sqlalchemy import text, tuple_, or_, and_
+from datetime import datetime
+import base64
+import json
+
+
+def codificar_cursor(fecha, id_):
+    """Cursor opaco a partir de la clave de la última fila"""
+    datos = json.dumps([fecha.isoformat() if fecha else None, id_])
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """(fecha, id) del cursor; ValueError si no es válido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha, id_ = json.loads(base64.urlsafe_b64decode((cursor + relleno).encode()))
+        return (datetime.fromisoformat(fecha) if fecha else None), int(id_)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('Cursor inválido')
+
+
+def parametros_keyset(limite_defecto=50, limite_maximo=100):
+    """(limite, cursor decodificado o None) desde ?limit/?per_page y ?cursor"""
+    try:
+        limite = int(request.args.get('limit', request.args.get('per_page', limite_defecto)))
+    except (ValueError, TypeError):
+        limite = limite_defecto
+    limite = min(limite_maximo, max(1, limite))
+
+    cursor = request.args.get('cursor')
+    return limite, (decodificar_cursor(cursor) if cursor else None)
+
+
+def pagina_solicitada():
+    """?page de los clientes anteriores al cursor; None si no vino o vino ?cursor"""
+    if request.args.get('cursor') or 'page' not in request.args:
+        return None
+    try:
+        return max(1, int(request.args['page']))
+    except (ValueError, TypeError):
+        return 1
+
+
+def campos_pagina(total, limite, pagina):
+    """pages/current_page como en la respuesta paginada anterior"""
+    return {
+        'pages': -(-total // limite) if total is not None else None,
+        'current_page': pagina or (None if request.args.get('cursor') else 1)
+    }
+
+
+def recortar_pagina(filas, limite, clave):
+    """Separar la fila extra (se piden limite + 1) y armar el siguiente cursor"""
+    if len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    return filas, codificar_cursor(*clave(filas[-1]))
+
+
+def paginar_query(query, columna_fecha, columna_id, limite, cursor, descendente=True, pagina=None):
+    """Aplicar keyset a una consulta ORM; devuelve (items, siguiente_cursor)
+
+    Con pagina (cliente con ?page) se salta con OFFSET; el cursor devuelto
+    sirve igual para seguir.
+    """
+    if cursor:
+        fecha, id_ = cursor
+        if fecha is None:
+            # Dentro del bloque de fechas NULL: seguir por id, luego (DESC) las fechadas
+            en_nulos = and_(columna_fecha.is_(None), columna_id < id_ if descendente else columna_id > id_)
+            query = query.filter(or_(en_nulos, columna_fecha.isnot(None)) if descendente else en_nulos)
+        else:
+            clave = tuple_(columna_fecha, columna_id)
+            query = query.filter(clave < tuple_(*cursor) if descendente
+                                 else or_(clave > tuple_(*cursor), columna_fecha.is_(None)))
+
+    if descendente:
+        query = query.order_by(columna_fecha.desc().nullsfirst(), columna_id.desc())
+    else:
+        query = query.order_by(columna_fecha.asc().nullslast(), columna_id.asc())
+
+    if pagina and not cursor:
+        query = query.offset((pagina - 1) * limite)
+    items = query.limit(limite + 1).all()
+    return recortar_pagina(
+        items, limite, lambda item: (getattr(item, columna_fecha.key), getattr(item, columna_id.key))
+    )
+
+
+def filtro_keyset(columna_fecha, columna_id, cursor, descendente=True, estilo='text'):
+    """Fragmento WHERE y parámetros para SQL crudo
+
+    estilo='text' usa :nombre (sqlalchemy.text), 'psycopg2' usa %(nombre)s.
+    Sin cursor devuelve 'TRUE' para poder anteponer siempre AND. La consulta
+    debe ordenar con orden_keyset (NULL primero en DESC, último en ASC).
+    """
+    if not cursor:
+        return 'TRUE', {}
+    if estilo == 'psycopg2':
+        fecha, id_ = '%(cursor_fecha)s', '%(cursor_id)s'
+    else:
+        fecha, id_ = ':cursor_fecha', ':cursor_id'
+    operador = '<' if descendente else '>'
+    if cursor[0] is None:
+        en_nulos = f'({columna_fecha} IS NULL AND {columna_id} {operador} {id_})'
+        filtro = f'({en_nulos} OR {columna_fecha} IS NOT NULL)' if descendente else en_nulos
+        return filtro, {'cursor_id': cursor[1]}
+    filtro = f'({columna_fecha}, {columna_id}) {operador} ({fecha}, {id_})'
+    if not descendente:
+        filtro = f'({filtro} OR {columna_fecha} IS NULL)'
+    return filtro, {'cursor_fecha': cursor[0], 'cursor_id': cursor[1]}
+
+
+def orden_keyset(columna_fecha, columna_id, descendente=True):
+    """ORDER BY que corresponde a filtro_keyset"""
+    if descendente:
+        return f'{columna_fecha} DESC NULLS FIRST, {columna_id} DESC'
+    return f'{columna_fecha} ASC NULLS LAST, {columna_id} ASC'
+
+
+def estimar_total(tabla):
+    """Filas aproximadas según las estadísticas del planner (sin recorrer la tabla)"""
+    estimado = db.session.execute(text("""
+        SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:tabla)
+    """), {'tabla': tabla}).scalar()
+    # -1 = tabla nunca analizada
+    return max(0, int(estimado)) if estimado is not None else None
+
+
+def total_listado(tabla, contar=None, filtrado=False):
+    """Total para la respuesta según ?total: 'exacto', 'no' o estimado (defecto)
+
+    `contar` es una consulta ORM o una función que devuelve el COUNT exacto.
+    Con filtros activos el estimado de la tabla no sirve, así que se omite.
+    """
+    # Con ?page el cliente espera el total exacto de antes
+    modo = request.args.get('total', 'exacto' if pagina_solicitada() else 'estimado')
+    if modo == 'no':
+        return None, False
+    if modo == 'exacto' and contar is not None:
+        return (contar() if callable(contar) else contar.order_by(None).count()), False
+    if filtrado:
+        return None, False
+    return estimar_total(tabla), True
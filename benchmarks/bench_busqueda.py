@@ -0,0 +1,98 @@
+"""
+Benchmark de /api/busqueda/global: siete ILIKE '%termino%' (implementación
+anterior) contra BusquedaService con índices pg_trgm.
+
+    python benchmarks/bench_busqueda.py --seed 500000   # sembrar 500k pacientes
+    python benchmarks/bench_busqueda.py                  # medir
+    python benchmarks/bench_busqueda.py --limpiar        # borrar datos BENCH
+"""
+import argparse
+
+from comun import crear_app, contar_queries, medir, imprimir
+
+
+SEED_SQL = """
+    INSERT INTO pacientes (nombre, apellido, cedula, telefono, email, estado, created_at)
+    SELECT
+        (ARRAY['José', 'María', 'Juan', 'Ana', 'Luis', 'Carmen', 'Pedro', 'Rosa',
+               'Ramón', 'Altagracia', 'Francisco', 'Yolanda', 'Rafael', 'Mercedes'])[1 + g % 14],
+        (ARRAY['Pérez', 'Rodríguez', 'Gómez', 'Martínez', 'Núñez', 'Peña', 'Reyes',
+               'Santana', 'Báez', 'Jiménez', 'Almonte', 'De la Cruz'])[1 + (g / 14) % 12]
+            || ' BENCH',
+        lpad((g % 1000)::text, 3, '0') || '-' || lpad(g::text, 7, '0') || '-' || (g % 10),
+        '809' || lpad(g::text, 7, '0'),
+        'paciente' || g || '@bench.local',
+        'activo',
+        NOW() - (g % 365) * INTERVAL '1 day'
+    FROM generate_series(1, :pacientes) g;
+
+    ANALYZE pacientes;
+"""
+
+LIMPIAR_SQL = "DELETE FROM pacientes WHERE apellido LIKE '% BENCH'"
+
+TERMINOS = ['jose perez', 'nunez', 'Peña', '0012345', '8090042', 'altagr', 'rodrigez', 'bench.local']
+
+
+def pacientes_legado(termino):
+    """Patrón anterior: OR de siete ILIKE con comodín inicial"""
+    from app.models import Paciente
+    from sqlalchemy import or_
+
+    search = f'%{termino}%'
+    return Paciente.query.filter(
+        or_(
+            Paciente.nombre.ilike(search),
+            Paciente.apellido.ilike(search),
+            Paciente.cedula.ilike(search),
+            Paciente.telefono.ilike(search),
+            Paciente.celular.ilike(search),
+            Paciente.email.ilike(search),
+            Paciente.codigo_paciente.ilike(search)
+        )
+    ).limit(10).all()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, metavar='PACIENTES', help='sembrar N pacientes de prueba')
+    parser.add_argument('--limpiar', action='store_true')
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    app = crear_app()
+    with app.app_context():
+        from app import db
+        from app.services.busqueda_service import BusquedaService
+        from sqlalchemy import text
+
+        if args.limpiar:
+            db.session.execute(text(LIMPIAR_SQL))
+            db.session.commit()
+            print('Datos BENCH eliminados')
+            return
+
+        if args.seed:
+            db.session.execute(text(SEED_SQL), {'pacientes': args.seed})
+            db.session.commit()
+            print(f'Sembrados {args.seed} pacientes')
+
+        pacientes = db.session.execute(text('SELECT COUNT(*) FROM pacientes')).scalar()
+        print(f'pacientes en la base: {pacientes}')
+
+        for termino in TERMINOS:
+            casos = [
+                ('ILIKE legado', lambda: pacientes_legado(termino)),
+                ('trigramas', lambda: BusquedaService.buscar_pacientes(termino)),
+            ]
+            for nombre, funcion in casos:
+                with contar_queries(db.engine) as contador:
+                    encontrados = len(funcion())
+                stats = medir(funcion, args.repeticiones)
+                imprimir(f'{termino[:14]:<14} {nombre}', stats,
+                         queries=contador['queries'], resultados=encontrados)
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
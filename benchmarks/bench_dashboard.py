@@ -0,0 +1,130 @@
+"""
+Benchmark de /api/reportes/dashboard: implementación anterior (una consulta
+por KPI) contra DashboardService.resumen().
+
+    python benchmarks/bench_dashboard.py --seed 1000000   # sembrar 1M pagos
+    python benchmarks/bench_dashboard.py                   # medir
+    python benchmarks/bench_dashboard.py --limpiar         # borrar datos BENCH
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from comun import crear_app, contar_queries, medir, imprimir
+
+
+SEED_SQL = """
+    INSERT INTO pacientes (nombre, apellido, estado, created_at)
+    SELECT 'BENCH', 'Paciente ' || g, 'activo', NOW() - (g % 365) * INTERVAL '1 day'
+    FROM generate_series(1, :pacientes) g;
+
+    INSERT INTO facturas (numero_factura, paciente_id, fecha_factura, subtotal,
+                          descuento, itbis, total, estado)
+    SELECT 'BENCH-' || g,
+           (SELECT MIN(id) FROM pacientes WHERE nombre = 'BENCH'),
+           NOW() - (g % 365) * INTERVAL '1 day',
+           1000, 0, 0, 1000,
+           (ARRAY['pendiente', 'parcial', 'pagada', 'anulada'])[1 + g % 4]
+    FROM generate_series(1, :facturas) g;
+
+    INSERT INTO pagos (factura_id, monto, metodo_pago, fecha_pago)
+    SELECT f.id, 250,
+           (ARRAY['efectivo', 'tarjeta', 'transferencia', 'cheque'])[1 + g % 4],
+           f.fecha_factura + (g % 3) * INTERVAL '1 hour'
+    FROM generate_series(1, :pagos) g
+    JOIN facturas f ON f.numero_factura = 'BENCH-' || (1 + g % :facturas);
+
+    ANALYZE pacientes; ANALYZE facturas; ANALYZE pagos;
+"""
+
+LIMPIAR_SQL = """
+    DELETE FROM pagos WHERE factura_id IN (SELECT id FROM facturas WHERE numero_factura LIKE 'BENCH-%');
+    DELETE FROM facturas WHERE numero_factura LIKE 'BENCH-%';
+    DELETE FROM pacientes WHERE nombre = 'BENCH';
+"""
+
+
+def dashboard_legado():
+    """Patrón anterior: un .count()/SUM por KPI y sumas en Python"""
+    from app import db
+    from app.models import Factura, Orden, Paciente, Pago
+    from sqlalchemy import func
+
+    hoy = datetime.now().date()
+    inicio_mes = hoy.replace(day=1)
+    inicio_semana = hoy - timedelta(days=hoy.weekday())
+
+    Paciente.query.filter_by(estado='activo').count()
+    Paciente.query.filter(func.date(Paciente.created_at) == hoy).count()
+    Paciente.query.filter(Paciente.created_at >= inicio_mes).count()
+    Orden.query.filter(Orden.estado.in_(['pendiente', 'en_proceso'])).count()
+    Orden.query.filter(func.date(Orden.fecha_orden) == hoy).count()
+    Orden.query.filter(Orden.fecha_orden >= inicio_mes).count()
+
+    facturas_mes = Factura.query.filter(
+        Factura.fecha_factura >= inicio_mes, Factura.estado != 'anulada'
+    ).all()
+    sum(float(f.total) for f in facturas_mes)
+
+    suma = db.session.query(func.coalesce(func.sum(Pago.monto), 0))
+    suma.filter(func.date(Pago.fecha_pago) == hoy).scalar()
+    suma.filter(Pago.fecha_pago >= inicio_mes).scalar()
+    suma.filter(Pago.fecha_pago >= inicio_semana).scalar()
+
+    for f in Factura.query.filter(Factura.estado.in_(['pendiente', 'parcial'])).all():
+        sum(float(p.monto) for p in f.pagos)
+
+    for i in range(6, -1, -1):
+        suma.filter(func.date(Pago.fecha_pago) == hoy - timedelta(days=i)).scalar()
+
+    db.session.query(Pago.metodo_pago, func.sum(Pago.monto), func.count(Pago.id)).filter(
+        Pago.fecha_pago >= inicio_mes
+    ).group_by(Pago.metodo_pago).all()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, metavar='PAGOS', help='sembrar N pagos de prueba')
+    parser.add_argument('--limpiar', action='store_true')
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--sin-legado', action='store_true',
+                        help='omitir la versión anterior (lenta con 1M pagos)')
+    args = parser.parse_args()
+
+    app = crear_app()
+    with app.app_context():
+        from app import db
+        from app.services.dashboard_service import DashboardService
+        from sqlalchemy import text
+
+        if args.limpiar:
+            db.session.execute(text(LIMPIAR_SQL))
+            db.session.commit()
+            print('Datos BENCH eliminados')
+            return
+
+        if args.seed:
+            db.session.execute(text(SEED_SQL), {
+                'pagos': args.seed,
+                'facturas': max(1, args.seed // 4),
+                'pacientes': max(1, args.seed // 20),
+            })
+            db.session.commit()
+            print(f'Sembrados {args.seed} pagos')
+
+        pagos = db.session.execute(text('SELECT COUNT(*) FROM pagos')).scalar()
+        print(f'pagos en la base: {pagos}')
+
+        casos = [('DashboardService.resumen', DashboardService.resumen)]
+        if not args.sin_legado:
+            casos.insert(0, ('dashboard legado', dashboard_legado))
+
+        for nombre, funcion in casos:
+            with contar_queries(db.engine) as contador:
+                funcion()
+            db.session.rollback()
+            stats = medir(lambda: (funcion(), db.session.rollback()), args.repeticiones)
+            imprimir(nombre, stats, queries=contador['queries'])
+
+
+if __name__ == '__main__':
+    main()
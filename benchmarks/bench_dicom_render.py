@@ -0,0 +1,151 @@
+"""
+Render de una serie DICOM a imagen: el convert_dicom_to_png anterior
+(float64, normalización mínimo/máximo, tres copias por cuadro) contra
+dicom_render (float32 in-place con LUT de modalidad y ventana) y el costo de
+servir una vista ya cacheada.
+
+No necesita base de datos ni archivos DICOM: genera una serie CT sintética
+int16 (--cuadros x --lado x --lado) con RescaleIntercept -1024. Si pydicom
+está instalado la guarda además como un DICOM multi-frame y mide
+CacheRender.generar (fallo de caché de un cuadro: solo ese cuadro se
+decodifica) contra decodificar el volumen completo con ds.pixel_array.
+
+    python benchmarks/bench_dicom_render.py --cuadros 300 --lado 512
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from comun import medir, imprimir
+
+
+def serie_ct(cuadros, lado):
+    """Volumen int16 con un 'cuerpo' circular (agua ~1024) sobre aire (0)"""
+    y, x = np.ogrid[:lado, :lado]
+    cuerpo = ((x - lado / 2) ** 2 + (y - lado / 2) ** 2) < (lado * 0.4) ** 2
+    generador = np.random.default_rng(0)
+    volumen = generador.integers(0, 60, size=(cuadros, lado, lado), dtype=np.int16)
+    volumen[:, cuerpo] += 1000
+    return volumen
+
+
+def anterior(pixeles):
+    """Copia del pipeline previo de DICOMService.convert_dicom_to_png"""
+    pixel_array = pixeles - np.min(pixeles)
+    pixel_array = pixel_array / np.max(pixel_array)
+    pixel_array = (pixel_array * 255).astype(np.uint8)
+    return Image.fromarray(pixel_array)
+
+
+def guardar_multiframe(volumen, ruta):
+    """Volumen int16 como un DICOM multi-frame sin comprimir"""
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.2.1'  # Enhanced CT
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = 'CT'
+    ds.NumberOfFrames = volumen.shape[0]
+    ds.Rows, ds.Columns = volumen.shape[1:]
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.BitsAllocated = ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 1
+    ds.RescaleSlope, ds.RescaleIntercept = 1, -1024
+    ds.WindowCenter, ds.WindowWidth = 40, 400
+    ds.PixelData = volumen.tobytes()
+    ds.save_as(ruta, enforce_file_format=True)
+
+
+def medir_memoria(funcion):
+    """(segundos, pico de memoria en MB) de una llamada"""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    funcion()
+    duracion = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duracion, pico / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cuadros', type=int, default=300)
+    parser.add_argument('--lado', type=int, default=512)
+    parser.add_argument('--repeticiones', type=int, default=50)
+    args = parser.parse_args()
+
+    from app.services.dicom_render import (
+        CacheRender, RESOLUCIONES, ventana, reducir, codificar
+    )
+
+    volumen = serie_ct(args.cuadros, args.lado)
+    params = dict(pendiente=1.0, intercepto=-1024.0, centro=40.0, ancho=400.0)
+    indice = args.cuadros // 2
+
+    casos = [
+        ('anterior (float64 min/max)', lambda: anterior(volumen[indice])),
+        ('ventana (float32 in-place)', lambda: Image.fromarray(ventana(volumen[indice], **params), 'L')),
+    ]
+    for nombre, funcion in casos:
+        imprimir(nombre, medir(funcion, args.repeticiones))
+
+    imagen = Image.fromarray(ventana(volumen[indice], **params), 'L')
+    imprimir('codificar png completa', medir(lambda: codificar(imagen), args.repeticiones))
+    imprimir('miniatura 256 png', medir(lambda: codificar(reducir(imagen, 256)), args.repeticiones))
+
+    # Serie completa: las tres resoluciones de cada cuadro, como en un fallo de caché
+    raiz = tempfile.mkdtemp(prefix='bench_render_')
+    try:
+        cache = CacheRender(raiz)
+        inicio = time.perf_counter()
+        for i in range(args.cuadros):
+            vista = Image.fromarray(ventana(volumen[i], **params), 'L')
+            for resolucion, lado in sorted(RESOLUCIONES.items(), key=lambda r: -(r[1] or 10 ** 9)):
+                vista = reducir(vista, lado)
+                cache._escribir(cache.ruta('1.2.3', i, None, None, resolucion), codificar(vista))
+        duracion = time.perf_counter() - inicio
+        print(f"serie {args.cuadros}x{args.lado}x{args.lado}: {duracion:.2f}s "
+              f"({args.cuadros / duracion:.0f} cuadros/s, 3 resoluciones)")
+
+        # Acierto de caché: sin leer el DICOM ni tocar píxeles
+        def acierto():
+            for i in range(args.cuadros):
+                cache.obtener('1.2.3', None, i, resolucion='miniatura')
+        imprimir(f'cache hit x{args.cuadros}', medir(acierto, 20))
+
+        try:
+            import pydicom
+        except ImportError as e:
+            print(f"generar desde archivo omitido: {e}")
+            return
+        ruta = os.path.join(raiz, 'serie.dcm')
+        guardar_multiframe(volumen, ruta)
+
+        def volumen_completo():
+            ds = pydicom.dcmread(ruta)
+            return ds.pixel_array[indice]
+
+        for nombre, funcion in (('volumen completo (ds.pixel_array)', volumen_completo),
+                                ('CacheRender.generar (un cuadro)', lambda: cache.generar('4.5.6', ruta, indice))):
+            duracion, pico = medir_memoria(funcion)
+            print(f"{nombre}: {duracion * 1000:.1f}ms pico={pico:.0f}MB")
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Recibos de 80 mm (recibos.py) en ESC/POS y en PDF, y envío por TCP 9100 a
+una impresora simulada en este proceso (un socket que recibe y cuenta bytes).
+
+No necesita base de datos; usa factura/pago/orden sintéticos y datos del
+centro fijos (el encabezado se maqueta una sola vez). Con --detalles 60 se
+ve que la factura larga crece de alto en vez de salirse de la página.
+
+    python benchmarks/bench_escpos.py --detalles 8
+
+Con --servir solo levanta la impresora simulada, para probar la app con
+IMPRESORAS_TERMICAS=prueba=127.0.0.1:9100 y ?format=escpos&impresora=prueba
+(guarda cada ticket recibido en --salida):
+
+    python benchmarks/bench_escpos.py --servir --puerto 9100 --salida /tmp/tickets
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from comun import medir, imprimir
+
+EMPRESA = {'version': 0, 'nombre': 'MI ESPERANZA CENTRO DIAGNÓSTICO', 'rnc': '000-00000-0',
+           'telefono': '809-000-0000', 'direccion': 'Calle Principal #1, Santo Domingo'}
+
+
+class ImpresoraSimulada:
+    """Servidor TCP que acepta conexiones raw como una impresora de red"""
+
+    def __init__(self, puerto=0, salida=None):
+        self.socket = socket.create_server(('127.0.0.1', puerto))
+        self.puerto = self.socket.getsockname()[1]
+        self.salida = salida
+        self.recibidos = []
+        self._hilo = threading.Thread(target=self._atender, daemon=True)
+        self._hilo.start()
+
+    def _atender(self):
+        while True:
+            try:
+                conexion, _ = self.socket.accept()
+            except OSError:
+                return
+            with conexion:
+                partes = []
+                while True:
+                    bloque = conexion.recv(65536)
+                    if not bloque:
+                        break
+                    partes.append(bloque)
+            datos = b''.join(partes)
+            self.recibidos.append(datos)
+            if self.salida:
+                with open(os.path.join(self.salida, f'ticket_{len(self.recibidos):05d}.bin'), 'wb') as f:
+                    f.write(datos)
+
+    def cerrar(self):
+        self.socket.close()
+
+
+def documentos_sinteticos(detalles):
+    paciente = SimpleNamespace(nombre='Juan', apellido='Pérez', cedula='001-0000000-1',
+                               telefono='809-555-0101', seguro_medico='SENASA')
+    ahora = datetime.now()
+    pagos = [SimpleNamespace(monto=1000.0, metodo_pago='efectivo', referencia=None, fecha_pago=ahora)]
+    lineas = [SimpleNamespace(descripcion=f'Estudio de laboratorio número {i}', total=850.0 + i)
+              for i in range(detalles)]
+    subtotal = sum(d.total for d in lineas)
+    factura = SimpleNamespace(numero_factura='FAC-000123', ncf='B0200000123', fecha_factura=ahora,
+                              forma_pago='efectivo', paciente=paciente, detalles=lineas, pagos=pagos,
+                              subtotal=subtotal, descuento=0.0, itbis=0.0, total=subtotal)
+    orden = SimpleNamespace(numero_orden='ORD-000123', paciente=paciente, fecha_orden=ahora,
+                            medico_referente='Dra. Gómez',
+                            detalles=[SimpleNamespace(estudio=SimpleNamespace(nombre=d.descripcion),
+                                                      precio_final=d.total) for d in lineas])
+    return factura, pagos[0], orden
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--detalles', type=int, default=8)
+    parser.add_argument('--servir', action='store_true')
+    parser.add_argument('--puerto', type=int, default=9100)
+    parser.add_argument('--salida')
+    args = parser.parse_args()
+
+    if args.servir:
+        if args.salida:
+            os.makedirs(args.salida, exist_ok=True)
+        impresora = ImpresoraSimulada(args.puerto, args.salida)
+        print(f"impresora simulada en 127.0.0.1:{impresora.puerto} (Ctrl+C para salir)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            impresora.cerrar()
+        return
+
+    from app.services import escpos, recibos
+
+    factura, pago, orden = documentos_sinteticos(args.detalles)
+    casos = {
+        'recibo_pago': lambda: recibos.recibo_pago(factura, pago, EMPRESA),
+        'ticket_orden': lambda: recibos.ticket_orden(orden, EMPRESA),
+        'factura_80mm': lambda: recibos.factura_80mm(factura, EMPRESA)
+    }
+    for nombre, recibo in casos.items():
+        imprimir(f'escpos {nombre}', medir(lambda: recibos.a_escpos(recibo()), 500),
+                 bytes=len(recibos.a_escpos(recibo())))
+
+    # Los mismos recibos en PDF, si reportlab está instalado
+    try:
+        import reportlab  # noqa: F401
+    except ImportError as e:
+        print(f"PDF omitido: {e}")
+    else:
+        from app.services.recibos import BackendPDF
+
+        backend = BackendPDF()
+        for nombre, recibo in casos.items():
+            imprimir(f'pdf maquetar {nombre}', medir(lambda: backend.maquetar(recibo()), 200),
+                     alto_mm=round(backend.maquetar(recibo()).alto / recibos.MM))
+            imprimir(f'pdf {nombre}', medir(lambda: recibos.a_pdf(recibo()), 50),
+                     bytes=len(recibos.a_pdf(recibo())))
+
+    impresora = ImpresoraSimulada()
+    try:
+        datos = recibos.a_escpos(recibos.factura_80mm(factura, EMPRESA))
+        imprimir('envío TCP 9100 (local)',
+                 medir(lambda: escpos.enviar_a_impresora('127.0.0.1', impresora.puerto, datos), 200))
+        time.sleep(0.1)
+        print(f"impresora simulada: {len(impresora.recibidos)} tickets, "
+              f"último íntegro={impresora.recibidos[-1] == datos}")
+    finally:
+        impresora.cerrar()
+
+
+if __name__ == '__main__':
+    main()
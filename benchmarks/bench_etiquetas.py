@@ -0,0 +1,63 @@
+"""
+Lote de etiquetas de muestra: --etiquetas en un solo documento por formato
+(zpl, escpos, pdf) y, para comparar, un PDF por etiqueta como hacía
+/etiqueta/<orden>/<detalle>. --codigos es cuántos pacientes distintos hay
+en el lote (cuántos Code128 hay que construir).
+
+No necesita base de datos.
+
+    python benchmarks/bench_etiquetas.py --etiquetas 1000 --codigos 80
+"""
+import argparse
+import time
+
+from comun import medir, imprimir
+
+
+def etiquetas_sinteticas(cantidad, codigos):
+    from app.services.etiquetas import Etiqueta
+
+    return [Etiqueta(f"P{n % codigos:06d}", f"Paciente de prueba {n % codigos}", f"ORD-{n // 12:06d}",
+                     f"Estudio de laboratorio {n % 12}", '17/10/26') for n in range(cantidad)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--etiquetas', type=int, default=1000)
+    parser.add_argument('--codigos', type=int, default=80)
+    args = parser.parse_args()
+
+    from app.services import etiquetas
+
+    lista = etiquetas_sinteticas(args.etiquetas, args.codigos)
+    for formato in ('zpl', 'escpos'):
+        generar = etiquetas.FORMATOS[formato][0]
+        imprimir(f'{formato} x{args.etiquetas}', medir(lambda: generar(lista), 20), bytes=len(generar(lista)))
+
+    try:
+        import reportlab  # noqa: F401
+    except ImportError as e:
+        print(f"PDF omitido: {e}")
+        return
+
+    etiquetas._barcodes.clear()
+    inicio = time.perf_counter()
+    pdf = etiquetas.etiquetas_pdf(lista)
+    print(f"pdf x{args.etiquetas} (caché de barcodes fría): {(time.perf_counter() - inicio) * 1000:.1f}ms "
+          f"bytes={len(pdf)}")
+    imprimir(f'pdf x{args.etiquetas} (caliente)', medir(lambda: etiquetas.etiquetas_pdf(lista), 5),
+             bytes=len(pdf))
+
+    # Como antes: un PDF y un Code128 nuevo por etiqueta
+    def uno_por_etiqueta():
+        for e in lista:
+            etiquetas._barcodes.clear()
+            etiquetas.etiquetas_pdf([e])
+
+    inicio = time.perf_counter()
+    uno_por_etiqueta()
+    print(f"pdf uno por etiqueta x{args.etiquetas}: {(time.perf_counter() - inicio) * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Throughput del parseo de resultados HL7: HL7Service.parse_hl7_file (árbol
+completo de hl7apy) contra HL7Service.parse_hl7_rapido (hl7_rapido).
+
+No necesita base de datos; genera mensajes ORU^R01 con --obx resultados.
+
+    python benchmarks/bench_hl7.py --mensajes 2000 --obx 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from comun import medir, imprimir
+
+
+def mensaje_oru(numero, obx):
+    segmentos = [
+        f'MSH|^~\\&|ANALIZADOR|LAB|CENTRO|CD|20260101120000||ORU^R01|MSG{numero:06d}|P|2.5',
+        f'PID|1||{100000 + numero}^^^CD||PEREZ^JUAN||19800101|M',
+        f'OBR|1|ORD-{numero:06d}||HEMO^Hemograma|||20260101110000',
+    ]
+    for i in range(1, obx + 1):
+        segmentos.append(f'OBX|{i}|NM|T{i:03d}^Prueba {i}||{i * 1.5:.1f}|mg/dL|1.0-99.0|N|||F')
+    return '\r'.join(segmentos) + '\r'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mensajes', type=int, default=2000)
+    parser.add_argument('--obx', type=int, default=20)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    from app.services.hl7_service import HL7Service
+
+    with tempfile.NamedTemporaryFile('w', suffix='.hl7', delete=False) as f:
+        f.write(mensaje_oru(1, args.obx))
+        ruta = f.name
+
+    def rapido():
+        with open(ruta, 'r') as archivo:
+            return HL7Service.parse_hl7_rapido(archivo.read())
+
+    try:
+        lento, nuevo = HL7Service.parse_hl7_file(ruta), rapido()
+        assert [r['value'] for r in lento['results']] == [r['value'] for r in nuevo['results']]
+
+        casos = [('parse_hl7_file (hl7apy)', lambda: HL7Service.parse_hl7_file(ruta)),
+                 ('parse_hl7_rapido', rapido)]
+        for nombre, funcion in casos:
+            imprimir(nombre, medir(funcion, args.repeticiones))
+
+        mensajes = [mensaje_oru(n, args.obx) for n in range(args.mensajes)]
+        from app.services.hl7_rapido import parsear_oru
+        inicio = time.perf_counter()
+        for texto in mensajes:
+            parsear_oru(texto)
+        duracion = time.perf_counter() - inicio
+        print(f"parsear_oru: {args.mensajes / duracion:.0f} mensajes/s "
+              f"({args.mensajes * args.obx / duracion:.0f} OBX/s)")
+    finally:
+        os.remove(ruta)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Ingesta de resultados: un SELECT + INSERT + commit por resultado (como hacían
+los endpoints de máquinas) contra insertar_lote(), que resuelve todas las
+órdenes en una consulta y hace un único INSERT con execute_values.
+
+Usa órdenes existentes de la base de pruebas; los resultados creados llevan
+'BENCH' en el nombre de archivo y se borran al terminar.
+
+    python benchmarks/bench_ingesta.py --resultados 10000
+"""
+import argparse
+import time
+
+from comun import crear_app
+
+ARCHIVO = 'resultado_BENCH.json'
+
+
+def items_prueba(cur, cantidad):
+    cur.execute("SELECT DISTINCT orden_id, o.paciente_id FROM orden_detalles d "
+                "JOIN ordenes o ON o.id = d.orden_id LIMIT 500")
+    ordenes = cur.fetchall()
+    if not ordenes:
+        raise SystemExit('La base de pruebas no tiene órdenes con detalles')
+    return [('json', {
+        'paciente_id': ordenes[i % len(ordenes)][1],
+        'orden_id': ordenes[i % len(ordenes)][0],
+        'tipo_estudio': 'BENCH',
+        'valores': {'glucosa': 90 + i % 40, 'unidad': 'mg/dL'}
+    }) for i in range(cantidad)]
+
+
+def por_item(conn, items):
+    """Implementación anterior: una transacción por resultado"""
+    cur = conn.cursor()
+    for _, payload in items:
+        cur.execute("SELECT id FROM orden_detalles WHERE orden_id = %s ORDER BY id DESC LIMIT 1",
+                    (payload['orden_id'],))
+        orden_detalle_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO resultados
+            (orden_detalle_id, tipo_archivo, nombre_archivo, datos_dicom, estado_validacion,
+             fecha_importacion, created_at)
+            VALUES (%s, 'json', %s, %s, 'pendiente', NOW(), NOW())
+        """, (orden_detalle_id, ARCHIVO, '{}'))
+        conn.commit()
+    cur.close()
+
+
+def en_lote(conn, items):
+    from app.services.cola_ingesta import insertar_lote
+    cur = conn.cursor()
+    estados = insertar_lote(cur, items)
+    conn.commit()
+    cur.close()
+    errores = [e for _, e in estados if e]
+    if errores:
+        raise SystemExit(f'{len(errores)} errores: {errores[0]}')
+
+
+def limpiar(conn):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM resultados WHERE nombre_archivo LIKE %s", ('%BENCH%',))
+    conn.commit()
+    cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resultados', type=int, default=10000)
+    args = parser.parse_args()
+
+    app = crear_app()
+    with app.app_context():
+        from app.utils.conexiones import conexion
+
+        with conexion() as conn:
+            cur = conn.cursor()
+            items = items_prueba(cur, args.resultados)
+            cur.close()
+
+            try:
+                for nombre, funcion in (('por resultado', por_item), ('insertar_lote', en_lote)):
+                    inicio = time.perf_counter()
+                    funcion(conn, items)
+                    duracion = time.perf_counter() - inicio
+                    print(f"{nombre:<28} total={duracion * 1000:9.0f}ms "
+                          f"resultados={len(items)} res_s={len(items) / duracion:.0f}")
+            finally:
+                # Si algo falló la transacción quedó abortada: sin rollback el DELETE también falla
+                conn.rollback()
+                limpiar(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+PDF de facturas por segundo: en el proceso (un núcleo) y en el pool de
+DocumentosPDF con --procesos, un lote completo en frío y en caché, y el
+costo de un acierto de caché.
+
+No necesita base de datos; usa facturas sintéticas con --detalles líneas.
+
+    python benchmarks/bench_pdf.py --facturas 200 --procesos 4
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from comun import medir, imprimir
+
+
+def factura_sintetica(numero, detalles):
+    lineas = [{
+        'descripcion': f'Estudio de laboratorio {i}',
+        'cantidad': 1,
+        'precio_unitario': 850.0 + i,
+        'total': 850.0 + i
+    } for i in range(detalles)]
+    subtotal = sum(d['total'] for d in lineas)
+    return {
+        'numero_factura': f'FAC-{numero:06d}',
+        'ncf': f'B02{numero:08d}',
+        'fecha_factura': '17/10/2026',
+        'paciente': 'Juan Pérez',
+        'cedula': '001-0000000-1',
+        'estado': 'pendiente',
+        'forma_pago': 'efectivo',
+        'detalles': lineas,
+        'subtotal': subtotal,
+        'descuento': 0.0,
+        'itbis': 0.0,
+        'total': subtotal
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--facturas', type=int, default=200)
+    parser.add_argument('--detalles', type=int, default=8)
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    from app.services.pdf_service import renderizar_factura
+    from app.services.documentos_pdf import DocumentosPDF
+
+    facturas = [factura_sintetica(n, args.detalles) for n in range(args.facturas)]
+    imprimir('renderizar_factura', medir(lambda: renderizar_factura(facturas[0]), 50),
+             bytes=len(renderizar_factura(facturas[0])))
+
+    inicio = time.perf_counter()
+    for datos in facturas:
+        renderizar_factura(datos)
+    duracion = time.perf_counter() - inicio
+    print(f"en proceso: {args.facturas / duracion:.1f} PDF/s (1 núcleo)")
+
+    raiz = tempfile.mkdtemp(prefix='bench_pdf_')
+    documentos = DocumentosPDF(raiz, procesos=args.procesos)
+    try:
+        # Arranque del pool fuera de la medición
+        documentos.calentar()
+        documentos.renderizar(renderizar_factura, facturas[0])
+
+        pool = documentos.pool()
+        inicio = time.perf_counter()
+        futuros = [pool.submit(renderizar_factura, datos) for datos in facturas]
+        for futuro in futuros:
+            futuro.result()
+        duracion = time.perf_counter() - inicio
+        por_segundo = args.facturas / duracion
+        print(f"pool x{args.procesos}: {por_segundo:.1f} PDF/s "
+              f"({por_segundo / args.procesos:.1f} PDF/s por núcleo)")
+
+        # Lote (lotes_pdf): en frío reparte en el pool, en caliente solo lee archivos
+        items = [(n, 1, datos) for n, datos in enumerate(facturas)]
+        for nombre in ('lote frío', 'lote en caché'):
+            inicio = time.perf_counter()
+            documentos.facturas(items)
+            duracion = time.perf_counter() - inicio
+            print(f"{nombre}: {args.facturas} facturas en {duracion:.2f}s ({args.facturas / duracion:.1f} PDF/s)")
+
+        clave = documentos.clave('factura', 1, 1)
+        documentos.obtener(clave, lambda: renderizar_factura(facturas[0]))
+        imprimir('acierto de caché', medir(lambda: documentos.obtener(clave, None), 500))
+    finally:
+        documentos.cerrar()
+        shutil.rmtree(raiz, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Prueba de carga de las rutas con SQL crudo: psycopg2.connect() por request
+(implementación anterior) contra una conexión del pool del engine.
+
+Cada "request" abre la conexión, ejecuta una consulta corta y la cierra, con
+varios hilos concurrentes como los de un worker con threads.
+
+    python benchmarks/bench_pool.py --hilos 8 --requests 2000
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from comun import crear_app, medir, imprimir
+
+CONSULTA = "SELECT COUNT(*) FROM estudios WHERE activo = true"
+
+
+def request_directa():
+    import psycopg2
+    conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+    cur = conn.cursor()
+    cur.execute(CONSULTA)
+    cur.fetchone()
+    cur.close()
+    conn.close()
+
+
+def request_pool():
+    from app.utils.conexiones import conexion
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute(CONSULTA)
+        cur.fetchone()
+        cur.close()
+
+
+def carga(funcion, hilos, requests):
+    """Latencias por request (ms) y throughput con `hilos` concurrentes"""
+    def una(_):
+        inicio = time.perf_counter()
+        funcion()
+        return (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        tiempos = sorted(ejecutor.map(una, range(requests)))
+    duracion = time.perf_counter() - inicio
+
+    return {
+        'min': tiempos[0],
+        'p50': tiempos[len(tiempos) // 2],
+        'p95': tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))],
+        'max': tiempos[-1],
+    }, requests / duracion
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    app = crear_app()
+    with app.app_context():
+        from app.utils.conexiones import metricas_pool
+
+        casos = [('psycopg2.connect', request_directa), ('pool del engine', request_pool)]
+
+        for nombre, funcion in casos:
+            imprimir(f'{nombre} (1 hilo)', medir(funcion, args.repeticiones))
+
+        for nombre, funcion in casos:
+            stats, rps = carga(funcion, args.hilos, args.requests)
+            imprimir(f'{nombre} ({args.hilos} hilos)', stats, req_s=f'{rps:.0f}')
+
+        print('pool:', metricas_pool())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Edición de radiografías: la API base64 anterior (decodificar, una operación,
+PNG y base64 en cada paso) contra EditorRadiografias (binario subido una vez,
+cadena de operaciones en una pasada, resultado en caché).
+
+No necesita base de datos; genera una radiografía sintética de --lado x
+--lado píxeles (3000 ~ 10 MB en PNG con ruido).
+
+    python benchmarks/bench_radiografias.py --lado 3000
+"""
+import argparse
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from comun import medir, imprimir
+
+
+def radiografia(lado):
+    generador = np.random.default_rng(0)
+    y, x = np.ogrid[:lado, :lado]
+    torax = ((x - lado / 2) ** 2 / 1.5 + (y - lado / 2) ** 2) < (lado * 0.35) ** 2
+    pixeles = generador.integers(20, 70, size=(lado, lado), dtype=np.uint8)
+    pixeles[torax] += 120
+    return Image.fromarray(pixeles, 'L')
+
+
+def contraste_anterior(imagen_base64, factor):
+    """Copia de RadiologiaService.ajustar_contraste previo"""
+    img_data = base64.b64decode(imagen_base64.split(',')[1])
+    img = Image.open(BytesIO(img_data))
+    img = ImageEnhance.Contrast(img).enhance(factor)
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return f"data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode()}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lado', type=int, default=3000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    from app.services.almacen_archivos import AlmacenArchivos
+    from app.services.radiografia_service import EditorRadiografias, parsear_operaciones
+
+    buffered = BytesIO()
+    radiografia(args.lado).save(buffered, format='PNG')
+    png = buffered.getvalue()
+    data_uri = f"data:image/png;base64,{base64.b64encode(png).decode()}"
+    print(f"radiografía {args.lado}x{args.lado}: {len(png) / 1e6:.1f} MB PNG, "
+          f"{len(data_uri) / 1e6:.1f} MB en base64")
+
+    def anterior():
+        imagen = data_uri
+        for factor in (1.2, 1.3, 1.4):
+            imagen = contraste_anterior(imagen, factor)
+        return imagen
+
+    imprimir('base64 x3 contraste', medir(anterior, args.repeticiones))
+
+    raiz = tempfile.mkdtemp(prefix='bench_radiografias_')
+    try:
+        editor = EditorRadiografias(AlmacenArchivos(f'{raiz}/almacen'), f'{raiz}/cache')
+        imagen_id = editor.subir(BytesIO(png))['id']
+        cadena = parsear_operaciones('contraste:1.2,contraste:1.3,contraste:1.4')
+
+        def sin_cache():
+            editor.original(imagen_id)
+            shutil.rmtree(f'{raiz}/cache', ignore_errors=True)
+            return editor.render(imagen_id, cadena)
+
+        imprimir('cadena x3 (render)', medir(sin_cache, args.repeticiones))
+        imprimir('cadena x3 (lado 1024 webp)', medir(
+            lambda: (shutil.rmtree(f'{raiz}/cache', ignore_errors=True),
+                     editor.render(imagen_id, cadena, 'webp', 1024)), args.repeticiones))
+        imprimir('cadena x3 (en caché)', medir(lambda: editor.render(imagen_id, cadena), 200))
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Utilidades compartidas por los benchmarks.
+
+Los scripts se ejecutan desde la raíz del proyecto contra una base de datos
+de pruebas (nunca producción):
+
+    DATABASE_URL=postgresql://.../centro_bench python benchmarks/bench_dashboard.py
+"""
+import os
+import sys
+import time
+import statistics
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def crear_app():
+    """App Flask con la configuración indicada en BENCH_CONFIG"""
+    from app import create_app
+    return create_app(os.getenv('BENCH_CONFIG', 'production'))
+
+
+@contextmanager
+def contar_queries(engine):
+    """Cuenta las sentencias enviadas al servidor dentro del bloque"""
+    from sqlalchemy import event
+
+    contador = {'queries': 0}
+
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        contador['queries'] += 1
+
+    event.listen(engine, 'before_cursor_execute', _antes)
+    try:
+        yield contador
+    finally:
+        event.remove(engine, 'before_cursor_execute', _antes)
+
+
+def medir(funcion, repeticiones=20, calentamiento=2):
+    """Ejecuta la función varias veces y devuelve percentiles en ms"""
+    for _ in range(calentamiento):
+        funcion()
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    tiempos.sort()
+    return {
+        'min': tiempos[0],
+        'p50': statistics.median(tiempos),
+        'p95': tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))],
+        'max': tiempos[-1],
+    }
+
+
+def imprimir(nombre, stats, **extra):
+    """Una línea de resultados legible"""
+    detalle = ' '.join(f'{k}={v}' for k, v in extra.items())
+    print(f"{nombre:<28} p50={stats['p50']:9.2f}ms p95={stats['p95']:9.2f}ms "
+          f"min={stats['min']:9.2f}ms {detalle}")
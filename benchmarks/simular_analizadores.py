@@ -0,0 +1,91 @@
+"""
+Simulador de analizadores para el listener MLLP: N conexiones concurrentes,
+cada una envía mensajes ORU^R01 uno tras otro esperando su ACK (como hacen
+los equipos reales).
+
+Contra un servidor ya levantado (flask mllp servir):
+
+    python benchmarks/simular_analizadores.py --host 127.0.0.1 --puerto 2575 --analizadores 200
+
+Con --local levanta un ServidorMLLP en este proceso sobre una cola temporal
+(no inserta en la base de datos; mide framing, parseo, ACK y escritura en la
+cola):
+
+    python benchmarks/simular_analizadores.py --local --analizadores 300 --mensajes 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from comun import imprimir
+from bench_hl7 import mensaje_oru
+
+FIN = b'\x1c\x0d'
+
+
+async def analizador(numero, host, puerto, mensajes, obx, latencias, respuestas):
+    reader, writer = await asyncio.open_connection(host, puerto)
+    try:
+        for i in range(mensajes):
+            texto = mensaje_oru(numero * 100000 + i, obx)
+            inicio = time.perf_counter()
+            writer.write(b'\x0b' + texto.encode() + FIN)
+            await writer.drain()
+            ack = await reader.readuntil(FIN)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            codigo = ack.split(b'\rMSA|', 1)[1][:2].decode() if b'\rMSA|' in ack else '??'
+            respuestas[codigo] = respuestas.get(codigo, 0) + 1
+    finally:
+        writer.close()
+
+
+async def simular(args):
+    servidor = None
+    host, puerto = args.host, args.puerto
+    if args.local:
+        from app.services.cola_ingesta import ColaIngesta
+        from app.services.mllp_server import ServidorMLLP
+
+        ruta = os.path.join(tempfile.mkdtemp(), 'cola_bench.sqlite3')
+        servidor = ServidorMLLP(ColaIngesta(ruta), host='127.0.0.1', puerto=0)
+        await servidor.iniciar()
+        host, puerto = '127.0.0.1', servidor.puerto_real
+
+    latencias, respuestas = [], {}
+    inicio = time.perf_counter()
+    await asyncio.gather(*(
+        analizador(n, host, puerto, args.mensajes, args.obx, latencias, respuestas)
+        for n in range(args.analizadores)
+    ))
+    duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    total = len(latencias)
+    imprimir(f'{args.analizadores} analizadores', {
+        'min': latencias[0],
+        'p50': latencias[total // 2],
+        'p95': latencias[min(total - 1, int(total * 0.95))],
+    }, mensajes=total, msg_s=f'{total / duracion:.0f}', respuestas=respuestas)
+
+    if servidor is not None:
+        print('servidor:', servidor.metricas)
+        print('cola:', servidor.cola.conteo())
+        await servidor.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=2575)
+    parser.add_argument('--local', action='store_true')
+    parser.add_argument('--analizadores', type=int, default=100)
+    parser.add_argument('--mensajes', type=int, default=20)
+    parser.add_argument('--obx', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(simular(args))
+
+
+if __name__ == '__main__':
+    main()
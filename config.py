@@ -17,6 +17,8 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_size': 10,
+        'max_overflow': 10,
+        'pool_timeout': 30,
         'pool_recycle': 3600,
         'pool_pre_ping': True,
     }
@@ -36,8 +38,61 @@ class Config:
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB
     ALLOWED_EXTENSIONS = {'pdf', 'dcm', 'jpg', 'jpeg', 'png', 'hl7', 'txt'}
 
+    # Cache de respuestas (app/cache.py)
+    CACHE_HABILITADO = os.getenv('CACHE_HABILITADO', 'true').lower() == 'true'
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite')  # sqlite | redis | ninguno
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/1')
+    CACHE_SQLITE_PATH = os.getenv('CACHE_SQLITE_PATH')  # por defecto TEMP_FOLDER/cache.sqlite3
+    CACHE_LOCAL_MAX_ENTRADAS = int(os.getenv('CACHE_LOCAL_MAX_ENTRADAS', 512))
+    CACHE_MAX_TAMANO = 1024 * 1024  # no cachear respuestas de más de 1MB
+    CACHE_TAGS_TTL = 1  # segundos que un worker reutiliza las versiones de tags
+
+    # Búsqueda
+    INDICE_PACIENTES_REFRESCO = int(os.getenv('INDICE_PACIENTES_REFRESCO', 30))  # segundos
+    INDICE_PACIENTES_PURGA = int(os.getenv('INDICE_PACIENTES_PURGA', 300))  # segundos entre bajas
+
+    # Cola de ingesta de máquinas (app/services/cola_ingesta.py)
+    INGESTA_COLA_PATH = os.getenv('INGESTA_COLA_PATH')  # por defecto UPLOAD_FOLDER/cola_ingesta.sqlite3
+    INGESTA_WORKERS = int(os.getenv('INGESTA_WORKERS', 2))  # hilos por worker de gunicorn
+    INGESTA_LOTE = 50
+    INGESTA_LOTE_MAXIMO = 10000  # items por POST a /api/maquinas/recibir-lote
+    INGESTA_MAX_INTENTOS = 8
+    INGESTA_LEASE = 120  # segundos antes de reclamar un lote abandonado
+
+    # Listener MLLP para analizadores (flask mllp servir)
+    MLLP_HOST = os.getenv('MLLP_HOST', '0.0.0.0')
+    MLLP_PUERTO = int(os.getenv('MLLP_PUERTO', 2575))
+    MLLP_MAX_CONEXIONES = 500
+    MLLP_MAX_MENSAJE = 1024 * 1024  # bytes por mensaje
+    MLLP_TIMEOUT_INACTIVO = 600  # segundos sin datos antes de cerrar la conexión
+
     # Monitoreo
     EQUIPOS_EXPORT_PATH = os.getenv('EQUIPOS_EXPORT_PATH', './uploads/equipos')
+    MONITOR_LEDGER_PATH = os.getenv('MONITOR_LEDGER_PATH')  # por defecto <carpeta>/.monitor_archivos.sqlite3
+    MONITOR_WORKERS = int(os.getenv('MONITOR_WORKERS', 4))
+    MONITOR_ESTABILIDAD = 1.0  # segundos sin cambios de tamaño/mtime antes de procesar
+    MONITOR_REESCANEO = 300  # segundos entre escaneos completos de la carpeta
+    DICOM_STORE_PATH = os.getenv('DICOM_STORE_PATH')  # por defecto UPLOAD_FOLDER/dicom
+    DICOM_MAX_TAMANO = int(os.getenv('DICOM_MAX_TAMANO', 2 * 1024 ** 3))  # bytes por estudio recibido
+    DICOM_RENDER_CACHE = os.getenv('DICOM_RENDER_CACHE')  # por defecto UPLOAD_FOLDER/dicom_render
+    DICOM_RENDER_CACHE_MAX = int(os.getenv('DICOM_RENDER_CACHE_MAX', 5 * 1024 ** 3))  # flask dicom purgar-render
+    RADIOGRAFIA_STORE_PATH = os.getenv('RADIOGRAFIA_STORE_PATH')  # por defecto UPLOAD_FOLDER/radiografias
+    RADIOGRAFIA_CACHE = os.getenv('RADIOGRAFIA_CACHE')  # por defecto UPLOAD_FOLDER/radiografias_render
+    RADIOGRAFIA_CACHE_MAX = int(os.getenv('RADIOGRAFIA_CACHE_MAX', 2 * 1024 ** 3))  # flask imagenes purgar-render
+    RADIOGRAFIA_MAX_TAMANO = int(os.getenv('RADIOGRAFIA_MAX_TAMANO', 50 * 1024 * 1024))
+    RADIOGRAFIA_DECODIFICADAS = 8  # originales decodificados en memoria por proceso
+    PDF_CACHE_PATH = os.getenv('PDF_CACHE_PATH')  # por defecto UPLOAD_FOLDER/pdf_cache
+    PDF_PROCESOS = int(os.getenv('PDF_PROCESOS', 2))  # procesos de render por worker; 0 = en el mismo worker
+    PDF_TIMEOUT = 60  # segundos de espera por un PDF
+    PDF_LOTES_PATH = os.getenv('PDF_LOTES_PATH')  # por defecto UPLOAD_FOLDER/pdf_lotes
+    PDF_LOTE_MAXIMO = 2000  # facturas por lote
+    PDF_LOTES_HILOS = 1  # lotes simultáneos por worker
+    IMPRESORAS_TERMICAS = os.getenv('IMPRESORAS_TERMICAS', '')  # caja1=192.168.1.50:9100,lab=192.168.1.51
+    IMPRESORA_TERMICA_COLUMNAS = int(os.getenv('IMPRESORA_TERMICA_COLUMNAS', 48))  # 48 en Font A de 80 mm; 42 en algunas
+    IMPRESORA_TERMICA_TIMEOUT = 5  # segundos para conectar/enviar por TCP 9100
+    ORTHANC_URL = os.getenv('ORTHANC_URL', 'http://127.0.0.1:8042')
+    ORTHANC_USUARIO = os.getenv('ORTHANC_USUARIO', 'orthanc')
+    ORTHANC_CLAVE = os.getenv('ORTHANC_CLAVE', 'orthanc')
 
     # Nube
     CLOUD_SYNC_ENABLED = os.getenv('CLOUD_SYNC_ENABLED', 'false').lower() == 'true'
@@ -80,6 +135,7 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    CACHE_BACKEND = 'ninguno'
 
 
 # Seleccionar configuración según entorno
@@ -24,6 +24,32 @@ daemon = False
 pidfile = '/tmp/gunicorn_centro.pid'
 preload_app = True
 
+
+def post_fork(server, worker):
+    app = worker.app.wsgi()
+
+    # No compartir con el master las conexiones del pool abiertas antes del fork
+    from app import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+    # Cada worker construye su propio índice de pacientes en memoria
+    from app.services.indice_pacientes import indice_pacientes
+    indice_pacientes.precargar(app)
+
+    # Hilos que vacían la cola de ingesta de máquinas
+    from app.services.cola_ingesta import iniciar_workers
+    iniciar_workers(app)
+
+    # Procesos de render de PDF de este worker (spawn, ya con estilos cargados)
+    from app.services.documentos_pdf import obtener_documentos
+    obtener_documentos(app).calentar()
+
+
+def worker_exit(server, worker):
+    from app.services.documentos_pdf import cerrar_pools
+    cerrar_pools()
+
 # Headers
 forwarded_allow_ips = '127.0.0.1'
 proxy_protocol = False
@@ -0,0 +1,53 @@
+"""Tabla resumen_diario (rollup de pagos y facturas por día)
+
+Revision ID: 3f8a2c1d9e47
+Revises: 6cce35a550cd
+Create Date: 2026-10-17 09:12:40.518233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8a2c1d9e47'
+down_revision = '6cce35a550cd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resumen_diario',
+    sa.Column('fecha', sa.DATE(), nullable=False),
+    sa.Column('metodo_pago', sa.VARCHAR(length=50), server_default=sa.text("''"), nullable=False),
+    sa.Column('estado', sa.VARCHAR(length=20), server_default=sa.text("''"), nullable=False),
+    sa.Column('cantidad_pagos', sa.INTEGER(), server_default=sa.text('0'), nullable=False),
+    sa.Column('monto_pagos', sa.NUMERIC(precision=14, scale=2), server_default=sa.text('0'), nullable=False),
+    sa.Column('cantidad_facturas', sa.INTEGER(), server_default=sa.text('0'), nullable=False),
+    sa.Column('monto_facturas', sa.NUMERIC(precision=14, scale=2), server_default=sa.text('0'), nullable=False),
+    sa.Column('actualizado_en', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.PrimaryKeyConstraint('fecha', 'metodo_pago', 'estado', name=op.f('resumen_diario_pkey'))
+    )
+
+    # Carga inicial desde el histórico completo
+    op.execute("""
+        INSERT INTO resumen_diario (fecha, metodo_pago, estado, cantidad_pagos, monto_pagos)
+        SELECT fecha_pago::date, COALESCE(metodo_pago, ''), '', COUNT(*), COALESCE(SUM(monto), 0)
+        FROM pagos
+        WHERE fecha_pago IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    op.execute("""
+        INSERT INTO resumen_diario (fecha, metodo_pago, estado, cantidad_facturas, monto_facturas)
+        SELECT fecha_factura::date, '', COALESCE(estado, ''), COUNT(*), COALESCE(SUM(total), 0)
+        FROM facturas
+        WHERE fecha_factura IS NOT NULL
+        GROUP BY 1, 3
+        ON CONFLICT (fecha, metodo_pago, estado) DO UPDATE
+        SET cantidad_facturas = EXCLUDED.cantidad_facturas,
+            monto_facturas = EXCLUDED.monto_facturas
+    """)
+
+
+def downgrade():
+    op.drop_table('resumen_diario')
@@ -0,0 +1,35 @@
+"""Referencias al almacén de imágenes en radiografias e índice keyset de sonografias
+
+Revision ID: a51d8e3c7f92
+Revises: f6c2a9d84e17
+Create Date: 2026-10-17 20:05:31.448127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a51d8e3c7f92'
+down_revision = 'f6c2a9d84e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los data URI existentes se pasan al almacén con `flask imagenes migrar`
+    with op.batch_alter_table('radiografias', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('imagen_original_id', sa.VARCHAR(length=64), nullable=True))
+        batch_op.add_column(sa.Column('imagen_procesada_id', sa.VARCHAR(length=64), nullable=True))
+
+    with op.batch_alter_table('sonografias', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_sonografias_fecha_id'), ['fecha_estudio', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sonografias', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_sonografias_fecha_id'))
+
+    with op.batch_alter_table('radiografias', schema=None) as batch_op:
+        batch_op.drop_column('imagen_procesada_id')
+        batch_op.drop_column('imagen_original_id')
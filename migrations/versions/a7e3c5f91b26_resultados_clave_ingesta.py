@@ -0,0 +1,29 @@
+"""Clave de idempotencia de la ingesta en resultados
+
+Revision ID: a7e3c5f91b26
+Revises: b83f0c6d2e14
+Create Date: 2026-10-17 18:05:12.318407
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e3c5f91b26'
+down_revision = 'b83f0c6d2e14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Recibo de la cola o MSH-10 del HL7; NULL en los resultados anteriores (no chocan entre sí)
+    with op.batch_alter_table('resultados', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('clave_ingesta', sa.String(length=255), nullable=True))
+        batch_op.create_index(batch_op.f('uq_resultados_clave_ingesta'), ['clave_ingesta', 'orden_detalle_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('resultados', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('uq_resultados_clave_ingesta'))
+        batch_op.drop_column('clave_ingesta')
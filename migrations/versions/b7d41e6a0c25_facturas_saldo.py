@@ -0,0 +1,44 @@
+"""facturas.total_pagado / facturas.saldo mantenidos por registrar_pago
+
+Revision ID: b7d41e6a0c25
+Revises: 3f8a2c1d9e47
+Create Date: 2026-10-17 10:03:11.204917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d41e6a0c25'
+down_revision = '3f8a2c1d9e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('facturas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_pagado', sa.NUMERIC(precision=12, scale=2), server_default=sa.text('0'), nullable=False))
+        batch_op.add_column(sa.Column('saldo', sa.NUMERIC(precision=12, scale=2), server_default=sa.text('0'), nullable=False))
+
+    op.execute("UPDATE facturas SET saldo = COALESCE(total, 0)")
+    op.execute("""
+        UPDATE facturas f
+        SET total_pagado = p.pagado,
+            saldo = COALESCE(f.total, 0) - p.pagado
+        FROM (SELECT factura_id, SUM(monto) AS pagado FROM pagos GROUP BY factura_id) p
+        WHERE p.factura_id = f.id
+    """)
+
+    # Cuentas por cobrar: orden + keyset sobre las facturas abiertas únicamente
+    op.execute("""
+        CREATE INDEX idx_facturas_por_cobrar ON facturas (fecha_factura, id)
+        WHERE estado IN ('pendiente', 'parcial')
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_facturas_por_cobrar")
+    with op.batch_alter_table('facturas', schema=None) as batch_op:
+        batch_op.drop_column('saldo')
+        batch_op.drop_column('total_pagado')
@@ -0,0 +1,26 @@
+"""facturas.version: sube con cada pago o anulación (caché de PDF)
+
+Revision ID: b83f0c6d2e14
+Revises: a51d8e3c7f92
+Create Date: 2026-10-17 21:12:40.903551
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b83f0c6d2e14'
+down_revision = 'a51d8e3c7f92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('facturas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.INTEGER(), server_default=sa.text('1'), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('facturas', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,47 @@
+"""Índice y trigger de pacientes.updated_at para el refresco del índice en memoria
+
+Revision ID: c5d7e2a94f18
+Revises: a7e3c5f91b26
+Create Date: 2026-10-17 18:41:37.902154
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d7e2a94f18'
+down_revision = 'a7e3c5f91b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # refrescar() pide id > :max_id OR updated_at > :desde: con los dos índices es un BitmapOr
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_pacientes_updated_at'), ['updated_at'], unique=False)
+
+    # Los UPDATE por SQL crudo (bajas, correcciones) también mueven updated_at
+    op.execute("""
+        CREATE OR REPLACE FUNCTION pacientes_updated_at_trigger() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            NEW.updated_at := CURRENT_TIMESTAMP;
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_pacientes_updated_at
+        BEFORE UPDATE ON pacientes
+        FOR EACH ROW EXECUTE FUNCTION pacientes_updated_at_trigger()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_pacientes_updated_at ON pacientes")
+    op.execute("DROP FUNCTION IF EXISTS pacientes_updated_at_trigger()")
+
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_pacientes_updated_at'))
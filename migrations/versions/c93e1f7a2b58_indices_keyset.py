@@ -0,0 +1,54 @@
+"""Índices (fecha, id) para la paginación por cursor de los listados
+
+Revision ID: c93e1f7a2b58
+Revises: b7d41e6a0c25
+Create Date: 2026-10-17 11:20:54.730162
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c93e1f7a2b58'
+down_revision = 'b7d41e6a0c25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_pacientes_created_id'), ['created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('facturas', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_facturas_fecha_id'), ['fecha_factura', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('idx_facturas_estado_fecha_id'), ['estado', 'fecha_factura', 'id'], unique=False)
+
+    with op.batch_alter_table('ordenes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_ordenes_fecha_id'), ['fecha_orden', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('idx_ordenes_estado_fecha_id'), ['estado', 'fecha_orden', 'id'], unique=False)
+
+    with op.batch_alter_table('resultados', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_resultados_importacion_id'), ['fecha_importacion', 'id'], unique=False)
+
+    with op.batch_alter_table('radiografias', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_radiografias_toma_id'), ['fecha_toma', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('radiografias', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_radiografias_toma_id'))
+
+    with op.batch_alter_table('resultados', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_resultados_importacion_id'))
+
+    with op.batch_alter_table('ordenes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_ordenes_estado_fecha_id'))
+        batch_op.drop_index(batch_op.f('idx_ordenes_fecha_id'))
+
+    with op.batch_alter_table('facturas', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_facturas_estado_fecha_id'))
+        batch_op.drop_index(batch_op.f('idx_facturas_fecha_id'))
+
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_pacientes_created_id'))
@@ -0,0 +1,93 @@
+"""Búsqueda por trigramas (pg_trgm + unaccent) para busqueda_global
+
+Revision ID: d2a8b4c61f03
+Revises: c93e1f7a2b58
+Create Date: 2026-10-17 12:02:17.348816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a8b4c61f03'
+down_revision = 'c93e1f7a2b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+
+    # unaccent() es STABLE; el envoltorio IMMUTABLE permite usarlo en índices
+    op.execute("""
+        CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        AS $$ SELECT public.unaccent('public.unaccent', $1) $$
+    """)
+
+    # Texto normalizado de todos los campos buscables de un paciente
+    op.execute("""
+        CREATE OR REPLACE FUNCTION f_busqueda_paciente(
+            nombre text, apellido text, cedula text, telefono text,
+            celular text, email text, codigo text
+        ) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$
+            SELECT lower(f_unaccent(concat_ws(' ',
+                nombre, apellido, cedula, regexp_replace(coalesce(cedula, ''), '\\D', '', 'g'),
+                telefono, celular, email, codigo
+            )))
+        $$
+    """)
+
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('busqueda_texto', sa.TEXT(), nullable=True))
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION pacientes_busqueda_trigger() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            NEW.busqueda_texto := f_busqueda_paciente(
+                NEW.nombre, NEW.apellido, NEW.cedula, NEW.telefono,
+                NEW.celular, NEW.email, NEW.codigo_paciente
+            );
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_pacientes_busqueda
+        BEFORE INSERT OR UPDATE OF nombre, apellido, cedula, telefono, celular, email, codigo_paciente
+        ON pacientes
+        FOR EACH ROW EXECUTE FUNCTION pacientes_busqueda_trigger()
+    """)
+    op.execute("""
+        UPDATE pacientes SET busqueda_texto = f_busqueda_paciente(
+            nombre, apellido, cedula, telefono, celular, email, codigo_paciente
+        )
+    """)
+
+    op.execute("CREATE INDEX idx_pacientes_busqueda_trgm ON pacientes USING gin (busqueda_texto gin_trgm_ops)")
+    op.execute("CREATE INDEX idx_ordenes_numero_trgm ON ordenes USING gin (lower(numero_orden) gin_trgm_ops)")
+    op.execute("CREATE INDEX idx_ordenes_medico_trgm ON ordenes USING gin (lower(f_unaccent(medico_referente)) gin_trgm_ops)")
+    op.execute("CREATE INDEX idx_facturas_numero_trgm ON facturas USING gin (lower(numero_factura) gin_trgm_ops)")
+    op.execute("CREATE INDEX idx_facturas_ncf_trgm ON facturas USING gin (lower(ncf) gin_trgm_ops)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_facturas_ncf_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_facturas_numero_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_ordenes_medico_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_ordenes_numero_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_pacientes_busqueda_trgm")
+    op.execute("DROP TRIGGER IF EXISTS trg_pacientes_busqueda ON pacientes")
+    op.execute("DROP FUNCTION IF EXISTS pacientes_busqueda_trigger()")
+
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        batch_op.drop_column('busqueda_texto')
+
+    op.execute("DROP FUNCTION IF EXISTS f_busqueda_paciente(text, text, text, text, text, text, text)")
+    op.execute("DROP FUNCTION IF EXISTS f_unaccent(text)")
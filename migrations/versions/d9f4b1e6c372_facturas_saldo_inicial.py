@@ -0,0 +1,60 @@
+"""facturas.saldo inicial = total para cualquier INSERT (ORM, semillas, importaciones)
+
+Revision ID: d9f4b1e6c372
+Revises: c5d7e2a94f18
+Create Date: 2026-10-17 19:12:48.551630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f4b1e6c372'
+down_revision = 'c5d7e2a94f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Sin default: un INSERT que no indica saldo lo recibe del trigger (NOT NULL se
+    # comprueba después de los triggers BEFORE)
+    with op.batch_alter_table('facturas', schema=None) as batch_op:
+        batch_op.alter_column('saldo', server_default=None)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION facturas_saldo_trigger() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                IF NEW.saldo IS NULL THEN
+                    NEW.saldo := COALESCE(NEW.total, 0) - NEW.total_pagado;
+                END IF;
+            ELSIF NEW.total IS DISTINCT FROM OLD.total AND NEW.estado IS DISTINCT FROM 'anulada' THEN
+                -- Corrección del total de una factura viva: el saldo lo sigue
+                NEW.saldo := COALESCE(NEW.total, 0) - NEW.total_pagado;
+            END IF;
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_facturas_saldo
+        BEFORE INSERT OR UPDATE OF total ON facturas
+        FOR EACH ROW EXECUTE FUNCTION facturas_saldo_trigger()
+    """)
+
+    # Facturas creadas fuera de crear_factura_desde_orden desde b7d41e6a0c25
+    op.execute("""
+        UPDATE facturas SET saldo = COALESCE(total, 0) - total_pagado
+        WHERE estado IN ('pendiente', 'parcial') AND saldo <> COALESCE(total, 0) - total_pagado
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_facturas_saldo ON facturas")
+    op.execute("DROP FUNCTION IF EXISTS facturas_saldo_trigger()")
+
+    with op.batch_alter_table('facturas', schema=None) as batch_op:
+        batch_op.alter_column('saldo', server_default=sa.text('0'))
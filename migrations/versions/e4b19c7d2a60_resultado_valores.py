@@ -0,0 +1,55 @@
+"""Valores estructurados de resultados (un registro por OBX)
+
+Revision ID: e4b19c7d2a60
+Revises: d2a8b4c61f03
+Create Date: 2026-10-17 16:05:12.481930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b19c7d2a60'
+down_revision = 'd2a8b4c61f03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resultado_valores',
+    sa.Column('id', sa.INTEGER(), autoincrement=True, nullable=False),
+    sa.Column('resultado_id', sa.INTEGER(), nullable=False),
+    sa.Column('orden_detalle_id', sa.INTEGER(), nullable=False),
+    sa.Column('secuencia', sa.INTEGER(), nullable=True),
+    sa.Column('codigo', sa.VARCHAR(length=50), nullable=True),
+    sa.Column('nombre', sa.VARCHAR(length=200), nullable=True),
+    sa.Column('valor', sa.TEXT(), nullable=True),
+    sa.Column('valor_numerico', sa.NUMERIC(precision=14, scale=4), nullable=True),
+    sa.Column('unidades', sa.VARCHAR(length=50), nullable=True),
+    sa.Column('rango_referencia', sa.VARCHAR(length=100), nullable=True),
+    sa.Column('bandera', sa.VARCHAR(length=10), nullable=True),
+    sa.Column('estado', sa.VARCHAR(length=5), nullable=True),
+    sa.Column('mapeado', sa.BOOLEAN(), server_default=sa.text('true'), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.ForeignKeyConstraint(['resultado_id'], ['resultados.id'], name=op.f('resultado_valores_resultado_id_fkey'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['orden_detalle_id'], ['orden_detalles.id'], name=op.f('resultado_valores_orden_detalle_id_fkey')),
+    sa.PrimaryKeyConstraint('id', name=op.f('resultado_valores_pkey'))
+    )
+    with op.batch_alter_table('resultado_valores', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_resultado_valores_resultado'), ['resultado_id'], unique=False)
+        batch_op.create_index(batch_op.f('idx_resultado_valores_detalle'), ['orden_detalle_id', 'codigo'], unique=False)
+
+    with op.batch_alter_table('orden_detalles', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_orden_detalles_orden_id'), ['orden_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orden_detalles', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_orden_detalles_orden_id'))
+
+    with op.batch_alter_table('resultado_valores', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_resultado_valores_detalle'))
+        batch_op.drop_index(batch_op.f('idx_resultado_valores_resultado'))
+
+    op.drop_table('resultado_valores')
@@ -0,0 +1,106 @@
+"""Índice de metadatos DICOM (estudio / serie / instancia)
+
+Revision ID: f6c2a9d84e17
+Revises: e4b19c7d2a60
+Create Date: 2026-10-17 18:42:07.215604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c2a9d84e17'
+down_revision = 'e4b19c7d2a60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dicom_estudios',
+    sa.Column('id', sa.INTEGER(), autoincrement=True, nullable=False),
+    sa.Column('study_uid', sa.VARCHAR(length=64), nullable=False),
+    sa.Column('paciente_id', sa.INTEGER(), nullable=True),
+    sa.Column('orden_id', sa.INTEGER(), nullable=True),
+    sa.Column('patient_id', sa.VARCHAR(length=64), nullable=True),
+    sa.Column('patient_name', sa.VARCHAR(length=200), nullable=True),
+    sa.Column('patient_birth_date', sa.VARCHAR(length=8), nullable=True),
+    sa.Column('patient_sex', sa.VARCHAR(length=16), nullable=True),
+    sa.Column('accession_number', sa.VARCHAR(length=64), nullable=True),
+    sa.Column('fecha_estudio', sa.TIMESTAMP(), nullable=False),
+    sa.Column('descripcion', sa.VARCHAR(length=200), nullable=True),
+    sa.Column('institucion', sa.VARCHAR(length=200), nullable=True),
+    sa.Column('modalidades', sa.VARCHAR(length=64), server_default=sa.text("''"), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.ForeignKeyConstraint(['paciente_id'], ['pacientes.id'], name=op.f('dicom_estudios_paciente_id_fkey'), ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['orden_id'], ['ordenes.id'], name=op.f('dicom_estudios_orden_id_fkey'), ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id', name=op.f('dicom_estudios_pkey')),
+    sa.UniqueConstraint('study_uid', name=op.f('dicom_estudios_study_uid_key'))
+    )
+    with op.batch_alter_table('dicom_estudios', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_dicom_estudios_fecha_id'), ['fecha_estudio', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('idx_dicom_estudios_paciente'), ['paciente_id', 'fecha_estudio'], unique=False)
+        batch_op.create_index(batch_op.f('idx_dicom_estudios_patient_id'), ['patient_id'], unique=False)
+        batch_op.create_index(batch_op.f('idx_dicom_estudios_orden'), ['orden_id'], unique=False)
+
+    op.create_table('dicom_series',
+    sa.Column('id', sa.INTEGER(), autoincrement=True, nullable=False),
+    sa.Column('series_uid', sa.VARCHAR(length=64), nullable=False),
+    sa.Column('estudio_id', sa.INTEGER(), nullable=False),
+    sa.Column('modalidad', sa.VARCHAR(length=16), nullable=True),
+    sa.Column('numero', sa.INTEGER(), nullable=True),
+    sa.Column('descripcion', sa.VARCHAR(length=200), nullable=True),
+    sa.Column('parte_cuerpo', sa.VARCHAR(length=64), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.ForeignKeyConstraint(['estudio_id'], ['dicom_estudios.id'], name=op.f('dicom_series_estudio_id_fkey'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('dicom_series_pkey')),
+    sa.UniqueConstraint('series_uid', name=op.f('dicom_series_series_uid_key'))
+    )
+    with op.batch_alter_table('dicom_series', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_dicom_series_estudio'), ['estudio_id', 'numero'], unique=False)
+        batch_op.create_index(batch_op.f('idx_dicom_series_modalidad'), ['modalidad'], unique=False)
+
+    op.create_table('dicom_instancias',
+    sa.Column('id', sa.INTEGER(), autoincrement=True, nullable=False),
+    sa.Column('sop_uid', sa.VARCHAR(length=64), nullable=False),
+    sa.Column('serie_id', sa.INTEGER(), nullable=False),
+    sa.Column('sop_class_uid', sa.VARCHAR(length=64), nullable=True),
+    sa.Column('numero', sa.INTEGER(), nullable=True),
+    sa.Column('filas', sa.INTEGER(), nullable=True),
+    sa.Column('columnas', sa.INTEGER(), nullable=True),
+    sa.Column('cuadros', sa.INTEGER(), server_default=sa.text('1'), nullable=False),
+    sa.Column('transfer_syntax', sa.VARCHAR(length=64), nullable=True),
+    sa.Column('ruta', sa.TEXT(), nullable=False),
+    sa.Column('sha256', sa.VARCHAR(length=64), nullable=True),
+    sa.Column('tamano_bytes', sa.BIGINT(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.ForeignKeyConstraint(['serie_id'], ['dicom_series.id'], name=op.f('dicom_instancias_serie_id_fkey'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('dicom_instancias_pkey')),
+    sa.UniqueConstraint('sop_uid', name=op.f('dicom_instancias_sop_uid_key'))
+    )
+    with op.batch_alter_table('dicom_instancias', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('idx_dicom_instancias_serie'), ['serie_id', 'numero'], unique=False)
+        batch_op.create_index(batch_op.f('idx_dicom_instancias_sha256'), ['sha256'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('dicom_instancias', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_dicom_instancias_sha256'))
+        batch_op.drop_index(batch_op.f('idx_dicom_instancias_serie'))
+
+    op.drop_table('dicom_instancias')
+
+    with op.batch_alter_table('dicom_series', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_dicom_series_modalidad'))
+        batch_op.drop_index(batch_op.f('idx_dicom_series_estudio'))
+
+    op.drop_table('dicom_series')
+
+    with op.batch_alter_table('dicom_estudios', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('idx_dicom_estudios_orden'))
+        batch_op.drop_index(batch_op.f('idx_dicom_estudios_patient_id'))
+        batch_op.drop_index(batch_op.f('idx_dicom_estudios_paciente'))
+        batch_op.drop_index(batch_op.f('idx_dicom_estudios_fecha_id'))
+
+    op.drop_table('dicom_estudios')